@@ -1,20 +1,390 @@
 #!/usr/bin/env python3
 """
 STAC API Simples para BGAPP
-Implementação básica que não requer PostgreSQL com extensões específicas
+Implementação leve que não requer PostgreSQL com extensões específicas:
+itens persistidos em SQLite com índice R-tree (bbox) e índice temporal,
+pesquisa STAC (/search) com paginação por token e ingestão NDJSON em lote
 """
 
-from fastapi import FastAPI
-from datetime import datetime
-import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+import asyncio
+import base64
 import json
+import os
+import sqlite3
+import threading
+import uvicorn
+
+BASE_URL = os.environ.get('STAC_BASE_URL', 'http://localhost:8081').rstrip('/')
+DB_PATH = Path(os.environ.get('STAC_DB_PATH', Path(__file__).parent / 'data' / 'stac_items.db'))
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 10000
+BULK_BATCH_SIZE = 1000
+
+# Coleções criadas no primeiro arranque (bbox em [minx, miny, maxx, maxy] WGS84)
+DEFAULT_COLLECTIONS = [
+    {
+        'id': 'angola-marine-data',
+        'title': 'Angola Marine Data',
+        'description': 'Oceanographic and marine biodiversity data for Angola EEZ',
+        'stac_version': '1.0.0',
+        'license': 'CC-BY-4.0',
+        'extent': {
+            'spatial': {'bbox': [[8.5, -18.2, 17.5, -4.2]]},
+            'temporal': {'interval': [['2024-01-01T00:00:00Z', None]]}
+        }
+    },
+    {
+        'id': 'angola-terrestrial-data',
+        'title': 'Angola Terrestrial Data',
+        'description': 'Satellite and terrestrial data for Angola',
+        'stac_version': '1.0.0',
+        'license': 'CC-BY-4.0',
+        'extent': {
+            'spatial': {'bbox': [[11.4, -18.0, 24.0, -4.4]]},
+            'temporal': {'interval': [['2024-01-01T00:00:00Z', None]]}
+        }
+    }
+]
+
+
+def _parse_datetime(value: str) -> float:
+    """Timestamp RFC 3339 → segundos epoch (UTC)"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00').replace('z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _parse_interval(value: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """Parâmetro datetime STAC: instante, 'a/b', '../b' ou 'a/..'"""
+    if not value:
+        return None, None
+    if '/' not in value:
+        instant = _parse_datetime(value)
+        return instant, instant
+    start, end = value.split('/', 1)
+    return (
+        None if start in ('', '..') else _parse_datetime(start),
+        None if end in ('', '..') else _parse_datetime(end)
+    )
+
+
+def _geometry_bbox(geometry: Optional[Dict[str, Any]]) -> Optional[List[float]]:
+    """Bbox [minx, miny, maxx, maxy] de qualquer geometria GeoJSON"""
+    if not geometry:
+        return None
+    if geometry.get('type') == 'GeometryCollection':
+        boxes = [b for b in (_geometry_bbox(g) for g in geometry.get('geometries', [])) if b]
+    else:
+        xs, ys = [], []
+        stack = [geometry.get('coordinates')]
+        while stack:
+            coords = stack.pop()
+            if coords and isinstance(coords[0], (int, float)):
+                xs.append(coords[0])
+                ys.append(coords[1])
+            elif coords:
+                stack.extend(coords)
+        boxes = [[min(xs), min(ys), max(xs), max(ys)]] if xs else []
+    if not boxes:
+        return None
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+
+def _encode_token(datetime_start: float, rowid: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([datetime_start, rowid]).encode()).decode().rstrip('=')
+
+
+def _decode_token(token: str) -> Tuple[float, int]:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        datetime_start, rowid = json.loads(base64.urlsafe_b64decode(padded))
+        return float(datetime_start), int(rowid)
+    except Exception:
+        raise ValueError(f"Token de paginação inválido: {token}")
+
+
+class STACItemStore:
+    """
+    Armazém de coleções e itens STAC em SQLite
+
+    - items_rtree (módulo R-tree do SQLite) para interseção de bbox
+    - índices em (datetime_start, datetime_end) e (collection, datetime_start)
+    - paginação keyset por (datetime_start DESC, rowid DESC), estável sob inserções
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma ligação por thread (endpoints síncronos correm no threadpool do FastAPI)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS collections (
+                id TEXT PRIMARY KEY,
+                body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                collection TEXT NOT NULL,
+                datetime_start REAL NOT NULL,
+                datetime_end REAL NOT NULL,
+                body TEXT NOT NULL,
+                UNIQUE (collection, id)
+            );
+            CREATE INDEX IF NOT EXISTS items_datetime ON items (datetime_start, datetime_end);
+            CREATE INDEX IF NOT EXISTS items_collection_datetime ON items (collection, datetime_start);
+            CREATE VIRTUAL TABLE IF NOT EXISTS items_rtree USING rtree (rowid, minx, maxx, miny, maxy);
+        ''')
+        if conn.execute('SELECT COUNT(*) FROM collections').fetchone()[0] == 0:
+            for collection in DEFAULT_COLLECTIONS:
+                self.upsert_collection(collection)
+        conn.commit()
+
+    # ------------------------------------------------------------------
+    # Coleções
+    # ------------------------------------------------------------------
+
+    def upsert_collection(self, collection: Dict[str, Any]) -> Dict[str, Any]:
+        collection = {'type': 'Collection', 'stac_version': '1.0.0', 'links': [], **collection}
+        if not collection.get('id'):
+            raise ValueError("Coleção sem 'id'")
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                'INSERT INTO collections (id, body) VALUES (?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET body = excluded.body',
+                (collection['id'], json.dumps(collection))
+            )
+            conn.commit()
+        return collection
+
+    def list_collections(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute('SELECT body FROM collections ORDER BY id').fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def get_collection(self, collection_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute('SELECT body FROM collections WHERE id = ?', (collection_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ------------------------------------------------------------------
+    # Itens
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _prepare_item(item: Dict[str, Any], collection_id: Optional[str]) -> Tuple[Dict[str, Any], Tuple]:
+        """Validar item e extrair colunas indexadas"""
+        if item.get('type') != 'Feature' or not item.get('id'):
+            raise ValueError("Item STAC tem de ser uma Feature com 'id'")
+        collection = collection_id or item.get('collection')
+        if not collection:
+            raise ValueError(f"Item {item['id']} sem coleção")
+        if item.get('collection') not in (None, collection):
+            raise ValueError(f"Item {item['id']} pertence à coleção {item['collection']}, não a {collection}")
+
+        properties = item.get('properties') or {}
+        start = properties.get('start_datetime') or properties.get('datetime')
+        end = properties.get('end_datetime') or properties.get('datetime')
+        if not start or not end:
+            raise ValueError(f"Item {item['id']} sem datetime nem start_datetime/end_datetime")
+
+        bbox = item.get('bbox') or _geometry_bbox(item.get('geometry'))
+        item = {'stac_version': '1.0.0', 'links': [], 'assets': {}, **item,
+                'collection': collection, 'bbox': bbox}
+        return item, (item['id'], collection, _parse_datetime(start), _parse_datetime(end), bbox)
+
+    def upsert_items(self, items: Iterable[Dict[str, Any]],
+                     collection_id: Optional[str] = None) -> Dict[str, Any]:
+        """Inserir/atualizar itens numa única transação; erros reportados por posição"""
+        inserted = 0
+        errors = []
+        with self._write_lock:
+            conn = self._conn()
+            try:
+                for position, raw_item in enumerate(items):
+                    try:
+                        item, (item_id, collection, start, end, bbox) = self._prepare_item(raw_item, collection_id)
+                    except (ValueError, TypeError, AttributeError) as e:
+                        errors.append({'position': position, 'error': str(e)})
+                        continue
+
+                    conn.execute(
+                        'INSERT INTO items (id, collection, datetime_start, datetime_end, body) '
+                        'VALUES (?, ?, ?, ?, ?) ON CONFLICT (collection, id) DO UPDATE SET '
+                        'datetime_start = excluded.datetime_start, datetime_end = excluded.datetime_end, '
+                        'body = excluded.body',
+                        (item_id, collection, start, end, json.dumps(item))
+                    )
+                    rowid = conn.execute(
+                        'SELECT rowid FROM items WHERE collection = ? AND id = ?', (collection, item_id)
+                    ).fetchone()[0]
+                    conn.execute('DELETE FROM items_rtree WHERE rowid = ?', (rowid,))
+                    if bbox:
+                        conn.execute(
+                            'INSERT INTO items_rtree (rowid, minx, maxx, miny, maxy) VALUES (?, ?, ?, ?, ?)',
+                            (rowid, bbox[0], bbox[2], bbox[1], bbox[3])
+                        )
+                    inserted += 1
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return {'upserted': inserted, 'errors': errors}
+
+    def get_item(self, collection_id: str, item_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            'SELECT body FROM items WHERE collection = ? AND id = ?', (collection_id, item_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search(self, bbox: Optional[List[float]] = None, datetime_range: Optional[str] = None,
+               collections: Optional[List[str]] = None, ids: Optional[List[str]] = None,
+               limit: int = DEFAULT_LIMIT, token: Optional[str] = None) -> Dict[str, Any]:
+        """Pesquisa por bbox (interseção), intervalo temporal, coleções e ids, com paginação por token"""
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        where: List[str] = []
+        params: List[Any] = []
+
+        if bbox:
+            if len(bbox) == 6:  # bbox 3D: ignorar elevação
+                bbox = [bbox[0], bbox[1], bbox[3], bbox[4]]
+            if len(bbox) != 4:
+                raise ValueError("bbox deve ter 4 (ou 6) valores")
+            minx, miny, maxx, maxy = (float(v) for v in bbox)
+            if minx <= maxx:
+                ranges = [(minx, maxx)]
+            else:
+                # Bbox que atravessa o antimeridiano
+                ranges = [(minx, 180.0), (-180.0, maxx)]
+            rtree_where = ' OR '.join('(minx <= ? AND maxx >= ?)' for _ in ranges)
+            where.append(f'items.rowid IN (SELECT rowid FROM items_rtree WHERE ({rtree_where}) '
+                         f'AND miny <= ? AND maxy >= ?)')
+            for low, high in ranges:
+                params.extend([high, low])
+            params.extend([maxy, miny])
+
+        start, end = _parse_interval(datetime_range)
+        if start is not None:
+            where.append('datetime_end >= ?')
+            params.append(start)
+        if end is not None:
+            where.append('datetime_start <= ?')
+            params.append(end)
+
+        if collections:
+            where.append(f"collection IN ({','.join('?' * len(collections))})")
+            params.extend(collections)
+        if ids:
+            where.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+
+        conn = self._conn()
+        filter_sql = ' AND '.join(where) or '1'
+        matched = conn.execute(f'SELECT COUNT(*) FROM items WHERE {filter_sql}', params).fetchone()[0]
+
+        page_where = list(where)
+        page_params = list(params)
+        if token:
+            token_start, token_rowid = _decode_token(token)
+            page_where.append('(datetime_start < ? OR (datetime_start = ? AND items.rowid < ?))')
+            page_params.extend([token_start, token_start, token_rowid])
+
+        rows = conn.execute(
+            f"SELECT items.rowid, datetime_start, body FROM items WHERE {' AND '.join(page_where) or '1'} "
+            f"ORDER BY datetime_start DESC, items.rowid DESC LIMIT ?",
+            page_params + [limit + 1]
+        ).fetchall()
+
+        next_token = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_token = _encode_token(rows[-1][1], rows[-1][0])
+
+        return {
+            'features': [json.loads(body) for _, _, body in rows],
+            'matched': matched,
+            'next_token': next_token
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        return {
+            'items': conn.execute('SELECT COUNT(*) FROM items').fetchone()[0],
+            'collections': conn.execute('SELECT COUNT(*) FROM collections').fetchone()[0],
+            'db_path': str(self.db_path)
+        }
+
+
+store = STACItemStore(DB_PATH)
 
 app = FastAPI(
-    title='BGAPP STAC API', 
-    version='1.0.0',
+    title='BGAPP STAC API',
+    version='1.1.0',
     description='Simple STAC API for BGAPP geospatial data'
 )
 
+
+def _collection_links(collection_id: str) -> List[Dict[str, str]]:
+    return [
+        {'rel': 'self', 'href': f'{BASE_URL}/collections/{collection_id}'},
+        {'rel': 'items', 'href': f'{BASE_URL}/collections/{collection_id}/items'}
+    ]
+
+
+def _search_response(result: Dict[str, Any], limit: int, link_base: str,
+                     query: Dict[str, Any]) -> Dict[str, Any]:
+    links = [{'rel': 'self', 'href': link_base, 'type': 'application/geo+json'}]
+    if result['next_token']:
+        next_query = urlencode({
+            key: value for key, value in {**query, 'limit': limit, 'token': result['next_token']}.items()
+            if value is not None
+        })
+        links.append({
+            'rel': 'next',
+            'href': f'{link_base}?{next_query}',
+            'type': 'application/geo+json',
+            'method': 'GET'
+        })
+    return {
+        'type': 'FeatureCollection',
+        'features': result['features'],
+        'links': links,
+        'numberMatched': result['matched'],
+        'numberReturned': len(result['features']),
+        'context': {
+            'returned': len(result['features']),
+            'limit': limit,
+            'matched': result['matched']
+        }
+    }
+
+
+def _split_csv(value: Optional[str]) -> Optional[List[str]]:
+    return [part.strip() for part in value.split(',') if part.strip()] if value else None
+
+
 @app.get('/')
 async def root():
     """STAC Catalog root"""
@@ -24,157 +394,200 @@ async def root():
         'id': 'bgapp-catalog',
         'title': 'BGAPP Data Catalog',
         'description': 'STAC API for BGAPP - Marine and terrestrial data for Angola',
+        'conformsTo': [
+            'https://api.stacspec.org/v1.0.0/core',
+            'https://api.stacspec.org/v1.0.0/item-search',
+            'https://api.stacspec.org/v1.0.0/ogcapi-features'
+        ],
         'links': [
             {
-                'rel': 'self', 
-                'href': 'http://localhost:8081/',
+                'rel': 'self',
+                'href': f'{BASE_URL}/',
                 'type': 'application/json'
             },
             {
-                'rel': 'collections', 
-                'href': 'http://localhost:8081/collections',
+                'rel': 'collections',
+                'href': f'{BASE_URL}/collections',
                 'type': 'application/json'
             },
             {
                 'rel': 'search',
-                'href': 'http://localhost:8081/search',
+                'href': f'{BASE_URL}/search',
                 'type': 'application/geo+json',
                 'method': 'GET'
+            },
+            {
+                'rel': 'search',
+                'href': f'{BASE_URL}/search',
+                'type': 'application/geo+json',
+                'method': 'POST'
             }
         ]
     }
 
 @app.get('/collections')
-async def collections():
+def collections():
     """STAC Collections"""
     return {
         'collections': [
-            {
-                'id': 'angola-marine-data',
-                'title': 'Angola Marine Data',
-                'description': 'Oceanographic and marine biodiversity data for Angola EEZ',
-                'stac_version': '1.0.0',
-                'license': 'CC-BY-4.0',
-                'extent': {
-                    'spatial': {
-                        'bbox': [[-18.2, 8.5, -4.2, 17.5]]
-                    },
-                    'temporal': {
-                        'interval': [['2024-01-01T00:00:00Z', None]]
-                    }
-                },
-                'links': [
-                    {
-                        'rel': 'self',
-                        'href': 'http://localhost:8081/collections/angola-marine-data'
-                    },
-                    {
-                        'rel': 'items',
-                        'href': 'http://localhost:8081/collections/angola-marine-data/items'
-                    }
-                ]
-            },
-            {
-                'id': 'angola-terrestrial-data',
-                'title': 'Angola Terrestrial Data',
-                'description': 'Satellite and terrestrial data for Angola',
-                'stac_version': '1.0.0',
-                'license': 'CC-BY-4.0',
-                'extent': {
-                    'spatial': {
-                        'bbox': [[-18.0, 11.4, -4.4, 24.0]]
-                    },
-                    'temporal': {
-                        'interval': [['2024-01-01T00:00:00Z', None]]
-                    }
-                },
-                'links': [
-                    {
-                        'rel': 'self',
-                        'href': 'http://localhost:8081/collections/angola-terrestrial-data'
-                    },
-                    {
-                        'rel': 'items',
-                        'href': 'http://localhost:8081/collections/angola-terrestrial-data/items'
-                    }
-                ]
-            }
+            {**collection, 'links': _collection_links(collection['id'])}
+            for collection in store.list_collections()
         ]
     }
 
+@app.post('/collections')
+def create_collection(collection: Dict[str, Any]):
+    """Criar ou atualizar coleção"""
+    try:
+        created = store.upsert_collection(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**created, 'links': _collection_links(created['id'])}
+
 @app.get('/collections/{collection_id}')
-async def get_collection(collection_id: str):
+def get_collection(collection_id: str):
     """Get specific collection"""
-    collections_data = await collections()
-    
-    for collection in collections_data['collections']:
-        if collection['id'] == collection_id:
-            return collection
-    
-    return {"error": "Collection not found"}, 404
+    collection = store.get_collection(collection_id)
+    if collection is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return {**collection, 'links': _collection_links(collection_id)}
 
 @app.get('/collections/{collection_id}/items')
-async def get_items(collection_id: str, limit: int = 10):
+def get_items(collection_id: str, limit: int = DEFAULT_LIMIT, bbox: Optional[str] = None,
+              datetime: Optional[str] = None, token: Optional[str] = None):
     """Get items from collection"""
-    return {
-        'type': 'FeatureCollection',
-        'features': [
-            {
-                'type': 'Feature',
-                'stac_version': '1.0.0',
-                'id': f'sample-item-{i}',
-                'collection': collection_id,
-                'geometry': {
-                    'type': 'Polygon',
-                    'coordinates': [[
-                        [-15.0, 10.0],
-                        [-14.0, 10.0],
-                        [-14.0, 11.0],
-                        [-15.0, 11.0],
-                        [-15.0, 10.0]
-                    ]]
-                },
-                'properties': {
-                    'datetime': f'2024-01-{i+1:02d}T12:00:00Z',
-                    'title': f'Sample Data Item {i+1}',
-                    'description': f'Sample geospatial data for {collection_id}'
-                },
-                'links': [],
-                'assets': {}
-            }
-            for i in range(min(limit, 5))
-        ],
-        'links': [
-            {
-                'rel': 'self',
-                'href': f'http://localhost:8081/collections/{collection_id}/items'
-            }
-        ]
-    }
+    if store.get_collection(collection_id) is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    try:
+        bbox_values = [float(v) for v in bbox.split(',')] if bbox else None
+        result = store.search(bbox_values, datetime, [collection_id], limit=limit, token=token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _search_response(
+        result, limit, f'{BASE_URL}/collections/{collection_id}/items',
+        {'bbox': bbox, 'datetime': datetime}
+    )
+
+@app.post('/collections/{collection_id}/items')
+def create_items(collection_id: str, payload: Dict[str, Any]):
+    """Inserir um Item ou uma FeatureCollection de itens"""
+    if store.get_collection(collection_id) is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    items = payload.get('features', []) if payload.get('type') == 'FeatureCollection' else [payload]
+    result = store.upsert_items(items, collection_id)
+    if result['errors'] and not result['upserted']:
+        raise HTTPException(status_code=400, detail=result['errors'])
+    if payload.get('type') == 'Feature':
+        return store.get_item(collection_id, payload['id'])
+    return result
+
+@app.post('/collections/{collection_id}/items/bulk')
+async def bulk_items(collection_id: str, request: Request):
+    """
+    Ingestão em lote: corpo NDJSON (application/x-ndjson), um Item por linha
+
+    O corpo é lido em streaming e gravado em transações de BULK_BATCH_SIZE itens;
+    linhas inválidas são reportadas pelo número de linha sem abortar o lote.
+    """
+    if await asyncio.to_thread(store.get_collection, collection_id) is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    upserted = 0
+    errors: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+    batch_lines: List[int] = []
+    line_number = 0
+    pending = b''
+
+    async def flush():
+        nonlocal upserted
+        result = await asyncio.to_thread(store.upsert_items, list(batch), collection_id)
+        upserted += result['upserted']
+        errors.extend({'line': batch_lines[e['position']], 'error': e['error']} for e in result['errors'])
+        batch.clear()
+        batch_lines.clear()
+
+    def parse(line: bytes):
+        nonlocal line_number
+        line_number += 1
+        if not line.strip():
+            return
+        try:
+            batch.append(json.loads(line))
+            batch_lines.append(line_number)
+        except ValueError as e:
+            errors.append({'line': line_number, 'error': f'JSON inválido: {e}'})
+
+    async for chunk in request.stream():
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            parse(line)
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+    if pending:
+        parse(pending)
+    if batch:
+        await flush()
+
+    return JSONResponse(
+        status_code=200 if upserted or not errors else 400,
+        content={'collection': collection_id, 'upserted': upserted,
+                 'errors': errors[:100], 'error_count': len(errors)}
+    )
+
+@app.get('/collections/{collection_id}/items/{item_id}')
+def get_item(collection_id: str, item_id: str):
+    """Obter item"""
+    item = store.get_item(collection_id, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
 
 @app.get('/health')
-async def health():
+def health():
     """Health check endpoint"""
     return {
-        'status': 'healthy', 
+        'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'service': 'BGAPP STAC API',
-        'version': '1.0.0'
+        'version': '1.1.0',
+        'store': store.stats()
     }
 
 @app.get('/search')
-async def search(limit: int = 10):
-    """Simple search endpoint"""
-    return {
-        'type': 'FeatureCollection',
-        'features': [],
-        'context': {
-            'returned': 0,
-            'limit': limit,
-            'matched': 0
-        }
+def search(limit: int = DEFAULT_LIMIT, bbox: Optional[str] = None, datetime: Optional[str] = None,
+           collections: Optional[str] = None, ids: Optional[str] = None, token: Optional[str] = None):
+    """STAC item search (GET)"""
+    try:
+        bbox_values = [float(v) for v in bbox.split(',')] if bbox else None
+        result = store.search(bbox_values, datetime, _split_csv(collections), _split_csv(ids), limit, token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _search_response(
+        result, limit, f'{BASE_URL}/search',
+        {'bbox': bbox, 'datetime': datetime, 'collections': collections, 'ids': ids}
+    )
+
+@app.post('/search')
+def search_post(body: Dict[str, Any]):
+    """STAC item search (POST)"""
+    limit = body.get('limit', DEFAULT_LIMIT)
+    try:
+        result = store.search(
+            body.get('bbox'), body.get('datetime'), body.get('collections'), body.get('ids'),
+            limit, body.get('token') or body.get('next')
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = {
+        'bbox': ','.join(str(v) for v in body['bbox']) if body.get('bbox') else None,
+        'datetime': body.get('datetime'),
+        'collections': ','.join(body['collections']) if body.get('collections') else None,
+        'ids': ','.join(body['ids']) if body.get('ids') else None
     }
+    return _search_response(result, limit, f'{BASE_URL}/search', query)
 
 if __name__ == '__main__':
     print("🚀 Starting BGAPP Simple STAC API...")
-    uvicorn.run(app, host='0.0.0.0', port=8081)
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('STAC_PORT', 8081)))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark de cold start da Admin API BGAPP
+Mede o tempo de import de bgapp.admin_api em processos novos (-X importtime),
+lista os módulos mais caros e falha se pacotes pesados forem importados no
+arranque ou se o tempo mediano ultrapassar o orçamento definido
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+
+# Pacotes que só devem ser importados sob demanda (service_registry)
+HEAVY_PACKAGES = [
+    "pandas", "scipy", "sklearn", "matplotlib", "plotly", "folium",
+    "geopandas", "xarray", "shapely", "seaborn", "reportlab"
+]
+
+# Os módulos podem escrever logs no stdout: o resultado vai numa linha marcada
+RESULT_MARKER = "BGAPP_BENCH_RESULT "
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import {module}; "
+    "print('" + RESULT_MARKER + "' + str(round((time.perf_counter() - started) * 1000, 1)))"
+)
+
+WARM_SNIPPET = (
+    "import json, time; started = time.perf_counter(); import {module}; "
+    "from bgapp.core.service_registry import service_registry; "
+    "cold = (time.perf_counter() - started) * 1000; service_registry.warm_up(); "
+    "print('" + RESULT_MARKER + "' + json.dumps({{'cold_ms': round(cold, 1), 'stats': service_registry.get_stats()}}))"
+)
+
+
+def _run(module: str, snippet: str, workdir: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(SRC), BGAPP_LAZY_WARMUP="0")
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet.format(module=module)],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=600
+    )
+
+
+def _result(stdout: str) -> str:
+    return [line for line in stdout.splitlines() if line.startswith(RESULT_MARKER)][-1][len(RESULT_MARKER):]
+
+
+def parse_importtime(stderr: str) -> list:
+    """Linhas "import time: self [us] | cumulative | module" → (módulo, self_us, cumulativo_us)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+            rows.append((name, int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def summarize_imports(rows: list, top: int) -> dict:
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    bgapp_modules = sorted(
+        ((name, cumulative) for name, _, cumulative in rows if name.startswith("bgapp.")),
+        key=lambda item: item[1], reverse=True
+    )
+    imported = {name.split(".")[0] for name, _, _ in rows}
+    return {
+        "modules_imported": len(rows),
+        "top_packages_ms": {
+            package: round(us / 1000, 1)
+            for package, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+        },
+        "top_bgapp_modules_ms": {name: round(us / 1000, 1) for name, us in bgapp_modules[:top]},
+        "heavy_packages_imported": [package for package in HEAVY_PACKAGES if package in imported]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cold start (tempo de import) da Admin API")
+    parser.add_argument("--module", default="bgapp.admin_api", help="Módulo a importar")
+    parser.add_argument("--runs", type=int, default=5, help="Processos novos a medir")
+    parser.add_argument("--top", type=int, default=15, help="Módulos/pacotes a listar")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Falhar se a mediana exceder este valor")
+    parser.add_argument("--allow-heavy", action="store_true", help="Não falhar se pacotes pesados forem importados")
+    parser.add_argument("--warm", action="store_true", help="Medir também o warm-up completo dos subsistemas")
+    parser.add_argument("--json", dest="json_path", help="Guardar resultados em JSON (acompanhamento de regressões)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Alguns módulos escrevem em logs/ relativo ao diretório atual
+        Path(workdir, "logs").mkdir()
+
+        timings, rows = [], []
+        for _ in range(args.runs):
+            result = _run(args.module, IMPORT_SNIPPET, workdir)
+            if result.returncode != 0:
+                print(result.stderr[-2000:], file=sys.stderr)
+                sys.exit(f"❌ Import de {args.module} falhou")
+            timings.append(float(_result(result.stdout)))
+            rows = parse_importtime(result.stderr)
+
+        warm = None
+        if args.warm:
+            result = _run(args.module, WARM_SNIPPET, workdir)
+            if result.returncode == 0:
+                warm = json.loads(_result(result.stdout))
+
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "median_ms": round(statistics.median(timings), 1),
+        "min_ms": round(min(timings), 1),
+        "max_ms": round(max(timings), 1),
+        **summarize_imports(rows, args.top)
+    }
+    if warm:
+        report["warm_up"] = {
+            name: service["load_time_ms"]
+            for name, service in warm["stats"]["services"].items() if service["state"] == "loaded"
+        }
+        report["warm_up_unavailable"] = [
+            name for name, service in warm["stats"]["services"].items() if service["state"] == "unavailable"
+        ]
+
+    print(f"🚀 Cold start de {args.module} ({args.runs} processos)")
+    print(f"  mediana: {report['median_ms']}ms  (min {report['min_ms']}ms, max {report['max_ms']}ms)")
+    print(f"  módulos importados: {report['modules_imported']}")
+    print("\n  Pacotes mais caros (self):")
+    for package, millis in report["top_packages_ms"].items():
+        print(f"  {package:>32}: {millis}ms")
+    print("\n  Módulos BGAPP mais caros (cumulativo):")
+    for name, millis in report["top_bgapp_modules_ms"].items():
+        print(f"  {name:>48}: {millis}ms")
+    if warm:
+        print(f"\n  Warm-up dos subsistemas (total {round(sum(report['warm_up'].values()), 1)}ms):")
+        for name, millis in sorted(report["warm_up"].items(), key=lambda item: item[1], reverse=True):
+            print(f"  {name:>32}: {millis}ms")
+        if report["warm_up_unavailable"]:
+            print(f"  indisponíveis: {', '.join(report['warm_up_unavailable'])}")
+
+    if args.json_path:
+        Path(args.json_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+    failures = []
+    if report["heavy_packages_imported"] and not args.allow_heavy:
+        failures.append(f"pacotes pesados importados no arranque: {', '.join(report['heavy_packages_imported'])}")
+    if args.budget_ms is not None and report["median_ms"] > args.budget_ms:
+        failures.append(f"mediana {report['median_ms']}ms acima do orçamento de {args.budget_ms}ms")
+    for failure in failures:
+        print(f"\n❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("\n✅ Cold start dentro dos limites")
+
+
+if __name__ == "__main__":
+    main()
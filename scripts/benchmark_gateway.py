@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark do API Gateway BGAPP
+Mede o overhead do rate limiting por pedido a uma taxa alvo (por omissão 5k req/s)
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bgapp.gateway.api_gateway import APIGateway  # noqa: E402
+
+
+def _fake_request(client_ip: str, path: str) -> SimpleNamespace:
+    """Pedido mínimo com os atributos usados por check_rate_limit"""
+    return SimpleNamespace(
+        client=SimpleNamespace(host=client_ip),
+        headers={"user-agent": "bgapp-benchmark"},
+        url=SimpleNamespace(path=path)
+    )
+
+
+async def run_benchmark(rate: int, duration: float, clients: int, use_redis: bool,
+                        redis_host: str, redis_port: int) -> dict:
+    gateway = APIGateway(redis_host=redis_host, redis_port=redis_port)
+    if use_redis:
+        await gateway.initialize()
+        if not gateway.redis:
+            raise SystemExit("❌ Redis indisponível para o benchmark")
+
+    requests = [_fake_request(f"10.0.{i // 256}.{i % 256}", "/collections") for i in range(clients)]
+    total = int(rate * duration)
+    latencies = []
+    blocked = 0
+
+    started = time.perf_counter()
+    for i in range(total):
+        # Ritmo constante: o pedido i é emitido em started + i/rate
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        t0 = time.perf_counter()
+        status = await gateway.check_rate_limit(requests[i % clients])
+        latencies.append(time.perf_counter() - t0)
+        blocked += status.blocked
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    micros = [value * 1_000_000 for value in latencies]
+    return {
+        "backend": "redis" if use_redis else "memory",
+        "requests": total,
+        "target_rate": rate,
+        "achieved_rate": round(total / elapsed, 1),
+        "blocked": blocked,
+        "mean_us": round(statistics.fmean(micros), 2),
+        "p50_us": round(micros[len(micros) // 2], 2),
+        "p99_us": round(micros[int(len(micros) * 0.99) - 1], 2),
+        "max_us": round(micros[-1], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do rate limiter do API Gateway")
+    parser.add_argument("--rate", type=int, default=5000, help="Pedidos por segundo")
+    parser.add_argument("--duration", type=float, default=5.0, help="Duração em segundos")
+    parser.add_argument("--clients", type=int, default=500, help="Número de IPs distintos")
+    parser.add_argument("--redis", action="store_true", help="Usar Redis (GCRA em Lua)")
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(
+        args.rate, args.duration, args.clients, args.redis, args.redis_host, args.redis_port
+    ))
+
+    print("🚪 Benchmark API Gateway")
+    for key, value in result.items():
+        print(f"  {key:>14}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark de previsões ML BGAPP
+Compara previsão linha a linha, predict_batch e o micro-batcher assíncrono
+(throughput e latência) para o modelo de biodiversidade
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bgapp.ml.models import MLModelManager, ModelType, create_real_training_data  # noqa: E402
+from bgapp.ml.batch_predictor import MicroBatchPredictor  # noqa: E402
+
+
+def _summary(name: str, latencies: list, elapsed: float, rows: int) -> dict:
+    # Percentis interpolados: com poucas amostras (ex.: lotes) p99 fica entre p50 e o máximo
+    millis = np.asarray(latencies) * 1000
+    p50, p99 = np.percentile(millis, [50, 99])
+    return {
+        "mode": name,
+        "rows": rows,
+        "samples": len(millis),
+        "throughput_rows_s": round(rows / elapsed, 1),
+        "mean_ms": round(float(millis.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(millis.max()), 3)
+    }
+
+
+def bench_single(manager: MLModelManager, model_type: str, inputs: list) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for row in inputs:
+        t0 = time.perf_counter()
+        manager.predict(model_type, row)
+        latencies.append(time.perf_counter() - t0)
+    return _summary("single_row", latencies, time.perf_counter() - started, len(inputs))
+
+
+def bench_batch(manager: MLModelManager, model_type: str, inputs: list, batch_size: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for start in range(0, len(inputs), batch_size):
+        t0 = time.perf_counter()
+        manager.predict_batch(model_type, inputs[start:start + batch_size])
+        latencies.append(time.perf_counter() - t0)
+    return _summary(f"predict_batch({batch_size})", latencies, time.perf_counter() - started, len(inputs))
+
+
+async def bench_micro_batcher(manager: MLModelManager, model_type: str, inputs: list,
+                              concurrency: int, max_batch_size: int, max_wait_ms: float,
+                              workers: int) -> dict:
+    batcher = MicroBatchPredictor(manager, max_batch_size=max_batch_size,
+                                  max_wait_ms=max_wait_ms, max_workers=workers)
+    latencies = []
+
+    async def client(rows: list):
+        # Cada cliente emite pedidos sequenciais, como um utilizador do endpoint
+        for row in rows:
+            t0 = time.perf_counter()
+            await batcher.predict(model_type, row)
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(inputs[i::concurrency]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stats = batcher.get_stats()
+    await batcher.shutdown()
+
+    result = _summary(f"micro_batcher(c={concurrency})", latencies, elapsed, len(inputs))
+    result["mean_batch_size"] = round(stats["mean_batch_size"], 1)
+    result["batches"] = stats["batches"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de previsões ML (batch e micro-batching)")
+    parser.add_argument("--requests", type=int, default=2000, help="Número de previsões")
+    parser.add_argument("--single", type=int, default=200, help="Previsões no modo linha a linha")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=64, help="Clientes concorrentes")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    model_type = ModelType.BIODIVERSITY_PREDICTOR
+    with tempfile.TemporaryDirectory() as models_dir:
+        manager = MLModelManager(models_dir=models_dir)
+        data = create_real_training_data()["biodiversity"]
+        manager.create_biodiversity_predictor(data)
+
+        features = manager.models[model_type]["features"]
+        sample = data[features].sample(n=args.requests, replace=True, random_state=42)
+        inputs = sample.to_dict(orient="records")
+
+        results = [
+            bench_single(manager, model_type, inputs[:args.single]),
+            bench_batch(manager, model_type, inputs, args.batch_size),
+            asyncio.run(bench_micro_batcher(
+                manager, model_type, inputs, args.concurrency,
+                args.batch_size, args.max_wait_ms, args.workers
+            ))
+        ]
+
+    print("🧠 Benchmark de previsões ML")
+    for result in results:
+        print(f"\n  {result['mode']}")
+        for key, value in result.items():
+            if key != "mode":
+                print(f"  {key:>18}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark da limpeza de ocorrências BGAPP
+Compara o pipeline colunar (process.biodiv.iter_clean_occurrences) com a limpeza
+anterior registo a registo (tuplos arredondados + shapely contains por ponto)
+em 1M e 10M ocorrências sintéticas
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bgapp.process.biodiv import iter_clean_occurrences  # noqa: E402
+
+
+def angola_aoi(vertices: int = 64) -> dict:
+    """Polígono irregular aproximando a ZEE angolana (muitos vértices, como uma AOI real)"""
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    rng = np.random.default_rng(7)
+    radius = 1.0 + 0.15 * rng.standard_normal(vertices)
+    lon = 16.3 + 7.8 * radius * np.cos(angles)
+    lat = -11.2 + 7.0 * radius * np.sin(angles)
+    ring = [[float(x), float(y)] for x, y in zip(lon, lat)]
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def synthetic_occurrences(n: int, seed: int = 42) -> pd.DataFrame:
+    """Ocorrências com ~10% de duplicados, ~2% sem coordenadas e ~1% fora de WGS84"""
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(6.0, 26.0, n)
+    lat = rng.uniform(-20.0, -2.0, n)
+
+    duplicates = rng.random(n) < 0.10
+    source = rng.integers(0, n, duplicates.sum())
+    lon[duplicates] = lon[source]
+    lat[duplicates] = lat[source]
+
+    lon[rng.random(n) < 0.02] = np.nan
+    lat[rng.random(n) < 0.01] = 120.0
+
+    species = np.array([f"Species {i}" for i in range(500)], dtype=object)
+    dates = pd.date_range("2000-01-01", periods=8000, freq="D").strftime("%Y-%m-%d").to_numpy(dtype=object)
+    names = species[rng.integers(0, species.size, n)]
+    event_dates = dates[rng.integers(0, dates.size, n)]
+    names[duplicates] = names[source]
+    event_dates[duplicates] = event_dates[source]
+
+    return pd.DataFrame({
+        "decimalLongitude": lon,
+        "decimalLatitude": lat,
+        "scientificName": names,
+        "eventDate": event_dates,
+    })
+
+
+def legacy_clean(records: list, geometry: dict) -> list:
+    """Implementação anterior: clean_occurrences + filtro AOI de obis.fetch_obis_occurrences"""
+    from shapely.geometry import Point, shape
+
+    seen = set()
+    cleaned = []
+    for r in records:
+        lon = r.get("decimalLongitude")
+        lat = r.get("decimalLatitude")
+        if lon is None or lat is None:
+            continue
+        key = (round(float(lon), 6), round(float(lat), 6), r.get("scientificName"), r.get("eventDate"))
+        if key in seen:
+            continue
+        seen.add(key)
+        cleaned.append(r)
+
+    geom = shape(geometry)
+    return [r for r in cleaned if geom.contains(Point(float(r["decimalLongitude"]), float(r["decimalLatitude"])))]
+
+
+def bench_vectorized(df: pd.DataFrame, aoi: dict, chunk_size: int) -> dict:
+    started = time.perf_counter()
+    kept = 0
+    chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    for cleaned in iter_clean_occurrences(chunks, aoi=aoi):
+        kept += len(cleaned)
+    elapsed = time.perf_counter() - started
+    return {"mode": f"vectorized(chunk={chunk_size})", "rows": len(df), "kept": kept,
+            "seconds": round(elapsed, 3), "rows_s": round(len(df) / elapsed, 1)}
+
+
+def bench_legacy(df: pd.DataFrame, aoi: dict, limit: int) -> dict:
+    sample = df.iloc[:limit]
+    # NaN → None, como nos registos JSON das APIs
+    records = sample.astype(object).where(sample.notna(), None).to_dict(orient="records")
+    started = time.perf_counter()
+    kept = len(legacy_clean(records, aoi))
+    elapsed = time.perf_counter() - started
+    result = {"mode": "legacy_loop", "rows": len(sample), "kept": kept,
+              "seconds": round(elapsed, 3), "rows_s": round(len(sample) / elapsed, 1)}
+    if len(sample) < len(df):
+        result["extrapolated_seconds"] = round(elapsed * len(df) / len(sample), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da limpeza/deduplicação de ocorrências")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--legacy-max", type=int, default=2_000_000,
+                        help="Máximo de registos no modo anterior (o resto é extrapolado)")
+    args = parser.parse_args()
+
+    aoi = angola_aoi()
+    print("🧹 Benchmark de limpeza de ocorrências")
+    for size in args.sizes:
+        df = synthetic_occurrences(size)
+        results = [
+            bench_vectorized(df, aoi, args.chunk_size),
+            bench_legacy(df, aoi, min(size, args.legacy_max)),
+        ]
+        print(f"\n  {size:,} registos")
+        for result in results:
+            print(f"  {result['mode']}")
+            for key, value in result.items():
+                if key != "mode":
+                    print(f"  {key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -312,7 +312,7 @@ class MetoceanAPI:
         
         # Variação sazonal
         month = time.month
-        if 12 <= month <= 2:  # Verão - ventos mais fracos
+        if month in (12, 1, 2):  # Verão - ventos mais fracos
             base_u *= 0.7
             base_v *= 0.8
         elif 6 <= month <= 8:  # Inverno - ventos mais fortes
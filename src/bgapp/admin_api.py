@@ -4,12 +4,14 @@ BGAPP Admin API - Backend seguro para o painel administrativo
 Fornece endpoints protegidos para gestão de serviços, monitorização e configuração
 """
 
+import asyncio
+import importlib.util
 import json
 import os
 import subprocess
 import time
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 
@@ -47,7 +49,10 @@ except ImportError:
 # Importar sistema de error handling e monitorização
 try:
     from .core.error_handler import error_handler, with_error_handling, create_fallback_response
-    from .core.database_pool import db_pool, initialize_database_pool, get_database_stats, is_database_healthy
+    from .core.database_pool import (
+        db_pool, initialize_database_pool, get_database_stats, is_database_healthy,
+        QueryStreamResponse, json_safe_row
+    )
     from .core.monitoring import monitoring_system, start_monitoring, get_monitoring_stats
     ERROR_HANDLING_ENABLED = True
     MONITORING_ENABLED = True
@@ -63,11 +68,19 @@ except ImportError:
     import logging
     logger = logging.getLogger(__name__)
 
+# Subsistemas pesados (ML, QGIS, cartografia, relatórios...) carregados sob demanda
+from .core.service_registry import service_registry
+
 # Importar módulos meteorológicos
 try:
     from .realtime.copernicus_simulator import CopernicusSimulator
 except ImportError:
     CopernicusSimulator = None
+from .realtime.metocean_grid import (
+    metocean_engine, MetoceanGridEngine, VELOCITY_VARIABLES, SCALAR_VARIABLES,
+    SCALAR_UNITS, BINARY_MEDIA_TYPE
+)
+from .cartography.tile_server import tile_server, ANGOLA_EEZ_BOUNDS
 
 # Importar scheduler
 try:
@@ -83,7 +96,6 @@ try:
     from .cache.redis_cache import cache, cache_manager, cached
     from .monitoring.alerts import alert_manager
     from .backup.backup_manager import backup_manager
-    from .ml.models import ml_manager, create_sample_training_data
     from .gateway.api_gateway import gateway, RateLimitMiddleware, initialize_gateway
     from .auth.enterprise_auth import (enterprise_auth, get_current_user, require_permission, 
                                      require_role, LoginRequest, RegisterRequest, MFASetupRequest,
@@ -91,7 +103,6 @@ try:
     CACHE_ENABLED = True
     ALERTS_ENABLED = True
     BACKUP_ENABLED = True
-    ML_ENABLED = True
     GATEWAY_ENABLED = True
     ENTERPRISE_AUTH_ENABLED = True
 except ImportError as e:
@@ -99,14 +110,12 @@ except ImportError as e:
     CACHE_ENABLED = False
     ALERTS_ENABLED = False
     BACKUP_ENABLED = False
-    ML_ENABLED = False
     GATEWAY_ENABLED = False
     ENTERPRISE_AUTH_ENABLED = False
     cache = None
     cache_manager = None
     alert_manager = None
     backup_manager = None
-    ml_manager = None
     gateway = None
     enterprise_auth = None
     
@@ -145,14 +154,19 @@ except ImportError as e:
             return func
         return decorator
 
+# Machine Learning (scikit-learn): carregado na primeira previsão ou no warm-up
+ml_manager = service_registry.lazy("ml_manager", ".ml.models:ml_manager")
+# ml.models expõe os dados de treino como create_real_training_data (import já feito por ml_manager)
+service_registry.register("ml_models", ".ml.models")
+ML_ENABLED = service_registry.flag("ml_manager")
+
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Depends, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 import sqlalchemy as sa
 import hashlib
-from .core.stac import STACManager
 
 app = FastAPI(
     title="BGAPP Admin API",
@@ -225,8 +239,14 @@ except ImportError as e:
 if settings.security.rate_limit_enabled and gateway:
     app.add_middleware(RateLimitMiddleware, gateway=gateway)
 
-# Inicializar STAC Manager
-stac_manager = STACManager()
+# Inicializar STAC Manager (sob demanda)
+def _create_stac_manager():
+    from .core.stac import STACManager
+    return STACManager()
+
+# Nos handlers usar `await service_registry.aget("stac_manager")`: o proxy levantaria
+# ServiceLoading dentro dos try/except genéricos, que o transformariam num 500
+service_registry.register("stac_manager", _create_stac_manager)
 
 # =============================================================================
 # EVENTOS DE STARTUP E SHUTDOWN
@@ -271,6 +291,9 @@ async def startup_event():
         except Exception as e:
             print(f"⚠️ Erro inicializando autenticação: {e}")
     
+    # Aquecer subsistemas pesados em background, depois de a porta estar aberta
+    service_registry.start_warm_up()
+    
     print("🎯 BGAPP Admin API pronta!")
 
 @app.on_event("shutdown") 
@@ -285,7 +308,15 @@ async def shutdown_event():
             print("✅ Cache Redis desconectado")
         except Exception as e:
             print(f"⚠️ Erro desconectando cache: {e}")
-    
+
+    # Terminar lotes de previsão pendentes e o pool de workers ML
+    if service_registry.is_loaded("ml_batcher"):
+        try:
+            await ml_batcher.shutdown()
+            print("✅ Pool de previsões ML encerrado")
+        except Exception as e:
+            print(f"⚠️ Erro encerrando pool de previsões ML: {e}")
+
     print("👋 BGAPP Admin API encerrada!")
 
 # Configurações dos serviços
@@ -593,7 +624,7 @@ async def health_check():
             "alerts": ALERTS_ENABLED, 
             "backup": BACKUP_ENABLED,
             "mobile_pwa": True,
-            "machine_learning": ML_ENABLED,
+            "machine_learning": not ML_ENABLED.known_unavailable,
             "api_gateway": GATEWAY_ENABLED,
             "enterprise_auth": ENTERPRISE_AUTH_ENABLED,
             "error_handling": ERROR_HANDLING_ENABLED,
@@ -676,6 +707,14 @@ async def detailed_health_check():
             "timestamp": datetime.now().isoformat()
         }
 
+@app.get("/health/subsystems")
+async def subsystems_health():
+    """Estado do carregamento preguiçoso dos subsistemas (sem disparar imports)"""
+    return {
+        **service_registry.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.get("/monitoring/stats")
 async def get_monitoring_statistics():
     """Obter estatísticas de monitorização"""
@@ -1093,6 +1132,22 @@ async def clear_cache_pattern(pattern: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cache/invalidate")
+async def invalidate_cache_tags(tags: List[str] = Query(..., description="Tags, ex.: dataset:obis, collection:sst, model:biodiversity")):
+    """Invalidar entradas de cache por tag (dataset, coleção, modelo)"""
+    if not CACHE_ENABLED or not cache:
+        raise HTTPException(status_code=503, detail="Cache não disponível")
+    
+    try:
+        cleared = await cache.invalidate_tags(*tags)
+        return {
+            "message": f"Cache invalidado por tags: {cleared} chaves removidas",
+            "tags": tags,
+            "cleared_keys": cleared
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/alerts/dashboard")
 async def get_alerts_dashboard():
     """Obter dashboard completo de alertas"""
@@ -1315,14 +1370,24 @@ async def get_ml_dashboard():
     except Exception as e:
         return {"error": str(e), "enabled": True}
 
+# Micro-batching: pedidos concorrentes são avaliados num único lote fora do event loop
+def _create_ml_batcher():
+    from .ml.batch_predictor import MicroBatchPredictor
+    return MicroBatchPredictor(service_registry.get("ml_manager"))
+
+ml_batcher = service_registry.lazy("ml_batcher", _create_ml_batcher)
+
 @app.post("/ml/predict/{model_type}")
 async def ml_predict(model_type: str, input_data: Dict[str, Any]):
     """Fazer previsão usando modelo específico"""
     if not ML_ENABLED or not ml_manager:
         raise HTTPException(status_code=503, detail="Sistema de ML não disponível")
     
+    # Esperar pelo batcher numa thread: dentro do try um ServiceLoading tornar-se-ia um 500
+    batcher = await service_registry.aget("ml_batcher")
+    
     try:
-        result = ml_manager.predict(model_type, input_data)
+        result = await batcher.predict(model_type, input_data)
         
         return {
             "success": True,
@@ -1338,6 +1403,44 @@ async def ml_predict(model_type: str, input_data: Dict[str, Any]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ml/predict/{model_type}/batch")
+async def ml_predict_batch(model_type: str, inputs: List[Dict[str, Any]]):
+    """Fazer previsões para um lote de entradas numa única avaliação"""
+    if not ML_ENABLED or not ml_manager:
+        raise HTTPException(status_code=503, detail="Sistema de ML não disponível")
+    if len(inputs) > 100000:
+        raise HTTPException(status_code=413, detail="Máximo de 100000 entradas por lote")
+    
+    batcher = await service_registry.aget("ml_batcher")
+    
+    try:
+        results = await batcher.predict_many(model_type, inputs)
+        
+        return {
+            "success": True,
+            "model_type": model_type,
+            "count": len(results),
+            "predictions": [result.prediction for result in results],
+            "confidence": [result.confidence for result in results],
+            "probability_distribution": [result.probability_distribution for result in results]
+                if results and results[0].probability_distribution is not None else None,
+            "feature_importance": results[0].feature_importance if results else None,
+            "model_version": results[0].model_version if results else None,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/ml/predict-stats")
+async def ml_predict_stats():
+    """Estatísticas de throughput e latência do micro-batching de previsões"""
+    if not ML_ENABLED or not ml_batcher:
+        return {"error": "Sistema de ML não disponível", "enabled": False}
+    return {"enabled": True, "batching": ml_batcher.get_stats()}
+
 @app.get("/ml/models")
 async def get_ml_models():
     """Listar todos os modelos disponíveis"""
@@ -1409,8 +1512,9 @@ async def retrain_model(model_type: str, background_tasks: BackgroundTasks):
     
     async def retrain_task():
         try:
-            # Criar dados de treino simulados (em produção, viria da BD)
-            training_data = create_sample_training_data()
+            # Criar dados de treino simulados (em produção, viria da BD); ml.models carregado numa thread
+            ml_models = await service_registry.aget("ml_models")
+            training_data = ml_models.create_real_training_data()
             
             if model_type == "biodiversity_predictor":
                 success = ml_manager.retrain_model(model_type, training_data['biodiversity'])
@@ -1444,8 +1548,9 @@ async def train_all_models(background_tasks: BackgroundTasks):
         try:
             print("🧠 Iniciando treino de todos os modelos ML...")
             
-            # Criar dados de treino
-            training_data = create_sample_training_data()
+            # Criar dados de treino (ml.models carregado numa thread)
+            ml_models = await service_registry.aget("ml_models")
+            training_data = ml_models.create_real_training_data()
             
             # Treinar modelos
             ml_manager.create_biodiversity_predictor(training_data['biodiversity'])
@@ -2207,6 +2312,14 @@ class SQLQuery(BaseModel):
     """Modelo para consultas SQL"""
     sql: str
     limit: Optional[int] = 1000
+    format: str = "json"  # json | ndjson | csv | arrow (os três últimos em streaming)
+
+# Limites de linhas: resposta JSON em memória vs. streaming por cursor do servidor
+QUERY_JSON_MAX_ROWS = 1000
+QUERY_STREAM_MAX_ROWS = 1_000_000
+QUERY_STREAM_BATCH_SIZE = 2000
+QUERY_STATEMENT_TIMEOUT_MS = 30000
+STREAM_QUERY_FORMATS = ("ndjson", "csv", "arrow")
 
 # Lista de consultas SQL pré-aprovadas (whitelist)
 APPROVED_QUERIES = {
@@ -2246,6 +2359,37 @@ def get_db_connection():
         password=settings.database.postgres_password
     )
 
+def _execute_query_direct(sql: str, row_limit: int) -> Dict[str, Any]:
+    """Executar uma consulta validada com psycopg2 (fallback quando o pool não está disponível)"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        
+        if cursor.description:
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+            result = {
+                "columns": columns,
+                "rows": [list(row) for row in rows],
+                "count": len(rows),
+                "limited": len(rows) >= row_limit,
+                "security_validated": True,
+                "execution_method": "validated_direct"
+            }
+        else:
+            result = {
+                "message": "Consulta executada com sucesso", 
+                "count": 0,
+                "security_validated": True,
+                "execution_method": "validated_direct"
+            }
+        
+        cursor.close()
+        return result
+    finally:
+        conn.close()
+
 def is_safe_sql(sql: str) -> bool:
     """Verificar se a consulta SQL é segura (VERSÃO MELHORADA)"""
     sql_upper = sql.strip().upper()
@@ -2413,51 +2557,81 @@ async def execute_query(
                     detail="Consulta SQL não permitida. Apenas SELECT simples são aceites."
                 )
         
+        output_format = (query.format or "json").lower()
+        if output_format != "json" and output_format not in STREAM_QUERY_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Formato inválido: {query.format}. Use json, {', '.join(STREAM_QUERY_FORMATS)}"
+            )
+        if output_format == "arrow" and importlib.util.find_spec("pyarrow") is None:
+            raise HTTPException(status_code=400, detail="Formato arrow indisponível (pyarrow não instalado)")
+        
+        streaming = output_format != "json"
+        max_rows = QUERY_STREAM_MAX_ROWS if streaming else QUERY_JSON_MAX_ROWS
+        row_limit = min(query.limit or max_rows, max_rows)
+        
         # Adicionar limite se não existir
         if "LIMIT" not in sql.upper():
-            sql += f" LIMIT {min(query.limit or 1000, 1000)}"
+            sql += f" LIMIT {row_limit}"
         
-        conn = get_db_connection()
+        # Log de auditoria ANTES da execução
+        logger.security_event(
+            "sql_query_executed",
+            username=current_user.username,
+            query_hash=hashlib.sha256(sql.encode()).hexdigest()[:16],
+            query_type="user_submitted",
+            table_access="multiple" if "," in sql else "single"
+        )
         
-        try:
-            # IMPLEMENTAÇÃO SEGURA: Usar prepared statements quando possível
-            cursor = conn.cursor()
+        pool_available = ERROR_HANDLING_ENABLED and getattr(db_pool, 'pool', None) is not None
+        
+        if streaming:
+            if not pool_available:
+                raise HTTPException(status_code=503, detail="Streaming requer o pool de conexões da base de dados")
             
-            # Log de auditoria ANTES da execução
-            logger.security_event(
-                "sql_query_executed",
+            # open() prepara a query: erros de SQL surgem aqui, antes do streaming
+            stream = await db_pool.open_stream(
+                sql,
+                batch_size=QUERY_STREAM_BATCH_SIZE,
+                statement_timeout_ms=QUERY_STATEMENT_TIMEOUT_MS
+            )
+            logger.info(
+                "database_query_streaming",
                 username=current_user.username,
-                query_hash=hashlib.sha256(sql.encode()).hexdigest()[:16],
-                query_type="user_submitted",
-                table_access="multiple" if "," in sql else "single"
+                format=output_format,
+                columns=len(stream.columns)
             )
-            
-            # Executar query (agora com validação rigorosa)
-            cursor.execute(sql)
-            
-            if cursor.description:
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
-                result = {
-                    "columns": columns,
-                    "rows": [list(row) for row in rows],
-                    "count": len(rows),
-                    "limited": len(rows) >= (query.limit or 1000),
-                    "security_validated": True,
-                    "execution_method": "validated_direct"
+            extension = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows"}[output_format]
+            return QueryStreamResponse(
+                stream,
+                output_format,
+                headers={
+                    "Content-Disposition": f'attachment; filename="query.{extension}"',
+                    "X-Query-Columns": ",".join(stream.columns),
+                    "X-Security-Validated": "true"
                 }
-            else:
-                result = {
-                    "message": "Consulta executada com sucesso", 
-                    "count": 0,
-                    "security_validated": True,
-                    "execution_method": "validated_direct"
-                }
-            
-            cursor.close()
-            
-        finally:
-            conn.close()
+            )
+        
+        if pool_available:
+            rows = []
+            async with db_pool.stream_query(
+                sql,
+                batch_size=QUERY_STREAM_BATCH_SIZE,
+                statement_timeout_ms=QUERY_STATEMENT_TIMEOUT_MS
+            ) as stream:
+                async for batch in stream.batches():
+                    rows.extend(json_safe_row(record) for record in batch)
+            result = {
+                "columns": stream.columns,
+                "rows": rows,
+                "count": len(rows),
+                "limited": len(rows) >= row_limit,
+                "security_validated": True,
+                "execution_method": "pooled_server_cursor"
+            }
+        else:
+            # Sem pool: psycopg2 numa thread para não bloquear o event loop
+            result = await asyncio.to_thread(_execute_query_direct, sql, row_limit)
         
         logger.info(
             "database_query_success", 
@@ -2574,23 +2748,29 @@ async def execute_approved_query(
     logger.info("approved_query_requested", username=current_user.username, query_name=query_name)
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(APPROVED_QUERIES[query_name])
+        if ERROR_HANDLING_ENABLED and getattr(db_pool, 'pool', None) is not None:
+            # Statement preparado e reutilizado por conexão do pool
+            columns, records = await db_pool.fetch_prepared(query_name, APPROVED_QUERIES[query_name])
+            rows = [json_safe_row(record) for record in records]
+        else:
+            def run_direct():
+                conn = get_db_connection()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(APPROVED_QUERIES[query_name])
+                    return [desc[0] for desc in cursor.description], [list(row) for row in cursor.fetchall()]
+                finally:
+                    conn.close()
+            
+            columns, rows = await asyncio.to_thread(run_direct)
         
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
-        result = {
+        return {
             "query_name": query_name,
             "columns": columns,
-            "rows": [list(row) for row in rows],
+            "rows": rows,
             "count": len(rows)
         }
         
-        conn.close()
-        return result
-        
     except Exception as e:
         logger.error("approved_query_error", username=current_user.username, error=str(e))
         raise HTTPException(status_code=500, detail=f"Erro na consulta: {str(e)}")
@@ -2931,7 +3111,9 @@ async def run_connector(connector_id: str, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=404, detail="Conector não encontrado")
     
     if SCHEDULER_AVAILABLE and scheduler:
-        # Usar o scheduler para executar o conector
+        # Usar o scheduler para executar o conector; se já estiver a correr, a nova execução fica em fila
+        queued = scheduler.is_connector_running(connector_id)
+        
         async def run_with_scheduler():
             try:
                 result = await scheduler.execute_connector(connector_id)
@@ -2940,7 +3122,11 @@ async def run_connector(connector_id: str, background_tasks: BackgroundTasks):
                 logger.error(f"Erro ao executar conector {connector_id} via scheduler: {e}")
         
         background_tasks.add_task(run_with_scheduler)
-        return {"message": f"Conector {connector_id} iniciado via scheduler", "scheduler_available": True}
+        if queued:
+            return {"message": f"Conector {connector_id} já em execução: nova execução em fila",
+                    "scheduler_available": True, "queued": True}
+        return {"message": f"Conector {connector_id} iniciado via scheduler", "scheduler_available": True,
+                "queued": False}
     else:
         # Fallback para execução manual
         def run_ingest():
@@ -3532,6 +3718,17 @@ async def get_scheduler_jobs(limit: int = 50):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter jobs: {str(e)}")
 
+@app.get("/scheduler/jobs/{job_id}/output")
+async def get_scheduler_job_output(job_id: str):
+    """Obtém as últimas linhas de stdout/stderr de um job (ring buffer)"""
+    if not SCHEDULER_AVAILABLE or not scheduler:
+        raise HTTPException(status_code=503, detail="Scheduler não disponível")
+    
+    output = scheduler.get_job_output(job_id)
+    if output is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado")
+    return output
+
 @app.get("/api/endpoints")
 async def get_api_endpoints():
     """Obtém lista de endpoints da API"""
@@ -3582,7 +3779,8 @@ async def get_admin_dashboard(request: Request):
     e integração prioritária dos dados Copernicus
     """
     try:
-        if not DASHBOARD_CONTROLLER_AVAILABLE:
+        # Página principal: esperar pelo controlador (import numa thread) em vez de responder 503
+        if not await service_registry.aavailable("dashboard_controller"):
             return HTMLResponse(
                 content="""
                 <html>
@@ -6050,7 +6248,8 @@ async def test_database_connection(connection_id: str):
 async def execute_database_query(
     connection_id: str,
     sql: str,
-    limit: int = 1000
+    limit: int = 1000,
+    export_format: Optional[str] = None
 ):
     """
     📊 Executar query SQL
@@ -6059,6 +6258,7 @@ async def execute_database_query(
         connection_id: ID da conexão
         sql: Query SQL a executar
         limit: Limite de registos
+        export_format: 'ndjson', 'csv' ou 'arrow' para resposta em streaming (apenas SELECT)
         
     Returns:
         Resultado da query
@@ -6069,6 +6269,23 @@ async def execute_database_query(
             detail="Gestor de base de dados não disponível"
         )
     
+    if export_format:
+        try:
+            stream = await database_manager.stream_query(
+                connection_id=connection_id,
+                sql=sql,
+                export_format=export_format.lower()
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            logger.error(f"Erro ao executar query em streaming: {e}")
+            raise HTTPException(status_code=500, detail=f"Erro na execução da query: {str(e)}")
+        
+        return QueryStreamResponse(stream, export_format.lower(), headers={"X-Query-Columns": ",".join(stream.columns)})
+    
     try:
         query_result = await database_manager.execute_query(
             connection_id=connection_id,
@@ -7092,150 +7309,76 @@ async def get_dashboard_overview_api():
 
 # === ENDPOINTS DE MACHINE LEARNING E BIODIVERSIDADE ===
 
-# Integrar API de ML
-from .api.ml_endpoints import ml_api
+# Integrar API de ML (sub-aplicação importada no primeiro pedido a /ml)
+service_registry.register("ml_api", ".api.ml_endpoints:ml_api")
+
+# Subsistemas do admin dashboard: cada módulo (e o seu singleton) só é importado
+# na primeira utilização ou no warm-up; as flags *_AVAILABLE avaliam-se nesse momento
 
 # Importar controlador do admin dashboard
-try:
-    from .admin_dashboard_controller import dashboard_controller
-    DASHBOARD_CONTROLLER_AVAILABLE = True
-except ImportError as e:
-    print(f"Dashboard controller not available: {e}")
-    DASHBOARD_CONTROLLER_AVAILABLE = False
-    dashboard_controller = None
+dashboard_controller = service_registry.lazy("dashboard_controller", ".admin_dashboard_controller:dashboard_controller")
+DASHBOARD_CONTROLLER_AVAILABLE = service_registry.flag("dashboard_controller")
 
 # Importar engine cartográfico Python
-try:
-    from .cartography.python_maps_engine import cartography_engine
-    CARTOGRAPHY_ENGINE_AVAILABLE = True
-except ImportError as e:
-    print(f"Cartography engine not available: {e}")
-    CARTOGRAPHY_ENGINE_AVAILABLE = False
-    cartography_engine = None
+cartography_engine = service_registry.lazy("cartography_engine", ".cartography.python_maps_engine:cartography_engine")
+CARTOGRAPHY_ENGINE_AVAILABLE = service_registry.flag("cartography_engine")
 
 # Importar interfaces especializadas
-try:
-    from .interfaces.biologist_interface import biologist_interface
-    from .interfaces.fisherman_interface import fisherman_interface
-    SPECIALIZED_INTERFACES_AVAILABLE = True
-except ImportError as e:
-    print(f"Specialized interfaces not available: {e}")
-    SPECIALIZED_INTERFACES_AVAILABLE = False
-    biologist_interface = None
-    fisherman_interface = None
+biologist_interface = service_registry.lazy("biologist_interface", ".interfaces.biologist_interface:biologist_interface")
+fisherman_interface = service_registry.lazy("fisherman_interface", ".interfaces.fisherman_interface:fisherman_interface")
+SPECIALIZED_INTERFACES_AVAILABLE = service_registry.flag("biologist_interface", "fisherman_interface")
 
 # Importar gestor de camadas unificado
-try:
-    from .unified_access.bgapp_layers_manager import bgapp_layers_manager
-    UNIFIED_ACCESS_AVAILABLE = True
-except ImportError as e:
-    print(f"Unified access manager not available: {e}")
-    UNIFIED_ACCESS_AVAILABLE = False
-    bgapp_layers_manager = None
+bgapp_layers_manager = service_registry.lazy("bgapp_layers_manager", ".unified_access.bgapp_layers_manager:bgapp_layers_manager")
+UNIFIED_ACCESS_AVAILABLE = service_registry.flag("bgapp_layers_manager")
 
 # Importar painel de controle de processamento de dados
-try:
-    from .data_processing.control_panel import data_processing_control_panel
-    DATA_PROCESSING_PANEL_AVAILABLE = True
-except ImportError as e:
-    print(f"Data processing control panel not available: {e}")
-    DATA_PROCESSING_PANEL_AVAILABLE = False
-    data_processing_control_panel = None
+data_processing_control_panel = service_registry.lazy("data_processing_control_panel", ".data_processing.control_panel:data_processing_control_panel")
+DATA_PROCESSING_PANEL_AVAILABLE = service_registry.flag("data_processing_control_panel")
 
 # Importar gestor de workflows científicos
-try:
-    from .workflows.scientific_workflow_manager import scientific_workflow_manager
-    SCIENTIFIC_WORKFLOW_MANAGER_AVAILABLE = True
-except ImportError as e:
-    print(f"Scientific workflow manager not available: {e}")
-    SCIENTIFIC_WORKFLOW_MANAGER_AVAILABLE = False
-    scientific_workflow_manager = None
+scientific_workflow_manager = service_registry.lazy("scientific_workflow_manager", ".workflows.scientific_workflow_manager:scientific_workflow_manager")
+SCIENTIFIC_WORKFLOW_MANAGER_AVAILABLE = service_registry.flag("scientific_workflow_manager")
 
 # Importar gestor de utilizadores e perfis
-try:
-    from .auth.user_role_manager import user_role_manager
-    USER_ROLE_MANAGER_AVAILABLE = True
-except ImportError as e:
-    print(f"User role manager not available: {e}")
-    USER_ROLE_MANAGER_AVAILABLE = False
-    user_role_manager = None
+user_role_manager = service_registry.lazy("user_role_manager", ".auth.user_role_manager:user_role_manager")
+USER_ROLE_MANAGER_AVAILABLE = service_registry.flag("user_role_manager")
 
 # Importar engine de relatórios científicos
-try:
-    from .reports.scientific_report_engine import scientific_report_engine
-    SCIENTIFIC_REPORT_ENGINE_AVAILABLE = True
-except ImportError as e:
-    print(f"Scientific report engine not available: {e}")
-    SCIENTIFIC_REPORT_ENGINE_AVAILABLE = False
-    scientific_report_engine = None
+scientific_report_engine = service_registry.lazy("scientific_report_engine", ".reports.scientific_report_engine:scientific_report_engine")
+SCIENTIFIC_REPORT_ENGINE_AVAILABLE = service_registry.flag("scientific_report_engine")
 
 # Importar gestor de base de dados
-try:
-    from .database.database_manager import database_manager
-    DATABASE_MANAGER_AVAILABLE = True
-except ImportError as e:
-    print(f"Database manager not available: {e}")
-    DATABASE_MANAGER_AVAILABLE = False
-    database_manager = None
+database_manager = service_registry.lazy("database_manager", ".database.database_manager:database_manager")
+DATABASE_MANAGER_AVAILABLE = service_registry.flag("database_manager")
 
 # Importar gestor de endpoints APIs
-try:
-    from .api_management.endpoints_manager import api_endpoints_manager
-    API_ENDPOINTS_MANAGER_AVAILABLE = True
-except ImportError as e:
-    print(f"API endpoints manager not available: {e}")
-    API_ENDPOINTS_MANAGER_AVAILABLE = False
-    api_endpoints_manager = None
+api_endpoints_manager = service_registry.lazy("api_endpoints_manager", ".api_management.endpoints_manager:api_endpoints_manager")
+API_ENDPOINTS_MANAGER_AVAILABLE = service_registry.flag("api_endpoints_manager")
 
 # Importar gestor Copernicus avançado
-try:
-    from .copernicus_integration.advanced_copernicus_manager import advanced_copernicus_manager
-    ADVANCED_COPERNICUS_MANAGER_AVAILABLE = True
-except ImportError as e:
-    print(f"Advanced Copernicus manager not available: {e}")
-    ADVANCED_COPERNICUS_MANAGER_AVAILABLE = False
-    advanced_copernicus_manager = None
+advanced_copernicus_manager = service_registry.lazy("advanced_copernicus_manager", ".copernicus_integration.advanced_copernicus_manager:advanced_copernicus_manager")
+ADVANCED_COPERNICUS_MANAGER_AVAILABLE = service_registry.flag("advanced_copernicus_manager")
 
 # Importar sistema de backup/restore
-try:
-    from .backup_restore.backup_system import backup_restore_system
-    BACKUP_RESTORE_SYSTEM_AVAILABLE = True
-except ImportError as e:
-    print(f"Backup/restore system not available: {e}")
-    BACKUP_RESTORE_SYSTEM_AVAILABLE = False
-    backup_restore_system = None
+backup_restore_system = service_registry.lazy("backup_restore_system", ".backup_restore.backup_system:backup_restore_system")
+BACKUP_RESTORE_SYSTEM_AVAILABLE = service_registry.flag("backup_restore_system")
 
 # Importar gestor de configurações
-try:
-    from .config_management.configuration_manager import configuration_manager
-    CONFIGURATION_MANAGER_AVAILABLE = True
-except ImportError as e:
-    print(f"Configuration manager not available: {e}")
-    CONFIGURATION_MANAGER_AVAILABLE = False
-    configuration_manager = None
+configuration_manager = service_registry.lazy("configuration_manager", ".config_management.configuration_manager:configuration_manager")
+CONFIGURATION_MANAGER_AVAILABLE = service_registry.flag("configuration_manager")
 
 # Importar analytics de performance
-try:
-    from .analytics.performance_analytics import performance_analytics
-    PERFORMANCE_ANALYTICS_AVAILABLE = True
-except ImportError as e:
-    print(f"Performance analytics not available: {e}")
-    PERFORMANCE_ANALYTICS_AVAILABLE = False
-    performance_analytics = None
+performance_analytics = service_registry.lazy("performance_analytics", ".analytics.performance_analytics:performance_analytics")
+PERFORMANCE_ANALYTICS_AVAILABLE = service_registry.flag("performance_analytics")
 
 # Importar monitor de saúde do sistema
-try:
-    from .monitoring.system_health_monitor import system_health_monitor
-    SYSTEM_HEALTH_MONITOR_AVAILABLE = True
-except ImportError as e:
-    print(f"System health monitor not available: {e}")
-    SYSTEM_HEALTH_MONITOR_AVAILABLE = False
-    system_health_monitor = None
+system_health_monitor = service_registry.lazy("system_health_monitor", ".monitoring.system_health_monitor:system_health_monitor")
+SYSTEM_HEALTH_MONITOR_AVAILABLE = service_registry.flag("system_health_monitor")
+
 from .ml.database_init import initialize_ml_database, MLDatabaseInitializer
 
-@app.on_event("startup")
-async def startup_ml_systems():
-    """Inicializa sistemas de ML na startup"""
+async def _initialize_ml_systems():
     try:
         logger.info("🧠 Inicializando sistemas de Machine Learning...")
         
@@ -7247,8 +7390,16 @@ async def startup_ml_systems():
     except Exception as e:
         logger.error(f"❌ Erro inicializando sistemas de ML: {e}")
 
+ml_startup_task = None
+
+@app.on_event("startup")
+async def startup_ml_systems():
+    """Inicializa sistemas de ML em background (não atrasa a abertura da porta)"""
+    global ml_startup_task
+    ml_startup_task = asyncio.create_task(_initialize_ml_systems())
+
 # Montar sub-aplicação de ML
-app.mount("/ml", ml_api)
+app.mount("/ml", service_registry.asgi("ml_api"))
 
 @app.get("/ml-dashboard")
 async def get_enhanced_ml_dashboard():
@@ -7442,109 +7593,87 @@ ANGOLA_BOUNDS = {
     'west': 8.5       # CRÍTICO: Limite oceânico oeste (era 11.4!)
 }
 
-def simulate_benguela_current(lat: float, lon: float, time: datetime) -> tuple:
-    """Simular corrente de Benguela"""
-    coast_distance = abs(lon - 13.0)
-    latitude_factor = max(0, (-lat - 4) / 14)
-    benguela_strength = max(0, 1.5 - coast_distance * 0.3) * latitude_factor
-    
-    v = benguela_strength * 0.8 + np.random.normal(0, 0.1)
-    u = benguela_strength * 0.2 + np.random.normal(0, 0.05)
-    
-    # Variação sazonal
-    month = time.month
-    if 6 <= month <= 9:
-        v *= 1.3
-    
-    return u, v
-
-def simulate_wind_patterns(lat: float, lon: float, time: datetime) -> tuple:
-    """Simular padrões de vento para Angola"""
-    base_u = -5.0 + np.random.normal(0, 2.0)
-    base_v = 2.0 + np.random.normal(0, 1.0)
-    
-    month = time.month
-    if 12 <= month <= 2:
-        base_u *= 0.7
-        base_v *= 0.8
-    elif 6 <= month <= 8:
-        base_u *= 1.2
-        base_v *= 1.1
-    
-    coast_distance = abs(lon - 13.0)
-    if coast_distance < 1.0:
-        base_u *= 1.3
-    
-    return base_u, base_v
+# Campos u/v e escalares: MetoceanGridEngine (bgapp.realtime.metocean_grid)
 
 @app.get("/metocean/velocity")
 async def get_velocity_data(
     var: str = Query("currents", description="Tipo: 'currents' ou 'wind'"),
     time: Optional[str] = Query(None, description="Timestamp ISO 8601"),
-    resolution: float = Query(0.5, description="Resolução em graus")
+    resolution: float = Query(0.5, description="Resolução em graus"),
+    format: str = Query("json", description="Formato: 'json', 'columnar' ou 'binary'")
 ):
     """Endpoint para dados de velocidade (correntes e vento)"""
     
+    if var not in VELOCITY_VARIABLES:
+        raise HTTPException(status_code=400, detail=f"Variável não suportada: {var}")
+    if format not in ("json", "columnar", "binary"):
+        raise HTTPException(status_code=400, detail=f"Formato não suportado: {format}")
+    
     try:
         # Parse do tempo
         if time:
             target_time = datetime.fromisoformat(time.replace('Z', '+00:00'))
         else:
-            target_time = datetime.utcnow()
-        
-        # Gerar grid de dados
-        grid_data = []
-        for lat in np.arange(ANGOLA_BOUNDS['south'], ANGOLA_BOUNDS['north'], resolution):
-            for lon in np.arange(ANGOLA_BOUNDS['west'], ANGOLA_BOUNDS['east'], resolution):
-                if var == "currents":
-                    u, v = simulate_benguela_current(lat, lon, target_time)
-                elif var == "wind":
-                    u, v = simulate_wind_patterns(lat, lon, target_time)
-                else:
-                    raise HTTPException(status_code=400, detail=f"Variável não suportada: {var}")
-                
-                grid_data.append({
-                    'lat': float(lat),
-                    'lon': float(lon),
-                    'u': float(u),
-                    'v': float(v)
-                })
+            target_time = datetime.now(timezone.utc)
+        
+        # Campo completo calculado de forma vetorizada (e em cache) fora do event loop
+        grid = await asyncio.to_thread(metocean_engine.get_field, var, target_time, resolution)
         
-        # Calcular estatísticas
-        u_values = [point['u'] for point in grid_data]
-        v_values = [point['v'] for point in grid_data]
+        if format == "binary":
+            return Response(content=grid.to_binary(), media_type=BINARY_MEDIA_TYPE)
+        if format == "columnar":
+            return JSONResponse(grid.to_columnar())
         
+        header = grid.header()
         result = {
-            'data': grid_data,
-            'uMin': float(np.min(u_values)),
-            'uMax': float(np.max(u_values)),
-            'vMin': float(np.min(v_values)),
-            'vMax': float(np.max(v_values)),
+            'data': grid.to_points(),
+            'uMin': header['uMin'],
+            'uMax': header['uMax'],
+            'vMin': header['vMin'],
+            'vMax': header['vMax'],
             'metadata': {
                 'variable': var,
-                'time': target_time.isoformat(),
+                'time': grid.time.isoformat(),
                 'units': 'm/s',
-                'points': len(grid_data)
+                'points': grid.points
             }
         }
         
         return JSONResponse(result)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter dados: {str(e)}")
 
 @app.get("/metocean/scalar")
 async def get_scalar_data(
     var: str = Query("sst", description="Variável: 'sst', 'salinity', 'chlorophyll'"),
-    time: Optional[str] = Query(None, description="Timestamp ISO 8601")
+    time: Optional[str] = Query(None, description="Timestamp ISO 8601"),
+    resolution: Optional[float] = Query(None, description="Resolução em graus (grelha completa)"),
+    format: str = Query("geojson", description="Formato: 'geojson', 'columnar' ou 'binary'")
 ):
     """Endpoint para dados escalares (SST, salinidade, clorofila)"""
     
+    if var not in SCALAR_VARIABLES:
+        raise HTTPException(status_code=400, detail=f"Variável não suportada: {var}")
+    if format not in ("geojson", "columnar", "binary"):
+        raise HTTPException(status_code=400, detail=f"Formato não suportado: {format}")
+    
     try:
         if time:
             target_time = datetime.fromisoformat(time.replace('Z', '+00:00'))
         else:
-            target_time = datetime.utcnow()
+            target_time = datetime.now(timezone.utc)
+        
+        # Grelha completa para camadas raster/partículas
+        if format != "geojson" or resolution is not None:
+            grid = await asyncio.to_thread(
+                metocean_engine.get_field, var, target_time, resolution or 0.5
+            )
+            if format == "binary":
+                return Response(content=grid.to_binary(), media_type=BINARY_MEDIA_TYPE)
+            return JSONResponse(grid.to_columnar())
         
         # Pontos de amostragem
         sample_points = [
@@ -7555,40 +7684,13 @@ async def get_scalar_data(
             (-16.8, 11.8, "Tombwa")
         ]
         
+        lats = np.array([point[0] for point in sample_points])
+        lons = np.array([point[1] for point in sample_points])
+        values = MetoceanGridEngine.sample_scalar(var, lats, lons, target_time)
+        unit = SCALAR_UNITS[var]
+        
         features = []
-        for lat, lon, name in sample_points:
-            if var == "sst":
-                # SST baseada na latitude e época
-                base_temp = 28 - abs(lat + 4) * 0.8
-                month = target_time.month
-                seasonal_var = 3 * np.sin(2 * np.pi * (month - 3) / 12)
-                value = base_temp + seasonal_var + np.random.normal(0, 0.5)
-                unit = "degrees_celsius"
-                
-            elif var == "salinity":
-                # Salinidade baseada no upwelling
-                base_salinity = 35.0
-                if lat < -12:
-                    base_salinity += 0.3
-                value = base_salinity + np.random.normal(0, 0.1)
-                unit = "psu"
-                
-            elif var == "chlorophyll":
-                # Clorofila baseada no upwelling
-                base_chl = 1.0
-                if lat < -10:
-                    base_chl = 5.0 + abs(lat + 10) * 2
-                
-                month = target_time.month
-                if 6 <= month <= 9:
-                    base_chl *= 1.5
-                
-                value = max(0.1, base_chl + np.random.normal(0, base_chl * 0.2))
-                unit = "mg/m3"
-                
-            else:
-                raise HTTPException(status_code=400, detail=f"Variável não suportada: {var}")
-            
+        for (lat, lon, name), value in zip(sample_points, values):
             features.append({
                 'type': 'Feature',
                 'geometry': {
@@ -7615,6 +7717,8 @@ async def get_scalar_data(
         
         return JSONResponse(result)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter dados: {str(e)}")
 
@@ -7628,6 +7732,7 @@ async def get_metocean_status():
             "velocity_endpoint": True,
             "scalar_endpoint": True
         },
+        "grid_cache": metocean_engine.get_stats(),
         "data_sources": {
             "currents": "Corrente de Benguela (simulado)",
             "wind": "Ventos alísios (simulado)", 
@@ -7642,6 +7747,79 @@ async def get_metocean_status():
     })
 
 
+# =============================================================================
+# TILES XYZ (RASTER E VETORIAIS)
+# =============================================================================
+
+@app.get("/tiles")
+async def list_tile_layers():
+    """Camadas de tiles disponíveis e estado do cache"""
+    return JSONResponse({
+        "layers": tile_server.list_layers(),
+        "stats": tile_server.get_stats()
+    })
+
+@app.get("/tiles/{layer}/tilejson.json")
+async def get_tilejson(layer: str, request: Request):
+    """Documento TileJSON da camada"""
+    try:
+        return JSONResponse(tile_server.tilejson(layer, str(request.base_url)))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.{fmt}")
+async def get_tile(layer: str, z: int, x: int, y: int, fmt: str, request: Request):
+    """Tile XYZ (png/webp para camadas raster, mvt/pbf para vetoriais) com ETag/304"""
+    try:
+        tile_layer = tile_server.get_layer(layer)
+        etag = tile_server.etag(tile_layer, z, x, y, fmt)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={tile_layer.max_age}",
+            "Access-Control-Allow-Origin": "*"
+        }
+        # O ETag depende apenas da versão da camada: 304 sem render nem leitura do cache
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        data, etag, media_type = await asyncio.to_thread(tile_server.get_tile, layer, z, x, y, fmt)
+        if not data:
+            return Response(status_code=204, headers=headers)
+        return Response(content=data, media_type=media_type, headers=headers)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar tile: {str(e)}")
+
+@app.post("/tiles/{layer}/seed")
+async def seed_tile_layer(
+    layer: str,
+    background_tasks: BackgroundTasks,
+    minzoom: Optional[int] = Query(None, ge=0, le=22),
+    maxzoom: int = Query(8, ge=0, le=22),
+    fmt: Optional[str] = Query(None, description="Formato (por defeito o primeiro da camada)")
+):
+    """Pré-gerar a pirâmide de tiles da ZEE de Angola em segundo plano"""
+    if layer not in tile_server.layers:
+        raise HTTPException(status_code=404, detail=f"Camada de tiles não encontrada: {layer}")
+    background_tasks.add_task(
+        tile_server.seed, layer, minzoom=minzoom, maxzoom=maxzoom, bounds=ANGOLA_EEZ_BOUNDS, fmt=fmt
+    )
+    return JSONResponse({
+        "message": f"Seed da camada {layer} iniciado",
+        "layer": layer,
+        "zooms": [minzoom, maxzoom],
+        "status_url": f"/tiles/{layer}/seed"
+    })
+
+@app.get("/tiles/{layer}/seed")
+async def get_seed_status(layer: str):
+    """Progresso do seed de uma camada"""
+    return JSONResponse(tile_server.seed_status(layer))
+
+
 # =============================================================================
 # ENDPOINTS PARA INFRAESTRUTURAS PESQUEIRAS
 # =============================================================================
@@ -7911,7 +8089,8 @@ async def get_fisheries_statistics():
 async def get_external_stac_collections():
     """Buscar coleções STAC externas prioritárias para dados oceanográficos"""
     try:
-        collections = await stac_manager.get_external_collections()
+        manager = await service_registry.aget("stac_manager")
+        collections = await manager.get_external_collections()
         return {
             "status": "success",
             "collections": collections,
@@ -7925,7 +8104,9 @@ async def get_external_stac_collections():
 async def get_stac_collections_summary():
     """Resumo completo das coleções STAC disponíveis (locais + externas)"""
     try:
-        summary = stac_manager.get_collections_summary()
+        manager = await service_registry.aget("stac_manager")
+        # O resumo inclui estatísticas da cache STAC em disco (glob): fora do event loop
+        summary = await asyncio.to_thread(manager.get_collections_summary)
         return {
             "status": "success",
             "summary": summary,
@@ -7934,6 +8115,50 @@ async def get_stac_collections_summary():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter resumo STAC: {str(e)}")
 
+@app.get("/stac/search")
+async def federated_search_stac_items(
+    collections: Optional[str] = Query(None, description="Coleções separadas por vírgula (padrão: prioritárias)"),
+    bbox: Optional[str] = Query(None, description="Bounding box: minx,miny,maxx,maxy"),
+    datetime_range: Optional[str] = Query(None, description="Data range: 2024-01-01/2024-12-31"),
+    apis: Optional[str] = Query(None, description="APIs separadas por vírgula (padrão: todas)"),
+    limit: int = Query(100, description="Número máximo de itens")
+):
+    """Pesquisa federada em todas as APIs STAC externas configuradas"""
+    try:
+        manager = await service_registry.aget("stac_manager")
+        bbox_list = None
+        if bbox:
+            bbox_list = [float(x.strip()) for x in bbox.split(',')]
+            if len(bbox_list) != 4:
+                raise HTTPException(status_code=400, detail="Bbox deve ter 4 valores: minx,miny,maxx,maxy")
+        collection_list = [c.strip() for c in collections.split(',') if c.strip()] if collections else None
+        api_list = [a.strip() for a in apis.split(',') if a.strip()] if apis else None
+
+        items = await manager.federated_search_external(
+            collections=collection_list,
+            bbox=bbox_list,
+            datetime_range=datetime_range,
+            limit=limit,
+            apis=api_list
+        )
+
+        return {
+            "status": "success",
+            "items": items,
+            "total": len(items),
+            "search_params": {
+                "collections": collection_list,
+                "bbox": bbox_list,
+                "datetime_range": datetime_range,
+                "apis": api_list,
+                "limit": limit
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na pesquisa STAC federada: {str(e)}")
+
 @app.get("/stac/search/{collection_id}")
 async def search_stac_items(
     collection_id: str,
@@ -7943,13 +8168,14 @@ async def search_stac_items(
 ):
     """Buscar itens em uma coleção STAC externa"""
     try:
+        manager = await service_registry.aget("stac_manager")
         bbox_list = None
         if bbox:
             bbox_list = [float(x.strip()) for x in bbox.split(',')]
             if len(bbox_list) != 4:
                 raise HTTPException(status_code=400, detail="Bbox deve ter 4 valores: minx,miny,maxx,maxy")
         
-        items = await stac_manager.search_external_items(
+        items = await manager.search_external_items(
             collection_id=collection_id,
             bbox=bbox_list,
             datetime_range=datetime_range,
@@ -7976,7 +8202,8 @@ async def get_recent_oceanographic_data(
 ):
     """Buscar dados oceanográficos recentes para Angola (SST, etc.)"""
     try:
-        data = await stac_manager.get_recent_oceanographic_data(days_back)
+        manager = await service_registry.aget("stac_manager")
+        data = await manager.get_recent_oceanographic_data(days_back)
         return {
             "status": "success",
             "data": data,
@@ -7990,7 +8217,8 @@ async def get_recent_oceanographic_data(
 async def check_external_stac_apis_health():
     """Verificar saúde das APIs STAC externas"""
     try:
-        health_status = await stac_manager.health_check_external_apis()
+        manager = await service_registry.aget("stac_manager")
+        health_status = await manager.health_check_external_apis()
         
         # Calcular estatísticas gerais
         total_apis = len(health_status)
@@ -8044,8 +8272,10 @@ async def get_stac_collection_info(collection_id: str):
 # QGIS INTEGRATION ENDPOINTS
 # ===============================================================================
 
-# Importar módulos QGIS
-try:
+# Importar módulos QGIS (sob demanda: primeiro endpoint /qgis/* ou warm-up)
+def _load_qgis_suite():
+    """Importar os módulos QGIS, criar os componentes e iniciar a monitorização de saúde"""
+    from types import SimpleNamespace
     from .qgis.temporal_visualization import TemporalVisualization, create_biomass_temporal_analysis, create_migration_environmental_analysis
     from .qgis.spatial_analysis import SpatialAnalysisTools, create_marine_spatial_planning_analysis
     from .qgis.biomass_calculator import AdvancedBiomassCalculator, BiomassType, create_angola_biomass_assessment
@@ -8053,23 +8283,49 @@ try:
     from .qgis.automated_reports import AutomatedReportGenerator, ReportType, create_biomass_assessment_report, create_migration_analysis_report
     from .qgis.sustainable_zones_mcda import SustainableZonesMCDA, MCDAMethod, create_marine_protected_areas_analysis, create_sustainable_fishing_zones_analysis
     from .qgis.service_health_monitor import health_monitor, start_health_monitoring, get_health_status, setup_alert_logging
-    QGIS_ENABLED = True
     
-    # Inicializar componentes QGIS
-    temporal_viz = TemporalVisualization()
-    spatial_tools = SpatialAnalysisTools()
-    biomass_calc = AdvancedBiomassCalculator()
-    migration_system = MigrationOverlaySystem()
-    report_generator = AutomatedReportGenerator()
-    mcda_system = SustainableZonesMCDA()
+    suite = SimpleNamespace(
+        # Inicializar componentes QGIS
+        temporal_viz=TemporalVisualization(),
+        spatial_tools=SpatialAnalysisTools(),
+        biomass_calc=AdvancedBiomassCalculator(),
+        migration_system=MigrationOverlaySystem(),
+        report_generator=AutomatedReportGenerator(),
+        mcda_system=SustainableZonesMCDA(),
+        create_marine_spatial_planning_analysis=create_marine_spatial_planning_analysis,
+        create_angola_biomass_assessment=create_angola_biomass_assessment,
+        create_migration_fishing_analysis=create_migration_fishing_analysis,
+        create_marine_protected_areas_analysis=create_marine_protected_areas_analysis,
+        create_sustainable_fishing_zones_analysis=create_sustainable_fishing_zones_analysis,
+        ReportType=ReportType,
+        MCDAMethod=MCDAMethod,
+        health_monitor=health_monitor,
+        get_health_status=get_health_status
+    )
     
     # Inicializar monitorização de saúde
     setup_alert_logging()
     start_health_monitoring()
-    
-except ImportError as e:
-    print(f"QGIS modules not available: {e}")
-    QGIS_ENABLED = False
+    return suite
+
+service_registry.register("qgis", _load_qgis_suite)
+QGIS_ENABLED = service_registry.flag("qgis")
+
+temporal_viz = service_registry.proxy("qgis", "temporal_viz")
+spatial_tools = service_registry.proxy("qgis", "spatial_tools")
+biomass_calc = service_registry.proxy("qgis", "biomass_calc")
+migration_system = service_registry.proxy("qgis", "migration_system")
+report_generator = service_registry.proxy("qgis", "report_generator")
+mcda_system = service_registry.proxy("qgis", "mcda_system")
+create_marine_spatial_planning_analysis = service_registry.proxy("qgis", "create_marine_spatial_planning_analysis")
+create_angola_biomass_assessment = service_registry.proxy("qgis", "create_angola_biomass_assessment")
+create_migration_fishing_analysis = service_registry.proxy("qgis", "create_migration_fishing_analysis")
+create_marine_protected_areas_analysis = service_registry.proxy("qgis", "create_marine_protected_areas_analysis")
+create_sustainable_fishing_zones_analysis = service_registry.proxy("qgis", "create_sustainable_fishing_zones_analysis")
+ReportType = service_registry.proxy("qgis", "ReportType")
+MCDAMethod = service_registry.proxy("qgis", "MCDAMethod")
+health_monitor = service_registry.proxy("qgis", "health_monitor")
+get_health_status = service_registry.proxy("qgis", "get_health_status")
 
 @app.get("/qgis/status")
 async def get_qgis_status():
@@ -8246,17 +8502,34 @@ async def create_buffer_zones(
 async def analyze_connectivity(
     habitats: List[Dict[str, Any]],
     species_mobility: float,
-    barrier_features: Optional[List[Dict[str, Any]]] = None
+    barrier_features: Optional[List[Dict[str, Any]]] = None,
+    format: str = Query("json", description="'json' ou 'ndjson' (lista de arestas em streaming)"),
+    include_corridors: bool = Query(True, description="Incluir corredores com geometria")
 ):
     """Analisar conectividade entre habitats"""
     if not QGIS_ENABLED:
         raise HTTPException(status_code=503, detail="QGIS não disponível")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Formato não suportado: {format}")
     
     try:
-        connectivity = spatial_tools.analyze_connectivity(
-            habitats, species_mobility, barrier_features
+        connectivity = await asyncio.to_thread(
+            spatial_tools.analyze_connectivity,
+            habitats, species_mobility, barrier_features,
+            include_corridors and format == "json"
         )
         
+        if format == "ndjson":
+            edges = spatial_tools.iter_connectivity_edges(connectivity)
+            return StreamingResponse(
+                (json.dumps(edge) + "\n" for edge in edges),
+                media_type="application/x-ndjson",
+                headers={
+                    "X-Total-Habitats": str(connectivity["total_habitats"]),
+                    "X-Total-Edges": str(connectivity["total_edges"])
+                }
+            )
+        
         return {
             "status": "success",
             "connectivity_analysis": connectivity,
@@ -8563,7 +8836,7 @@ async def analyze_marine_protected_areas():
         raise HTTPException(status_code=503, detail="QGIS não disponível")
     
     try:
-        analysis = create_marine_protected_areas_analysis()
+        analysis = await asyncio.to_thread(create_marine_protected_areas_analysis)
         
         return {
             "status": "success",
@@ -8580,7 +8853,7 @@ async def analyze_sustainable_fishing_zones():
         raise HTTPException(status_code=503, detail="QGIS não disponível")
     
     try:
-        analysis = create_sustainable_fishing_zones_analysis()
+        analysis = await asyncio.to_thread(create_sustainable_fishing_zones_analysis)
         
         return {
             "status": "success",
@@ -8594,24 +8867,38 @@ async def analyze_sustainable_fishing_zones():
 async def run_custom_mcda_analysis(
     zone_type: str,
     criteria_weights: Dict[str, float],
-    method: str = "weighted_sum"
+    method: str = "weighted_sum",
+    criteria_stack: Optional[str] = None
 ):
-    """Executar análise MCDA personalizada"""
+    """
+    Executar análise MCDA personalizada
+
+    criteria_stack: nome de um stack de critérios (.npy) no diretório de stacks MCDA,
+    aberto por memory-map em vez de usar dados simulados
+    """
     if not QGIS_ENABLED:
         raise HTTPException(status_code=503, detail="QGIS não disponível")
     
     try:
         # Criar critérios com pesos personalizados
-        criteria = mcda_system.create_criteria_from_template(
-            zone_type, {}, criteria_weights
-        )
+        if criteria_stack:
+            stack_path = mcda_system.resolve_criteria_stack(criteria_stack)
+            if not stack_path.exists():
+                raise HTTPException(status_code=404, detail=f"Stack de critérios não encontrado: {criteria_stack}")
+            criteria = mcda_system.create_criteria_from_stack(
+                zone_type, str(stack_path), custom_weights=criteria_weights
+            )
+        else:
+            criteria = mcda_system.create_criteria_from_template(
+                zone_type, {}, criteria_weights
+            )
         
         # Mapear método
         mcda_method = MCDAMethod(method)
         
-        # Executar análise
-        results = mcda_system.run_mcda_analysis(
-            criteria, mcda_method, zone_type
+        # Executar análise (CPU-bound: fora do event loop)
+        results = await asyncio.to_thread(
+            mcda_system.run_mcda_analysis, criteria, mcda_method, zone_type
         )
         
         return {
@@ -8619,6 +8906,10 @@ async def run_custom_mcda_analysis(
             "custom_mcda_analysis": results,
             "timestamp": datetime.now().isoformat()
         }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise MCDA personalizada: {str(e)}")
 
@@ -8927,7 +9218,14 @@ async def shutdown_event():
             logger.info("Database pool closed")
         except Exception as e:
             logger.error(f"Error closing database pool: {e}")
-    
+
+    # Fechar pools do gestor de bases de dados
+    if service_registry.is_loaded("database_manager"):
+        try:
+            await database_manager.close_pools()
+        except Exception as e:
+            logger.error(f"Error closing database manager pools: {e}")
+
     logger.info("BGAPP Admin API shutdown completed")
 
 if __name__ == "__main__":
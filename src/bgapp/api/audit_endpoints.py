@@ -46,7 +46,7 @@ if AUDIT_AVAILABLE:
         event_type: Optional[str] = Query(None, description="Filtrar por tipo de evento"),
         severity: Optional[str] = Query(None, description="Filtrar por severidade"),
         user_id: Optional[str] = Query(None, description="Filtrar por usuário"),
-        hours: int = Query(24, description="Últimas N horas", ge=1, le=168),  # Max 1 semana
+        hours: int = Query(24, description="Últimas N horas", ge=1, le=8784),  # Max 1 ano (pesquisa indexada)
         limit: int = Query(100, description="Limite de eventos", ge=1, le=1000)
     ):
         """Obter eventos de auditoria"""
@@ -23,7 +23,7 @@ from slowapi.middleware import SlowAPIMiddleware
 from ..models.biodiversity_ml_schemas import StudyType, DataSource, MLModelStatus
 from ..ml.auto_ingestion import AutoMLIngestionManager, initialize_auto_ingestion
 from ..ml.predictive_filters import PredictiveFilterManager, FilterType, initialize_predictive_filters
-from ..ml.models import MLModelManager, ModelType, PredictionResult
+from ..ml.models import MLModelManager, ModelType, PredictionResult, ml_manager as shared_ml_manager
 from ..core.secure_config import DatabaseSettings, SecuritySettings
 from ..auth.security import auth_service, get_current_user
 
@@ -164,8 +164,8 @@ async def get_filter_manager(db_settings: DatabaseSettings = Depends(get_db_sett
     return await initialize_predictive_filters(db_settings)
 
 async def get_ml_manager() -> MLModelManager:
-    """Obtém manager de ML"""
-    return MLModelManager()
+    """Obtém manager de ML (instância partilhada: os modelos são carregados uma vez)"""
+    return shared_ml_manager
 
 # Middleware de segurança
 async def verify_api_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -337,7 +337,8 @@ def create_ml_api() -> FastAPI:
         """
         try:
             # Fazer predição
-            result = ml_manager.predict(request.model_type, request.input_data)
+            # Inferência fora do event loop
+            result = await asyncio.to_thread(ml_manager.predict, request.model_type, request.input_data)
             
             # Verificar confiança mínima
             if result.confidence < request.confidence_threshold:
@@ -73,14 +73,15 @@ def process_oceanographic_data(self, data_source: str, parameters: Dict[str, Any
         # 5. Salvar resultados
         result_id = _save_processed_data(processed_data, statistics)
         
-        # 6. Cachear resultados para acesso rápido
+        # 6. Invalidar entradas obsoletas desta fonte e cachear resultados para acesso rápido
         if cache:
+            asyncio.run(cache.invalidate_tags(f"dataset:{data_source}"))
             cache_key = f"oceanographic:{data_source}:{hash(str(parameters))}"
             asyncio.run(cache.set(cache_key, {
                 'result_id': result_id,
                 'statistics': statistics,
                 'quality_score': quality_score
-            }, ttl=3600))  # 1 hora
+            }, ttl=3600, tags=[f"dataset:{data_source}"]))  # 1 hora
         
         processing_time = time.time() - start_time
         
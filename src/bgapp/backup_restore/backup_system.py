@@ -10,8 +10,8 @@ import json
 import logging
 import shutil
 import tarfile
-import gzip
 import hashlib
+from io import BytesIO
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple
@@ -21,6 +21,8 @@ import uuid
 import os
 import subprocess
 
+from .chunk_store import ChunkedStreamWriter, ChunkStore, ChunkStreamReader, ContentDefinedChunker
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -115,9 +117,16 @@ class BackupRestoreSystem:
             },
             'compression': {
                 'enabled': True,
-                'algorithm': 'gzip',
-                'level': 6
+                'algorithm': 'zstd',   # gzip se zstandard não estiver instalado
+                'level': 3,
+                'workers': None        # threads de compressão (None = nº de CPUs, máx. 8)
+            },
+            'chunking': {
+                'min_size_kb': 256,
+                'avg_size_kb': 1024,
+                'max_size_kb': 4096
             },
+            'parallel_components': 4,
             'encryption': {
                 'enabled': False,  # Para simplificar inicialmente
                 'algorithm': 'AES-256'
@@ -188,6 +197,13 @@ class BackupRestoreSystem:
         self.restore_jobs = {}
         self.scheduled_backups = {}
         
+        # Exclusão entre backups e recolha de chunks órfãos: um backup só se regista
+        # em _active_backups com o lock livre e a GC corre inteira com o lock adquirido
+        self._gc_lock = asyncio.Lock()
+        self._active_backups: set = set()
+        # Manifestos removidos cuja recolha de chunks ainda não correu (adiada por backups em curso)
+        self._gc_pending = False
+        
         # Métricas de backup
         self.backup_metrics = {
             'total_backups': 0,
@@ -227,6 +243,23 @@ class BackupRestoreSystem:
         
         # Criar diretório de backup se não existir
         self.backup_config['base_backup_dir'].mkdir(parents=True, exist_ok=True)
+        self.manifests_dir = self.backup_config['base_backup_dir'] / 'manifests'
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Armazém de chunks deduplicados (partilhado por todos os backups)
+        compression = self.backup_config['compression']
+        chunking = self.backup_config['chunking']
+        self.chunk_store = ChunkStore(
+            self.backup_config['base_backup_dir'] / 'store',
+            compression=compression['algorithm'] if compression['enabled'] else 'gzip',
+            level=compression['level'] if compression['enabled'] else 1,
+            max_workers=compression.get('workers')
+        )
+        self.chunker = ContentDefinedChunker(
+            min_size=chunking['min_size_kb'] * 1024,
+            avg_size=chunking['avg_size_kb'] * 1024,
+            max_size=chunking['max_size_kb'] * 1024
+        )
     
     async def create_backup_job(self, 
                               name: str,
@@ -302,7 +335,17 @@ class BackupRestoreSystem:
         return job_id
     
     async def _execute_backup_job(self, job: BackupJob):
-        """Executar trabalho de backup"""
+        """
+        Executar trabalho de backup
+        
+        Os componentes correm em paralelo (até `parallel_components`), cada um a
+        escrever em streaming para o chunk store: corte, hash e compressão numa
+        só passagem, sem ficheiros intermédios nem re-leitura para verificação.
+        """
+        
+        # Esperar por uma GC em curso: os chunks reutilizados têm de sobreviver até ao manifesto
+        async with self._gc_lock:
+            self._active_backups.add(job.job_id)
         
         try:
             job.status = BackupStatus.RUNNING
@@ -310,75 +353,94 @@ class BackupRestoreSystem:
             
             logger.info(f"💾 Iniciando backup: {job.name}")
             
-            # Criar diretório para este backup
             backup_timestamp = job.started_at.strftime('%Y%m%d_%H%M%S')
-            backup_dir = self.backup_config['base_backup_dir'] / f"{backup_timestamp}_{job.job_id}"
-            backup_dir.mkdir(parents=True, exist_ok=True)
+            components = [comp for comp in job.includes if comp not in job.excludes]
+            total_components = max(len(components), 1)
+            manifest_components: Dict[str, Any] = {}
+            semaphore = asyncio.Semaphore(self.backup_config['parallel_components'])
             
-            # Executar backup de cada componente
-            total_components = len(job.includes)
-            completed_components = 0
+            async def run_component(component_id: str):
+                async with semaphore:
+                    try:
+                        component_config = self.system_components[component_id]
+                        
+                        # Executar backup do componente (streaming num thread)
+                        manifest_components[component_id] = await asyncio.to_thread(
+                            self._backup_component, component_id, component_config
+                        )
+                        
+                        # Atualizar progresso
+                        job.progress = (len(manifest_components) / total_components) * 90  # 90% para componentes
+                        logger.info(f"✅ Componente {component_id} backup concluído")
+                        
+                    except Exception as e:
+                        error_msg = f"Erro no backup do componente {component_id}: {str(e)}"
+                        job.metadata[f'error_{component_id}'] = error_msg
+                        logger.error(error_msg)
             
-            for component_id in job.includes:
-                if component_id in job.excludes:
-                    continue
-                
-                try:
-                    component_config = self.system_components[component_id]
-                    
-                    # Atualizar progresso
-                    job.progress = (completed_components / total_components) * 80  # 80% para componentes
-                    
-                    # Executar backup do componente
-                    await self._backup_component(component_id, component_config, backup_dir)
-                    
-                    completed_components += 1
-                    
-                    logger.info(f"✅ Componente {component_id} backup concluído")
-                    
-                except Exception as e:
-                    error_msg = f"Erro no backup do componente {component_id}: {str(e)}"
-                    job.metadata[f'error_{component_id}'] = error_msg
-                    logger.error(error_msg)
+            await asyncio.gather(*(run_component(comp) for comp in components))
             
-            # Comprimir backup
-            job.progress = 85
-            compressed_file = await self._compress_backup(backup_dir, job)
+            if not manifest_components:
+                raise Exception("Nenhum componente foi copiado com sucesso")
             
-            # Verificar integridade
+            # Verificar integridade (todos os chunks referenciados presentes)
             job.progress = 95
             job.status = BackupStatus.VERIFYING
-            integrity_hash = await self._verify_backup_integrity(compressed_file)
+            integrity_hash = await self._verify_backup_integrity(manifest_components)
+            
+            manifest = {
+                'version': 2,
+                'job_id': job.job_id,
+                'name': job.name,
+                'backup_type': job.backup_type.value,
+                'created_at': job.started_at.isoformat(),
+                'integrity_hash': integrity_hash,
+                'chunking': self.backup_config['chunking'],
+                'codec': self.chunk_store.codec,
+                'components': manifest_components
+            }
+            manifest_file = self.manifests_dir / f"bgapp_backup_{backup_timestamp}_{job.job_id[:8]}.json"
+            with open(manifest_file, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            
+            # Finalizar backup: tamanho = bytes novos efetivamente escritos
+            raw_bytes = sum(comp['size'] for comp in manifest_components.values())
+            stored_bytes = sum(comp['stored_bytes'] for comp in manifest_components.values())
+            new_bytes = sum(comp['new_bytes'] for comp in manifest_components.values())
+            chunk_count = sum(len(comp['chunks']) for comp in manifest_components.values())
+            new_chunks = sum(comp['new_chunks'] for comp in manifest_components.values())
             
-            # Finalizar backup
             job.status = BackupStatus.COMPLETED
             job.completed_at = datetime.now()
-            job.file_path = str(compressed_file)
-            job.file_size_mb = compressed_file.stat().st_size / (1024 * 1024)
+            job.file_path = str(manifest_file)
+            job.file_size_mb = new_bytes / (1024 * 1024)
             job.integrity_hash = integrity_hash
             job.progress = 100.0
             
             # Calcular ratio de compressão
-            original_size = sum(
-                (backup_dir / f"{comp}.backup").stat().st_size 
-                for comp in job.includes 
-                if (backup_dir / f"{comp}.backup").exists()
-            )
-            if original_size > 0:
-                job.compression_ratio = job.file_size_mb / (original_size / (1024 * 1024))
-            
-            # Limpar diretório temporário
-            shutil.rmtree(backup_dir, ignore_errors=True)
+            if raw_bytes > 0:
+                job.compression_ratio = stored_bytes / raw_bytes
+            job.metadata.update({
+                'logical_size_mb': raw_bytes / (1024 * 1024),
+                'stored_size_mb': stored_bytes / (1024 * 1024),
+                'chunks_total': chunk_count,
+                'chunks_new': new_chunks,
+                'chunks_reused': chunk_count - new_chunks,
+                'dedup_ratio': (1 - new_bytes / stored_bytes) if stored_bytes else 0.0,
+                'duration_seconds': (job.completed_at - job.started_at).total_seconds()
+            })
             
             # Atualizar métricas
             self.backup_metrics['successful_backups'] += 1
             self.backup_metrics['total_backup_size_gb'] += job.file_size_mb / 1024
             self.backup_metrics['last_successful_backup'] = datetime.now().isoformat()
             
-            # Aplicar política de retenção
+            # Aplicar política de retenção (o manifesto deste backup já está escrito)
+            self._active_backups.discard(job.job_id)
             await self._apply_retention_policy()
             
-            logger.info(f"✅ Backup concluído: {job.name} ({job.file_size_mb:.1f}MB)")
+            logger.info(f"✅ Backup concluído: {job.name} ({job.file_size_mb:.1f}MB novos, "
+                        f"{chunk_count - new_chunks}/{chunk_count} chunks reutilizados)")
             
         except Exception as e:
             job.status = BackupStatus.FAILED
@@ -388,42 +450,43 @@ class BackupRestoreSystem:
             self.backup_metrics['failed_backups'] += 1
             
             logger.error(f"❌ Backup falhado: {job.name} - {str(e)}")
+        
+        finally:
+            self._active_backups.discard(job.job_id)
     
-    async def _backup_component(self, component_id: str, config: Dict[str, Any], backup_dir: Path):
-        """Fazer backup de um componente específico"""
+    def _backup_component(self, component_id: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Fazer backup de um componente específico (síncrono, corre num thread)"""
         
-        component_backup_file = backup_dir / f"{component_id}.backup"
+        writer = ChunkedStreamWriter(self.chunk_store, self.chunker)
+        try:
+            if config['type'] == 'database':
+                # Backup de base de dados
+                self._backup_database(config, writer)
+            elif config['type'] == 'files':
+                # Backup de ficheiros
+                self._backup_files(config, writer)
+            elif config['type'] == 'cache':
+                # Backup de cache
+                self._backup_cache(config, writer)
+            else:
+                raise ValueError(f"Tipo de componente não suportado: {config['type']}")
+        finally:
+            writer.close()
         
-        if config['type'] == 'database':
-            # Backup de base de dados
-            await self._backup_database(config, component_backup_file)
-        elif config['type'] == 'files':
-            # Backup de ficheiros
-            await self._backup_files(config, component_backup_file)
-        elif config['type'] == 'cache':
-            # Backup de cache
-            await self._backup_cache(config, component_backup_file)
-        else:
-            raise ValueError(f"Tipo de componente não suportado: {config['type']}")
+        return {'type': config['type'], **writer.summary()}
     
-    async def _backup_database(self, config: Dict[str, Any], output_file: Path):
+    def _backup_database(self, config: Dict[str, Any], writer: ChunkedStreamWriter):
         """Fazer backup de base de dados"""
         
         try:
-            # Simular backup de BD (seria substituído por comando real)
-            await asyncio.sleep(2)  # Simular tempo de backup
+            # Simular backup de BD (seria o stdout de pg_dump ligado diretamente ao writer)
+            writer.write(f"-- BGAPP Database Backup\n".encode())
+            writer.write(f"-- Database: {config['name']}\n".encode())
+            writer.write(f"-- Command: {config['backup_command']}\n\n".encode())
             
-            # Criar ficheiro de backup simulado
-            with open(output_file, 'w') as f:
-                f.write(f"-- BGAPP Database Backup\n")
-                f.write(f"-- Generated: {datetime.now().isoformat()}\n")
-                f.write(f"-- Database: {config['name']}\n")
-                f.write(f"-- Command: {config['backup_command']}\n")
-                f.write("\n")
-                
-                # Simular dados SQL
-                for i in range(100):
-                    f.write(f"INSERT INTO sample_table VALUES ({i}, 'data_{i}', '{datetime.now()}');\n")
+            # Simular dados SQL
+            for i in range(100):
+                writer.write(f"INSERT INTO sample_table VALUES ({i}, 'data_{i}');\n".encode())
             
             logger.info(f"✅ Database backup: {config['name']}")
             
@@ -431,23 +494,24 @@ class BackupRestoreSystem:
             logger.error(f"❌ Erro no backup da BD {config['name']}: {e}")
             raise
     
-    async def _backup_files(self, config: Dict[str, Any], output_file: Path):
-        """Fazer backup de ficheiros"""
+    def _backup_files(self, config: Dict[str, Any], writer: ChunkedStreamWriter):
+        """Fazer backup de ficheiros (tar em modo stream, sem ficheiro intermédio)"""
         
         try:
             source_path = Path(config['source_path'])
             
-            # Simular backup de ficheiros
-            await asyncio.sleep(1)
-            
-            # Criar arquivo tar simulado
-            with tarfile.open(output_file, 'w') as tar:
-                # Adicionar ficheiros simulados
-                for i in range(50):
-                    info = tarfile.TarInfo(name=f"file_{i}.txt")
-                    info.size = 1024  # 1KB por ficheiro
-                    data = f"Sample file content {i}\nTimestamp: {datetime.now()}\n".encode()
-                    tar.addfile(info, fileobj=BytesIO(data))
+            with tarfile.open(fileobj=writer, mode='w|') as tar:
+                if source_path.exists():
+                    # Ordem determinística: ficheiros inalterados produzem os mesmos chunks
+                    for path in sorted(source_path.rglob('*')):
+                        tar.add(path, arcname=str(path.relative_to(source_path)), recursive=False)
+                else:
+                    # Simular backup de ficheiros
+                    for i in range(50):
+                        data = f"Sample file content {i}\n".encode()
+                        info = tarfile.TarInfo(name=f"file_{i}.txt")
+                        info.size = len(data)
+                        tar.addfile(info, fileobj=BytesIO(data))
             
             logger.info(f"✅ Files backup: {config['name']}")
             
@@ -455,25 +519,19 @@ class BackupRestoreSystem:
             logger.error(f"❌ Erro no backup de ficheiros {config['name']}: {e}")
             raise
     
-    async def _backup_cache(self, config: Dict[str, Any], output_file: Path):
+    def _backup_cache(self, config: Dict[str, Any], writer: ChunkedStreamWriter):
         """Fazer backup de cache"""
         
         try:
-            # Simular backup de cache
-            await asyncio.sleep(0.5)
-            
-            # Criar backup JSON do cache
+            # Criar backup JSON do cache (simulado)
             cache_data = {
                 'cache_type': 'redis',
-                'backup_timestamp': datetime.now().isoformat(),
                 'keys_count': 1247,
                 'data_sample': {
                     f'key_{i}': f'cached_value_{i}' for i in range(10)
                 }
             }
-            
-            with open(output_file, 'w') as f:
-                json.dump(cache_data, f, indent=2)
+            writer.write(json.dumps(cache_data, indent=2).encode('utf-8'))
             
             logger.info(f"✅ Cache backup: {config['name']}")
             
@@ -481,42 +539,30 @@ class BackupRestoreSystem:
             logger.error(f"❌ Erro no backup de cache {config['name']}: {e}")
             raise
     
-    async def _compress_backup(self, backup_dir: Path, job: BackupJob) -> Path:
-        """Comprimir backup"""
-        
-        if not self.backup_config['compression']['enabled']:
-            return backup_dir
-        
-        timestamp = job.started_at.strftime('%Y%m%d_%H%M%S')
-        compressed_file = self.backup_config['base_backup_dir'] / f"bgapp_backup_{timestamp}.tar.gz"
+    async def _verify_backup_integrity(self, components: Dict[str, Any]) -> str:
+        """
+        Verificar integridade do backup
         
-        try:
-            # Criar arquivo comprimido
-            with tarfile.open(compressed_file, 'w:gz') as tar:
-                tar.add(backup_dir, arcname=f"bgapp_backup_{timestamp}")
-            
-            logger.info(f"✅ Backup comprimido: {compressed_file.name}")
-            
-            return compressed_file
-            
-        except Exception as e:
-            logger.error(f"❌ Erro na compressão: {e}")
-            raise
-    
-    async def _verify_backup_integrity(self, backup_file: Path) -> str:
-        """Verificar integridade do backup"""
+        Os chunks novos já foram verificados ao escrever (hash na mesma passagem);
+        aqui confirma-se que todos os referenciados existem e calcula-se o hash
+        do backup a partir dos SHA-256 de cada componente.
+        """
         
         if not self.backup_config['verification']['enabled']:
             return "verification_disabled"
         
         try:
-            # Calcular hash do ficheiro
-            hash_md5 = hashlib.md5()
-            with open(backup_file, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
+            missing = [
+                chunk['id'] for comp in components.values() for chunk in comp['chunks']
+                if not self.chunk_store.has(chunk['id'])
+            ]
+            if missing:
+                raise Exception(f"{len(missing)} chunks em falta no armazém")
             
-            integrity_hash = hash_md5.hexdigest()
+            backup_hash = hashlib.sha256()
+            for component_id in sorted(components):
+                backup_hash.update(f"{component_id}:{components[component_id]['sha256']}\n".encode())
+            integrity_hash = backup_hash.hexdigest()
             
             logger.info(f"✅ Integridade verificada: {integrity_hash[:16]}...")
             
@@ -526,11 +572,35 @@ class BackupRestoreSystem:
             logger.error(f"❌ Erro na verificação de integridade: {e}")
             raise
     
+    def verify_backup(self, manifest_path: str) -> Dict[str, Any]:
+        """Verificação completa: ler e descomprimir todos os chunks e comparar os SHA-256"""
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        results = {}
+        for component_id, component in manifest['components'].items():
+            reader = ChunkStreamReader(
+                self.chunk_store, [chunk['id'] for chunk in component['chunks']], component['sha256']
+            )
+            try:
+                while reader.read(1024 * 1024):
+                    pass
+                results[component_id] = 'ok'
+            except Exception as e:
+                results[component_id] = f"erro: {e}"
+            finally:
+                reader.close()
+        
+        return {'manifest': manifest_path, 'valid': all(v == 'ok' for v in results.values()),
+                'components': results}
+    
     async def _apply_retention_policy(self):
-        """Aplicar política de retenção"""
+        """Aplicar política de retenção (manifestos antigos + chunks órfãos)"""
         
         try:
-            backup_files = list(self.backup_config['base_backup_dir'].glob("bgapp_backup_*.tar.gz"))
+            # Manifestos de chunks e backups antigos (.tar.gz), que o restore ainda suporta
+            backup_files = list(self.manifests_dir.glob("bgapp_backup_*.json"))
+            backup_files += self.backup_config['base_backup_dir'].glob("bgapp_backup_*.tar.gz")
             
             # Ordenar por data (mais antigo primeiro)
             backup_files.sort(key=lambda x: x.stat().st_mtime)
@@ -549,9 +619,32 @@ class BackupRestoreSystem:
             for file_to_delete in files_to_delete:
                 file_to_delete.unlink()
                 logger.info(f"🗑️ Backup antigo removido: {file_to_delete.name}")
+                if file_to_delete.suffix == '.json':
+                    self._gc_pending = True
             
             if files_to_delete:
-                logger.info(f"🧹 Política de retenção aplicada: {len(files_to_delete)} ficheiros removidos")
+                logger.info(f"🧹 Política de retenção aplicada: {len(files_to_delete)} backups removidos")
+            
+            # Só manifestos libertam chunks; uma GC adiada é retomada na próxima passagem
+            if self._gc_pending:
+                # Lock durante toda a GC: nenhum backup arranca (nem reutiliza chunks) até terminar
+                async with self._gc_lock:
+                    # Chunks de backups em curso ainda não estão em nenhum manifesto: não recolher
+                    if self._active_backups:
+                        logger.info(f"🧹 Recolha de chunks adiada: {len(self._active_backups)} backups em curso")
+                        return
+                    
+                    # Recolher chunks que deixaram de ser referenciados
+                    referenced = set()
+                    for manifest_file in self.manifests_dir.glob("bgapp_backup_*.json"):
+                        with open(manifest_file, 'r', encoding='utf-8') as f:
+                            manifest = json.load(f)
+                        for component in manifest['components'].values():
+                            referenced.update(chunk['id'] for chunk in component['chunks'])
+                    gc_result = await asyncio.to_thread(self.chunk_store.collect_garbage, referenced)
+                    self._gc_pending = False
+                
+                logger.info(f"🧹 Recolha de chunks órfãos: {gc_result['chunks_removed']} chunks libertados")
             
         except Exception as e:
             logger.error(f"❌ Erro na aplicação da política de retenção: {e}")
@@ -625,9 +718,10 @@ class BackupRestoreSystem:
                 job.pre_restore_backup = pre_backup_id
                 
                 # Aguardar conclusão do backup pré-restore
-                await asyncio.sleep(5)  # Simular tempo de backup
+                pre_backup = self.backup_jobs[pre_backup_id]
+                while pre_backup.status in (BackupStatus.RUNNING, BackupStatus.VERIFYING):
+                    await asyncio.sleep(0.5)
             
-            # Extrair backup
             job.progress = 30
             job.status = RestoreStatus.RESTORING
             
@@ -635,9 +729,15 @@ class BackupRestoreSystem:
             extract_dir = self.backup_config['base_backup_dir'] / f"restore_{job.job_id}"
             extract_dir.mkdir(parents=True, exist_ok=True)
             
-            # Extrair ficheiro
-            with tarfile.open(backup_file, 'r:gz') as tar:
-                tar.extractall(extract_dir)
+            if backup_file.suffix == '.json':
+                # Manifesto de chunks: cada componente é lido em streaming do armazém
+                with open(backup_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            else:
+                # Backups antigos (.tar.gz): extrair ficheiro
+                manifest = None
+                with tarfile.open(backup_file, 'r:gz') as tar:
+                    tar.extractall(extract_dir)
             
             job.progress = 50
             
@@ -652,7 +752,15 @@ class BackupRestoreSystem:
                     job.progress = 50 + (i / total_components) * 40
                     
                     # Restaurar componente
-                    await self._restore_component(component_id, component_config, extract_dir)
+                    if manifest is not None:
+                        if component_id not in manifest['components']:
+                            raise FileNotFoundError(f"Backup do componente {component_id} não encontrado")
+                        await asyncio.to_thread(
+                            self._restore_component_stream, component_id, component_config,
+                            manifest['components'][component_id], extract_dir
+                        )
+                    else:
+                        await self._restore_component(component_id, component_config, extract_dir)
                     
                     logger.info(f"✅ Componente {component_id} restaurado")
                     
@@ -678,6 +786,42 @@ class BackupRestoreSystem:
             
             logger.error(f"❌ Restore falhado: {job.job_id} - {str(e)}")
     
+    def _restore_component_stream(self, component_id: str, config: Dict[str, Any],
+                                  component: Dict[str, Any], staging_dir: Path):
+        """
+        Restaurar um componente diretamente do chunk store (síncrono, corre num thread)
+        
+        Os chunks são descomprimidos em pré-carregamento e consumidos em streaming;
+        o SHA-256 do componente é validado no fim do stream.
+        """
+        
+        reader = ChunkStreamReader(
+            self.chunk_store, [chunk['id'] for chunk in component['chunks']], component['sha256']
+        )
+        try:
+            if config['type'] == 'files':
+                # Extração do tar em modo stream para a área de preparação
+                target_dir = staging_dir / component_id
+                target_dir.mkdir(parents=True, exist_ok=True)
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    tar.extractall(target_dir)
+                # Consumir o padding final do tar para validar o hash do stream completo
+                while reader.read(1024 * 1024):
+                    pass
+                logger.info(f"📁 Ficheiros restaurados: {config['name']}")
+            else:
+                # BD/cache: o stream seria ligado ao stdin do restore_command (psql, redis)
+                restored = 0
+                while True:
+                    block = reader.read(1024 * 1024)
+                    if not block:
+                        break
+                    restored += len(block)
+                icon = "🔄" if config['type'] == 'database' else "💾"
+                logger.info(f"{icon} {config['name']} restaurado ({restored} bytes)")
+        finally:
+            reader.close()
+    
     async def _restore_component(self, component_id: str, config: Dict[str, Any], extract_dir: Path):
         """Restaurar um componente específico"""
         
@@ -1100,7 +1244,8 @@ class BackupRestoreSystem:
             'scheduled_jobs': len(self.scheduled_backups),
             'completed_jobs': len([job for job in self.backup_jobs.values() if job.status == BackupStatus.COMPLETED]),
             'failed_jobs': len([job for job in self.backup_jobs.values() if job.status == BackupStatus.FAILED]),
-            'available_backups': list(self.backup_config['base_backup_dir'].glob("bgapp_backup_*.tar.gz")),
+            'available_backups': sorted(str(path) for path in self.manifests_dir.glob("bgapp_backup_*.json")),
+            'chunk_store': self.chunk_store.stats(),
             'system_components': {
                 comp_id: {
                     'name': config['name'],
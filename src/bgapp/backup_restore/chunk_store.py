@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+BGAPP Chunk Store - Armazenamento de backups por chunks deduplicados
+Content-defined chunking, compressão multi-thread (zstd, com fallback gzip)
+e hashing numa única passagem, com leitura em streaming para restore.
+"""
+
+import gzip
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+class ChunkIntegrityError(Exception):
+    """Chunk ou stream cujo hash não corresponde ao manifesto"""
+
+
+class ContentDefinedChunker:
+    """
+    Content-defined chunking (CDC) vetorizado
+
+    A fronteira depende apenas dos últimos `window` bytes: soma de uma tabela
+    "gear" aleatória (fixa) numa janela deslizante, calculada com cumsum em
+    numpy. Inserções num ficheiro só alteram os chunks vizinhos, o que permite
+    backups incrementais por deduplicação.
+    """
+
+    # Semente fixa: as fronteiras têm de ser iguais entre execuções
+    GEAR_SEED = 0x5BD1E995
+
+    def __init__(self, min_size: int = 256 * 1024, avg_size: int = 1024 * 1024,
+                 max_size: int = 4 * 1024 * 1024, window: int = 48):
+        if not (window < min_size < avg_size < max_size):
+            raise ValueError("Requer window < min_size < avg_size < max_size")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.window = window
+
+        # Fronteira com probabilidade 1/2^bits após min_size → tamanho médio ≈ avg_size
+        bits = max(1, int(round(np.log2(avg_size - min_size))))
+        self.mask = np.uint32((1 << bits) - 1)
+        self._gear = np.random.default_rng(self.GEAR_SEED).integers(
+            0, 2 ** 32, 256, dtype=np.uint64
+        ).astype(np.uint32)
+
+    def cut_points(self, data: bytes, final: bool = False) -> List[int]:
+        """
+        Offsets (exclusivos) de fim de cada chunk completo em `data`
+
+        Sem `final`, o resto após a última fronteira fica por cortar (precisa de
+        mais dados); com `final`, o resto forma o último chunk.
+        """
+        size = len(data)
+        if size == 0:
+            return []
+
+        candidates = np.empty(0, dtype=np.int64)
+        if size > self.window:
+            arr = np.frombuffer(data, dtype=np.uint8)
+            # uint32 com overflow modular: soma da janela = diferença de prefixos
+            prefix = np.cumsum(self._gear[arr], dtype=np.uint32)
+            window_sum = prefix[self.window:] - prefix[:-self.window]
+            candidates = np.flatnonzero((window_sum & self.mask) == 0) + self.window + 1
+
+        cuts = []
+        start = 0
+        while True:
+            index = np.searchsorted(candidates, start + self.min_size)
+            candidate = int(candidates[index]) if index < candidates.size else None
+            if candidate is not None and candidate - start <= self.max_size:
+                cut = candidate
+            elif size - start >= self.max_size:
+                cut = start + self.max_size
+            else:
+                break
+            cuts.append(cut)
+            start = cut
+
+        if final and start < size:
+            cuts.append(size)
+        return cuts
+
+
+class ChunkStore:
+    """
+    Armazém de chunks endereçado por conteúdo (blake2b-256)
+
+    chunks/<2 primeiros hex>/<hash>.zst (ou .gz sem zstandard). Um chunk já
+    existente nunca é reescrito: backups sucessivos só guardam chunks novos.
+    """
+
+    def __init__(self, root: Path, compression: str = 'zstd', level: int = 3,
+                 max_workers: Optional[int] = None):
+        self.root = Path(root)
+        self.chunks_dir = self.root / 'chunks'
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+
+        self.codec = 'zstd' if compression == 'zstd' and ZSTD_AVAILABLE else 'gzip'
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            logger.warning("⚠️ zstandard não instalado - chunks comprimidos com gzip")
+        self.level = level
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Codecs (um compressor por thread: zstd liberta o GIL)
+    # ------------------------------------------------------------------
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == 'zstd':
+            compressor = getattr(self._local, 'compressor', None)
+            if compressor is None:
+                compressor = zstandard.ZstdCompressor(level=self.level)
+                self._local.compressor = compressor
+            return compressor.compress(data)
+        return gzip.compress(data, compresslevel=self.level)
+
+    def _decompress(self, data: bytes, suffix: str) -> bytes:
+        if suffix == '.zst':
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("zstandard necessário para ler chunks .zst")
+            decompressor = getattr(self._local, 'decompressor', None)
+            if decompressor is None:
+                decompressor = zstandard.ZstdDecompressor()
+                self._local.decompressor = decompressor
+            return decompressor.decompress(data)
+        return gzip.decompress(data)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="backup-chunks"
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    # ------------------------------------------------------------------
+    # Chunks
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+    def _find(self, digest: str) -> Optional[Path]:
+        base = self.chunks_dir / digest[:2] / digest
+        for suffix in ('.zst', '.gz'):
+            path = base.with_suffix(suffix)
+            if path.exists():
+                return path
+        return None
+
+    def has(self, digest: str) -> bool:
+        return self._find(digest) is not None
+
+    def put(self, data: bytes) -> Tuple[str, int, bool]:
+        """Hash + compressão + escrita de um chunk; devolve (hash, bytes guardados, novo)"""
+        digest = self.digest(data)
+        existing = self._find(digest)
+        if existing is not None:
+            return digest, existing.stat().st_size, False
+
+        payload = self._compress(data)
+        path = self.chunks_dir / digest[:2] / (digest + ('.zst' if self.codec == 'zstd' else '.gz'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return digest, len(payload), True
+
+    def get(self, digest: str, verify: bool = True) -> bytes:
+        path = self._find(digest)
+        if path is None:
+            raise FileNotFoundError(f"Chunk {digest} não encontrado")
+        with open(path, 'rb') as f:
+            data = self._decompress(f.read(), path.suffix)
+        if verify and self.digest(data) != digest:
+            raise ChunkIntegrityError(f"Chunk {digest} corrompido")
+        return data
+
+    def collect_garbage(self, referenced: Set[str]) -> Dict[str, int]:
+        """Remover chunks não referenciados por nenhum manifesto"""
+        removed = 0
+        freed = 0
+        for path in self.chunks_dir.glob('*/*'):
+            digest = path.name.split('.', 1)[0]
+            if digest not in referenced or path.name.endswith('.tmp'):
+                freed += path.stat().st_size
+                path.unlink()
+                removed += 1
+        return {'chunks_removed': removed, 'bytes_freed': freed}
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [path.stat().st_size for path in self.chunks_dir.glob('*/*')]
+        return {
+            'codec': self.codec,
+            'chunks': len(sizes),
+            'stored_mb': round(sum(sizes) / (1024 * 1024), 2)
+        }
+
+
+class ChunkedStreamWriter(io.RawIOBase):
+    """
+    Destino de escrita (file-like) que corta, comprime e guarda em streaming
+
+    O produtor (pg_dump, tarfile em modo stream, json) escreve diretamente aqui;
+    o hash SHA-256 do stream completo é calculado na mesma passagem e os chunks
+    são comprimidos no pool do ChunkStore com um máximo de `max_pending` em voo.
+    """
+
+    def __init__(self, store: ChunkStore, chunker: ContentDefinedChunker, max_pending: int = 16):
+        super().__init__()
+        self.store = store
+        self.chunker = chunker
+        self.max_pending = max_pending
+        self.stream_hash = hashlib.sha256()
+        self.raw_bytes = 0
+
+        self._buffer = bytearray()
+        self._pending: Deque[Future] = deque()
+        self._results: List[Tuple[str, int, bool]] = []
+        self._sizes: List[int] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("Escrita num stream fechado")
+        view = memoryview(data)
+        self.stream_hash.update(view)
+        self.raw_bytes += len(view)
+        self._buffer += view
+        if len(self._buffer) >= 2 * self.chunker.max_size:
+            self._cut(final=False)
+        return len(view)
+
+    def _cut(self, final: bool):
+        data = bytes(self._buffer)
+        start = 0
+        for end in self.chunker.cut_points(data, final=final):
+            self._submit(data[start:end])
+            start = end
+        del self._buffer[:start]
+
+    def _submit(self, chunk: bytes):
+        # Backpressure: nunca mais de `max_pending` chunks em memória à espera do pool
+        while len(self._pending) >= self.max_pending:
+            self._results.append(self._pending.popleft().result())
+        self._sizes.append(len(chunk))
+        self._pending.append(self.store.executor.submit(self.store.put, chunk))
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._cut(final=True)
+            while self._pending:
+                self._results.append(self._pending.popleft().result())
+        finally:
+            super().close()
+
+    def summary(self) -> Dict[str, Any]:
+        """Entrada de manifesto do componente"""
+        return {
+            'sha256': self.stream_hash.hexdigest(),
+            'size': self.raw_bytes,
+            'chunks': [
+                {'id': digest, 'size': size, 'stored': stored}
+                for (digest, stored, _), size in zip(self._results, self._sizes)
+            ],
+            'new_chunks': sum(1 for _, _, new in self._results if new),
+            'new_bytes': sum(stored for _, stored, new in self._results if new),
+            'stored_bytes': sum(stored for _, stored, _ in self._results)
+        }
+
+
+class ChunkStreamReader(io.RawIOBase):
+    """
+    Leitura (file-like) de um componente a partir do chunk store
+
+    Os chunks seguintes são lidos e descomprimidos em pré-carregamento no pool;
+    no fim do stream o SHA-256 é comparado com o do manifesto.
+    """
+
+    def __init__(self, store: ChunkStore, chunk_ids: Iterable[str],
+                 expected_sha256: Optional[str] = None, prefetch: int = 4):
+        super().__init__()
+        self.store = store
+        self.expected_sha256 = expected_sha256
+        self.prefetch = prefetch
+        self.stream_hash = hashlib.sha256()
+
+        self._ids = deque(chunk_ids)
+        self._pending: Deque[Future] = deque()
+        self._current = memoryview(b'')
+        self._fill_prefetch()
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill_prefetch(self):
+        while self._ids and len(self._pending) < self.prefetch:
+            self._pending.append(self.store.executor.submit(self.store.get, self._ids.popleft()))
+
+    def readinto(self, buffer) -> int:
+        while not self._current:
+            if not self._pending:
+                self._finish()
+                return 0
+            chunk = self._pending.popleft().result()
+            self._fill_prefetch()
+            self.stream_hash.update(chunk)
+            self._current = memoryview(chunk)
+
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def _finish(self):
+        if self.expected_sha256 and self.stream_hash.hexdigest() != self.expected_sha256:
+            raise ChunkIntegrityError("SHA-256 do stream restaurado não corresponde ao manifesto")
+        self.expected_sha256 = None
+
+    def close(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        super().close()
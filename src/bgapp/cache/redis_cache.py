@@ -4,17 +4,31 @@ Sistema de Cache Inteligente com Redis
 Reduz latência de consultas de 6s para <1s
 """
 
+import fnmatch
 import json
+import math
 import pickle
+import random
+import struct
+import time
+import zlib
 import hashlib
 import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Optional, Dict, List, Union
+from typing import Any, Awaitable, Callable, Optional, Dict, List, Tuple, Union
 from functools import wraps
 
 import redis.asyncio as redis
 from pydantic import BaseModel
 
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
 class CacheConfig(BaseModel):
     """Configuração do sistema de cache"""
     redis_host: str = "redis"
@@ -23,6 +37,17 @@ class CacheConfig(BaseModel):
     default_ttl: int = 300  # 5 minutos
     max_connections: int = 20
     encoding: str = "utf-8"
+    # Tier L1 (memória local de cada worker)
+    l1_max_entries: int = 1024
+    l1_ttl: int = 30  # Limita a desatualização entre workers
+    # Codec binário
+    compression_threshold: int = 1024  # Comprimir payloads acima de N bytes
+    compression_level: int = 3
+    # Refresh antecipado probabilístico (XFetch)
+    early_refresh_beta: float = 1.0
+    # Invalidação incremental (SCAN/SSCAN + UNLINK)
+    scan_batch_size: int = 500
+    tag_ttl: int = 86400  # Vida mínima dos sets de tags
 
 class CacheStats(BaseModel):
     """Estatísticas do cache"""
@@ -32,9 +57,163 @@ class CacheStats(BaseModel):
     total_keys: int = 0
     memory_usage: str = "0B"
     last_updated: datetime = datetime.now()
+    # Contadores por tier
+    l1_hits: int = 0
+    l2_hits: int = 0
+    l1_size: int = 0
+    l1_evictions: int = 0
+    coalesced_requests: int = 0
+    early_refreshes: int = 0
+    loader_calls: int = 0
+    tag_invalidations: int = 0
+    keys_unlinked: int = 0
+    l1_avg_latency_ms: float = 0.0
+    l2_avg_latency_ms: float = 0.0
+    loader_avg_latency_ms: float = 0.0
+
+
+# Formato binário: MAGIC | flags | expires_at | delta | payload
+_FRAME_MAGIC = b"\xbc"
+_FRAME_HEADER = struct.Struct("<cBdd")
+_FLAG_MSGPACK = 0x01
+_FLAG_PICKLE = 0x02
+_FLAG_ZLIB = 0x04
+
+
+class CacheCodec:
+    """Codec binário do cache: msgpack (ou pickle) com compressão zlib opcional"""
+
+    def __init__(self, compression_threshold: int = 1024, compression_level: int = 3):
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+
+    @staticmethod
+    def _msgpack_default(obj: Any) -> Any:
+        if isinstance(obj, (datetime,)):
+            return obj.isoformat()
+        if isinstance(obj, (set, frozenset, tuple)):
+            return list(obj)
+        if hasattr(obj, "tolist"):  # numpy arrays/escalares
+            return obj.tolist()
+        raise TypeError(f"Tipo não serializável: {type(obj)!r}")
+
+    def encode(self, value: Any, expires_at: float = 0.0, delta: float = 0.0) -> bytes:
+        """Serializar valor com metadados de expiração e custo de recomputação"""
+        flags = 0
+        payload = None
+        if MSGPACK_AVAILABLE:
+            try:
+                payload = msgpack.packb(value, default=self._msgpack_default, use_bin_type=True)
+                flags |= _FLAG_MSGPACK
+            except (TypeError, ValueError, OverflowError):
+                payload = None
+        if payload is None:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            flags |= _FLAG_PICKLE
+        if len(payload) > self.compression_threshold:
+            payload = zlib.compress(payload, self.compression_level)
+            flags |= _FLAG_ZLIB
+        return _FRAME_HEADER.pack(_FRAME_MAGIC, flags, expires_at, delta) + payload
+
+    def decode(self, data: bytes) -> Tuple[Any, float, float]:
+        """Desserializar (valor, expires_at, delta); aceita entradas legadas JSON/latin1"""
+        if data[:1] != _FRAME_MAGIC or len(data) < _FRAME_HEADER.size:
+            return self._decode_legacy(data), 0.0, 0.0
+        _, flags, expires_at, delta = _FRAME_HEADER.unpack_from(data)
+        payload = data[_FRAME_HEADER.size:]
+        if flags & _FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        if flags & _FLAG_MSGPACK:
+            value = msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        else:
+            value = pickle.loads(payload)
+        return value, expires_at, delta
+
+    @staticmethod
+    def _decode_legacy(data: bytes) -> Any:
+        text = data.decode("utf-8")
+        try:
+            return json.loads(text)
+        except ValueError:
+            return pickle.loads(text.encode("latin1"))
+
+
+class LocalLRUCache:
+    """
+    Tier L1: LRU limitado em memória, local a cada worker
+
+    Guarda o frame serializado (os mesmos bytes enviados ao Redis) e descodifica
+    em cada hit: quem chama recebe sempre uma cópia e mutá-la não altera o cache.
+    """
+
+    def __init__(self, max_entries: int = 1024, codec: Optional[CacheCodec] = None):
+        self.max_entries = max_entries
+        self.codec = codec or CacheCodec()
+        self._entries: "OrderedDict[str, Tuple[bytes, float, float, float, frozenset]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Obter (valor, expires_at, delta) se ainda válido no tier local"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        data, expires_at, delta, local_expiry, _ = entry
+        if time.time() >= local_expiry:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return self.codec.decode(data)[0], expires_at, delta
+
+    def set(self, key: str, data: bytes, expires_at: float, delta: float, local_ttl: float,
+            tags: Optional[List[str]] = None):
+        """Guardar o frame já serializado (CacheCodec.encode)"""
+        if self.max_entries <= 0:
+            return
+        local_expiry = min(expires_at, time.time() + local_ttl)
+        self._entries[key] = (data, expires_at, delta, local_expiry, frozenset(tags or ()))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    def delete_tagged(self, tags: List[str]) -> int:
+        """Remover entradas locais que tenham qualquer uma das tags"""
+        wanted = set(tags)
+        stale = [key for key, entry in self._entries.items() if entry[4] & wanted]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def keys(self) -> List[str]:
+        return list(self._entries.keys())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _LatencyCounter:
+    """Acumulador simples de latência média"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+
+    @property
+    def avg_ms(self) -> float:
+        return (self.total / self.count * 1000) if self.count else 0.0
 
 class RedisCache:
-    """Sistema de cache Redis inteligente com estatísticas e otimizações"""
+    """Cache em dois níveis (L1 local + Redis) com coalescência de pedidos e refresh antecipado"""
     
     def __init__(self, config: CacheConfig = None):
         self.config = config or CacheConfig()
@@ -42,6 +221,14 @@ class RedisCache:
         self.redis = None  # Inicializar redis como None
         self.stats = CacheStats()
         self._connection_retries = 3
+        self.codec = CacheCodec(self.config.compression_threshold, self.config.compression_level)
+        self.l1 = LocalLRUCache(self.config.l1_max_entries, self.codec)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._latency = {
+            "l1": _LatencyCounter(),
+            "l2": _LatencyCounter(),
+            "loader": _LatencyCounter()
+        }
         
     async def connect(self):
         """Conectar ao Redis com pool de conexões"""
@@ -52,7 +239,7 @@ class RedisCache:
                 db=self.config.redis_db,
                 max_connections=self.config.max_connections,
                 retry_on_timeout=True,
-                decode_responses=True
+                decode_responses=False  # Payloads binários (msgpack/zlib)
             )
             self.redis = redis.Redis(connection_pool=self.redis_pool)
             
@@ -75,54 +262,161 @@ class RedisCache:
         key_data = f"{prefix}:{args}:{sorted(kwargs.items())}"
         key_hash = hashlib.md5(key_data.encode()).hexdigest()
         return f"bgapp:cache:{prefix}:{key_hash}"
+    
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        """Chave do set Redis que regista as entradas de uma tag (ex.: 'dataset:obis')"""
+        return f"bgapp:cache:tags:{tag}"
+    
+    async def _get_entry(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Obter (valor, expires_at, delta) percorrendo L1 e depois Redis"""
+        started = time.perf_counter()
+        entry = self.l1.get(key)
+        self._latency["l1"].add(time.perf_counter() - started)
+        if entry is not None:
+            self.stats.l1_hits += 1
+            self.stats.hits += 1
+            return entry
+        
+        if self.redis:
+            started = time.perf_counter()
+            try:
+                cached_data = await self.redis.get(key)
+            except Exception as e:
+                print(f"Erro lendo cache {key}: {e}")
+                cached_data = None
+            finally:
+                self._latency["l2"].add(time.perf_counter() - started)
+            
+            if cached_data:
+                try:
+                    value, expires_at, delta = self.codec.decode(cached_data)
+                except Exception as e:
+                    print(f"Erro descodificando cache {key}: {e}")
+                else:
+                    if not expires_at:
+                        expires_at = time.time() + self.config.default_ttl
+                    self.stats.l2_hits += 1
+                    self.stats.hits += 1
+                    self.l1.set(key, cached_data, expires_at, delta, self.config.l1_ttl)
+                    return value, expires_at, delta
+        
+        self.stats.misses += 1
+        return None
         
     async def get(self, key: str) -> Optional[Any]:
         """Obter valor do cache"""
-        if not self.redis:
-            return None
+        entry = await self._get_entry(key)
+        return entry[0] if entry is not None else None
             
+    async def set(self, key: str, value: Any, ttl: int = None, delta: float = 0.0,
+                  tags: Optional[List[str]] = None) -> bool:
+        """
+        Definir valor no cache (L1 e Redis)
+        
+        Args:
+            tags: Tags da entrada (ex.: 'dataset:obis', 'collection:sst', 'model:biodiversity')
+                  usadas por invalidate_tags
+        """
+        ttl = ttl or self.config.default_ttl
+        expires_at = time.time() + ttl
         try:
-            cached_data = await self.redis.get(key)
-            if cached_data:
-                self.stats.hits += 1
-                try:
-                    # Tentar JSON primeiro (mais rápido)
-                    return json.loads(cached_data)
-                except:
-                    # Fallback para pickle
-                    return pickle.loads(cached_data.encode('latin1'))
-            else:
-                self.stats.misses += 1
-                return None
-                
+            serialized_data = self.codec.encode(value, expires_at, delta)
         except Exception as e:
-            print(f"Erro lendo cache {key}: {e}")
-            self.stats.misses += 1
-            return None
-            
-    async def set(self, key: str, value: Any, ttl: int = None) -> bool:
-        """Definir valor no cache"""
+            print(f"Erro serializando cache {key}: {e}")
+            return False
+        self.l1.set(key, serialized_data, expires_at, delta, self.config.l1_ttl, tags)
+        
         if not self.redis:
             return False
-            
-        ttl = ttl or self.config.default_ttl
         
         try:
-            # Serializar dados (JSON quando possível, pickle como fallback)
-            try:
-                serialized_data = json.dumps(value, default=str)
-            except:
-                serialized_data = pickle.dumps(value).decode('latin1')
-                
-            await self.redis.setex(key, ttl, serialized_data)
+            if not tags:
+                await self.redis.setex(key, ttl, serialized_data)
+                return True
+            
+            # Valor + registo nas tags numa única ida ao servidor
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.setex(key, ttl, serialized_data)
+            for tag in tags:
+                tag_key = self._tag_key(tag)
+                pipe.sadd(tag_key, key)
+                # Membros já expirados são inofensivos: UNLINK ignora chaves inexistentes
+                pipe.expire(tag_key, max(ttl, self.config.tag_ttl))
+            await pipe.execute()
             return True
             
         except Exception as e:
             print(f"Erro gravando cache {key}: {e}")
             return False
+    
+    def _should_refresh_early(self, expires_at: float, delta: float) -> bool:
+        """XFetch: antecipar recomputação com probabilidade crescente perto da expiração"""
+        if delta <= 0 or self.config.early_refresh_beta <= 0:
+            return False
+        gap = -delta * self.config.early_refresh_beta * math.log(1.0 - random.random())
+        return time.time() + gap >= expires_at
+    
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int,
+                    tags: Optional[List[str]] = None) -> Any:
+        """Executar loader uma única vez por chave (single-flight) e gravar resultado"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats.coalesced_requests += 1
+            return await asyncio.shield(future)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            started = time.perf_counter()
+            self.stats.loader_calls += 1
+            result = await loader()
+            delta = time.perf_counter() - started
+            self._latency["loader"].add(delta)
+            if result is not None:
+                await self.set(key, result, ttl, delta=delta, tags=tags)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evitar aviso "exception never retrieved" quando não há esperas
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def _refresh_in_background(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int,
+                                     tags: Optional[List[str]] = None):
+        try:
+            await self._load(key, loader, ttl, tags)
+        except Exception as e:
+            print(f"Erro no refresh antecipado {key}: {e}")
+    
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int = None,
+                         tags: Optional[List[str]] = None) -> Any:
+        """
+        Obter do cache ou calcular com o loader.
+        
+        Pedidos concorrentes para a mesma chave partilham uma única execução do loader,
+        e entradas próximas da expiração são recalculadas antecipadamente em background.
+        """
+        ttl = ttl or self.config.default_ttl
+        entry = await self._get_entry(key)
+        if entry is not None:
+            value, expires_at, delta = entry
+            if key not in self._inflight and self._should_refresh_early(expires_at, delta):
+                self.stats.early_refreshes += 1
+                asyncio.ensure_future(self._refresh_in_background(key, loader, ttl, tags))
+            return value
+        
+        return await self._load(key, loader, ttl, tags)
             
     async def delete(self, key: str) -> bool:
         """Remover chave do cache"""
+        self.l1.delete(key)
         if not self.redis:
             return False
             
@@ -135,20 +429,77 @@ class RedisCache:
             
     async def clear_pattern(self, pattern: str) -> int:
         """Limpar chaves que correspondem a um padrão"""
+        for key in self.l1.keys():
+            if fnmatch.fnmatchcase(key, pattern):
+                self.l1.delete(key)
         if not self.redis:
             return 0
             
         try:
-            keys = await self.redis.keys(pattern)
-            if keys:
-                return await self.redis.delete(*keys)
-            return 0
+            # SCAN incremental em vez de KEYS: não bloqueia o servidor Redis
+            removed = 0
+            batch = []
+            async for key in self.redis.scan_iter(match=pattern, count=self.config.scan_batch_size):
+                batch.append(key)
+                if len(batch) >= self.config.scan_batch_size:
+                    removed += await self._unlink_batch(batch)
+                    batch = []
+            if batch:
+                removed += await self._unlink_batch(batch)
+            return removed
         except Exception as e:
             print(f"Erro limpando padrão {pattern}: {e}")
             return 0
+    
+    async def _unlink_batch(self, keys: List[Any]) -> int:
+        """Remover um lote de chaves com UNLINK (libertação de memória assíncrona no servidor)"""
+        removed = await self.redis.unlink(*keys)
+        self.stats.keys_unlinked += removed
+        # Ceder o event loop entre lotes
+        await asyncio.sleep(0)
+        return removed
+    
+    async def invalidate_tags(self, *tags: str) -> int:
+        """
+        Invalidar todas as entradas marcadas com qualquer uma das tags.
+        
+        Percorre cada set de tag com SSCAN e remove as chaves em lotes com UNLINK,
+        para que uma ingestão possa expirar apenas as entradas que tornou obsoletas.
+        """
+        if not tags:
+            return 0
+        self.l1.delete_tagged(list(tags))
+        self.stats.tag_invalidations += len(tags)
+        if not self.redis:
+            return 0
+        
+        removed = 0
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            try:
+                batch = []
+                async for key in self.redis.sscan_iter(tag_key, count=self.config.scan_batch_size):
+                    batch.append(key)
+                    if len(batch) >= self.config.scan_batch_size:
+                        removed += await self._unlink_batch(batch)
+                        batch = []
+                if batch:
+                    removed += await self._unlink_batch(batch)
+                await self.redis.unlink(tag_key)
+            except Exception as e:
+                print(f"Erro invalidando tag {tag}: {e}")
+        return removed
             
     async def get_stats(self) -> CacheStats:
         """Obter estatísticas do cache"""
+        total_requests = self.stats.hits + self.stats.misses
+        self.stats.hit_rate = (self.stats.hits / total_requests * 100) if total_requests > 0 else 0
+        self.stats.l1_size = len(self.l1)
+        self.stats.l1_evictions = self.l1.evictions
+        self.stats.l1_avg_latency_ms = round(self._latency["l1"].avg_ms, 4)
+        self.stats.l2_avg_latency_ms = round(self._latency["l2"].avg_ms, 4)
+        self.stats.loader_avg_latency_ms = round(self._latency["loader"].avg_ms, 4)
+        
         if not self.redis:
             return self.stats
             
@@ -156,10 +507,6 @@ class RedisCache:
             info = await self.redis.info('memory')
             keyspace = await self.redis.info('keyspace')
             
-            # Calcular hit rate
-            total_requests = self.stats.hits + self.stats.misses
-            self.stats.hit_rate = (self.stats.hits / total_requests * 100) if total_requests > 0 else 0
-            
             # Informações de memória
             memory_used = info.get('used_memory_human', '0B')
             self.stats.memory_usage = memory_used
@@ -178,13 +525,15 @@ class RedisCache:
 # Instância global do cache
 cache = RedisCache()
 
-def cached(ttl: int = 300, key_prefix: str = "default"):
+def cached(ttl: int = 300, key_prefix: str = "default",
+           tags: Union[List[str], Callable[..., List[str]], None] = None):
     """
     Decorator para cache automático de funções
     
     Args:
         ttl: Tempo de vida em segundos
         key_prefix: Prefixo para a chave do cache
+        tags: Tags fixas ou função (*args, **kwargs) -> tags para invalidação seletiva
     """
     def decorator(func):
         @wraps(func)
@@ -192,15 +541,10 @@ def cached(ttl: int = 300, key_prefix: str = "default"):
             # Gerar chave do cache
             cache_key = cache._generate_key(key_prefix, func.__name__, *args, **kwargs)
             
-            # Tentar obter do cache
-            cached_result = await cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-                
-            # Executar função e cachear resultado
-            result = await func(*args, **kwargs)
-            await cache.set(cache_key, result, ttl)
-            return result
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            
+            # L1 → Redis → função (uma única execução por chave entre pedidos concorrentes)
+            return await cache.get_or_set(cache_key, lambda: func(*args, **kwargs), ttl, entry_tags)
             
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
@@ -254,6 +598,20 @@ class CacheManager:
         if pattern:
             cleared = await self.cache.clear_pattern(pattern)
             print(f"🗑️ Invalidados {cleared} caches de {data_type}")
+    
+    async def invalidate_dataset(self, dataset: str = None, collection: str = None,
+                                 model_id: str = None) -> int:
+        """Invalidar as entradas associadas a um dataset, coleção STAC ou modelo ML"""
+        tags = []
+        if dataset:
+            tags.append(f"dataset:{dataset}")
+        if collection:
+            tags.append(f"collection:{collection}")
+        if model_id:
+            tags.append(f"model:{model_id}")
+        cleared = await self.cache.invalidate_tags(*tags)
+        print(f"🗑️ Invalidados {cleared} caches das tags {tags}")
+        return cleared
             
     async def warm_up_cache(self):
         """Pré-carregar cache com dados frequentemente acessados"""
@@ -52,6 +52,9 @@ class AngolaMarineCartography:
     e pescadores angolanos, com foco na ZEE de Angola.
     """
     
+    # Acima deste número de pontos os mapas Folium usam tiles vetoriais
+    MAX_INLINE_MARKERS = 2000
+    
     def __init__(self):
         """Inicializar engine cartográfico"""
         
@@ -804,8 +807,15 @@ class AngolaMarineCartography:
         
         return pd.DataFrame(data)
     
-    def _create_folium_species_map(self, species_data: pd.DataFrame) -> folium.Map:
-        """Criar mapa Folium de distribuição de espécies"""
+    def _create_folium_species_map(self, species_data: pd.DataFrame,
+                                   tile_base_url: str = '') -> folium.Map:
+        """
+        Criar mapa Folium de distribuição de espécies
+
+        Até MAX_INLINE_MARKERS pontos são embebidos como marcadores; acima disso
+        cada espécie é registada como camada vetorial no tile server e servida
+        em MVT, mantendo a página leve independentemente do volume de dados.
+        """
         
         # Centro do mapa
         center_lat = species_data['lat'].mean()
@@ -826,6 +836,10 @@ class AngolaMarineCartography:
             )
         }
         
+        if len(species_data) > self.MAX_INLINE_MARKERS:
+            self._add_species_vector_tiles(m, species_data, species_colors, tile_base_url)
+            species_data = species_data.iloc[0:0]
+        
         # Adicionar pontos por espécie
         for species in species_data['species'].unique():
             species_subset = species_data[species_data['species'] == species]
@@ -865,6 +879,46 @@ class AngolaMarineCartography:
         
         return m
     
+    def _add_species_vector_tiles(self, m: folium.Map, species_data: pd.DataFrame,
+                                  species_colors: Dict[str, str], tile_base_url: str = ''):
+        """Registar uma camada MVT por espécie e adicioná-la ao mapa via VectorGrid"""
+        from folium.plugins import VectorGridProtobuf
+        from .tile_server import VectorTileLayer, tile_server, tile_url
+
+        for species, color in species_colors.items():
+            subset = species_data[species_data['species'] == species]
+            version = pd.util.hash_pandas_object(subset[['lat', 'lon', 'abundance']], index=False).sum()
+            layer_name = f"species-{species.lower().replace(' ', '-')}"
+            features = {
+                'type': 'FeatureCollection',
+                'features': [
+                    {
+                        'type': 'Feature',
+                        'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]},
+                        'properties': {'species': species, 'abundance': round(float(abundance), 2)}
+                    }
+                    for lat, lon, abundance in subset[['lat', 'lon', 'abundance']].itertuples(index=False)
+                ]
+            }
+            tile_server.register(VectorTileLayer(layer_name, features, version=str(version)))
+
+            VectorGridProtobuf(
+                tile_url(layer_name, 'mvt', tile_base_url),
+                name=species,
+                options={
+                    'vectorTileLayerStyles': {
+                        layer_name: {
+                            'radius': 5, 'fill': True, 'fillColor': color, 'fillOpacity': 0.7,
+                            'color': color, 'weight': 1
+                        }
+                    },
+                    'maxNativeZoom': 14
+                }
+            ).add_to(m)
+
+        folium.LayerControl().add_to(m)
+        logger.info(f"🧩 {len(species_data)} ocorrências servidas como tiles vetoriais ({len(species_colors)} camadas)")
+    
     def generate_fisheries_report(self, 
                                 zone: str = 'all',
                                 period_days: int = 30,
@@ -0,0 +1,932 @@
+#!/usr/bin/env python3
+"""
+BGAPP Tile Server - Tiles XYZ dinâmicos para camadas oceanográficas
+Tiles raster (PNG/WebP) a partir de COGs, cubos xarray e grelhas metocean,
+tiles vetoriais (Mapbox Vector Tiles) para camadas de pontos/polígonos,
+com cache em disco, pré-seeding da ZEE de Angola e ETag/Cache-Control
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from ..core.config import ROOT
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MVT_EXTENT = 4096
+MERCATOR_ORIGIN = 20037508.342789244
+MAX_LATITUDE = 85.0511287798066
+
+# ZEE de Angola (mesmos limites do motor metocean) em lon/lat
+ANGOLA_EEZ_BOUNDS = (8.5, -18.2, 17.5, -4.2)
+
+MEDIA_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'mvt': 'application/vnd.mapbox-vector-tile',
+    'pbf': 'application/x-protobuf',
+}
+
+# Rampas de cor (posição, RGB) interpoladas linearmente numa LUT de 256 cores
+COLORMAPS = {
+    'viridis': [(0.0, (68, 1, 84)), (0.25, (59, 82, 139)), (0.5, (33, 145, 140)),
+                (0.75, (94, 201, 98)), (1.0, (253, 231, 37))],
+    'thermal': [(0.0, (4, 35, 51)), (0.25, (58, 59, 161)), (0.5, (158, 72, 124)),
+                (0.75, (234, 115, 57)), (1.0, (232, 250, 91))],
+    'haline': [(0.0, (41, 24, 107)), (0.33, (21, 101, 142)), (0.66, (79, 166, 126)),
+               (1.0, (253, 238, 153))],
+    'algae': [(0.0, (215, 249, 208)), (0.33, (121, 193, 118)), (0.66, (33, 126, 56)),
+              (1.0, (17, 36, 20))],
+    'speed': [(0.0, (255, 253, 205)), (0.33, (170, 204, 87)), (0.66, (61, 135, 48)),
+              (1.0, (23, 35, 18))],
+}
+
+
+# ----------------------------------------------------------------------
+# Geometria das tiles (Web Mercator, esquema XYZ)
+# ----------------------------------------------------------------------
+
+def tile_bounds_mercator(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Limites (minx, miny, maxx, maxy) da tile em EPSG:3857"""
+    size = 2 * MERCATOR_ORIGIN / (1 << z)
+    minx = -MERCATOR_ORIGIN + x * size
+    maxy = MERCATOR_ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def mercator_to_lonlat(mx: np.ndarray, my: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    lon = np.degrees(mx / 6378137.0)
+    lat = np.degrees(np.arctan(np.sinh(my / 6378137.0)))
+    return lon, lat
+
+
+def lonlat_to_mercator(lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    lat = np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)
+    mx = np.radians(lon) * 6378137.0
+    my = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * 6378137.0
+    return mx, my
+
+
+def tile_bounds_lonlat(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    minx, miny, maxx, maxy = tile_bounds_mercator(z, x, y)
+    (west, east), (south, north) = mercator_to_lonlat(np.array([minx, maxx]), np.array([miny, maxy]))
+    return float(west), float(south), float(east), float(north)
+
+
+def lonlat_to_tile(lon: float, lat: float, z: int) -> Tuple[int, int]:
+    n = 1 << z
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bounds(bounds: Tuple[float, float, float, float], zoom: int) -> Iterator[Tuple[int, int]]:
+    """Tiles (x, y) do nível `zoom` que intersetam bounds (west, south, east, north)"""
+    west, south, east, north = bounds
+    x0, y0 = lonlat_to_tile(west, north, zoom)
+    x1, y1 = lonlat_to_tile(east, south, zoom)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+
+def tile_pixel_centers(z: int, x: int, y: int, size: int = TILE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Lon (colunas) e lat (linhas) dos centros dos píxeis; separáveis em Mercator"""
+    minx, miny, maxx, maxy = tile_bounds_mercator(z, x, y)
+    step = (maxx - minx) / size
+    mx = minx + (np.arange(size) + 0.5) * step
+    my = maxy - (np.arange(size) + 0.5) * step
+    lon, _ = mercator_to_lonlat(mx, np.zeros(size))
+    _, lat = mercator_to_lonlat(np.zeros(size), my)
+    return lon, lat
+
+
+# ----------------------------------------------------------------------
+# Cor e codificação de imagem
+# ----------------------------------------------------------------------
+
+_LUT_CACHE: Dict[str, np.ndarray] = {}
+
+
+def colormap_lut(name: str) -> np.ndarray:
+    """LUT (256, 3) uint8 da rampa `name`"""
+    if name not in _LUT_CACHE:
+        stops = COLORMAPS.get(name)
+        if stops is None:
+            raise ValueError(f"Colormap desconhecido: {name}")
+        positions = np.array([p for p, _ in stops])
+        colors = np.array([c for _, c in stops], dtype=np.float64)
+        steps = np.linspace(0, 1, 256)
+        _LUT_CACHE[name] = np.stack(
+            [np.interp(steps, positions, colors[:, channel]) for channel in range(3)], axis=1
+        ).round().astype(np.uint8)
+    return _LUT_CACHE[name]
+
+
+def colorize(values: np.ndarray, vmin: float, vmax: float, colormap: str = 'viridis',
+             log_scale: bool = False) -> np.ndarray:
+    """Valores (com NaN = transparente) → RGBA uint8"""
+    valid = np.isfinite(values)
+    if log_scale:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.log10(np.where(valid & (values > 0), values, np.nan))
+        vmin, vmax = math.log10(vmin), math.log10(vmax)
+        valid = np.isfinite(values)
+    scaled = np.clip((np.nan_to_num(values, nan=vmin) - vmin) / ((vmax - vmin) or 1.0), 0, 1)
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = colormap_lut(colormap)[(scaled * 255).astype(np.uint8)]
+    rgba[..., 3] = np.where(valid, 255, 0)
+    return rgba
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_image(rgba: np.ndarray, fmt: str) -> bytes:
+    """RGBA → PNG/WebP (Pillow; PNG sem Pillow com codificador mínimo)"""
+    if PIL_AVAILABLE:
+        buffer = BytesIO()
+        image = Image.fromarray(rgba, mode='RGBA')
+        if fmt == 'webp':
+            image.save(buffer, format='WEBP', quality=85, method=4)
+        else:
+            image.save(buffer, format='PNG', optimize=False, compress_level=6)
+        return buffer.getvalue()
+    if fmt != 'png':
+        raise ValueError("WebP requer Pillow")
+    height, width = rgba.shape[:2]
+    raw = b''.join(b'\x00' + rgba[row].tobytes() for row in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + _png_chunk(b'IDAT', zlib.compress(raw, 6))
+            + _png_chunk(b'IEND', b''))
+
+
+# ----------------------------------------------------------------------
+# Mapbox Vector Tiles (codificador protobuf mínimo, especificação MVT 2.1)
+# ----------------------------------------------------------------------
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number: int, wire_type: int, payload: bytes) -> bytes:
+    key = _varint((number << 3) | wire_type)
+    if wire_type == 2:
+        return key + _varint(len(payload)) + payload
+    return key + payload
+
+
+def _packed(values: Iterable[int]) -> bytes:
+    return b''.join(_varint(v) for v in values)
+
+
+def _mvt_value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return _field(7, 0, _varint(int(value)))
+    if isinstance(value, (int, np.integer)):
+        return _field(6, 0, _varint(_zigzag(int(value)) & 0xFFFFFFFFFFFFFFFF))
+    if isinstance(value, (float, np.floating)):
+        return _field(3, 1, struct.pack('<d', float(value)))
+    return _field(1, 2, str(value).encode('utf-8'))
+
+
+def _ring_commands(coords: np.ndarray, cursor: List[int], close: bool) -> List[int]:
+    """MoveTo/LineTo(/ClosePath) com deltas zigzag a partir do cursor atual"""
+    commands = [(1 & 7) | (1 << 3)]
+    x, y = int(coords[0, 0]), int(coords[0, 1])
+    commands += [_zigzag(x - cursor[0]), _zigzag(y - cursor[1])]
+    cursor[0], cursor[1] = x, y
+    rest = coords[1:]
+    commands.append((2 & 7) | (len(rest) << 3))
+    for px, py in rest:
+        commands += [_zigzag(int(px) - cursor[0]), _zigzag(int(py) - cursor[1])]
+        cursor[0], cursor[1] = int(px), int(py)
+    if close:
+        commands.append((7 & 7) | (1 << 3))
+    return commands
+
+
+def _dedupe(coords: np.ndarray) -> np.ndarray:
+    if len(coords) < 2:
+        return coords
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    return coords[keep]
+
+
+def _signed_area(coords: np.ndarray) -> float:
+    x, y = coords[:, 0], coords[:, 1]
+    return 0.5 * float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y))
+
+
+def encode_geometry(geometry) -> Tuple[int, List[int]]:
+    """Geometria shapely já em coordenadas inteiras da tile → (tipo MVT, comandos)"""
+    geom_type = geometry.geom_type
+    cursor = [0, 0]
+    if geom_type in ('Point', 'MultiPoint'):
+        points = [geometry] if geom_type == 'Point' else list(geometry.geoms)
+        coords = np.array([[int(p.x), int(p.y)] for p in points])
+        commands = [(1 & 7) | (len(coords) << 3)]
+        for px, py in coords:
+            commands += [_zigzag(int(px) - cursor[0]), _zigzag(int(py) - cursor[1])]
+            cursor[0], cursor[1] = int(px), int(py)
+        return 1, commands
+
+    if geom_type in ('LineString', 'MultiLineString'):
+        commands = []
+        for line in ([geometry] if geom_type == 'LineString' else geometry.geoms):
+            coords = _dedupe(np.asarray(line.coords, dtype=np.int64))
+            if len(coords) >= 2:
+                commands += _ring_commands(coords, cursor, close=False)
+        return 2, commands
+
+    if geom_type in ('Polygon', 'MultiPolygon'):
+        commands = []
+        for polygon in ([geometry] if geom_type == 'Polygon' else geometry.geoms):
+            rings = [polygon.exterior] + list(polygon.interiors)
+            for index, ring in enumerate(rings):
+                coords = _dedupe(np.asarray(ring.coords, dtype=np.int64))[:-1]
+                if len(coords) < 3:
+                    if index == 0:
+                        break
+                    continue
+                # Exterior com área positiva em coordenadas de ecrã (y para baixo), interiores negativa
+                area = _signed_area(coords)
+                if area == 0:
+                    continue
+                if (area < 0) == (index == 0):
+                    coords = coords[::-1]
+                commands += _ring_commands(coords, cursor, close=True)
+        return 3, commands
+
+    if geom_type == 'GeometryCollection':
+        raise ValueError("GeometryCollection não suportada em MVT")
+    raise ValueError(f"Tipo de geometria não suportado: {geom_type}")
+
+
+def encode_mvt_layer(name: str, features: List[Tuple[Any, Dict[str, Any], Optional[int]]],
+                     extent: int = MVT_EXTENT) -> bytes:
+    """Camada MVT com features (geometria em coordenadas da tile, propriedades, id)"""
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[str, Any], int] = {}
+    encoded_values: List[bytes] = []
+    body = _field(15, 0, _varint(2)) + _field(1, 2, name.encode('utf-8'))
+
+    for geometry, properties, feature_id in features:
+        try:
+            geom_type, commands = encode_geometry(geometry)
+        except ValueError:
+            continue
+        if not commands:
+            continue
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            key_index = keys.setdefault(key, len(keys))
+            value_key = (type(value).__name__, value)
+            if value_key not in values:
+                values[value_key] = len(encoded_values)
+                encoded_values.append(_mvt_value(value))
+            tags += [key_index, values[value_key]]
+        feature = b''
+        if feature_id is not None:
+            feature += _field(1, 0, _varint(int(feature_id)))
+        if tags:
+            feature += _field(2, 2, _packed(tags))
+        feature += _field(3, 0, _varint(geom_type)) + _field(4, 2, _packed(commands))
+        body += _field(2, 2, feature)
+
+    for key in keys:
+        body += _field(3, 2, key.encode('utf-8'))
+    for value in encoded_values:
+        body += _field(4, 2, value)
+    body += _field(5, 0, _varint(extent))
+    return _field(3, 2, body)
+
+
+# ----------------------------------------------------------------------
+# Camadas
+# ----------------------------------------------------------------------
+
+class TileLayer:
+    """Camada de tiles: render(z, x, y, fmt) → bytes (vazio = tile sem dados)"""
+
+    kind = 'raster'
+    formats: Tuple[str, ...] = ('png', 'webp')
+
+    def __init__(self, name: str, minzoom: int = 0, maxzoom: int = 12,
+                 bounds: Tuple[float, float, float, float] = ANGOLA_EEZ_BOUNDS,
+                 max_age: int = 86400, description: str = ''):
+        self.name = name
+        self.minzoom = minzoom
+        self.maxzoom = maxzoom
+        self.bounds = bounds
+        self.max_age = max_age
+        self.description = description
+
+    def version(self) -> str:
+        """Identificador da versão dos dados/estilo (muda → cache e ETag invalidados)"""
+        return '1'
+
+    def intersects(self, z: int, x: int, y: int) -> bool:
+        west, south, east, north = tile_bounds_lonlat(z, x, y)
+        return not (east < self.bounds[0] or west > self.bounds[2] or
+                    north < self.bounds[1] or south > self.bounds[3])
+
+    def render(self, z: int, x: int, y: int, fmt: str) -> bytes:
+        raise NotImplementedError
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'formats': list(self.formats),
+            'minzoom': self.minzoom,
+            'maxzoom': self.maxzoom,
+            'bounds': list(self.bounds),
+            'description': self.description,
+        }
+
+
+class ValueTileLayer(TileLayer):
+    """Camada raster de valores contínuos colorizados (rampa + intervalo fixo)"""
+
+    def __init__(self, name: str, vmin: float, vmax: float, colormap: str = 'viridis',
+                 log_scale: bool = False, **kwargs):
+        super().__init__(name, **kwargs)
+        self.vmin = vmin
+        self.vmax = vmax
+        self.colormap = colormap
+        self.log_scale = log_scale
+
+    def style_key(self) -> str:
+        return f"{self.colormap}:{self.vmin}:{self.vmax}:{int(self.log_scale)}"
+
+    def read_tile(self, z: int, x: int, y: int) -> Optional[np.ndarray]:
+        """Valores (TILE_SIZE, TILE_SIZE) float com NaN fora dos dados; None = vazio"""
+        raise NotImplementedError
+
+    def render(self, z: int, x: int, y: int, fmt: str) -> bytes:
+        values = self.read_tile(z, x, y)
+        if values is None or not np.isfinite(values).any():
+            return b''
+        return encode_image(colorize(values, self.vmin, self.vmax, self.colormap, self.log_scale), fmt)
+
+    def info(self) -> Dict[str, Any]:
+        return {**super().info(), 'vmin': self.vmin, 'vmax': self.vmax, 'colormap': self.colormap}
+
+
+def grid_indices(axis: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Índice do vizinho mais próximo num eixo regular (crescente ou decrescente) e máscara de cobertura"""
+    ascending = axis[-1] >= axis[0]
+    ordered = axis if ascending else axis[::-1]
+    step = abs(float(axis[1] - axis[0])) if axis.size > 1 else 1.0
+    position = np.clip(np.searchsorted(ordered, targets), 1, max(1, ordered.size - 1))
+    left = ordered[position - 1]
+    right = ordered[np.minimum(position, ordered.size - 1)]
+    nearest = np.where(np.abs(targets - left) <= np.abs(right - targets), position - 1,
+                       np.minimum(position, ordered.size - 1))
+    inside = (targets >= ordered[0] - step / 2) & (targets <= ordered[-1] + step / 2)
+    if not ascending:
+        nearest = ordered.size - 1 - nearest
+    return nearest, inside
+
+
+def sample_regular_grid(values: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                        tile_lats: np.ndarray, tile_lons: np.ndarray) -> np.ndarray:
+    """Vizinho mais próximo numa grelha regular (linhas = lats, colunas = lons)"""
+    rows, rows_inside = grid_indices(np.asarray(lats, dtype=np.float64), tile_lats)
+    cols, cols_inside = grid_indices(np.asarray(lons, dtype=np.float64), tile_lons)
+    if not rows_inside.any() or not cols_inside.any():
+        return np.full((tile_lats.size, tile_lons.size), np.nan)
+    sampled = np.asarray(values[np.ix_(rows, cols)], dtype=np.float64)
+    sampled[~rows_inside, :] = np.nan
+    sampled[:, ~cols_inside] = np.nan
+    return sampled
+
+
+class MetoceanTileLayer(ValueTileLayer):
+    """Campos do MetoceanGridEngine (escalares ou magnitude de u/v); versão = janela temporal"""
+
+    STYLES = {
+        'sst': {'vmin': 14.0, 'vmax': 30.0, 'colormap': 'thermal'},
+        'salinity': {'vmin': 34.0, 'vmax': 37.0, 'colormap': 'haline'},
+        'chlorophyll': {'vmin': 0.05, 'vmax': 20.0, 'colormap': 'algae', 'log_scale': True},
+        'currents': {'vmin': 0.0, 'vmax': 2.0, 'colormap': 'speed'},
+        'wind': {'vmin': 0.0, 'vmax': 15.0, 'colormap': 'speed'},
+    }
+
+    def __init__(self, variable: str, resolution: float = 0.1, engine=None, **kwargs):
+        style = {**self.STYLES.get(variable, {'vmin': 0.0, 'vmax': 1.0}), **kwargs.pop('style', {})}
+        kwargs.setdefault('maxzoom', 10)
+        kwargs.setdefault('max_age', 600)
+        kwargs.setdefault('description', f"Campo metocean '{variable}' ({resolution}°)")
+        super().__init__(f"metocean-{variable}", **style, **kwargs)
+        self.variable = variable
+        self.resolution = resolution
+        self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from ..realtime.metocean_grid import metocean_engine
+            self._engine = metocean_engine
+        return self._engine
+
+    def version(self) -> str:
+        bucket = int(time.time()) // self.engine.time_bucket_seconds
+        return f"{bucket}-{self.resolution}-{self.style_key()}"
+
+    def read_tile(self, z: int, x: int, y: int) -> Optional[np.ndarray]:
+        grid = self.engine.get_field(self.variable, datetime.utcnow(), self.resolution)
+        if 'value' in grid.fields:
+            values = grid.fields['value']
+        else:
+            values = np.hypot(grid.fields['u'], grid.fields['v'])
+        tile_lons, tile_lats = tile_pixel_centers(z, x, y)
+        return sample_regular_grid(values, grid.lats, grid.lons, tile_lats, tile_lons)
+
+
+class CubeTileLayer(ValueTileLayer):
+    """
+    DataArray xarray 2D (ou um passo temporal de um cubo) servido como tiles
+
+    Só os índices da grelha necessários para a tile são lidos (isel), pelo que
+    cubos dask/Zarr são carregados janela a janela.
+    """
+
+    def __init__(self, name: str, data_array, vmin: float, vmax: float, version: str = '1', **kwargs):
+        from ..process.cubes import spatial_dims
+
+        x_dim, y_dim = spatial_dims(data_array)
+        extra = [dim for dim in data_array.dims if dim not in (x_dim, y_dim)]
+        if extra:
+            raise ValueError(f"CubeTileLayer requer um DataArray 2D (dims extra: {extra})")
+        self.data_array = data_array.transpose(y_dim, x_dim)
+        self.lats = np.asarray(data_array[y_dim].values, dtype=np.float64)
+        self.lons = np.asarray(data_array[x_dim].values, dtype=np.float64)
+        kwargs.setdefault('bounds', (float(self.lons.min()), float(self.lats.min()),
+                                     float(self.lons.max()), float(self.lats.max())))
+        super().__init__(name, vmin, vmax, **kwargs)
+        self._version = version
+
+    def version(self) -> str:
+        return f"{self._version}-{self.style_key()}"
+
+    def read_tile(self, z: int, x: int, y: int) -> Optional[np.ndarray]:
+        tile_lons, tile_lats = tile_pixel_centers(z, x, y)
+        # Índices por eixo (no máximo 256 + 256), nunca uma grelha lats × lons
+        rows, rows_inside = grid_indices(self.lats, tile_lats)
+        cols, cols_inside = grid_indices(self.lons, tile_lons)
+        if not rows_inside.any() or not cols_inside.any():
+            return None
+        unique_rows, row_positions = np.unique(rows[rows_inside], return_inverse=True)
+        unique_cols, col_positions = np.unique(cols[cols_inside], return_inverse=True)
+        window = np.asarray(self.data_array.isel({self.data_array.dims[0]: unique_rows,
+                                                  self.data_array.dims[1]: unique_cols}).values, dtype=np.float64)
+        values = np.full((tile_lats.size, tile_lons.size), np.nan)
+        values[np.ix_(rows_inside, cols_inside)] = window[np.ix_(row_positions, col_positions)]
+        return values
+
+
+class COGTileLayer(ValueTileLayer):
+    """GeoTIFF/COG lido por janela em EPSG:3857 (usa as overviews do COG em zooms baixos)"""
+
+    def __init__(self, name: str, path: Union[str, Path], vmin: float, vmax: float, band: int = 1,
+                 resampling: str = 'bilinear', **kwargs):
+        import rasterio
+
+        self.path = Path(path)
+        self.band = band
+        self.resampling = resampling
+        with rasterio.open(self.path) as src:
+            if 'bounds' not in kwargs:
+                from rasterio.warp import transform_bounds
+                kwargs['bounds'] = tuple(transform_bounds(src.crs, 'EPSG:4326', *src.bounds))
+        super().__init__(name, vmin, vmax, **kwargs)
+        self._local = threading.local()
+
+    def version(self) -> str:
+        stat = self.path.stat()
+        return f"{stat.st_mtime_ns}-{stat.st_size}-{self.band}-{self.style_key()}"
+
+    def _vrt(self):
+        import rasterio
+        from rasterio.enums import Resampling
+        from rasterio.vrt import WarpedVRT
+
+        # Um handle por thread (GDAL não partilha datasets entre threads)
+        key = self.version()
+        if getattr(self._local, 'key', None) != key:
+            self._local.src = rasterio.open(self.path)
+            self._local.vrt = WarpedVRT(self._local.src, crs='EPSG:3857',
+                                        resampling=Resampling[self.resampling])
+            self._local.key = key
+        return self._local.vrt
+
+    def read_tile(self, z: int, x: int, y: int) -> Optional[np.ndarray]:
+        from rasterio.enums import Resampling
+        from rasterio.windows import from_bounds
+
+        vrt = self._vrt()
+        window = from_bounds(*tile_bounds_mercator(z, x, y), transform=vrt.transform)
+        data = vrt.read(self.band, window=window, out_shape=(TILE_SIZE, TILE_SIZE), boundless=True,
+                        masked=True, resampling=Resampling[self.resampling])
+        return np.ma.filled(data.astype(np.float64), np.nan)
+
+
+class VectorTileLayer(TileLayer):
+    """
+    Pontos/linhas/polígonos servidos como Mapbox Vector Tiles
+
+    As geometrias são projetadas para Web Mercator uma única vez e indexadas
+    numa STRtree; cada tile consulta o índice, recorta pela tile (com margem),
+    simplifica à resolução do zoom e quantiza para a extensão MVT.
+    """
+
+    kind = 'vector'
+    formats = ('mvt', 'pbf')
+
+    def __init__(self, name: str, features: Union[Dict[str, Any], str, Path, Any],
+                 properties: Optional[List[str]] = None, buffer: int = 64, version: str = '1', **kwargs):
+        import shapely
+
+        if isinstance(features, (str, Path)):
+            features = json.loads(Path(features).read_text(encoding='utf-8'))
+        geometries, records = self._load(features, properties)
+        if not geometries:
+            raise ValueError(f"Camada vetorial '{name}' sem geometrias")
+
+        lonlat = np.array(geometries, dtype=object)
+        kwargs.setdefault('bounds', tuple(float(v) for v in shapely.total_bounds(lonlat)))
+        kwargs.setdefault('maxzoom', 14)
+        super().__init__(name, **kwargs)
+
+        self.geometries = shapely.transform(lonlat, lambda c: np.column_stack(lonlat_to_mercator(c[:, 0], c[:, 1])))
+        self.properties = records
+        self.tree = shapely.STRtree(self.geometries)
+        self.buffer = buffer
+        self._version = version
+
+    @staticmethod
+    def _load(features, properties: Optional[List[str]]) -> Tuple[List[Any], List[Dict[str, Any]]]:
+        from shapely.geometry import shape
+
+        if hasattr(features, 'geometry') and hasattr(features, 'to_crs'):
+            # GeoDataFrame
+            gdf = features.to_crs('EPSG:4326') if features.crs else features
+            columns = properties or [c for c in gdf.columns if c != gdf.geometry.name]
+            records = gdf[columns].to_dict(orient='records')
+            return list(gdf.geometry.values), records
+
+        if features.get('type') == 'FeatureCollection':
+            items = features.get('features', [])
+        else:
+            items = [features if features.get('type') == 'Feature' else {'geometry': features}]
+        geometries, records = [], []
+        for item in items:
+            if not item.get('geometry'):
+                continue
+            geometries.append(shape(item['geometry']))
+            props = item.get('properties') or {}
+            records.append({k: props.get(k) for k in properties} if properties else props)
+        return geometries, records
+
+    def version(self) -> str:
+        return self._version
+
+    def render(self, z: int, x: int, y: int, fmt: str) -> bytes:
+        import shapely
+
+        minx, miny, maxx, maxy = tile_bounds_mercator(z, x, y)
+        size = maxx - minx
+        margin = size * self.buffer / MVT_EXTENT
+        candidates = self.tree.query(shapely.box(minx - margin, miny - margin, maxx + margin, maxy + margin))
+        if candidates.size == 0:
+            return b''
+
+        geometries = shapely.clip_by_rect(
+            self.geometries[candidates], minx - margin, miny - margin, maxx + margin, maxy + margin
+        )
+        # Simplificação a ~1/4 de píxel do ecrã (256 px por tile)
+        geometries = shapely.simplify(geometries, size / (TILE_SIZE * 4), preserve_topology=True)
+        scale = MVT_EXTENT / size
+        geometries = shapely.transform(
+            geometries, lambda c: np.column_stack(((c[:, 0] - minx) * scale, (maxy - c[:, 1]) * scale)).round()
+        )
+
+        features = []
+        seen_points = set()
+        for index, geometry in zip(candidates, geometries):
+            if geometry is None or shapely.is_empty(geometry):
+                continue
+            if geometry.geom_type == 'Point':
+                # Pontos coincidentes após quantização são desenhados uma única vez
+                key = (int(geometry.x), int(geometry.y))
+                if key in seen_points:
+                    continue
+                seen_points.add(key)
+            features.append((geometry, self.properties[index], int(index)))
+        if not features:
+            return b''
+        return encode_mvt_layer(self.name, features)
+
+
+# ----------------------------------------------------------------------
+# Cache e servidor
+# ----------------------------------------------------------------------
+
+class TileCache:
+    """
+    Tiles em disco: <raiz>/<camada>/<versão>/<z>/<x>/<y>.<formato> (ficheiro vazio = tile sem dados)
+
+    O número de tiles e o tamanho ocupado são contados uma vez (no primeiro
+    get_stats) e depois mantidos por put/prune, sem percorrer a árvore a cada pedido.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'pruned_versions': 0}
+        self._usage: Optional[Dict[str, int]] = None
+        self._usage_lock = threading.Lock()
+
+    @staticmethod
+    def _scan(directory: Path) -> Tuple[int, int]:
+        tiles = size = 0
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                try:
+                    size += os.stat(os.path.join(dirpath, filename)).st_size
+                except OSError:
+                    continue
+                tiles += 1
+        return tiles, size
+
+    def _account(self, tiles: int, size: int):
+        with self._usage_lock:
+            if self._usage is not None:
+                self._usage['tiles'] += tiles
+                self._usage['bytes'] += size
+
+    @staticmethod
+    def _safe(version: str) -> str:
+        return hashlib.blake2b(version.encode(), digest_size=8).hexdigest()
+
+    def path(self, layer: str, version: str, z: int, x: int, y: int, fmt: str) -> Path:
+        return self.root / layer / self._safe(version) / str(z) / str(x) / f"{y}.{fmt}"
+
+    def get(self, layer: str, version: str, z: int, x: int, y: int, fmt: str) -> Optional[bytes]:
+        try:
+            data = self.path(layer, version, z, x, y, fmt).read_bytes()
+        except OSError:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return data
+
+    def put(self, layer: str, version: str, z: int, x: int, y: int, fmt: str, data: bytes):
+        path = self.path(layer, version, z, x, y, fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        try:
+            previous = path.stat().st_size
+        except OSError:
+            previous = None
+        os.replace(tmp_path, path)
+        self.stats['writes'] += 1
+        if previous is None:
+            self._account(1, len(data))
+        else:
+            self._account(0, len(data) - previous)
+
+    def has_version(self, layer: str, version: str) -> bool:
+        return (self.root / layer / self._safe(version)).exists()
+
+    def prune(self, layer: str, keep_version: str) -> int:
+        """Remover versões antigas de uma camada"""
+        import shutil
+
+        removed = 0
+        layer_dir = self.root / layer
+        if layer_dir.exists():
+            for version_dir in layer_dir.iterdir():
+                if version_dir.name != self._safe(keep_version):
+                    tiles, size = self._scan(version_dir) if self._usage is not None else (0, 0)
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                    self._account(-tiles, -size)
+                    removed += 1
+        self.stats['pruned_versions'] += removed
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._usage_lock:
+            if self._usage is None:
+                tiles, size = self._scan(self.root)
+                self._usage = {'tiles': tiles, 'bytes': size}
+            usage = dict(self._usage)
+        return {
+            **self.stats,
+            'tiles': usage['tiles'],
+            'size_mb': round(usage['bytes'] / (1024 * 1024), 2),
+            'cache_dir': str(self.root),
+        }
+
+
+class TileServer:
+    """Registo de camadas + cache; devolve tiles com ETag calculável sem render"""
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None):
+        self.cache = TileCache(cache_dir or os.getenv('BGAPP_TILE_CACHE_DIR', ROOT / 'data' / 'cache' / 'tiles'))
+        self.layers: Dict[str, TileLayer] = {}
+        self._seed_jobs: Dict[str, Dict[str, Any]] = {}
+        # Última versão escrita por camada: uma versão nova (ex.: hora metocean seguinte) poda as anteriores
+        self._written_versions: Dict[str, str] = {}
+        self._versions_lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+
+    def register(self, layer: TileLayer) -> TileLayer:
+        self.layers[layer.name] = layer
+        logger.info(f"🗺️ Camada de tiles registada: {layer.name} ({layer.kind})")
+        return layer
+
+    def unregister(self, name: str):
+        self.layers.pop(name, None)
+
+    def get_layer(self, name: str) -> TileLayer:
+        layer = self.layers.get(name)
+        if layer is None:
+            raise KeyError(f"Camada de tiles não encontrada: {name}")
+        return layer
+
+    def etag(self, layer: TileLayer, z: int, x: int, y: int, fmt: str) -> str:
+        digest = hashlib.blake2b(f"{layer.name}:{layer.version()}:{z}/{x}/{y}.{fmt}".encode(),
+                                 digest_size=12).hexdigest()
+        return f'"{digest}"'
+
+    def _validate(self, layer: TileLayer, z: int, x: int, y: int, fmt: str):
+        if fmt not in layer.formats:
+            raise ValueError(f"Formato '{fmt}' não suportado pela camada {layer.name} ({', '.join(layer.formats)})")
+        if not layer.minzoom <= z <= layer.maxzoom:
+            raise ValueError(f"Zoom {z} fora do intervalo {layer.minzoom}-{layer.maxzoom}")
+        if not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError(f"Tile inválida: {z}/{x}/{y}")
+
+    def get_tile(self, name: str, z: int, x: int, y: int, fmt: str) -> Tuple[bytes, str, str]:
+        """(conteúdo, ETag, media type); conteúdo vazio = sem dados nesta tile"""
+        layer = self.get_layer(name)
+        self._validate(layer, z, x, y, fmt)
+        version = layer.version()
+        etag = self.etag(layer, z, x, y, fmt)
+
+        data = self.cache.get(name, version, z, x, y, fmt)
+        if data is None:
+            data = layer.render(z, x, y, fmt) if layer.intersects(z, x, y) else b''
+            first_write = not self.cache.has_version(name, version)
+            self.cache.put(name, version, z, x, y, fmt, data)
+            self._on_version_written(name, version, first_write)
+        return data, etag, MEDIA_TYPES[fmt]
+
+    def _on_version_written(self, name: str, version: str, first_write: bool):
+        """Podar versões antigas (numa thread) quando uma camada começa a escrever uma versão nova"""
+        with self._versions_lock:
+            previous = self._written_versions.get(name)
+            self._written_versions[name] = version
+        # Arranque do processo (previous None) só conta se a versão ainda não existia em disco
+        if previous == version or (previous is None and not first_write):
+            return
+        threading.Thread(target=self._prune_stale, args=(name,), name=f"tile-prune-{name}", daemon=True).start()
+
+    def _prune_stale(self, name: str):
+        # Serializado e com a versão lida no momento: uma poda atrasada nunca apaga a versão atual
+        with self._prune_lock:
+            with self._versions_lock:
+                version = self._written_versions[name]
+            removed = self.cache.prune(name, version)
+        if removed:
+            logger.info(f"🧹 Camada {name}: {removed} versões antigas removidas da cache")
+
+    def seed(self, name: str, minzoom: Optional[int] = None, maxzoom: int = 8,
+             bounds: Tuple[float, float, float, float] = ANGOLA_EEZ_BOUNDS,
+             fmt: Optional[str] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+        """Pré-gerar a pirâmide de tiles de `bounds` (por defeito a ZEE de Angola)"""
+        layer = self.get_layer(name)
+        fmt = fmt or layer.formats[0]
+        minzoom = layer.minzoom if minzoom is None else minzoom
+        maxzoom = min(maxzoom, layer.maxzoom)
+        version = layer.version()
+        tiles = [
+            (z, x, y)
+            for z in range(minzoom, maxzoom + 1)
+            for x, y in tiles_in_bounds(bounds, z)
+            if not self.cache.path(name, version, z, x, y, fmt).exists()
+        ]
+
+        job = {'layer': name, 'status': 'running', 'total': len(tiles), 'done': 0, 'errors': 0,
+               'zooms': [minzoom, maxzoom], 'format': fmt, 'started_at': datetime.now().isoformat()}
+        self._seed_jobs[name] = job
+        started = time.perf_counter()
+
+        def render(tile: Tuple[int, int, int]):
+            try:
+                self.get_tile(name, *tile, fmt)
+            except Exception as e:
+                job['errors'] += 1
+                logger.warning(f"⚠️ Seed {name} {tile}: {e}")
+            job['done'] += 1
+
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1),
+                                thread_name_prefix="tile-seed") as executor:
+            list(executor.map(render, tiles))
+
+        # Sem poda aqui: `version` pode já estar desatualizada (mudança de janela durante o seed);
+        # as escritas via get_tile disparam _on_version_written, que poda com a versão atual
+        job.update({'status': 'completed', 'seconds': round(time.perf_counter() - started, 2)})
+        logger.info(f"✅ Seed {name}: {job['done']} tiles em {job['seconds']}s ({job['errors']} erros)")
+        return job
+
+    def seed_status(self, name: Optional[str] = None) -> Dict[str, Any]:
+        if name is not None:
+            return self._seed_jobs.get(name, {'layer': name, 'status': 'idle'})
+        return dict(self._seed_jobs)
+
+    def tilejson(self, name: str, base_url: str) -> Dict[str, Any]:
+        layer = self.get_layer(name)
+        fmt = layer.formats[0]
+        west, south, east, north = layer.bounds
+        tilejson = {
+            'tilejson': '3.0.0',
+            'name': layer.name,
+            'description': layer.description,
+            'version': layer.version(),
+            'scheme': 'xyz',
+            'tiles': [f"{base_url.rstrip('/')}/tiles/{layer.name}/{{z}}/{{x}}/{{y}}.{fmt}"],
+            'minzoom': layer.minzoom,
+            'maxzoom': layer.maxzoom,
+            'bounds': [west, south, east, north],
+            'center': [(west + east) / 2, (south + north) / 2, max(layer.minzoom, min(6, layer.maxzoom))],
+        }
+        if layer.kind == 'vector':
+            tilejson['vector_layers'] = [{'id': layer.name, 'minzoom': layer.minzoom, 'maxzoom': layer.maxzoom}]
+        return tilejson
+
+    def list_layers(self) -> List[Dict[str, Any]]:
+        return [layer.info() for layer in self.layers.values()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'layers': len(self.layers), 'cache': self.cache.get_stats(), 'seed_jobs': self.seed_status()}
+
+
+def tile_url(layer: str, fmt: str = 'png', base_url: str = '') -> str:
+    """URL XYZ de uma camada (para Leaflet/Folium/MapLibre)"""
+    return f"{base_url.rstrip('/')}/tiles/{layer}/{{z}}/{{x}}/{{y}}.{fmt}"
+
+
+def _create_default_server() -> TileServer:
+    server = TileServer()
+    for variable in MetoceanTileLayer.STYLES:
+        server.register(MetoceanTileLayer(variable))
+    return server
+
+
+# Instância global
+tile_server = _create_default_server()
@@ -16,6 +16,7 @@ from queue import Queue
 import os
 
 from .log_sanitizer import get_log_sanitizer
+from .audit_store import PartitionedAuditStore
 
 class AuditEventType(Enum):
     """Tipos de eventos de auditoria"""
@@ -132,7 +133,12 @@ class AuditLogger:
                  max_file_size: int = 100 * 1024 * 1024,  # 100MB
                  backup_count: int = 10,
                  enable_console: bool = False,
-                 enable_sanitization: bool = True):
+                 enable_sanitization: bool = True,
+                 partitioned: bool = True,
+                 partition_dir: Optional[str] = None,
+                 partition_granularity: str = "hour",
+                 compress_closed_segments: bool = True,
+                 retention_days: Optional[int] = None):
         
         self.audit_file = Path(audit_file)
         self.max_file_size = max_file_size
@@ -146,9 +152,23 @@ class AuditLogger:
         # Configurar sanitizador
         self.sanitizer = get_log_sanitizer() if enable_sanitization else None
         
+        # Armazenamento particionado e indexado (segmentos por hora/dia)
+        self.store = None
+        if partitioned:
+            self.store = PartitionedAuditStore(
+                base_dir=partition_dir or str(self.audit_file.parent / "audit"),
+                granularity=partition_granularity,
+                compress_closed_segments=compress_closed_segments,
+                retention_days=retention_days
+            )
+        
         # Configurar logger interno
         self._setup_logger()
         
+        # Eventos escritos no modo legado continuam pesquisáveis
+        if self.store is not None:
+            self._migrate_legacy_log()
+        
         # Queue para processamento assíncrono
         self._queue = Queue()
         self._stop_event = threading.Event()
@@ -172,19 +192,20 @@ class AuditLogger:
         for handler in self.logger.handlers[:]:
             self.logger.removeHandler(handler)
         
-        # Handler para arquivo com rotação
-        from logging.handlers import RotatingFileHandler
-        file_handler = RotatingFileHandler(
-            self.audit_file,
-            maxBytes=self.max_file_size,
-            backupCount=self.backup_count,
-            encoding='utf-8'
-        )
-        
         # Formatter JSON
         formatter = logging.Formatter('%(message)s')
-        file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
+        
+        # Handler para arquivo com rotação (modo legado, sem partições)
+        if self.store is None:
+            from logging.handlers import RotatingFileHandler
+            file_handler = RotatingFileHandler(
+                self.audit_file,
+                maxBytes=self.max_file_size,
+                backupCount=self.backup_count,
+                encoding='utf-8'
+            )
+            file_handler.setFormatter(formatter)
+            self.logger.addHandler(file_handler)
         
         # Handler para console (se habilitado)
         if self.enable_console:
@@ -192,6 +213,28 @@ class AuditLogger:
             console_handler.setFormatter(formatter)
             self.logger.addHandler(console_handler)
     
+    def _migrate_legacy_log(self):
+        """Importar logs/audit.log (e backups rodados) do modo legado para as partições"""
+        candidates = [
+            self.audit_file.with_name(f"{self.audit_file.name}.{index}")
+            for index in range(self.backup_count, 0, -1)
+        ] + [self.audit_file]
+        
+        for path in candidates:
+            if not path.exists() or path.stat().st_size == 0:
+                continue
+            # Renomear primeiro: o rename é atómico, só um worker importa cada ficheiro
+            migrated = path.with_name(f"{path.name}.migrated")
+            try:
+                os.replace(path, migrated)
+            except FileNotFoundError:
+                continue
+            try:
+                imported = self.store.import_jsonl(str(migrated))
+                print(f"📦 {imported} eventos de auditoria importados de {path}")
+            except Exception as e:
+                self.logger.error(f"Erro ao importar log de auditoria legado {path}: {e}")
+    
     def _worker(self):
         """Worker thread para processamento assíncrono"""
         while not self._stop_event.is_set():
@@ -204,6 +247,10 @@ class AuditLogger:
                 self._write_event(event)
                 self._queue.task_done()
                 
+                # Persistir índice quando a fila esvazia (commits em lote sob carga)
+                if self.store and self._queue.empty():
+                    self.store.flush()
+                
             except:
                 continue  # Timeout ou erro - continuar
     
@@ -218,7 +265,12 @@ class AuditLogger:
                 event_dict = self.sanitizer.sanitize_dict(event_dict)
             
             # Escrever no log
-            self.logger.info(json.dumps(event_dict, ensure_ascii=False))
+            if self.store:
+                self.store.append(event_dict)
+                if self.enable_console:
+                    self.logger.info(json.dumps(event_dict, ensure_ascii=False))
+            else:
+                self.logger.info(json.dumps(event_dict, ensure_ascii=False))
             
             # Atualizar estatísticas
             self._update_stats(event)
@@ -280,13 +332,19 @@ class AuditLogger:
     def get_stats(self) -> Dict[str, Any]:
         """Obter estatísticas de auditoria"""
         uptime = datetime.now(timezone.utc) - self._stats["start_time"]
-        return {
+        stats = {
             **self._stats,
             "uptime_seconds": uptime.total_seconds(),
             "queue_size": self._queue.qsize(),
             "audit_file": str(self.audit_file),
             "file_size": self.audit_file.stat().st_size if self.audit_file.exists() else 0
         }
+        if self.store:
+            store_stats = self.store.get_stats()
+            stats["audit_file"] = str(self.store.base_dir)
+            stats["file_size"] = store_stats["segments_size"]
+            stats["partitions"] = store_stats
+        return stats
     
     def search_events(self, 
                      event_type: Optional[AuditEventType] = None,
@@ -297,6 +355,21 @@ class AuditLogger:
                      limit: int = 100) -> List[Dict[str, Any]]:
         """Pesquisar eventos de auditoria"""
         
+        if self.store:
+            # Pesquisa indexada: poda por tempo e leitura direta das linhas correspondentes
+            try:
+                return self.store.search(
+                    event_type=event_type.value if event_type else None,
+                    severity=severity.value if severity else None,
+                    user_id=user_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                    limit=limit
+                )
+            except Exception as e:
+                self.logger.error(f"Erro ao pesquisar eventos: {e}")
+                return []
+        
         events = []
         if not self.audit_file.exists():
             return events
@@ -358,6 +431,9 @@ class AuditLogger:
                     self._write_event(event)
             except:
                 break
+        
+        if self.store:
+            self.store.close()
 
 # Instância global
 _audit_logger = None
@@ -448,7 +524,9 @@ if __name__ == "__main__":
     
     # Cleanup
     import os
+    import shutil
     if os.path.exists("test_audit.log"):
         os.remove("test_audit.log")
+    shutil.rmtree("audit", ignore_errors=True)
     
     print("\n✅ Teste concluído!")
@@ -0,0 +1,428 @@
+"""
+Armazenamento Particionado e Indexado de Eventos de Auditoria
+Segmentos JSONL por hora/dia com índice SQLite lateral (tipo, utilizador, severidade, tempo)
+"""
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas o lock entre threads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Formato do identificador de partição por granularidade
+PARTITION_FORMATS = {
+    "hour": "%Y%m%d%H",
+    "day": "%Y%m%d"
+}
+
+
+def _to_utc(value: datetime) -> datetime:
+    """Normalizar datetime para UTC (naive é interpretado como UTC)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class PartitionedAuditStore:
+    """
+    Armazenamento de auditoria em segmentos temporais.
+
+    Cada evento é escrito no segmento da sua hora (ou dia) e registado num índice
+    SQLite com o offset em bytes da linha, permitindo pesquisar por tipo, utilizador,
+    severidade e intervalo temporal lendo apenas as linhas que correspondem.
+
+    Vários workers (processos) podem partilhar o mesmo diretório: escritas,
+    compressão e retenção são serializadas por um lock de ficheiro, e o offset
+    de cada linha é o fim real do segmento no momento da escrita. Segmentos só
+    são comprimidos quando a partição terminou há mais de `compress_grace`
+    (eventos ligeiramente atrasados não obrigam a descomprimir), no arranque e
+    sempre que a escrita passa para uma nova partição.
+    """
+
+    def __init__(self,
+                 base_dir: str = "logs/audit",
+                 granularity: str = "hour",
+                 compress_closed_segments: bool = True,
+                 retention_days: Optional[int] = None,
+                 commit_every: int = 200,
+                 compress_grace: timedelta = timedelta(hours=1)):
+        if granularity not in PARTITION_FORMATS:
+            raise ValueError(f"Granularidade inválida: {granularity}")
+
+        self.base_dir = Path(base_dir)
+        self.granularity = granularity
+        self.compress_closed_segments = compress_closed_segments
+        self.retention_days = retention_days
+        self.commit_every = commit_every
+        self.compress_grace = compress_grace
+
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.base_dir / "audit_index.sqlite"
+
+        self._lock = threading.RLock()
+        self._lock_file = open(self.base_dir / ".audit.lock", "a+b") if fcntl else None
+        self._lock_depth = 0
+        self._current_partition: Optional[str] = None
+        self._current_file = None
+        # Linhas do índice por gravar: inseridas em lote em flush(), sempre com o
+        # lock de ficheiro, para que nenhum worker espere pelo SQLite com o lock na mão
+        self._pending_rows: List[Tuple[str, int, int, float, Any, Any, Any]] = []
+
+        # timeout: outros workers podem ter uma transação de escrita aberta
+        self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False, timeout=30.0)
+        self._init_index()
+
+        # Segmentos deixados em claro por uma execução anterior
+        self.maintain()
+
+    @contextmanager
+    def _exclusive(self):
+        """Lock entre threads e, com fcntl, entre processos (reentrante)"""
+        with self._lock:
+            if self._lock_file is not None and self._lock_depth == 0:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_file is not None and self._lock_depth == 0:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------------
+
+    def _init_index(self):
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS audit_events (
+                partition TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                ts REAL NOT NULL,
+                event_type TEXT,
+                severity TEXT,
+                user_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_audit_ts ON audit_events (ts);
+            CREATE INDEX IF NOT EXISTS idx_audit_type_ts ON audit_events (event_type, ts);
+            CREATE INDEX IF NOT EXISTS idx_audit_user_ts ON audit_events (user_id, ts);
+            CREATE INDEX IF NOT EXISTS idx_audit_severity_ts ON audit_events (severity, ts);
+            CREATE TABLE IF NOT EXISTS audit_partitions (
+                partition TEXT PRIMARY KEY,
+                start_ts REAL NOT NULL,
+                end_ts REAL NOT NULL,
+                events INTEGER NOT NULL DEFAULT 0,
+                compressed INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Partições
+    # ------------------------------------------------------------------
+
+    def _partition_for(self, timestamp: datetime) -> str:
+        return _to_utc(timestamp).strftime(PARTITION_FORMATS[self.granularity])
+
+    def _partition_bounds(self, partition: str) -> Tuple[float, float]:
+        start = datetime.strptime(partition, PARTITION_FORMATS[self.granularity]).replace(
+            tzinfo=timezone.utc
+        )
+        step = timedelta(hours=1) if self.granularity == "hour" else timedelta(days=1)
+        return start.timestamp(), (start + step).timestamp()
+
+    def _segment_path(self, partition: str, compressed: bool = False) -> Path:
+        suffix = ".jsonl.gz" if compressed else ".jsonl"
+        return self.base_dir / partition[:6] / f"audit-{partition}{suffix}"
+
+    def _open_partition(self, partition: str):
+        """Abrir (ou reabrir para append) o segmento de uma partição; chamado com o lock"""
+        previous = self._current_partition
+        self._close_current()
+        path = self._segment_path(partition)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Evento tardio para uma partição já comprimida: reabrir o segmento em claro
+        compressed = self._segment_path(partition, compressed=True)
+        if compressed.exists() and not path.exists():
+            with gzip.open(compressed, "rb") as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=1024 * 1024)
+            compressed.unlink()
+            self._conn.execute(
+                "UPDATE audit_partitions SET compressed = 0 WHERE partition = ?", (partition,)
+            )
+            self._conn.commit()
+        self._current_file = open(path, "ab")
+        self._current_partition = partition
+
+        # Passagem para uma partição nova: comprimir as que já terminaram
+        if previous is not None and partition > previous:
+            self.maintain()
+
+    def _close_current(self):
+        """Fechar o segmento atual (a compressão fica para maintain())"""
+        if self._current_file is None:
+            return
+        self._current_file.close()
+        self._current_file = None
+        self._current_partition = None
+
+    def maintain(self) -> int:
+        """Comprimir segmentos de partições terminadas há mais de compress_grace e aplicar retenção"""
+        compressed = 0
+        with self._exclusive():
+            self.flush()
+            if self.compress_closed_segments:
+                cutoff = (datetime.now(timezone.utc) - self.compress_grace).timestamp()
+                closed = [row[0] for row in self._conn.execute(
+                    "SELECT partition FROM audit_partitions WHERE compressed = 0 AND end_ts <= ?", (cutoff,)
+                )]
+                for partition in closed:
+                    if partition == self._current_partition:
+                        self._close_current()
+                    if self._compress_partition(partition):
+                        compressed += 1
+            if self.retention_days:
+                self.apply_retention()
+        return compressed
+
+    def _compress_partition(self, partition: str) -> bool:
+        """Comprimir um segmento fechado (o índice guarda offsets no conteúdo descomprimido)"""
+        source = self._segment_path(partition)
+        target = self._segment_path(partition, compressed=True)
+        if not source.exists():
+            # Já comprimido por outro worker (ou sem eventos): só acertar o índice
+            if target.exists():
+                self._conn.execute(
+                    "UPDATE audit_partitions SET compressed = 1 WHERE partition = ?", (partition,)
+                )
+                self._conn.commit()
+            return False
+        try:
+            with open(source, "rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, length=1024 * 1024)
+            source.unlink()
+            self._conn.execute(
+                "UPDATE audit_partitions SET compressed = 1 WHERE partition = ?", (partition,)
+            )
+            self._conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao comprimir segmento de auditoria {partition}: {e}")
+            target.unlink(missing_ok=True)
+            return False
+
+    def apply_retention(self) -> int:
+        """Remover partições mais antigas que retention_days"""
+        if not self.retention_days:
+            return 0
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).timestamp()
+        with self._exclusive():
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT partition FROM audit_partitions WHERE end_ts <= ?", (cutoff,)
+            )]
+            for partition in expired:
+                if partition == self._current_partition:
+                    continue
+                for compressed in (False, True):
+                    self._segment_path(partition, compressed).unlink(missing_ok=True)
+                self._conn.execute("DELETE FROM audit_events WHERE partition = ?", (partition,))
+                self._conn.execute("DELETE FROM audit_partitions WHERE partition = ?", (partition,))
+            self._conn.commit()
+        return len(expired)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def append(self, event: Dict[str, Any]):
+        """Escrever evento no segmento da sua partição e registar no índice"""
+        timestamp = _to_utc(datetime.fromisoformat(event["timestamp"]))
+        partition = self._partition_for(timestamp)
+        line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._exclusive():
+            # Segmento comprimido (e removido) por outro worker desde que foi aberto
+            if self._current_file is not None and os.fstat(self._current_file.fileno()).st_nlink == 0:
+                self._current_file.close()
+                self._current_file = None
+                self._current_partition = None
+            if partition != self._current_partition:
+                self._open_partition(partition)
+
+            # Outros workers escrevem no mesmo segmento: o offset é o fim real do ficheiro
+            self._current_file.seek(0, os.SEEK_END)
+            offset = self._current_file.tell()
+            self._current_file.write(line)
+            # Tornar a linha visível (e o tamanho correto) antes de libertar o lock
+            self._current_file.flush()
+            self._pending_rows.append((
+                partition, offset, len(line), timestamp.timestamp(),
+                event.get("event_type"), event.get("severity"), event.get("user_id")
+            ))
+            if len(self._pending_rows) >= self.commit_every:
+                self.flush()
+
+    def flush(self):
+        """Persistir segmento atual e gravar no índice as linhas pendentes"""
+        with self._exclusive():
+            if self._current_file is not None:
+                self._current_file.flush()
+            if self._pending_rows:
+                rows, self._pending_rows = self._pending_rows, []
+                counts: Dict[str, int] = {}
+                for row in rows:
+                    counts[row[0]] = counts.get(row[0], 0) + 1
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO audit_partitions (partition, start_ts, end_ts) VALUES (?, ?, ?)",
+                    [(partition, *self._partition_bounds(partition)) for partition in counts]
+                )
+                self._conn.executemany(
+                    "INSERT INTO audit_events (partition, offset, length, ts, event_type, severity, user_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.executemany(
+                    "UPDATE audit_partitions SET events = events + ? WHERE partition = ?",
+                    [(count, partition) for partition, count in counts.items()]
+                )
+            self._conn.commit()
+
+    def close(self):
+        """Fechar o segmento aberto e o índice"""
+        self.flush()
+        with self._lock:
+            if self._current_file is not None:
+                self._current_file.close()
+                self._current_file = None
+                self._current_partition = None
+            self._conn.commit()
+            self._conn.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    # ------------------------------------------------------------------
+    # Pesquisa
+    # ------------------------------------------------------------------
+
+    def search(self,
+               event_type: Optional[str] = None,
+               severity: Optional[str] = None,
+               user_id: Optional[str] = None,
+               start_time: Optional[datetime] = None,
+               end_time: Optional[datetime] = None,
+               limit: int = 100) -> List[Dict[str, Any]]:
+        """Pesquisar eventos pelo índice, lendo só as linhas correspondentes"""
+        clauses, params = [], []
+        if event_type:
+            clauses.append("event_type = ?")
+            params.append(event_type)
+        if severity:
+            clauses.append("severity = ?")
+            params.append(severity)
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if start_time:
+            clauses.append("ts >= ?")
+            params.append(_to_utc(start_time).timestamp())
+        if end_time:
+            clauses.append("ts <= ?")
+            params.append(_to_utc(end_time).timestamp())
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            f"SELECT partition, offset, length FROM audit_events {where} "
+            f"ORDER BY ts, rowid LIMIT ?"
+        )
+        params.append(limit)
+
+        with self._exclusive():
+            # Garantir que os eventos em buffer são visíveis à pesquisa; ler com o
+            # lock para que nenhum worker comprima um segmento a meio da leitura
+            self.flush()
+            rows = self._conn.execute(query, params).fetchall()
+            return list(self._read_rows(rows))
+
+    def _read_rows(self, rows: List[Tuple[str, int, int]]) -> Iterator[Dict[str, Any]]:
+        """Ler eventos por (partição, offset, tamanho), abrindo cada segmento uma vez"""
+        by_partition: Dict[str, List[Tuple[int, int, int]]] = {}
+        for position, (partition, offset, length) in enumerate(rows):
+            by_partition.setdefault(partition, []).append((position, offset, length))
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        for partition, entries in by_partition.items():
+            plain = self._segment_path(partition)
+            compressed = self._segment_path(partition, compressed=True)
+            try:
+                if plain.exists():
+                    with open(plain, "rb") as f:
+                        for position, offset, length in entries:
+                            f.seek(offset)
+                            results[position] = json.loads(f.read(length))
+                elif compressed.exists():
+                    # gzip não permite seek eficiente: descomprimir o segmento uma única vez
+                    with gzip.open(compressed, "rb") as f:
+                        data = f.read()
+                    for position, offset, length in entries:
+                        results[position] = json.loads(data[offset:offset + length])
+            except (OSError, ValueError) as e:
+                logger.error(f"Erro ao ler segmento de auditoria {partition}: {e}")
+
+        return (event for event in results if event is not None)
+
+    # ------------------------------------------------------------------
+    # Utilitários
+    # ------------------------------------------------------------------
+
+    def import_jsonl(self, path: str) -> int:
+        """Importar um ficheiro JSONL legado (ex.: logs/audit.log) para as partições"""
+        imported = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                    if "timestamp" not in event:
+                        continue
+                    self.append(event)
+                    imported += 1
+                except ValueError:
+                    continue
+        self.flush()
+        self.maintain()
+        return imported
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas das partições e do índice"""
+        with self._lock:
+            partitions, events, compressed = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(events), 0), COALESCE(SUM(compressed), 0) "
+                "FROM audit_partitions"
+            ).fetchone()
+        size = sum(p.stat().st_size for p in self.base_dir.glob("*/audit-*") if p.is_file())
+        return {
+            "partitions": partitions,
+            "indexed_events": events,
+            "compressed_partitions": compressed,
+            "current_partition": self._current_partition,
+            "granularity": self.granularity,
+            "segments_size": size,
+            "index_size": self.index_path.stat().st_size if self.index_path.exists() else 0
+        }
@@ -5,14 +5,23 @@ Implementa pool de conexões com health checks e recovery automático
 """
 
 import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
 import logging
+import re
 import time
+from bisect import bisect_left
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
-from typing import Dict, Optional, Any
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 import asyncpg
 from asyncpg import Pool, Connection
 from asyncpg.pool import PoolConnectionProxy
+from starlette.responses import StreamingResponse
 
 from .secure_config import get_settings
 from .error_handler import error_handler, with_error_handling
@@ -21,12 +30,179 @@ settings = get_settings()
 logger = logging.getLogger(__name__)
 
 
+class QueryTimingHistogram:
+    """Histogramas de latência por query (buckets fixos em ms, percentis aproximados)"""
+    
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf'))
+    MAX_QUERIES = 500
+    
+    def __init__(self):
+        self.histograms: Dict[str, Dict[str, Any]] = {}
+    
+    @staticmethod
+    def query_key(query: str) -> str:
+        """Chave estável para uma query: hash do SQL normalizado (espaços colapsados)"""
+        normalized = re.sub(r'\s+', ' ', query).strip()
+        return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+    
+    def observe(self, query: str, elapsed_ms: float, label: Optional[str] = None):
+        key = label or self.query_key(query)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            if len(self.histograms) >= self.MAX_QUERIES:
+                key = '__other__'
+                histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'query': re.sub(r'\s+', ' ', query).strip()[:120] if key != '__other__' else None,
+                    'buckets': [0] * len(self.BUCKETS_MS),
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0
+                }
+        histogram['buckets'][bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+        histogram['count'] += 1
+        histogram['total_ms'] += elapsed_ms
+        histogram['max_ms'] = max(histogram['max_ms'], elapsed_ms)
+    
+    def _percentile(self, buckets: List[int], count: int, fraction: float) -> Optional[float]:
+        threshold = fraction * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.BUCKETS_MS, buckets):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                # Bucket de overflow sem limite finito: None (float('inf') não é JSON válido)
+                return bound if bound != float('inf') else None
+        return None
+    
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        """
+        Queries mais executadas com contagem, média, máximo, p50/p95/p99 (limite superior do bucket)
+        
+        Um percentil acima do último bucket finito é None; max_ms indica o valor real.
+        """
+        ranked = sorted(self.histograms.items(), key=lambda item: item[1]['count'], reverse=True)[:top]
+        return {
+            key: {
+                'query': histogram['query'],
+                'count': histogram['count'],
+                'mean_ms': round(histogram['total_ms'] / histogram['count'], 2),
+                'max_ms': round(histogram['max_ms'], 2),
+                'p50_ms': self._percentile(histogram['buckets'], histogram['count'], 0.50),
+                'p95_ms': self._percentile(histogram['buckets'], histogram['count'], 0.95),
+                'p99_ms': self._percentile(histogram['buckets'], histogram['count'], 0.99),
+                'buckets': {
+                    ('+inf' if bound == float('inf') else f"le_{bound}"): count
+                    for bound, count in zip(self.BUCKETS_MS, histogram['buckets'])
+                }
+            }
+            for key, histogram in ranked
+        }
+
+
+class QueryStream:
+    """
+    Resultado de query lido por um cursor do lado do servidor, em lotes
+    
+    Adquire uma conexão do pool, abre uma transação (só de leitura por
+    defeito) e prepara a query em open(); erros de SQL surgem aí, antes de
+    qualquer resposta em streaming começar. A conexão é devolvida em close().
+    """
+    
+    def __init__(self, manager: 'DatabasePoolManager', query: str, args: tuple,
+                 batch_size: int = 1000, readonly: bool = True,
+                 statement_timeout_ms: Optional[int] = None, label: Optional[str] = None):
+        self.manager = manager
+        self.query = query
+        self.args = args
+        self.batch_size = batch_size
+        self.readonly = readonly
+        self.statement_timeout_ms = statement_timeout_ms
+        self.label = label
+        self.columns: List[str] = []
+        self.column_types: List[str] = []
+        self.rows_streamed = 0
+        self._connection_context = None
+        self._connection = None
+        self._transaction = None
+        self._statement = None
+        self._db_seconds = 0.0
+        self._failed = False
+        self._closed = False
+    
+    async def open(self) -> 'QueryStream':
+        started = time.perf_counter()
+        self._connection_context = self.manager.get_connection()
+        self._connection = await self._connection_context.__aenter__()
+        try:
+            self._transaction = self._connection.transaction(readonly=self.readonly)
+            await self._transaction.start()
+            if self.statement_timeout_ms:
+                await self._connection.execute(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}")
+            self._statement = await self._connection.prepare(self.query)
+            attributes = self._statement.get_attributes()
+            self.columns = [attribute.name for attribute in attributes]
+            self.column_types = [attribute.type.name for attribute in attributes]
+        except BaseException:
+            self._failed = True
+            self._db_seconds += time.perf_counter() - started
+            await self.close()
+            raise
+        self._db_seconds += time.perf_counter() - started
+        return self
+    
+    async def batches(self) -> AsyncIterator[List[Any]]:
+        """Lotes de registos (asyncpg.Record) lidos pelo cursor do servidor"""
+        # Só o tempo à espera da base de dados conta para o histograma, não o envio ao cliente
+        started = time.perf_counter()
+        cursor = await self._statement.cursor(*self.args)
+        while True:
+            try:
+                batch = await cursor.fetch(self.batch_size)
+            finally:
+                self._db_seconds += time.perf_counter() - started
+            if not batch:
+                break
+            self.rows_streamed += len(batch)
+            yield batch
+            if len(batch) < self.batch_size:
+                break
+            started = time.perf_counter()
+    
+    async def close(self):
+        # Idempotente: o gerador de streaming e a resposta HTTP podem fechar ambos
+        if self._connection is None or self._closed:
+            return
+        self._closed = True
+        try:
+            if self._transaction is not None:
+                # Só de leitura: terminar com rollback evita qualquer efeito residual
+                await self._transaction.rollback()
+        except Exception as e:
+            logger.warning(f"Error closing query stream transaction: {e}")
+        finally:
+            connection_context, self._connection = self._connection_context, None
+            await connection_context.__aexit__(None, None, None)
+            self.manager.query_timings.observe(self.query, self._db_seconds * 1000, self.label)
+            self.manager.stats['failed_queries' if self._failed else 'successful_queries'] += 1
+    
+    async def __aenter__(self) -> 'QueryStream':
+        return await self.open()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self._failed = True
+        await self.close()
+
+
 class DatabasePoolManager:
     """Gerenciador de pool de conexões PostgreSQL"""
     
-    def __init__(self):
+    def __init__(self, dsn: Optional[str] = None, min_size: int = 5, max_size: int = 20):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
         self.pool: Optional[Pool] = None
         self.health_check_task: Optional[asyncio.Task] = None
+        self.query_timings = QueryTimingHistogram()
         self.stats = {
             'total_connections': 0,
             'active_connections': 0,
@@ -46,11 +222,12 @@ class DatabasePoolManager:
             # Criar pool com configurações otimizadas
             self.pool = await asyncpg.create_pool(
                 dsn,
-                min_size=5,           # Mínimo de conexões
-                max_size=20,          # Máximo de conexões
+                min_size=self.min_size,   # Mínimo de conexões
+                max_size=self.max_size,   # Máximo de conexões
                 max_queries=50000,    # Queries por conexão antes de reciclar
                 max_inactive_connection_lifetime=300,  # 5 minutos
                 command_timeout=30,   # Timeout para comandos
+                statement_cache_size=256,  # Statements preparados por conexão
                 server_settings={
                     'jit': 'off',     # Desabilitar JIT para consultas rápidas
                     'application_name': 'bgapp_pool'
@@ -76,6 +253,9 @@ class DatabasePoolManager:
     
     def _build_dsn(self) -> str:
         """Construir DSN de conexão"""
+        if self.dsn:
+            return self.dsn
+        
         host = getattr(settings, 'postgres_host', 'localhost')
         port = getattr(settings, 'postgres_port', 5432)
         database = getattr(settings, 'postgres_database', 'geo')
@@ -124,7 +304,9 @@ class DatabasePoolManager:
         """Executar query com retry automático"""
         async with self.get_connection() as conn:
             try:
+                started = time.perf_counter()
                 result = await conn.fetch(query, *args, **kwargs)
+                self.query_timings.observe(query, (time.perf_counter() - started) * 1000)
                 self.stats['successful_queries'] += 1
                 return result
             except Exception as e:
@@ -137,7 +319,9 @@ class DatabasePoolManager:
         """Executar query que retorna um resultado"""
         async with self.get_connection() as conn:
             try:
+                started = time.perf_counter()
                 result = await conn.fetchrow(query, *args, **kwargs)
+                self.query_timings.observe(query, (time.perf_counter() - started) * 1000)
                 self.stats['successful_queries'] += 1
                 return result
             except Exception as e:
@@ -150,7 +334,9 @@ class DatabasePoolManager:
         """Executar query que retorna um valor"""
         async with self.get_connection() as conn:
             try:
+                started = time.perf_counter()
                 result = await conn.fetchval(query, *args, **kwargs)
+                self.query_timings.observe(query, (time.perf_counter() - started) * 1000)
                 self.stats['successful_queries'] += 1
                 return result
             except Exception as e:
@@ -158,6 +344,43 @@ class DatabasePoolManager:
                 logger.error(f"Query failed: {query[:100]}... Error: {e}")
                 raise
     
+    @with_error_handling("database", max_retries=3)
+    async def fetch_prepared(self, name: str, query: str, *args) -> Tuple[List[str], List[Any]]:
+        """
+        Executar uma consulta aprovada (SQL fixo, parâmetros posicionais)
+        
+        O statement fica preparado no cache LRU de cada conexão física do pool
+        (statement_cache_size), pelo que execuções repetidas saltam o parse/plan.
+        
+        Returns:
+            (colunas, registos)
+        """
+        async with self.get_connection() as conn:
+            try:
+                started = time.perf_counter()
+                rows = await conn.fetch(query, *args)
+                if rows:
+                    columns = list(rows[0].keys())
+                else:
+                    columns = [attribute.name for attribute in (await conn.prepare(query)).get_attributes()]
+                self.query_timings.observe(query, (time.perf_counter() - started) * 1000, label=name)
+                self.stats['successful_queries'] += 1
+                return columns, rows
+            except Exception as e:
+                self.stats['failed_queries'] += 1
+                logger.error(f"Prepared query '{name}' failed: {e}")
+                raise
+    
+    async def open_stream(self, query: str, *args, batch_size: int = 1000, readonly: bool = True,
+                          statement_timeout_ms: Optional[int] = None,
+                          label: Optional[str] = None) -> QueryStream:
+        """Abrir um QueryStream (cursor do servidor); fechar com close() ou usar `async with`"""
+        return await QueryStream(self, query, args, batch_size, readonly, statement_timeout_ms, label).open()
+    
+    def stream_query(self, query: str, *args, **kwargs) -> QueryStream:
+        """QueryStream para `async with db_pool.stream_query(sql) as stream: ...`"""
+        return QueryStream(self, query, args, **kwargs)
+    
     async def execute_transaction(self, queries: list) -> bool:
         """Executar múltiplas queries em transação"""
         async with self.get_connection() as conn:
@@ -238,6 +461,7 @@ class DatabasePoolManager:
         return {
             **self.stats,
             **pool_stats,
+            'query_timings': self.query_timings.snapshot(),
             'healthy': self.is_healthy()
         }
     
@@ -312,3 +536,162 @@ def get_database_stats():
 def is_database_healthy():
     """Verificar se database está saudável"""
     return db_pool.is_healthy()
+
+
+# ----------------------------------------------------------------------
+# Codificação de resultados em streaming (NDJSON, CSV, Arrow IPC)
+# ----------------------------------------------------------------------
+
+STREAM_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    return str(value)
+
+
+def json_safe_row(record: Any) -> List[Any]:
+    """Registo → lista de valores serializáveis em JSON"""
+    return json.loads(json.dumps(list(record), default=_json_default))
+
+
+async def _encode_ndjson(stream: QueryStream) -> AsyncIterator[bytes]:
+    columns = stream.columns
+    async for batch in stream.batches():
+        yield ''.join(
+            json.dumps(dict(zip(columns, record)), default=_json_default, ensure_ascii=False) + '\n'
+            for record in batch
+        ).encode('utf-8')
+
+
+async def _encode_csv(stream: QueryStream) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(stream.columns)
+    async for batch in stream.batches():
+        writer.writerows(
+            [_json_default(value) if isinstance(value, (datetime, date, bytes, memoryview)) else value
+             for value in record]
+            for record in batch
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# Tipos PostgreSQL → Arrow; os restantes (uuid, inet, enums, PostGIS...) seguem como texto
+def _pg_arrow_types(pa) -> Dict[str, Any]:
+    return {
+        'bool': pa.bool_(),
+        'int2': pa.int16(),
+        'int4': pa.int32(),
+        'int8': pa.int64(),
+        'oid': pa.int64(),
+        'float4': pa.float32(),
+        'float8': pa.float64(),
+        # NUMERIC sem precisão fixa no protocolo: escala máxima útil, sem perda entre lotes
+        'numeric': pa.decimal128(38, 18),
+        'text': pa.string(),
+        'varchar': pa.string(),
+        'bpchar': pa.string(),
+        'name': pa.string(),
+        'char': pa.string(),
+        'json': pa.string(),
+        'jsonb': pa.string(),
+        'bytea': pa.binary(),
+        'date': pa.date32(),
+        'time': pa.time64('us'),
+        'timestamp': pa.timestamp('us'),
+        'timestamptz': pa.timestamp('us', tz='UTC'),
+        'interval': pa.duration('us'),
+    }
+
+
+def arrow_schema(pa, columns: List[str], column_types: List[str]):
+    """Esquema Arrow a partir dos tipos da query preparada (não dos valores do primeiro lote)"""
+    known = _pg_arrow_types(pa)
+    fields = []
+    for name, type_name in zip(columns, column_types):
+        if type_name in known:
+            arrow_type = known[type_name]
+        elif type_name.startswith('_') and type_name[1:] in known:
+            # Arrays PostgreSQL (_int4, _text...) → listas Arrow
+            arrow_type = pa.list_(known[type_name[1:]])
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+async def _encode_arrow(stream: QueryStream) -> AsyncIterator[bytes]:
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("pyarrow é necessário para o formato Arrow (pip install pyarrow)") from e
+    
+    schema = arrow_schema(pa, stream.columns, stream.column_types)
+    as_text = [pa.types.is_string(field.type) for field in schema]
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    async for batch in stream.batches():
+        arrays = []
+        for index, field in enumerate(schema):
+            values = [record[index] for record in batch]
+            if as_text[index]:
+                values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+STREAM_ENCODERS = {'ndjson': _encode_ndjson, 'csv': _encode_csv, 'arrow': _encode_arrow}
+
+
+async def stream_encoded(stream: QueryStream, fmt: str) -> AsyncIterator[bytes]:
+    """Codificar um QueryStream já aberto e fechá-lo no fim (ou em caso de erro/cancelamento)"""
+    try:
+        async for chunk in STREAM_ENCODERS[fmt](stream):
+            yield chunk
+    except BaseException:
+        stream._failed = True
+        raise
+    finally:
+        await stream.close()
+
+
+class QueryStreamResponse(StreamingResponse):
+    """
+    Resposta HTTP em streaming de um QueryStream já aberto
+
+    Fecha o stream (rollback + devolução da conexão ao pool) quando a resposta
+    termina por qualquer motivo, incluindo o cliente desligar antes de o corpo
+    começar a ser iterado.
+    """
+
+    def __init__(self, stream: QueryStream, fmt: str, headers: Optional[Dict[str, str]] = None):
+        self.query_stream = stream
+        super().__init__(stream_encoded(stream, fmt), media_type=STREAM_MEDIA_TYPES[fmt], headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        except BaseException:
+            self.query_stream._failed = True
+            raise
+        finally:
+            await self.query_stream.close()
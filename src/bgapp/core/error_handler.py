@@ -330,12 +330,13 @@ def with_error_handling(
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
+            # Posicionais: argumentos nomeados colidiriam com *args (p.ex. self)
             return await error_handler.execute_with_retry(
-                func=func,
-                service_name=service_name,
-                max_retries=max_retries,
-                backoff_factor=backoff_factor,
-                fallback_func=fallback_func,
+                func,
+                service_name,
+                max_retries,
+                backoff_factor,
+                fallback_func,
                 *args,
                 **kwargs
             )
@@ -1,21 +1,28 @@
 """
 Cliente STAC para integração com APIs externas
-Implementação para acessar coleções oceanográficas de alta qualidade
+Implementação para acessar coleções oceanográficas de alta qualidade:
+pesquisa federada concorrente sobre uma sessão HTTP partilhada e cache
+de respostas em disco com TTL e revalidação por ETag/Last-Modified
 """
 
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
-from urllib.parse import urljoin
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import aiohttp
-import requests
 from pydantic import BaseModel, Field
 
-from .config import AppConfig
+from .config import AppConfig, ROOT
 
 
 class STACCollection(BaseModel):
@@ -42,6 +49,149 @@ class STACItem(BaseModel):
     datetime: str
 
 
+class STACResponseCache:
+    """
+    Cache de respostas JSON em disco (um ficheiro por pedido) com camada LRU em memória
+
+    Cada entrada guarda o corpo, o instante de gravação, o TTL e os validadores
+    (ETag, Last-Modified). Entradas expiradas continuam disponíveis para
+    revalidação condicional (304) e como fallback quando a API externa falha,
+    até serem podadas: a cada `prune_every` gravações removem-se os ficheiros
+    não regravados há mais de `max_age_days` e os mais antigos acima de
+    `max_disk_mb`. O diretório só é criado na primeira gravação.
+    """
+
+    def __init__(self, cache_dir: Path, max_memory_entries: int = 256,
+                 max_disk_mb: float = 512.0, max_age_days: float = 7.0, prune_every: int = 200):
+        self.cache_dir = Path(cache_dir)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 86400
+        self.prune_every = prune_every
+        self._writes_since_prune = 0
+        self._prune_lock = threading.Lock()
+        # O LRU em memória é usado a partir de threads (to_thread) e do event loop
+        self._memory_lock = threading.Lock()
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def key(method: str, url: str, params: Optional[Dict[str, Any]] = None,
+            body: Optional[Dict[str, Any]] = None) -> str:
+        raw = json.dumps([method.upper(), url, params or {}, body or {}], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        with self._memory_lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    @staticmethod
+    def is_fresh(entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["stored_at"] < entry["ttl"]
+
+    def put(self, key: str, url: str, body: Any, ttl: float,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+        entry = {
+            "url": url,
+            "body": body,
+            "ttl": ttl,
+            "stored_at": time.time(),
+            "etag": etag,
+            "last_modified": last_modified
+        }
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self._remember(key, entry)
+
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= self.prune_every:
+            self.prune()
+        return entry
+
+    def prune(self) -> int:
+        """Remover entradas antigas e as menos recentes acima do limite de tamanho"""
+        if not self._prune_lock.acquire(blocking=False):
+            return 0  # Outra thread já está a podar
+        try:
+            self._writes_since_prune = 0
+            files = []
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            files.sort(reverse=True)
+
+            cutoff = time.time() - self.max_age_seconds
+            kept_bytes = 0
+            removed = 0
+            for mtime, size, path in files:
+                if mtime >= cutoff and kept_bytes + size <= self.max_disk_bytes:
+                    kept_bytes += size
+                    continue
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                with self._memory_lock:
+                    self._memory.pop(path.stem, None)
+                removed += 1
+            if removed:
+                print(f"🧹 Cache STAC: {removed} respostas removidas do disco")
+            return removed
+        finally:
+            self._prune_lock.release()
+
+    def touch(self, key: str, entry: Dict[str, Any], ttl: float) -> Dict[str, Any]:
+        """Resposta 304: o corpo guardado continua válido por mais `ttl` segundos"""
+        return self.put(key, entry["url"], entry["body"], ttl, entry.get("etag"), entry.get("last_modified"))
+
+    def clear(self) -> int:
+        removed = 0
+        for path in self.cache_dir.glob("*/*.json"):
+            path.unlink()
+            removed += 1
+        with self._memory_lock:
+            self._memory.clear()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Percorre o diretório em disco: em handlers async chamar numa thread"""
+        sizes = [path.stat().st_size for path in self.cache_dir.glob("*/*.json")]
+        return {
+            "entries": len(sizes),
+            "size_mb": round(sum(sizes) / (1024 * 1024), 2),
+            "memory_entries": len(self._memory),
+            "max_disk_mb": round(self.max_disk_bytes / (1024 * 1024), 1),
+            "cache_dir": str(self.cache_dir)
+        }
+
+
 class ExternalSTACClient:
     """Cliente para acessar APIs STAC externas"""
     
@@ -121,234 +271,439 @@ class ExternalSTACClient:
     
     # Bbox para Angola (expandido para incluir ZEE)
     ANGOLA_BBOX = [8.1559051, -18.922632, 13.794773, -4.2610419]
-    
-    def __init__(self, config: Optional[AppConfig] = None):
+
+    # TTL por tipo de pedido (segundos); Cache-Control max-age da API tem prioridade
+    COLLECTION_TTL = 6 * 3600
+    SEARCH_TTL = 15 * 60
+
+    def __init__(self, config: Optional[AppConfig] = None, cache_dir: Optional[Path] = None,
+                 max_connections: int = 32, max_per_host: int = 8, timeout: float = 30.0):
         self.config = config or AppConfig()
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "BGAPP/2.0 external-stac-client",
-            "Accept": "application/json"
-        })
-        self._cache = {}  # Cache simples em memória
-        
-    async def get_collection(self, collection_id: str, api_name: str = None) -> Optional[STACCollection]:
-        """Buscar informações de uma coleção específica"""
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.cache = STACResponseCache(
+            cache_dir or Path(os.getenv("BGAPP_STAC_CACHE_DIR", ROOT / "data" / "cache" / "external_stac"))
+        )
+        self.cache_stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale_served": 0}
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ------------------------------------------------------------------
+    # HTTP partilhado + cache
+    # ------------------------------------------------------------------
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Sessão com pool de ligações partilhado (recriada se o event loop mudou)"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=10),
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections, limit_per_host=self.max_per_host, ttl_dns_cache=300
+                ),
+                headers={
+                    "User-Agent": "BGAPP/2.0 external-stac-client",
+                    "Accept": "application/json"
+                }
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @staticmethod
+    def _response_ttl(response: aiohttp.ClientResponse, default_ttl: float) -> Optional[float]:
+        """TTL a partir de Cache-Control (None = não guardar)"""
+        cache_control = response.headers.get("Cache-Control", "")
+        if "no-store" in cache_control:
+            return None
+        match = re.search(r"max-age=(\d+)", cache_control)
+        if match and int(match.group(1)) > 0:
+            return float(match.group(1))
+        return default_ttl
+
+    async def _request_json(self, url: str, method: str = "GET", params: Optional[Dict[str, Any]] = None,
+                            body: Optional[Dict[str, Any]] = None, ttl: float = SEARCH_TTL,
+                            use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Pedido JSON com cache: entrada fresca → servida localmente; expirada →
+        pedido condicional (If-None-Match / If-Modified-Since); erro → entrada
+        expirada (se existir) em vez de falhar.
+        """
+        params = {k: str(v) for k, v in (params or {}).items()}
+        key = self.cache.key(method, url, params, body)
+        entry = await asyncio.to_thread(self.cache.get, key) if use_cache else None
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache_stats["hits"] += 1
+            return entry["body"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        session = await self._get_session()
+        try:
+            async with session.request(method, url, params=params or None, json=body,
+                                       headers=headers) as response:
+                response_ttl = self._response_ttl(response, ttl)
+                if response.status == 304 and entry is not None:
+                    self.cache_stats["revalidated"] += 1
+                    if response_ttl:
+                        try:
+                            await asyncio.to_thread(self.cache.touch, key, entry, response_ttl)
+                        except OSError as e:
+                            print(f"⚠️ Falha ao gravar cache STAC ({url}): {e}")
+                    return entry["body"]
+
+                if response.status != 200:
+                    print(f"⚠️ {method} {url} respondeu {response.status}")
+                    if entry is not None:
+                        self.cache_stats["stale_served"] += 1
+                        return entry["body"]
+                    return None
+
+                data = await response.json(content_type=None)
+                self.cache_stats["misses"] += 1
+                if use_cache and response_ttl:
+                    try:
+                        await asyncio.to_thread(
+                            self.cache.put, key, url, data, response_ttl,
+                            response.headers.get("ETag"), response.headers.get("Last-Modified")
+                        )
+                    except OSError as e:
+                        print(f"⚠️ Falha ao gravar cache STAC ({url}): {e}")
+                return data
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if entry is not None:
+                print(f"⚠️ {url} indisponível ({e}) - a servir resposta em cache")
+                self.cache_stats["stale_served"] += 1
+                return entry["body"]
+            raise
+
+    def _resolve_api(self, collection_id: str, api_name: Optional[str] = None) -> str:
         if api_name is None:
             # Determinar API baseado nas coleções prioritárias
             collection_info = self.PRIORITY_COLLECTIONS.get(collection_id)
-            if collection_info:
-                api_name = collection_info["api"]
-            else:
-                api_name = "planetary_computer"  # Default
-        
-        api_config = self.STAC_APIS.get(api_name)
+            api_name = collection_info["api"] if collection_info else "planetary_computer"
+        return api_name
+
+    @staticmethod
+    def _to_item(feature: Dict[str, Any], default_bbox: List[float]) -> Optional[STACItem]:
+        try:
+            return STACItem(
+                id=feature["id"],
+                collection=feature["collection"],
+                geometry=feature["geometry"],
+                properties=feature["properties"],
+                assets=feature["assets"],
+                bbox=feature.get("bbox") or default_bbox,
+                datetime=feature["properties"].get("datetime") or ""
+            )
+        except Exception as e:
+            print(f"Erro ao processar item {feature.get('id', 'unknown')}: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Coleções
+    # ------------------------------------------------------------------
+
+    async def get_collection(self, collection_id: str, api_name: str = None) -> Optional[STACCollection]:
+        """Buscar informações de uma coleção específica"""
+        api_config = self.STAC_APIS.get(self._resolve_api(collection_id, api_name))
         if not api_config:
             return None
-            
+
         url = f"{api_config['url']}/collections/{collection_id}"
-        
-        # Verificar cache
-        cache_key = f"collection_{api_name}_{collection_id}"
-        if cache_key in self._cache:
-            cached_data, timestamp = self._cache[cache_key]
-            # Cache válido por 1 hora
-            if datetime.now() - timestamp < timedelta(hours=1):
-                return STACCollection(**cached_data, api_url=api_config['url'])
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # Calcular relevância
-                        relevance = self._calculate_relevance(collection_id, data)
-                        
-                        collection = STACCollection(
-                            id=data["id"],
-                            title=data["title"],
-                            description=data["description"],
-                            license=data["license"],
-                            extent=data["extent"],
-                            providers=data.get("providers", []),
-                            keywords=data.get("keywords", []),
-                            api_url=api_config['url'],
-                            relevance_score=relevance
-                        )
-                        
-                        # Atualizar cache
-                        self._cache[cache_key] = (data, datetime.now())
-                        
-                        return collection
-                        
+            data = await self._request_json(url, ttl=self.COLLECTION_TTL)
+            if not data:
+                return None
+            return STACCollection(
+                id=data["id"],
+                title=data["title"],
+                description=data["description"],
+                license=data["license"],
+                extent=data["extent"],
+                providers=data.get("providers", []),
+                keywords=data.get("keywords", []),
+                api_url=api_config['url'],
+                relevance_score=self._calculate_relevance(collection_id, data)
+            )
         except Exception as e:
             print(f"Erro ao buscar coleção {collection_id}: {e}")
             return None
-    
-    async def search_items(
-        self, 
-        collection_id: str, 
+
+    async def get_priority_collections(self) -> List[STACCollection]:
+        """Buscar todas as coleções prioritárias identificadas no estudo (em paralelo)"""
+        results = await asyncio.gather(*(
+            self.get_collection(collection_id, info["api"])
+            for collection_id, info in self.PRIORITY_COLLECTIONS.items()
+        ))
+
+        collections = []
+        for collection, info in zip(results, self.PRIORITY_COLLECTIONS.values()):
+            if collection:
+                # Adicionar informações extras do estudo
+                collection.relevance_score = info["relevance"]
+                collections.append(collection)
+
+        # Ordenar por relevância
+        collections.sort(key=lambda x: x.relevance_score, reverse=True)
+        return collections
+
+    # ------------------------------------------------------------------
+    # Pesquisa
+    # ------------------------------------------------------------------
+
+    async def iter_search_pages(
+        self,
+        api_name: str,
+        collections: List[str],
         bbox: Optional[List[float]] = None,
         datetime_range: Optional[str] = None,
-        limit: int = 100,
-        api_name: str = None
-    ) -> List[STACItem]:
-        """Buscar itens em uma coleção com filtros espaciais e temporais"""
-        
-        if api_name is None:
-            collection_info = self.PRIORITY_COLLECTIONS.get(collection_id)
-            if collection_info:
-                api_name = collection_info["api"]
-            else:
-                api_name = "planetary_computer"
-        
+        page_size: int = 100,
+        max_items: Optional[int] = None
+    ) -> AsyncIterator[List[STACItem]]:
+        """Páginas de itens de uma API, seguindo os links 'next' (GET ou POST)"""
         api_config = self.STAC_APIS.get(api_name)
         if not api_config:
-            return []
-        
+            return
+
         # Usar bbox de Angola como padrão
         search_bbox = bbox or self.ANGOLA_BBOX
-        
-        # Construir parâmetros de busca
-        params = {
-            "collections": collection_id,
-            "limit": limit,
+        url = f"{api_config['url']}/search"
+        method = "GET"
+        params: Optional[Dict[str, Any]] = {
+            "collections": ",".join(collections),
+            "limit": page_size,
             "bbox": ",".join(map(str, search_bbox))
         }
-        
         if datetime_range:
             params["datetime"] = datetime_range
-        
-        url = f"{api_config['url']}/search"
-        
+        body: Optional[Dict[str, Any]] = None
+
+        fetched = 0
+        while url:
+            data = await self._request_json(url, method, params, body, ttl=self.SEARCH_TTL)
+            features = (data or {}).get("features") or []
+            if max_items is not None:
+                features = features[:max_items - fetched]
+            fetched += len(features)
+
+            items = [item for item in (self._to_item(f, search_bbox) for f in features) if item]
+            if items:
+                yield items
+            if not features or (max_items is not None and fetched >= max_items):
+                return
+
+            next_link = next((link for link in data.get("links", []) if link.get("rel") == "next"), None)
+            if not next_link or not next_link.get("href"):
+                return
+            url = next_link["href"]
+            method = next_link.get("method", "GET").upper()
+            if method == "POST":
+                base_body = dict(params or body or {}) if next_link.get("merge") else {}
+                body = {**base_body, **next_link.get("body", {})}
+            else:
+                body = None
+            # O href do link 'next' já traz a query completa
+            params = None
+
+    async def search_items(
+        self,
+        collection_id: str,
+        bbox: Optional[List[float]] = None,
+        datetime_range: Optional[str] = None,
+        limit: int = 100,
+        api_name: str = None
+    ) -> List[STACItem]:
+        """Buscar itens em uma coleção com filtros espaciais e temporais"""
+        items: List[STACItem] = []
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        items = []
-                        
-                        if data and "features" in data:
-                            for feature in data.get("features", []):
-                                try:
-                                    item = STACItem(
-                                        id=feature["id"],
-                                        collection=feature["collection"],
-                                        geometry=feature["geometry"],
-                                        properties=feature["properties"],
-                                        assets=feature["assets"],
-                                        bbox=feature.get("bbox", search_bbox),
-                                        datetime=feature["properties"].get("datetime", "")
-                                    )
-                                    items.append(item)
-                                except Exception as e:
-                                    print(f"Erro ao processar item {feature.get('id', 'unknown')}: {e}")
-                                    continue
-                        
-                        return items
-                        
+            async for page in self.iter_search_pages(
+                self._resolve_api(collection_id, api_name), [collection_id],
+                bbox, datetime_range, page_size=limit, max_items=limit
+            ):
+                items.extend(page)
         except Exception as e:
             print(f"Erro ao buscar itens da coleção {collection_id}: {e}")
-            return []
-    
-    async def get_priority_collections(self) -> List[STACCollection]:
-        """Buscar todas as coleções prioritárias identificadas no estudo"""
-        collections = []
-        
-        for collection_id, info in self.PRIORITY_COLLECTIONS.items():
-            collection = await self.get_collection(collection_id, info["api"])
-            if collection:
-                # Adicionar informações extras do estudo
-                collection.relevance_score = info["relevance"]
-                collections.append(collection)
-        
-        # Ordenar por relevância
-        collections.sort(key=lambda x: x.relevance_score, reverse=True)
-        return collections
-    
+        return items
+
+    def _plan_federated_search(self, collections: Optional[List[str]],
+                               apis: Optional[List[str]]) -> List[Tuple[str, str]]:
+        """Pares (API, coleção) a pesquisar; coleções desconhecidas vão a todas as APIs"""
+        api_names = [name for name in self.STAC_APIS if apis is None or name in apis]
+        if not collections:
+            return [
+                (info["api"], collection_id)
+                for collection_id, info in self.PRIORITY_COLLECTIONS.items()
+                if info["api"] in api_names
+            ]
+
+        plan = []
+        for collection_id in collections:
+            known = self.PRIORITY_COLLECTIONS.get(collection_id)
+            targets = [known["api"]] if known else api_names
+            plan.extend((api_name, collection_id) for api_name in targets if api_name in api_names)
+        return plan
+
+    async def federated_search(
+        self,
+        collections: Optional[List[str]] = None,
+        bbox: Optional[List[float]] = None,
+        datetime_range: Optional[str] = None,
+        page_size: int = 100,
+        max_items_per_source: Optional[int] = None,
+        max_items: Optional[int] = None,
+        apis: Optional[List[str]] = None
+    ) -> AsyncIterator[List[STACItem]]:
+        """
+        Pesquisa federada: uma tarefa por (API, coleção) em paralelo, páginas
+        entregues à medida que chegam, sem itens repetidos (coleção, id)
+
+        `max_items` corta pela ordem de chegada; para os N mais recentes usar
+        federated_search_all.
+        """
+        plan = self._plan_federated_search(collections, apis)
+        if not plan:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * len(plan))
+        finished = object()
+
+        async def produce(api_name: str, collection_id: str):
+            try:
+                async for page in self.iter_search_pages(
+                    api_name, [collection_id], bbox, datetime_range, page_size, max_items_per_source
+                ):
+                    await queue.put(page)
+            except Exception as e:
+                print(f"⚠️ Pesquisa em {api_name}/{collection_id} falhou: {e}")
+            await queue.put(finished)
+
+        tasks = [asyncio.create_task(produce(api_name, collection_id)) for api_name, collection_id in plan]
+        seen = set()
+        emitted = 0
+        remaining = len(tasks)
+        try:
+            while remaining:
+                page = await queue.get()
+                if page is finished:
+                    remaining -= 1
+                    continue
+
+                unique = []
+                for item in page:
+                    key = (item.collection, item.id)
+                    if key not in seen:
+                        seen.add(key)
+                        unique.append(item)
+                if max_items is not None:
+                    unique = unique[:max_items - emitted]
+                if unique:
+                    emitted += len(unique)
+                    yield unique
+                if max_items is not None and emitted >= max_items:
+                    return
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def federated_search_all(self, *args, max_items: Optional[int] = None, **kwargs) -> List[STACItem]:
+        """
+        federated_search agregado numa lista ordenada por data (mais recente primeiro)
+
+        O corte em `max_items` é feito depois de juntar e ordenar as páginas de todas
+        as fontes (cada uma limitada a max_items_per_source, por omissão max_items),
+        e não pela ordem de chegada.
+        """
+        if max_items is not None and kwargs.get("max_items_per_source") is None:
+            kwargs["max_items_per_source"] = max_items
+        items: List[STACItem] = []
+        async for page in self.federated_search(*args, **kwargs):
+            items.extend(page)
+        items.sort(key=lambda x: x.properties.get("datetime") or "", reverse=True)
+        return items[:max_items] if max_items is not None else items
+
     async def get_recent_sst_data(self, days_back: int = 7) -> List[STACItem]:
         """Buscar dados recentes de temperatura da superfície do mar"""
-        end_date = datetime.now()
+        # Intervalo em UTC arredondado à hora: pedidos na mesma hora partilham a chave de cache
+        end_date = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
         start_date = end_date - timedelta(days=days_back)
-        datetime_range = f"{start_date.isoformat()}Z/{end_date.isoformat()}Z"
-        
-        # Buscar em ambas as coleções SST
+        datetime_range = f"{start_date:%Y-%m-%dT%H:%M:%SZ}/{end_date:%Y-%m-%dT%H:%M:%SZ}"
+
+        # Buscar em ambas as coleções SST (em paralelo)
         sst_collections = [
             "noaa-cdr-sea-surface-temperature-whoi",
             "sentinel-3-slstr-wst-l2-netcdf"
         ]
-        
-        all_items = []
-        for collection_id in sst_collections:
-            items = await self.search_items(
-                collection_id=collection_id,
-                datetime_range=datetime_range,
-                limit=50
-            )
-            all_items.extend(items)
-        
-        # Ordenar por data (mais recente primeiro)
-        all_items.sort(
-            key=lambda x: x.properties.get("datetime", ""), 
-            reverse=True
+        all_items = await self.federated_search_all(
+            sst_collections, datetime_range=datetime_range, page_size=50, max_items_per_source=50
         )
-        
         return all_items[:20]  # Retornar apenas os 20 mais recentes
-    
+
     def _calculate_relevance(self, collection_id: str, collection_data: Dict) -> float:
         """Calcular score de relevância baseado nos critérios do estudo"""
         base_score = 0.0
-        
+
         # Score base das coleções prioritárias
         if collection_id in self.PRIORITY_COLLECTIONS:
             base_score = self.PRIORITY_COLLECTIONS[collection_id]["relevance"]
-        
+
         # Bonificações baseadas em keywords
         keywords = collection_data.get("keywords", [])
         ocean_keywords = ["ocean", "marine", "sea", "coastal", "temperature", "sst"]
-        
-        keyword_bonus = sum(0.1 for keyword in keywords 
+
+        keyword_bonus = sum(0.1 for keyword in keywords
                           if any(ok in keyword.lower() for ok in ocean_keywords))
-        
+
         # Bonificação por cobertura temporal recente
         extent = collection_data.get("extent", {})
         temporal = extent.get("temporal", {})
         intervals = temporal.get("interval", [[]])
-        
+
         temporal_bonus = 0.0
         if intervals and intervals[0]:
             end_date = intervals[0][1]
             if end_date is None or "2024" in str(end_date) or "2025" in str(end_date):
                 temporal_bonus = 0.5  # Dados atuais
-        
+
         return min(5.0, base_score + keyword_bonus + temporal_bonus)
-    
+
     async def health_check(self) -> Dict[str, Any]:
-        """Verificar saúde das APIs STAC externas"""
-        health_status = {}
-        
-        for api_name, api_config in self.STAC_APIS.items():
+        """Verificar saúde das APIs STAC externas (em paralelo, sem cache)"""
+        session = await self._get_session()
+
+        async def check(api_config: Dict[str, Any]) -> Dict[str, Any]:
             try:
-                async with aiohttp.ClientSession() as session:
-                    start_time = datetime.now()
-                    async with session.get(api_config["url"], timeout=10) as response:
-                        response_time = (datetime.now() - start_time).total_seconds()
-                        
-                        health_status[api_name] = {
-                            "status": "healthy" if response.status == 200 else "unhealthy",
-                            "response_time_ms": int(response_time * 1000),
-                            "status_code": response.status,
-                            "description": api_config["description"]
-                        }
+                start_time = time.perf_counter()
+                async with session.get(api_config["url"], timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    response_time = time.perf_counter() - start_time
+                    return {
+                        "status": "healthy" if response.status == 200 else "unhealthy",
+                        "response_time_ms": int(response_time * 1000),
+                        "status_code": response.status,
+                        "description": api_config["description"]
+                    }
             except Exception as e:
-                health_status[api_name] = {
+                return {
                     "status": "error",
                     "error": str(e),
                     "description": api_config["description"]
                 }
-        
-        return health_status
-    
+
+        results = await asyncio.gather(*(check(config) for config in self.STAC_APIS.values()))
+        return dict(zip(self.STAC_APIS.keys(), results))
+
     def get_collection_summary(self) -> Dict[str, Any]:
         """Retornar resumo das coleções disponíveis"""
         return {
@@ -368,7 +723,8 @@ class ExternalSTACClient:
                     "description": config["description"]
                 }
                 for name, config in self.STAC_APIS.items()
-            }
+            },
+            "cache": {**self.cache.stats(), **self.cache_stats}
         }
 
 
@@ -0,0 +1,320 @@
+"""
+BGAPP Service Registry - Carregamento preguiçoso de subsistemas
+Os módulos pesados (ML, cartografia, QGIS, relatórios, Copernicus...) só são
+importados na primeira utilização ou num warm-up em background depois do
+arranque, reduzindo o tempo de cold start dos workers da Admin API
+
+No event loop (handlers async) um subsistema ainda não carregado nunca é
+importado nem esperado de forma síncrona: o import é agendado numa thread e
+é levantado ServiceLoading (HTTP 503 com Retry-After). Para esperar pelo
+subsistema num handler async usar `await service_registry.aget(nome)` ou
+`await service_registry.aavailable(nome)`.
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from starlette.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Pacote base para alvos relativos (".ml.models:ml_manager")
+DEFAULT_PACKAGE = __name__.rsplit('.', 2)[0]
+
+WARMUP_ENABLED = os.getenv("BGAPP_LAZY_WARMUP", "1").lower() not in ("0", "false", "no")
+WARMUP_DELAY_SECONDS = float(os.getenv("BGAPP_WARMUP_DELAY", "2.0"))
+LOADING_RETRY_AFTER_SECONDS = 2
+
+
+class ServiceLoading(HTTPException):
+    """Subsistema pedido no event loop enquanto ainda está a ser importado (503 + Retry-After)"""
+
+    def __init__(self, name: str):
+        super().__init__(
+            status_code=503,
+            detail=f"Subsistema '{name}' a carregar, tente novamente dentro de instantes",
+            headers={"Retry-After": str(LOADING_RETRY_AFTER_SECONDS)}
+        )
+        self.name = name
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@dataclass
+class ServiceEntry:
+    """Estado de um subsistema registado"""
+    name: str
+    loader: Callable[[], Any]
+    target: str
+    warm_up: bool = True
+    instance: Any = None
+    state: str = "pending"  # pending | loaded | unavailable
+    error: Optional[str] = None
+    load_time_ms: Optional[float] = None
+    loaded_at: Optional[float] = None
+    loaded_by: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    loading: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+class LazyService:
+    """
+    Proxy para um subsistema (ou atributo dele) resolvido na primeira utilização
+
+    Encaminha acesso a atributos, chamadas, indexação e iteração; o truthiness
+    indica se o subsistema está disponível (carregando-o se necessário), tal como
+    os antigos `if not manager:` esperavam de um singleton ou de None.
+    """
+
+    __slots__ = ('_registry', '_name', '_attr')
+
+    def __init__(self, registry: 'ServiceRegistry', name: str, attr: Optional[str] = None):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_attr', attr)
+
+    def _resolve(self) -> Any:
+        instance = self._registry.get(self._name)
+        return getattr(instance, self._attr) if self._attr else instance
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._resolve(), item)
+
+    def __setattr__(self, item: str, value: Any):
+        setattr(self._resolve(), item, value)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self._resolve()(*args, **kwargs)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._resolve()[key]
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __len__(self) -> int:
+        return len(self._resolve())
+
+    def __bool__(self) -> bool:
+        return self._registry.available(self._name) and bool(self._resolve())
+
+    def __repr__(self) -> str:
+        target = f"{self._name}.{self._attr}" if self._attr else self._name
+        return f"<LazyService {target} ({self._registry.state(self._name)})>"
+
+
+class ServiceFlag:
+    """Flag de disponibilidade (substitui os `*_AVAILABLE = True/False` calculados no import)"""
+
+    __slots__ = ('_registry', '_names')
+
+    def __init__(self, registry: 'ServiceRegistry', *names: str):
+        self._registry = registry
+        self._names = names
+
+    def __bool__(self) -> bool:
+        return all(self._registry.available(name) for name in self._names)
+
+    @property
+    def known_unavailable(self) -> bool:
+        """True apenas se o carregamento já falhou (não dispara o import)"""
+        return any(self._registry.state(name) == "unavailable" for name in self._names)
+
+    def __repr__(self) -> str:
+        states = ', '.join(f"{name}={self._registry.state(name)}" for name in self._names)
+        return f"<ServiceFlag {states}>"
+
+
+class LazyASGIApp:
+    """Sub-aplicação ASGI montada sem a importar; o import corre numa thread no primeiro pedido"""
+
+    def __init__(self, registry: 'ServiceRegistry', name: str):
+        self.registry = registry
+        self.name = name
+
+    async def __call__(self, scope, receive, send):
+        app = await self.registry.aget(self.name)
+        await app(scope, receive, send)
+
+
+class ServiceRegistry:
+    """Registo de subsistemas com import sob demanda, warm-up em background e métricas de carga"""
+
+    def __init__(self, package: str = DEFAULT_PACKAGE):
+        self.package = package
+        self.services: Dict[str, ServiceEntry] = {}
+        self.created_at = time.perf_counter()
+        self.warmup_task: Optional[asyncio.Task] = None
+        self.warmup_completed_ms: Optional[float] = None
+
+    def _import_target(self, target: str) -> Callable[[], Any]:
+        module_name, _, attribute = target.partition(':')
+
+        def loader():
+            module = importlib.import_module(module_name, package=self.package)
+            return getattr(module, attribute) if attribute else module
+
+        return loader
+
+    def register(self, name: str, target: Union[str, Callable[[], Any]], warm_up: bool = True) -> 'ServiceRegistry':
+        """
+        Registar um subsistema
+
+        Args:
+            name: Nome do serviço
+            target: "modulo:atributo" (relativo ao pacote bgapp se começar por ".")
+                    ou função sem argumentos que cria o serviço
+            warm_up: Incluir no warm-up em background
+        """
+        if isinstance(target, str):
+            loader, description = self._import_target(target), target
+        else:
+            loader, description = target, getattr(target, '__qualname__', repr(target))
+        self.services[name] = ServiceEntry(name=name, loader=loader, target=description, warm_up=warm_up)
+        return self
+
+    def lazy(self, name: str, target: Union[str, Callable[[], Any]], warm_up: bool = True) -> LazyService:
+        """Registar e devolver o proxy do serviço"""
+        self.register(name, target, warm_up)
+        return LazyService(self, name)
+
+    def proxy(self, name: str, attr: Optional[str] = None) -> LazyService:
+        return LazyService(self, name, attr)
+
+    def flag(self, *names: str) -> ServiceFlag:
+        return ServiceFlag(self, *names)
+
+    def asgi(self, name: str) -> LazyASGIApp:
+        return LazyASGIApp(self, name)
+
+    def _load(self, entry: ServiceEntry, reason: str):
+        with entry.lock:
+            if entry.state != "pending":
+                return
+            started = time.perf_counter()
+            try:
+                entry.instance = entry.loader()
+                entry.state = "loaded"
+                entry.loaded_by = reason
+                logger.info(f"📦 Subsistema '{entry.name}' carregado ({reason}) em "
+                            f"{(time.perf_counter() - started) * 1000:.0f}ms")
+            except Exception as e:
+                # ImportError (dependência opcional em falta) ou erro na criação do singleton
+                entry.state = "unavailable"
+                entry.error = f"{type(e).__name__}: {e}"
+                print(f"{entry.name} not available: {e}")
+                if not isinstance(e, ImportError):
+                    logger.error(f"❌ Erro ao carregar subsistema '{entry.name}': {e}")
+            finally:
+                entry.load_time_ms = round((time.perf_counter() - started) * 1000, 1)
+                entry.loaded_at = time.perf_counter()
+
+    def _ensure_loaded(self, entry: ServiceEntry):
+        """Carregar de forma síncrona, exceto no event loop: aí agendar numa thread e levantar ServiceLoading"""
+        if entry.state != "pending":
+            return
+        if not _on_event_loop():
+            self._load(entry, "on_demand")
+            return
+        # Sem import nem espera pelo lock do warm-up no event loop
+        if not entry.lock.locked() and (entry.loading is None or entry.loading.done()):
+            entry.loading = asyncio.get_running_loop().run_in_executor(None, self._load, entry, "on_demand")
+        raise ServiceLoading(entry.name)
+
+    def get(self, name: str) -> Any:
+        """Obter o serviço, importando-o se necessário (ver _ensure_loaded no event loop)"""
+        entry = self.services[name]
+        self._ensure_loaded(entry)
+        if entry.state != "loaded":
+            raise ImportError(f"Subsistema '{name}' não disponível: {entry.error}")
+        return entry.instance
+
+    async def aget(self, name: str) -> Any:
+        """Como get(), mas o import corre numa thread para não bloquear o event loop"""
+        entry = self.services[name]
+        if entry.state == "pending":
+            await asyncio.to_thread(self._load, entry, "on_demand")
+        return self.get(name)
+
+    async def aavailable(self, *names: str) -> bool:
+        """Como available(), mas espera pelo import numa thread em vez de levantar ServiceLoading"""
+        for name in names:
+            entry = self.services[name]
+            if entry.state == "pending":
+                await asyncio.to_thread(self._load, entry, "on_demand")
+        return all(self.services[name].state == "loaded" for name in names)
+
+    def available(self, name: str) -> bool:
+        entry = self.services[name]
+        self._ensure_loaded(entry)
+        return entry.state == "loaded"
+
+    def is_loaded(self, name: str) -> bool:
+        return self.services[name].state == "loaded"
+
+    def state(self, name: str) -> str:
+        return self.services[name].state
+
+    def warm_up(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """Carregar (de forma síncrona) os serviços pendentes marcados para warm-up"""
+        for name in names or [n for n, entry in self.services.items() if entry.warm_up]:
+            entry = self.services[name]
+            if entry.state == "pending":
+                self._load(entry, "warm_up")
+        return {name: entry.state for name, entry in self.services.items()}
+
+    async def warm_up_in_background(self, delay: float = WARMUP_DELAY_SECONDS):
+        """Aquecer os serviços um a um numa thread, depois de a API começar a aceitar pedidos"""
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        for name, entry in list(self.services.items()):
+            if entry.warm_up and entry.state == "pending":
+                await asyncio.to_thread(self._load, entry, "warm_up")
+        self.warmup_completed_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"🔥 Warm-up de subsistemas concluído em {self.warmup_completed_ms:.0f}ms")
+
+    def start_warm_up(self) -> Optional[asyncio.Task]:
+        """Agendar o warm-up em background (desativável com BGAPP_LAZY_WARMUP=0)"""
+        if not WARMUP_ENABLED or self.warmup_task is not None:
+            return self.warmup_task
+        self.warmup_task = asyncio.create_task(self.warm_up_in_background())
+        return self.warmup_task
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado, tempo de carga e origem (on_demand/warm_up) de cada subsistema"""
+        states = [entry.state for entry in self.services.values()]
+        return {
+            'total': len(self.services),
+            'loaded': states.count('loaded'),
+            'pending': states.count('pending'),
+            'unavailable': states.count('unavailable'),
+            'warmup_enabled': WARMUP_ENABLED,
+            'warmup_completed_ms': self.warmup_completed_ms,
+            'services': {
+                name: {
+                    'target': entry.target,
+                    'state': entry.state,
+                    'load_time_ms': entry.load_time_ms,
+                    'loaded_by': entry.loaded_by,
+                    'loaded_after_s': round(entry.loaded_at - self.created_at, 2) if entry.loaded_at else None,
+                    'error': entry.error
+                }
+                for name, entry in self.services.items()
+            }
+        }
+
+
+# Instância global
+service_registry = ServiceRegistry()
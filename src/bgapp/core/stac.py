@@ -4,7 +4,7 @@ import asyncio
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 import requests
 
@@ -69,14 +69,57 @@ class STACManager:
             print(f"Failed to create item {item_id}: {e}")
             return {}
 
+    def create_items_bulk(self, collection_id: str, items: Iterable[Dict[str, Any]],
+                          batch_size: int = 5000) -> Dict[str, Any]:
+        """Bulk-ingest STAC items as NDJSON (one request per `batch_size` items)."""
+        url = f"{self.base_url}/collections/{collection_id}/items/bulk"
+        summary: Dict[str, Any] = {"upserted": 0, "error_count": 0, "errors": []}
+
+        def post(batch: List[Dict[str, Any]]):
+            # Shallow copies: never add bbox to the caller's dicts
+            body = "".join(
+                json.dumps({**item, "bbox": self._geometry_to_bbox(item["geometry"])}
+                           if item.get("geometry") and not item.get("bbox") else item) + "\n"
+                for item in batch
+            ).encode()
+            try:
+                resp = self.session.post(
+                    url, data=body, headers={"Content-Type": "application/x-ndjson"}, timeout=300
+                )
+                result = resp.json()
+                summary["upserted"] += result.get("upserted", 0)
+                summary["error_count"] += result.get("error_count", 0)
+                summary["errors"].extend(result.get("errors", []))
+            except (requests.RequestException, ValueError) as e:
+                print(f"Failed to bulk-ingest {len(batch)} items into {collection_id}: {e}")
+                summary["error_count"] += len(batch)
+
+        batch: List[Dict[str, Any]] = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                post(batch)
+                batch = []
+        if batch:
+            post(batch)
+        return summary
+
     def _geometry_to_bbox(self, geometry: Dict[str, Any]) -> List[float]:
-        """Extract bbox from geometry."""
-        if geometry.get("type") == "Polygon":
-            coords = geometry["coordinates"][0]
-            xs = [c[0] for c in coords]
-            ys = [c[1] for c in coords]
-            return [min(xs), min(ys), max(xs), max(ys)]
-        return [-180, -90, 180, 90]
+        """Extract bbox from any GeoJSON geometry."""
+        xs: List[float] = []
+        ys: List[float] = []
+        stack = [geometry.get("coordinates")]
+        stack.extend(g.get("coordinates") for g in geometry.get("geometries", []))
+        while stack:
+            coords = stack.pop()
+            if coords and isinstance(coords[0], (int, float)):
+                xs.append(coords[0])
+                ys.append(coords[1])
+            elif coords:
+                stack.extend(coords)
+        if not xs:
+            return [-180, -90, 180, 90]
+        return [min(xs), min(ys), max(xs), max(ys)]
     
     async def get_external_collections(self) -> List[Dict[str, Any]]:
         """Buscar coleções das APIs STAC externas."""
@@ -132,6 +175,42 @@ class STACManager:
             print(f"Erro ao buscar itens externos: {e}")
             return []
     
+    async def federated_search_external(
+        self,
+        collections: Optional[List[str]] = None,
+        bbox: Optional[List[float]] = None,
+        datetime_range: Optional[str] = None,
+        limit: int = 100,
+        apis: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Pesquisa federada em todas as APIs STAC externas (em paralelo, com cache)."""
+        try:
+            items = await external_stac_client.federated_search_all(
+                collections,
+                bbox=bbox,
+                datetime_range=datetime_range,
+                page_size=min(limit, 100),
+                max_items_per_source=limit,
+                max_items=limit,
+                apis=apis
+            )
+            return [
+                {
+                    "id": item.id,
+                    "collection": item.collection,
+                    "geometry": item.geometry,
+                    "properties": item.properties,
+                    "assets": item.assets,
+                    "bbox": item.bbox,
+                    "datetime": item.datetime,
+                    "source": "external"
+                }
+                for item in items
+            ]
+        except Exception as e:
+            print(f"Erro na pesquisa federada: {e}")
+            return []
+
     async def get_recent_oceanographic_data(self, days_back: int = 7) -> Dict[str, Any]:
         """Buscar dados oceanográficos recentes para Angola."""
         try:
@@ -172,5 +251,6 @@ class STACManager:
             "priority_collections": external_summary["priority_collections"],
             "data_types_available": external_summary["data_types"],
             "coverage": external_summary["coverage_area"],
-            "apis": external_summary["apis"]
+            "apis": external_summary["apis"],
+            "cache": external_summary["cache"]
         }
@@ -30,6 +30,13 @@ except ImportError:
     print("Bibliotecas de base de dados não disponíveis - usando simulação")
     DATABASE_LIBS_AVAILABLE = False
 
+# Pool asyncpg (cursores do servidor, streaming)
+try:
+    from ..core.database_pool import DatabasePoolManager, QueryStream, STREAM_MEDIA_TYPES
+    DATABASE_POOL_AVAILABLE = True
+except ImportError:
+    DATABASE_POOL_AVAILABLE = False
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -145,8 +152,9 @@ class DatabaseManager:
             )
         }
         
-        # Cache de conexões ativas
-        self.active_connections = {}
+        # Cache de conexões ativas (um pool asyncpg por connection_id)
+        self.active_connections: Dict[str, 'DatabasePoolManager'] = {}
+        self._pool_lock = asyncio.Lock()
         
         # Histórico de queries
         self.query_history = []
@@ -333,51 +341,44 @@ class DatabaseManager:
         start_time = datetime.now()
         
         try:
-            if DATABASE_LIBS_AVAILABLE and connection_id in self.database_connections:
-                connection_config = self.database_connections[connection_id]
+            connection_config = self.database_connections.get(connection_id)
+            is_postgres = (
+                connection_config is not None and
+                connection_config.db_type in [DatabaseType.POSTGRESQL, DatabaseType.TIMESCALEDB]
+            )
+            
+            if is_postgres and (DATABASE_POOL_AVAILABLE or DATABASE_LIBS_AVAILABLE):
+                # Adicionar LIMIT se não existir
+                if 'LIMIT' not in sql.upper() and sql.strip().upper().startswith('SELECT'):
+                    sql += f" LIMIT {limit}"
                 
-                if connection_config.db_type in [DatabaseType.POSTGRESQL, DatabaseType.TIMESCALEDB]:
-                    # Executar query real
-                    engine = create_engine(connection_config.connection_string)
-                    
-                    # Adicionar LIMIT se não existir
-                    if 'LIMIT' not in sql.upper() and sql.strip().upper().startswith('SELECT'):
-                        sql += f" LIMIT {limit}"
-                    
-                    with engine.connect() as conn:
-                        result = conn.execute(text(sql))
-                        
-                        if result.returns_rows:
-                            # Query SELECT
-                            rows = result.fetchall()
-                            columns = list(result.keys())
-                            data = [dict(zip(columns, row)) for row in rows]
-                            rows_affected = len(data)
-                        else:
-                            # Query INSERT/UPDATE/DELETE
-                            rows_affected = result.rowcount
-                            columns = []
-                            data = []
-                    
-                    execution_time = (datetime.now() - start_time).total_seconds() * 1000
-                    
-                    query_result = QueryResult(
-                        query_id=query_id,
-                        sql=sql,
-                        executed_at=start_time,
-                        execution_time_ms=execution_time,
-                        rows_affected=rows_affected,
-                        columns=columns,
-                        data=data,
-                        success=True,
-                        metadata={'connection': connection_id}
-                    )
+                if DATABASE_POOL_AVAILABLE:
+                    # Executar query real através do pool asyncpg da conexão
+                    columns, data, rows_affected = await self._execute_pooled(connection_id, sql)
                 else:
-                    # Simular para outros tipos
-                    await asyncio.sleep(0.2)
-                    query_result = await self._simulate_query_execution(query_id, sql, start_time)
+                    # Sem asyncpg: SQLAlchemy numa thread para não bloquear o event loop
+                    columns, data, rows_affected = await asyncio.to_thread(
+                        self._execute_sqlalchemy, connection_config.connection_string, sql
+                    )
+                
+                execution_time = (datetime.now() - start_time).total_seconds() * 1000
+                
+                query_result = QueryResult(
+                    query_id=query_id,
+                    sql=sql,
+                    executed_at=start_time,
+                    execution_time_ms=execution_time,
+                    rows_affected=rows_affected,
+                    columns=columns,
+                    data=data,
+                    success=True,
+                    metadata={
+                        'connection': connection_id,
+                        'execution_method': 'asyncpg_pool' if DATABASE_POOL_AVAILABLE else 'sqlalchemy'
+                    }
+                )
             else:
-                # Simular execução
+                # Simular execução (sem bibliotecas ou tipos não-PostgreSQL)
                 await asyncio.sleep(0.2)
                 query_result = await self._simulate_query_execution(query_id, sql, start_time)
             
@@ -410,6 +411,103 @@ class DatabaseManager:
                 error_message=str(e)
             )
     
+    async def _get_pool(self, connection_id: str) -> 'DatabasePoolManager':
+        """Pool asyncpg da conexão, criado na primeira utilização"""
+        pool = self.active_connections.get(connection_id)
+        if pool is not None and pool.pool is not None:
+            return pool
+        
+        async with self._pool_lock:
+            pool = self.active_connections.get(connection_id)
+            if pool is None or pool.pool is None:
+                connection_config = self.database_connections[connection_id]
+                pool = DatabasePoolManager(
+                    dsn=connection_config.connection_string,
+                    min_size=1,
+                    max_size=connection_config.connection_pool_size
+                )
+                if not await pool.initialize():
+                    raise ConnectionError(f"Não foi possível criar o pool para {connection_id}")
+                self.active_connections[connection_id] = pool
+                self.db_metrics['total_connections'] += 1
+        return pool
+    
+    async def _execute_pooled(self, connection_id: str, sql: str) -> Tuple[List[str], List[Dict[str, Any]], int]:
+        """Executar query no pool: SELECT lido em lotes por cursor do servidor, restantes via execute"""
+        pool = await self._get_pool(connection_id)
+        
+        if sql.strip().upper().startswith(('SELECT', 'WITH')):
+            data = []
+            async with pool.stream_query(sql, batch_size=2000) as stream:
+                async for batch in stream.batches():
+                    data.extend(dict(zip(stream.columns, record)) for record in batch)
+            return stream.columns, data, len(data)
+        
+        async with pool.get_connection() as conn:
+            status = await conn.execute(sql)
+        # Estado do comando, p.ex. "INSERT 0 5" / "UPDATE 3"
+        last_token = status.rsplit(' ', 1)[-1]
+        return [], [], int(last_token) if last_token.isdigit() else 0
+    
+    @staticmethod
+    def _execute_sqlalchemy(connection_string: str, sql: str) -> Tuple[List[str], List[Dict[str, Any]], int]:
+        """Executar query com SQLAlchemy (fallback síncrono quando asyncpg não está disponível)"""
+        engine = create_engine(connection_string)
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(text(sql))
+                
+                if result.returns_rows:
+                    # Query SELECT
+                    columns = list(result.keys())
+                    data = [dict(zip(columns, row)) for row in result.fetchall()]
+                    return columns, data, len(data)
+                
+                # Query INSERT/UPDATE/DELETE
+                return [], [], result.rowcount
+        finally:
+            engine.dispose()
+    
+    async def stream_query(self,
+                         connection_id: str,
+                         sql: str,
+                         export_format: str = 'ndjson',
+                         batch_size: int = 2000) -> 'QueryStream':
+        """
+        📡 Executar query SELECT em streaming (cursor do servidor)
+        
+        Args:
+            connection_id: ID da conexão
+            sql: Query SQL (apenas leitura)
+            export_format: Formato ('ndjson', 'csv', 'arrow')
+            batch_size: Registos lidos por lote
+            
+        Returns:
+            QueryStream aberto (entregar a QueryStreamResponse, que o fecha no fim)
+        """
+        
+        if not DATABASE_POOL_AVAILABLE:
+            raise RuntimeError("Streaming requer asyncpg (pool de conexões indisponível)")
+        if export_format not in STREAM_MEDIA_TYPES:
+            raise ValueError(f"Formato de streaming não suportado: {export_format}")
+        
+        connection_config = self.database_connections.get(connection_id)
+        if connection_config is None or connection_config.db_type not in [DatabaseType.POSTGRESQL, DatabaseType.TIMESCALEDB]:
+            raise ValueError(f"Conexão {connection_id} não suporta queries SQL")
+        
+        pool = await self._get_pool(connection_id)
+        stream = await pool.open_stream(sql, batch_size=batch_size)
+        self.db_metrics['total_queries_executed'] += 1
+        logger.info(f"📡 Query em streaming ({export_format}) na conexão {connection_id}")
+        
+        return stream
+    
+    async def close_pools(self):
+        """Fechar os pools de conexões abertos"""
+        for pool in self.active_connections.values():
+            await pool.close()
+        self.active_connections.clear()
+    
     async def _simulate_query_execution(self, query_id: str, sql: str, start_time: datetime) -> QueryResult:
         """Simular execução de query"""
         
@@ -12,7 +12,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Callable
 from dataclasses import dataclass, asdict
 from enum import Enum
-from collections import defaultdict, deque
+from collections import defaultdict
 
 import redis.asyncio as redis
 from fastapi import FastAPI, Request, HTTPException, Depends, status
@@ -56,6 +56,37 @@ class RateLimitStatus:
     reset_time: datetime
     blocked: bool
 
+# GCRA (Generic Cell Rate Algorithm) atómico: uma ida ao Redis e uma única chave
+# (theoretical arrival time, em microssegundos) por cliente. Pedidos rejeitados não
+# consomem quota. Retorna {permitido, restantes, retry_after_us, reset_after_us}.
+GCRA_LUA_SCRIPT = """
+local key = KEYS[1]
+local emission_interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000000 + tonumber(clock[2])
+local tolerance = emission_interval * burst
+
+local tat = tonumber(redis.call('GET', key))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission_interval * cost
+local allow_at = new_tat - tolerance
+
+if now < allow_at then
+    return {0, 0, string.format('%.0f', allow_at - now), string.format('%.0f', tat - now)}
+end
+
+local reset_after = new_tat - now
+redis.call('SET', key, string.format('%.0f', new_tat), 'PX', math.ceil(reset_after / 1000))
+local remaining = math.floor((now - allow_at) / emission_interval)
+return {1, remaining, '0', string.format('%.0f', reset_after)}
+"""
+
 class CircuitBreakerState(str, Enum):
     """Estados do Circuit Breaker"""
     CLOSED = "closed"      # Normal operation
@@ -88,8 +119,16 @@ class APIGateway:
         self.redis_port = redis_port
         
         # Rate limiting
+        self.redis = None
         self.rate_limit_rules: Dict[str, RateLimitRule] = {}
-        self.request_counts: Dict[str, deque] = defaultdict(deque)
+        self._sorted_rules: Optional[List[RateLimitRule]] = None
+        self._gcra_script = None
+        # Estado GCRA local (fallback sem Redis): chave -> theoretical arrival time
+        self._local_tat: Dict[str, float] = {}
+        # Pré-verificação local: clientes bloqueados não voltam ao Redis até retry_after
+        self._blocked_until: Dict[str, float] = {}
+        self._local_prune_every = 10000
+        self._local_checks = 0
         
         # Load balancing
         self.backend_services: Dict[str, List[str]] = {}
@@ -123,6 +162,7 @@ class APIGateway:
             )
             self.redis = redis.Redis(connection_pool=self.redis_pool)
             await self.redis.ping()
+            self._gcra_script = self.redis.register_script(GCRA_LUA_SCRIPT)
             
             print("✅ API Gateway inicializado com Redis")
             
@@ -234,38 +274,51 @@ class APIGateway:
         if not applicable_rule:
             return RateLimitStatus(0, 999999, 999999, datetime.now(), False)
         
-        # Gerar chave para rate limiting
+        # Gerar chave para rate limiting (por regra, já que cada regra tem a sua cadência)
         if applicable_rule.type == RateLimitType.PER_IP:
-            key = f"rate_limit:ip:{client_ip}"
+            key = f"rate_limit:{applicable_rule.id}:ip:{client_ip}"
         elif applicable_rule.type == RateLimitType.PER_USER and user_id:
-            key = f"rate_limit:user:{user_id}"
+            key = f"rate_limit:{applicable_rule.id}:user:{user_id}"
         elif applicable_rule.type == RateLimitType.PER_API_KEY:
             api_key = request.headers.get("x-api-key", "anonymous")
-            key = f"rate_limit:key:{api_key}"
+            key = f"rate_limit:{applicable_rule.id}:key:{api_key}"
         else:
-            key = f"rate_limit:global"
+            key = f"rate_limit:{applicable_rule.id}:global"
         
         # Check rate limit
         current_time = datetime.now()
-        window_start = current_time - timedelta(seconds=applicable_rule.window_seconds)
         
-        if self.redis:
+        # Pré-verificação local: cliente já bloqueado não custa uma ida ao Redis
+        blocked_until = self._blocked_until.get(key)
+        if blocked_until is not None:
+            if current_time.timestamp() < blocked_until:
+                return RateLimitStatus(
+                    requests_made=applicable_rule.limit,
+                    limit=applicable_rule.limit,
+                    remaining=0,
+                    reset_time=datetime.fromtimestamp(blocked_until),
+                    blocked=True
+                )
+            del self._blocked_until[key]
+        
+        if self.redis and self._gcra_script:
             # Use Redis for distributed rate limiting
             return await self._check_redis_rate_limit(key, applicable_rule, current_time)
         else:
             # Use in-memory rate limiting
-            return self._check_memory_rate_limit(key, applicable_rule, current_time, window_start)
+            return self._check_memory_rate_limit(key, applicable_rule, current_time)
     
     def _find_applicable_rule(self, endpoint: str, access_level: AccessLevel) -> Optional[RateLimitRule]:
         """Encontrar regra aplicável para endpoint e nível de acesso"""
-        # Ordenar por especificidade (regras mais específicas primeiro)
-        sorted_rules = sorted(
-            self.rate_limit_rules.values(),
-            key=lambda r: (r.access_level.value, len(r.endpoints[0]) if r.endpoints else 0),
-            reverse=True
-        )
+        # Ordenar por especificidade (regras mais específicas primeiro); recalculado só quando as regras mudam
+        if self._sorted_rules is None:
+            self._sorted_rules = sorted(
+                self.rate_limit_rules.values(),
+                key=lambda r: (r.access_level.value, len(r.endpoints[0]) if r.endpoints else 0),
+                reverse=True
+            )
         
-        for rule in sorted_rules:
+        for rule in self._sorted_rules:
             if not rule.enabled:
                 continue
                 
@@ -279,67 +332,71 @@ class APIGateway:
         
         return None
     
+    @staticmethod
+    def _emission_interval_us(rule: RateLimitRule) -> float:
+        """Intervalo entre pedidos (µs) para uma regra de `limit` pedidos por `window_seconds`"""
+        return rule.window_seconds * 1_000_000 / max(1, rule.limit)
+    
+    def _build_status(self, key: str, rule: RateLimitRule, allowed: bool, remaining: int,
+                      retry_after_us: float, reset_after_us: float, current_time: datetime) -> RateLimitStatus:
+        """Converter resultado GCRA em RateLimitStatus (e memorizar bloqueios para a pré-verificação)"""
+        remaining = max(0, min(rule.limit, remaining))
+        if allowed:
+            reset_time = current_time + timedelta(microseconds=reset_after_us)
+        else:
+            reset_time = current_time + timedelta(microseconds=retry_after_us)
+            self._blocked_until[key] = reset_time.timestamp()
+        return RateLimitStatus(
+            requests_made=rule.limit - remaining,
+            limit=rule.limit,
+            remaining=remaining,
+            reset_time=reset_time,
+            blocked=not allowed
+        )
+    
     async def _check_redis_rate_limit(self, key: str, rule: RateLimitRule, current_time: datetime) -> RateLimitStatus:
-        """Verificar rate limit usando Redis"""
+        """Verificar rate limit no Redis com GCRA atómico (um EVALSHA, O(1) memória por chave)"""
         try:
-            pipe = self.redis.pipeline()
-            
-            # Remove expired entries
-            expire_time = current_time.timestamp() - rule.window_seconds
-            pipe.zremrangebyscore(key, 0, expire_time)
-            
-            # Count current requests
-            pipe.zcard(key)
-            
-            # Add current request
-            pipe.zadd(key, {str(current_time.timestamp()): current_time.timestamp()})
-            
-            # Set expiration
-            pipe.expire(key, rule.window_seconds)
-            
-            results = await pipe.execute()
-            current_count = results[1]
-            
-            remaining = max(0, rule.limit - current_count)
-            reset_time = current_time + timedelta(seconds=rule.window_seconds)
-            blocked = current_count >= rule.limit
-            
-            return RateLimitStatus(
-                requests_made=current_count,
-                limit=rule.limit,
-                remaining=remaining,
-                reset_time=reset_time,
-                blocked=blocked
+            allowed, remaining, retry_after_us, reset_after_us = await self._gcra_script(
+                keys=[key],
+                args=[self._emission_interval_us(rule), rule.limit, 1]
+            )
+            return self._build_status(
+                key, rule, bool(allowed), int(remaining), float(retry_after_us),
+                float(reset_after_us), current_time
             )
             
         except Exception as e:
             print(f"❌ Erro verificando rate limit Redis: {e}")
-            # Fallback to allow request
-            return RateLimitStatus(0, rule.limit, rule.limit, current_time, False)
+            # Degradar para o limitador local em vez de deixar passar tudo
+            return self._check_memory_rate_limit(key, rule, current_time)
     
-    def _check_memory_rate_limit(self, key: str, rule: RateLimitRule, current_time: datetime, window_start: datetime) -> RateLimitStatus:
-        """Verificar rate limit usando memória local"""
-        requests = self.request_counts[key]
+    def _check_memory_rate_limit(self, key: str, rule: RateLimitRule, current_time: datetime) -> RateLimitStatus:
+        """Verificar rate limit usando GCRA em memória local (O(1) por chave)"""
+        now = current_time.timestamp() * 1_000_000
+        emission_interval = self._emission_interval_us(rule)
         
-        # Remove expired requests
-        while requests and datetime.fromtimestamp(requests[0]) < window_start:
-            requests.popleft()
+        tat = max(self._local_tat.get(key, now), now)
+        new_tat = tat + emission_interval
+        allow_at = new_tat - emission_interval * rule.limit
         
-        # Add current request
-        requests.append(current_time.timestamp())
+        self._local_checks += 1
+        if self._local_checks >= self._local_prune_every:
+            self._prune_local_state(now)
         
-        current_count = len(requests)
-        remaining = max(0, rule.limit - current_count)
-        reset_time = current_time + timedelta(seconds=rule.window_seconds)
-        blocked = current_count > rule.limit
+        if now < allow_at:
+            return self._build_status(key, rule, False, 0, allow_at - now, tat - now, current_time)
         
-        return RateLimitStatus(
-            requests_made=current_count,
-            limit=rule.limit,
-            remaining=remaining,
-            reset_time=reset_time,
-            blocked=blocked
-        )
+        self._local_tat[key] = new_tat
+        remaining = int((now - allow_at) // emission_interval)
+        return self._build_status(key, rule, True, remaining, 0, new_tat - now, current_time)
+    
+    def _prune_local_state(self, now_us: float):
+        """Remover em lote chaves locais cuja quota já foi totalmente reposta"""
+        self._local_checks = 0
+        self._local_tat = {k: tat for k, tat in self._local_tat.items() if tat > now_us}
+        now = now_us / 1_000_000
+        self._blocked_until = {k: until for k, until in self._blocked_until.items() if until > now}
     
     async def route_request(self, service_name: str, path: str, method: str, **kwargs) -> httpx.Response:
         """Rotear requisição para serviço backend com load balancing"""
@@ -538,11 +595,13 @@ class APIGateway:
     def add_rate_limit_rule(self, rule: RateLimitRule):
         """Adicionar nova regra de rate limiting"""
         self.rate_limit_rules[rule.id] = rule
+        self._sorted_rules = None
     
     def remove_rate_limit_rule(self, rule_id: str):
         """Remover regra de rate limiting"""
         if rule_id in self.rate_limit_rules:
             del self.rate_limit_rules[rule_id]
+            self._sorted_rules = None
 
 # Middleware para integração com FastAPI
 class RateLimitMiddleware(BaseHTTPMiddleware):
@@ -155,6 +155,10 @@ class GBIFConnector:
             data = response.json()
             occurrences = []
             
+            if data.get('count', 0) > len(data.get('results', [])):
+                logger.warning(f"⚠️ Apenas a primeira página de {data.get('count')} ocorrências; "
+                               f"usar harvest_occurrences_angola para a colheita completa")
+            
             for result in data.get('results', []):
                 occurrence = {
                     'gbif_id': result.get('gbifID'),
@@ -197,6 +201,38 @@ class GBIFConnector:
             logger.error(f"❌ Erro ao buscar ocorrências: {e}")
             return []
     
+    def harvest_occurrences_angola(self, output_dir: str,
+                                   taxon_key: int = None,
+                                   scientific_name: str = None,
+                                   start_date: str = None,
+                                   end_date: str = None,
+                                   checkpoint_path: str = None,
+                                   row_group_size: int = 50_000,
+                                   max_in_flight: int = 8) -> Dict[str, Any]:
+        """
+        Colheita completa (todas as páginas) das ocorrências em Angola para GeoParquet
+        
+        Retoma a partir do checkpoint se a mesma consulta tiver sido interrompida.
+        """
+        from .occurrence_harvester import harvest_occurrences
+        
+        params: Dict[str, Any] = {'country': 'AO'}
+        if taxon_key:
+            params['taxonKey'] = taxon_key
+        if scientific_name:
+            params['scientificName'] = scientific_name
+        if start_date and end_date:
+            params['eventDate'] = f"{start_date},{end_date}"
+        
+        logger.info(f"🌾 Colheita completa GBIF para {output_dir}: {params}")
+        return harvest_occurrences(
+            'gbif', output_dir, params,
+            bounds=self.angola_bounds,
+            checkpoint_path=checkpoint_path,
+            row_group_size=row_group_size,
+            max_in_flight=max_in_flight
+        )
+    
     def search_marine_species_angola(self, taxa_type: str = 'fish',
                                    limit: int = 500) -> Dict[str, Any]:
         """Buscar espécies marinhas específicas em Angola"""
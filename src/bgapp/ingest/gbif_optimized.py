@@ -224,6 +224,26 @@ class GBIFOptimizedConnector:
         logger.info(f"✅ Async: {len(all_occurrences)} ocorrências encontradas")
         return all_occurrences
     
+    async def harvest_occurrences_batch(self, taxon_keys: List[int], output_dir: str,
+                                        checkpoint_path: str = None,
+                                        row_group_size: int = 50_000,
+                                        max_in_flight: int = 8) -> Dict[str, Any]:
+        """Colheita completa (sem limite por espécie) de vários taxa para GeoParquet, retomável"""
+        from .occurrence_harvester import GBIFOccurrenceSource, OccurrenceHarvester
+        
+        # Vários taxonKey na mesma consulta (OR), partilhando a paginação
+        source = GBIFOccurrenceSource(
+            {'taxonKey': sorted(taxon_keys), 'country': 'AO'}, bounds=self.angola_bounds
+        )
+        harvester = OccurrenceHarvester(
+            source,
+            checkpoint_path or str(Path(output_dir) / '_checkpoint.json'),
+            max_in_flight=max_in_flight
+        )
+        summary = await harvester.harvest_to_parquet(output_dir, row_group_size)
+        logger.info(f"✅ Colheita: {summary['records_written']} ocorrências em {summary['parts']} partes")
+        return summary
+    
     @cached(ttl=7200)  # Cache por 2 horas
     @timed
     def get_comprehensive_marine_data(self, taxa_types: List[str] = None, 
@@ -68,25 +68,61 @@ def fetch_obis_occurrences(
 
     results: List[Dict[str, Any]] = data.get("results", []) if isinstance(data, dict) else data
 
-    if geometry is not None:
+    if geometry is not None and results:
         try:
-            from shapely.geometry import shape, Point  # type: ignore
+            import numpy as np
+            import pandas as pd
+            from ..process.biodiv import aoi_mask
         except Exception:
             return results
-        geom = shape(geometry)
-        filtered: List[Dict[str, Any]] = []
-        for rec in results:
-            lon = rec.get("decimalLongitude")
-            lat = rec.get("decimalLatitude")
-            if lon is None or lat is None:
-                continue
-            if geom.contains(Point(float(lon), float(lat))):
-                filtered.append(rec)
-        return filtered
+        # Vectorized clip (prepared geometry / contains_xy) instead of per-point contains
+        lon = pd.to_numeric(pd.Series([r.get("decimalLongitude") for r in results]), errors="coerce").to_numpy(float)
+        lat = pd.to_numeric(pd.Series([r.get("decimalLatitude") for r in results]), errors="coerce").to_numpy(float)
+        try:
+            inside = aoi_mask(lon, lat, geometry)
+        except ImportError:
+            return results
+        return [results[i] for i in np.flatnonzero(inside)]
 
     return results
 
 
+def harvest_obis_occurrences(
+    output_dir: str,
+    taxonid: Optional[int] = None,
+    scientificname: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    row_group_size: int = 50_000,
+    geometry: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Harvest every OBIS occurrence in the Angolan EEZ to GeoParquet (cursor paging, resumable).
+
+    Unlike fetch_obis_occurrences, which returns a single page, this follows the
+    `after` cursor until exhaustion and checkpoints progress after each row group.
+    With `geometry`, records outside it are dropped as each row group is written.
+    """
+    from .occurrence_harvester import harvest_occurrences
+
+    params: Dict[str, Any] = {}
+    if taxonid is not None:
+        params["taxonid"] = taxonid
+    if scientificname is not None:
+        params["scientificname"] = scientificname
+    if start is not None:
+        params["startdate"] = start
+    if end is not None:
+        params["enddate"] = end
+
+    return harvest_occurrences(
+        "obis", output_dir, params,
+        checkpoint_path=checkpoint_path,
+        row_group_size=row_group_size,
+        aoi=geometry,
+    )
+
+
 def main(argv: Optional[List[str]] = None) -> None:
     parser = argparse.ArgumentParser(description="OBIS occurrences downloader")
     parser.add_argument("--taxonid", type=int, default=None)
@@ -95,6 +131,9 @@ def main(argv: Optional[List[str]] = None) -> None:
     parser.add_argument("--end", type=str, default=None)
     parser.add_argument("--aoi", type=str, default=None, help="Path to AOI GeoJSON to filter locally")
     parser.add_argument("--out", type=str, default=f"obis_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json")
+    parser.add_argument("--parquet-dir", type=str, default=None,
+                        help="Harvest all pages to a GeoParquet directory instead of a single JSON page")
+    parser.add_argument("--checkpoint", type=str, default=None, help="Checkpoint file for --parquet-dir")
 
     args = parser.parse_args(argv)
 
@@ -111,6 +150,19 @@ def main(argv: Optional[List[str]] = None) -> None:
         else:
             geometry = aoi
 
+    if args.parquet_dir:
+        summary = harvest_obis_occurrences(
+            args.parquet_dir,
+            taxonid=args.taxonid,
+            scientificname=args.scientificname,
+            start=args.start,
+            end=args.end,
+            checkpoint_path=args.checkpoint,
+            geometry=geometry,
+        )
+        print(f"Saved {summary['records_written']} records to {args.parquet_dir} ({summary['parts']} parts)")
+        return
+
     records = fetch_obis_occurrences(
         taxonid=args.taxonid,
         scientificname=args.scientificname,
@@ -0,0 +1,783 @@
+"""
+Harvester de ocorrências GBIF/OBIS
+Paginação completa em streaming (assíncrona, com pedidos em voo limitados),
+checkpoints retomáveis e escrita direta para (Geo)Parquet em row groups fixos
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import struct
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+GBIF_BASE_URL = "https://api.gbif.org/v1"
+OBIS_BASE_URL = "https://api.obis.org/v3"
+
+# Limites das APIs
+GBIF_MAX_PAGE_SIZE = 300
+GBIF_MAX_OFFSET = 100_000  # A pesquisa GBIF não pagina além de offset + limit = 100000
+OBIS_MAX_PAGE_SIZE = 10_000
+
+# ZEE angolana (inclui o domínio oceânico até 8.5°E)
+ANGOLA_EEZ_BOUNDS = {'north': -4.2, 'south': -18.2, 'east': 24.1, 'west': 8.5}
+
+# Separação entre partições adjacentes (os filtros de intervalo são inclusivos)
+PARTITION_EPSILON = 1e-7
+
+# Esquema normalizado das ocorrências (igual para GBIF e OBIS)
+OCCURRENCE_COLUMNS: List[Tuple[str, str]] = [
+    ('source', 'string'),
+    ('record_id', 'string'),
+    ('scientific_name', 'string'),
+    ('kingdom', 'string'),
+    ('phylum', 'string'),
+    ('class', 'string'),
+    ('order', 'string'),
+    ('family', 'string'),
+    ('genus', 'string'),
+    ('species', 'string'),
+    ('taxon_key', 'int64'),
+    ('latitude', 'float64'),
+    ('longitude', 'float64'),
+    ('depth', 'float64'),
+    ('event_date', 'string'),
+    ('year', 'int32'),
+    ('month', 'int32'),
+    ('day', 'int32'),
+    ('basis_of_record', 'string'),
+    ('dataset_id', 'string'),
+    ('institution_code', 'string'),
+    ('country', 'string'),
+]
+
+FetchFunction = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _to_str(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return None if value is None or value == '' else int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return None if value is None or value == '' else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_gbif_record(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Converter um resultado de /occurrence/search do GBIF para o esquema normalizado"""
+    return {
+        'source': 'gbif',
+        'record_id': _to_str(result.get('gbifID') or result.get('key')),
+        'scientific_name': result.get('scientificName'),
+        'kingdom': result.get('kingdom'),
+        'phylum': result.get('phylum'),
+        'class': result.get('class'),
+        'order': result.get('order'),
+        'family': result.get('family'),
+        'genus': result.get('genus'),
+        'species': result.get('species'),
+        'taxon_key': _to_int(result.get('taxonKey')),
+        'latitude': _to_float(result.get('decimalLatitude')),
+        'longitude': _to_float(result.get('decimalLongitude')),
+        'depth': _to_float(result.get('depth')),
+        'event_date': _to_str(result.get('eventDate')),
+        'year': _to_int(result.get('year')),
+        'month': _to_int(result.get('month')),
+        'day': _to_int(result.get('day')),
+        'basis_of_record': result.get('basisOfRecord'),
+        'dataset_id': _to_str(result.get('datasetKey')),
+        'institution_code': result.get('institutionCode'),
+        'country': result.get('countryCode') or result.get('country'),
+    }
+
+
+def normalize_obis_record(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Converter um resultado de /occurrence do OBIS para o esquema normalizado"""
+    depth = result.get('depth')
+    if depth is None:
+        depth = result.get('minimumDepthInMeters')
+    return {
+        'source': 'obis',
+        'record_id': _to_str(result.get('id')),
+        'scientific_name': result.get('scientificName'),
+        'kingdom': result.get('kingdom'),
+        'phylum': result.get('phylum'),
+        'class': result.get('class'),
+        'order': result.get('order'),
+        'family': result.get('family'),
+        'genus': result.get('genus'),
+        'species': result.get('species'),
+        'taxon_key': _to_int(result.get('aphiaID')),
+        'latitude': _to_float(result.get('decimalLatitude')),
+        'longitude': _to_float(result.get('decimalLongitude')),
+        'depth': _to_float(depth),
+        'event_date': _to_str(result.get('eventDate')),
+        'year': _to_int(result.get('date_year') or result.get('year')),
+        'month': _to_int(result.get('month')),
+        'day': _to_int(result.get('day')),
+        'basis_of_record': result.get('basisOfRecord'),
+        'dataset_id': _to_str(result.get('dataset_id')),
+        'institution_code': result.get('institutionCode'),
+        'country': result.get('country'),
+    }
+
+
+def _encode_params(params: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Parâmetros de query (listas → parâmetro repetido, ex. vários taxonKey)"""
+    encoded = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if isinstance(item, bool):
+                item = 'true' if item else 'false'
+            encoded.append((key, str(item)))
+    return encoded
+
+
+@dataclass
+class HarvestPartition:
+    """Subconjunto da consulta paginado de forma independente"""
+    partition_id: str
+    params: Dict[str, Any]
+    count: Optional[int] = None
+
+
+@dataclass
+class HarvestPage:
+    """Página normalizada; `positions` permite retomar a partir de qualquer registo"""
+    partition_id: str
+    records: List[Dict[str, Any]]
+    positions: List[Any]
+    last: bool = False
+
+
+# ----------------------------------------------------------------------
+# Fontes
+# ----------------------------------------------------------------------
+
+class OccurrenceSource:
+    """Fonte paginada de ocorrências (planeamento de partições + páginas por partição)"""
+
+    name = 'base'
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None,
+                 bounds: Optional[Dict[str, float]] = None,
+                 page_size: int = 300):
+        self.params = dict(params or {})
+        self.bounds = dict(bounds or ANGOLA_EEZ_BOUNDS)
+        self.page_size = page_size
+
+    def query_key(self) -> str:
+        """Identificador estável da consulta (um checkpoint só é retomado para a mesma consulta)"""
+        payload = json.dumps(
+            {'source': self.name, 'params': self.params, 'bounds': self.bounds}, sort_keys=True, default=str
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    async def plan(self, fetch: FetchFunction) -> List[HarvestPartition]:
+        raise NotImplementedError
+
+    def pages(self, fetch: FetchFunction, partition: HarvestPartition, position: Any,
+              max_in_flight: int) -> AsyncIterator[HarvestPage]:
+        raise NotImplementedError
+
+
+class GBIFOccurrenceSource(OccurrenceSource):
+    """
+    Ocorrências GBIF por offset/limit
+
+    A pesquisa GBIF só pagina até 100000 registos por consulta; o planeamento divide
+    a área em faixas de latitude (contagens com limit=0) até cada partição caber
+    nesse limite. Dentro de cada partição as páginas são pedidas em paralelo.
+    """
+
+    name = 'gbif'
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None,
+                 bounds: Optional[Dict[str, float]] = None,
+                 page_size: int = GBIF_MAX_PAGE_SIZE,
+                 max_split_depth: int = 12):
+        super().__init__(params, bounds, min(page_size, GBIF_MAX_PAGE_SIZE))
+        self.max_split_depth = max_split_depth
+        self.url = f"{GBIF_BASE_URL}/occurrence/search"
+
+    def _partition_params(self, south: float, north: float) -> Dict[str, Any]:
+        return {
+            'hasCoordinate': 'true',
+            'hasGeospatialIssue': 'false',
+            **self.params,
+            'decimalLatitude': f"{south:.7f},{north:.7f}",
+            'decimalLongitude': f"{self.bounds['west']},{self.bounds['east']}",
+        }
+
+    async def plan(self, fetch: FetchFunction) -> List[HarvestPartition]:
+        partitions: List[Tuple[float, HarvestPartition]] = []
+
+        async def split(south: float, north: float, depth: int):
+            params = self._partition_params(south, north)
+            data = await fetch(self.url, {**params, 'limit': 0})
+            count = int(data.get('count', 0))
+            if count == 0:
+                return
+            if count <= GBIF_MAX_OFFSET or depth >= self.max_split_depth:
+                if count > GBIF_MAX_OFFSET:
+                    logger.warning(f"⚠️ Partição GBIF {south:.4f}..{north:.4f} com {count} registos "
+                                   f"excede {GBIF_MAX_OFFSET}; apenas os primeiros serão obtidos")
+                partitions.append((south, HarvestPartition(f"lat_{south:.7f}_{north:.7f}", params, count)))
+                return
+            middle = (south + north) / 2
+            await asyncio.gather(
+                split(south, middle, depth + 1),
+                split(middle + PARTITION_EPSILON, north, depth + 1)
+            )
+
+        await split(self.bounds['south'], self.bounds['north'], 0)
+        return [partition for _, partition in sorted(partitions, key=lambda item: item[0])]
+
+    async def pages(self, fetch: FetchFunction, partition: HarvestPartition, position: Any,
+                    max_in_flight: int) -> AsyncIterator[HarvestPage]:
+        start = int(position or 0)
+        total = min(partition.count if partition.count is not None else GBIF_MAX_OFFSET, GBIF_MAX_OFFSET)
+        offsets = list(range(start, total, self.page_size))
+        if not offsets:
+            yield HarvestPage(partition.partition_id, [], [], last=True)
+            return
+
+        async def get(page_offset: int) -> Tuple[int, Dict[str, Any]]:
+            limit = min(self.page_size, total - page_offset)
+            data = await fetch(self.url, {**partition.params, 'offset': page_offset, 'limit': limit})
+            return page_offset, data
+
+        # Janela deslizante: até `max_in_flight` páginas em voo, emitidas por ordem de offset
+        pending = deque()
+        next_index = 0
+        try:
+            while next_index < len(offsets) and len(pending) < max_in_flight:
+                pending.append(asyncio.ensure_future(get(offsets[next_index])))
+                next_index += 1
+
+            while pending:
+                page_offset, data = await pending.popleft()
+                results = data.get('results', [])
+                end = bool(data.get('endOfRecords')) or not results
+
+                if not end and next_index < len(offsets):
+                    pending.append(asyncio.ensure_future(get(offsets[next_index])))
+                    next_index += 1
+
+                yield HarvestPage(
+                    partition.partition_id,
+                    [normalize_gbif_record(result) for result in results],
+                    list(range(page_offset + 1, page_offset + len(results) + 1)),
+                    last=end or not pending
+                )
+                if end:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class OBISOccurrenceSource(OccurrenceSource):
+    """
+    Ocorrências OBIS por cursor (`after` = último id recebido)
+
+    O cursor é sequencial, por isso a área é dividida numa grelha de tiles
+    (geometria WKT) paginados em paralelo.
+    """
+
+    name = 'obis'
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None,
+                 bounds: Optional[Dict[str, float]] = None,
+                 page_size: int = 5000,
+                 tiles: Tuple[int, int] = (4, 2)):
+        super().__init__(params, bounds, min(page_size, OBIS_MAX_PAGE_SIZE))
+        self.tiles = tiles
+        self.url = f"{OBIS_BASE_URL}/occurrence"
+
+    async def plan(self, fetch: FetchFunction) -> List[HarvestPartition]:
+        rows, cols = self.tiles
+        lat_step = (self.bounds['north'] - self.bounds['south']) / rows
+        lon_step = (self.bounds['east'] - self.bounds['west']) / cols
+
+        partitions = []
+        for row in range(rows):
+            for col in range(cols):
+                south = self.bounds['south'] + row * lat_step + (PARTITION_EPSILON if row else 0)
+                north = self.bounds['south'] + (row + 1) * lat_step
+                west = self.bounds['west'] + col * lon_step + (PARTITION_EPSILON if col else 0)
+                east = self.bounds['west'] + (col + 1) * lon_step
+                wkt = (f"POLYGON(({west:.7f} {south:.7f},{east:.7f} {south:.7f},{east:.7f} {north:.7f},"
+                       f"{west:.7f} {north:.7f},{west:.7f} {south:.7f}))")
+                partitions.append(HarvestPartition(f"tile_{row}_{col}", {**self.params, 'geometry': wkt}))
+        return partitions
+
+    async def pages(self, fetch: FetchFunction, partition: HarvestPartition, position: Any,
+                    max_in_flight: int) -> AsyncIterator[HarvestPage]:
+        after = position
+        while True:
+            params = {**partition.params, 'size': self.page_size}
+            if after:
+                params['after'] = after
+            data = await fetch(self.url, params)
+            results = data.get('results', []) if isinstance(data, dict) else data
+            positions = [result.get('id') for result in results]
+            last = len(results) < self.page_size or not positions[-1]
+
+            yield HarvestPage(
+                partition.partition_id,
+                [normalize_obis_record(result) for result in results],
+                positions,
+                last=last
+            )
+            if last:
+                break
+            after = positions[-1]
+
+
+# ----------------------------------------------------------------------
+# Checkpoint
+# ----------------------------------------------------------------------
+
+@dataclass
+class HarvestCheckpoint:
+    """Estado retomável de uma colheita (gravado atomicamente em JSON)"""
+    query_key: str
+    partitions: List[Dict[str, Any]] = field(default_factory=list)
+    positions: Dict[str, Any] = field(default_factory=dict)
+    done: List[str] = field(default_factory=list)
+    next_part: int = 0
+    records_written: int = 0
+    completed: bool = False
+    started_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    updated_at: Optional[str] = None
+    path: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: Optional[Path], query_key: str) -> 'HarvestCheckpoint':
+        if path is not None and Path(path).exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('query_key') == query_key:
+                state['path'] = str(path)
+                return cls(**state)
+            logger.warning(f"⚠️ Checkpoint {path} pertence a outra consulta; a recomeçar")
+        return cls(query_key=query_key, path=str(path) if path is not None else None)
+
+    def save(self):
+        if self.path is None:
+            return
+        self.updated_at = datetime.now().isoformat()
+        path = Path(self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = asdict(self)
+        state.pop('path')
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+
+# ----------------------------------------------------------------------
+# Sink (Geo)Parquet
+# ----------------------------------------------------------------------
+
+class ParquetOccurrenceSink:
+    """
+    Escreve ocorrências em ficheiros part-NNNNNN.parquet de `row_group_size` linhas
+
+    Cada parte é escrita num ficheiro temporário e renomeada, só depois o checkpoint
+    avança; partes sem checkpoint (interrupção) são descartadas ao retomar.
+    Com `geoparquet=True` inclui coluna `geometry` (WKB Point) e metadados `geo`.
+    Com `aoi` (GeoJSON) só são escritos os registos contidos na área de interesse.
+    """
+
+    def __init__(self, output_dir: Path, row_group_size: int = 50_000,
+                 geoparquet: bool = True, compression: str = 'zstd',
+                 aoi: Optional[Dict[str, Any]] = None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("pyarrow é necessário para o sink Parquet (pip install pyarrow)") from e
+
+        self._pa = pa
+        self._pq = pq
+        self.output_dir = Path(output_dir)
+        self.row_group_size = row_group_size
+        self.geoparquet = geoparquet
+        self.compression = compression
+        self.aoi = aoi
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        types = {'string': pa.string(), 'int32': pa.int32(), 'int64': pa.int64(), 'float64': pa.float64()}
+        self.fields = [pa.field(name, types[kind]) for name, kind in OCCURRENCE_COLUMNS]
+        if geoparquet:
+            self.fields.append(pa.field('geometry', pa.binary()))
+
+    def part_path(self, sequence: int) -> Path:
+        return self.output_dir / f"part-{sequence:06d}.parquet"
+
+    def discard_uncommitted(self, next_part: int) -> int:
+        """Remover partes escritas depois do último checkpoint"""
+        removed = 0
+        for path in self.output_dir.glob('part-*.parquet*'):
+            try:
+                sequence = int(path.name[5:11])
+            except ValueError:
+                continue
+            if sequence >= next_part or path.name.endswith('.tmp'):
+                path.unlink()
+                removed += 1
+        return removed
+
+    def _table(self, records: List[Dict[str, Any]]):
+        pa = self._pa
+        arrays = [
+            pa.array([record.get(name) for record in records], type=self.fields[index].type)
+            for index, (name, _) in enumerate(OCCURRENCE_COLUMNS)
+        ]
+        metadata = None
+
+        if self.geoparquet:
+            geometries = [
+                struct.pack('<BIdd', 1, 1, record['longitude'], record['latitude'])
+                if record.get('longitude') is not None and record.get('latitude') is not None else None
+                for record in records
+            ]
+            arrays.append(pa.array(geometries, type=pa.binary()))
+
+            lons = [record['longitude'] for record in records if record.get('longitude') is not None]
+            lats = [record['latitude'] for record in records if record.get('latitude') is not None]
+            column = {'encoding': 'WKB', 'geometry_types': ['Point']}
+            if lons and lats:
+                column['bbox'] = [min(lons), min(lats), max(lons), max(lats)]
+            metadata = {b'geo': json.dumps({
+                'version': '1.0.0',
+                'primary_column': 'geometry',
+                'columns': {'geometry': column}
+            }).encode('utf-8')}
+
+        return pa.Table.from_arrays(arrays, schema=pa.schema(self.fields, metadata=metadata))
+
+    def _within_aoi(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        import numpy as np
+        from ..process.biodiv import aoi_mask
+
+        lon = np.array([_to_float(record.get('longitude')) for record in records], dtype=float)
+        lat = np.array([_to_float(record.get('latitude')) for record in records], dtype=float)
+        return [records[index] for index in np.flatnonzero(aoi_mask(lon, lat, self.aoi))]
+
+    def write_part(self, sequence: int, records: List[Dict[str, Any]]) -> int:
+        """Escrever uma parte e devolver o número de linhas escritas (após o filtro da AOI)"""
+        if self.aoi is not None:
+            records = self._within_aoi(records)
+        path = self.part_path(sequence)
+        tmp_path = path.with_name(path.name + '.tmp')
+        self._pq.write_table(
+            self._table(records), tmp_path,
+            row_group_size=self.row_group_size, compression=self.compression
+        )
+        os.replace(tmp_path, path)
+        return len(records)
+
+
+# ----------------------------------------------------------------------
+# Harvester
+# ----------------------------------------------------------------------
+
+_DONE = object()
+
+
+class OccurrenceHarvester:
+    """
+    Colheita completa e retomável de uma fonte de ocorrências
+
+    - `max_in_flight` limita os pedidos HTTP simultâneos (todas as partições)
+    - `max_partitions` limita as partições paginadas em paralelo
+    - As páginas passam por uma fila limitada: a rede nunca se adianta mais de
+      `queue_size` páginas ao consumidor
+    """
+
+    def __init__(self, source: OccurrenceSource,
+                 checkpoint_path: Optional[str] = None,
+                 max_in_flight: int = 8,
+                 max_partitions: int = 4,
+                 queue_size: int = 32,
+                 max_retries: int = 5,
+                 backoff: float = 1.0,
+                 timeout: float = 60.0):
+        self.source = source
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.max_in_flight = max_in_flight
+        self.max_partitions = max_partitions
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.checkpoint = HarvestCheckpoint.load(self.checkpoint_path, source.query_key())
+        self.stats = {'requests': 0, 'retries': 0, 'pages': 0, 'records': 0}
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _fetch(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET JSON com retry/backoff (429 e 5xx) dentro do limite de pedidos em voo"""
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with self._session.get(url, params=_encode_params(params)) as response:
+                        if response.status in (429, 500, 502, 503, 504) and attempt < self.max_retries:
+                            retry_after = response.headers.get('Retry-After', '')
+                            delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+                            self.stats['retries'] += 1
+                            await asyncio.sleep(delay)
+                            continue
+                        response.raise_for_status()
+                        self.stats['requests'] += 1
+                        return await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if isinstance(e, aiohttp.ClientResponseError) and e.status not in (429, 500, 502, 503, 504):
+                        raise
+                    if attempt >= self.max_retries:
+                        raise
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+        raise RuntimeError(f"Falha ao obter {url}")
+
+    async def pages(self) -> AsyncIterator[HarvestPage]:
+        """Páginas normalizadas de todas as partições por concluir (retoma do checkpoint)"""
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        headers = {'User-Agent': 'BGAPP-Angola/1.0 occurrence-harvester', 'Accept': 'application/json'}
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=headers) as session:
+            self._session = session
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+            checkpoint = self.checkpoint
+            if not checkpoint.partitions:
+                partitions = await self.source.plan(self._fetch)
+                checkpoint.partitions = [asdict(partition) for partition in partitions]
+                checkpoint.save()
+                logger.info(f"🗺️ {self.source.name}: {len(partitions)} partições planeadas")
+
+            done = set(checkpoint.done)
+            todo = [HarvestPartition(**partition) for partition in checkpoint.partitions
+                    if partition['partition_id'] not in done]
+
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+            partition_slots = asyncio.Semaphore(self.max_partitions)
+
+            async def produce(partition: HarvestPartition):
+                async with partition_slots:
+                    position = checkpoint.positions.get(partition.partition_id)
+                    async for page in self.source.pages(self._fetch, partition, position, self.max_in_flight):
+                        await queue.put(page)
+
+            async def produce_all():
+                try:
+                    await asyncio.gather(*(produce(partition) for partition in todo))
+                except Exception as e:
+                    await queue.put(e)
+                    return
+                await queue.put(_DONE)
+
+            producer = asyncio.ensure_future(produce_all())
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    self.stats['pages'] += 1
+                    self.stats['records'] += len(item.records)
+                    yield item
+            finally:
+                producer.cancel()
+                try:
+                    await producer
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+    async def iter_records(self) -> AsyncIterator[Dict[str, Any]]:
+        """Registos normalizados, um a um, à medida que as páginas chegam"""
+        async for page in self.pages():
+            for record in page.records:
+                yield record
+
+    async def harvest_to_parquet(self, output_dir: str, row_group_size: int = 50_000,
+                                 geoparquet: bool = True,
+                                 aoi: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Colher para um diretório (Geo)Parquet, com checkpoint a cada row group escrito
+
+        Com `aoi` os registos fora da área são descartados à escrita; o checkpoint avança
+        sobre todos os registos colhidos, pelo que a retoma não os volta a pedir
+
+        Returns:
+            Resumo da colheita (registos, partes, pedidos)
+        """
+        checkpoint = self.checkpoint
+        sink = ParquetOccurrenceSink(Path(output_dir), row_group_size, geoparquet, aoi=aoi)
+        discarded = sink.discard_uncommitted(checkpoint.next_part)
+        if discarded:
+            logger.info(f"🧹 {discarded} partes sem checkpoint descartadas")
+        if checkpoint.completed:
+            logger.info("✅ Colheita já concluída segundo o checkpoint")
+            return self._summary(output_dir)
+
+        buffer: List[Dict[str, Any]] = []
+        owners: List[Tuple[str, Any]] = []
+        buffered = Counter()
+        finished: set = set()
+
+        def mark_done(partition_id: str):
+            if partition_id not in checkpoint.done:
+                checkpoint.done.append(partition_id)
+
+        def commit(count: int):
+            written = sink.write_part(checkpoint.next_part, buffer[:count])
+            for partition_id, position in owners[:count]:
+                checkpoint.positions[partition_id] = position
+                buffered[partition_id] -= 1
+            del buffer[:count]
+            del owners[:count]
+
+            for partition_id in finished:
+                if buffered[partition_id] == 0:
+                    mark_done(partition_id)
+            checkpoint.next_part += 1
+            checkpoint.records_written += written
+            checkpoint.save()
+
+        async for page in self.pages():
+            for record, position in zip(page.records, page.positions):
+                buffer.append(record)
+                owners.append((page.partition_id, position))
+                buffered[page.partition_id] += 1
+                if len(buffer) >= row_group_size:
+                    commit(row_group_size)
+
+            if page.last:
+                finished.add(page.partition_id)
+                if buffered[page.partition_id] == 0:
+                    mark_done(page.partition_id)
+                    checkpoint.save()
+
+        if buffer:
+            commit(len(buffer))
+
+        checkpoint.completed = True
+        checkpoint.save()
+        return self._summary(output_dir)
+
+    def _summary(self, output_dir: str) -> Dict[str, Any]:
+        return {
+            'source': self.source.name,
+            'output_dir': str(output_dir),
+            'records_written': self.checkpoint.records_written,
+            'parts': self.checkpoint.next_part,
+            'partitions': len(self.checkpoint.partitions),
+            'partitions_done': len(self.checkpoint.done),
+            'completed': self.checkpoint.completed,
+            **self.stats
+        }
+
+
+def create_source(source: str, params: Optional[Dict[str, Any]] = None,
+                  bounds: Optional[Dict[str, float]] = None, **kwargs) -> OccurrenceSource:
+    """Criar fonte 'gbif' ou 'obis'"""
+    if source == 'gbif':
+        return GBIFOccurrenceSource(params, bounds, **kwargs)
+    if source == 'obis':
+        return OBISOccurrenceSource(params, bounds, **kwargs)
+    raise ValueError(f"Fonte não suportada: {source}")
+
+
+def harvest_occurrences(source: str, output_dir: str,
+                        params: Optional[Dict[str, Any]] = None,
+                        bounds: Optional[Dict[str, float]] = None,
+                        checkpoint_path: Optional[str] = None,
+                        row_group_size: int = 50_000,
+                        max_in_flight: int = 8,
+                        geoparquet: bool = True,
+                        aoi: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Colheita síncrona completa para (Geo)Parquet (checkpoint por omissão no diretório de saída)"""
+    checkpoint_path = checkpoint_path or str(Path(output_dir) / '_checkpoint.json')
+    harvester = OccurrenceHarvester(
+        create_source(source, params, bounds), checkpoint_path, max_in_flight=max_in_flight
+    )
+    return asyncio.run(harvester.harvest_to_parquet(output_dir, row_group_size, geoparquet, aoi))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Colheita completa de ocorrências GBIF/OBIS para GeoParquet")
+    parser.add_argument("--source", choices=['gbif', 'obis'], default='gbif')
+    parser.add_argument("--output-dir", type=str, required=True)
+    parser.add_argument("--checkpoint", type=str, default=None)
+    parser.add_argument("--taxon-key", type=int, default=None, help="taxonKey (GBIF) ou taxonid (OBIS)")
+    parser.add_argument("--scientific-name", type=str, default=None)
+    parser.add_argument("--start", type=str, default=None)
+    parser.add_argument("--end", type=str, default=None)
+    parser.add_argument("--row-group-size", type=int, default=50_000)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--no-geometry", action='store_true', help="Parquet simples, sem coluna geometry")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    params: Dict[str, Any] = {}
+    if args.source == 'gbif':
+        if args.taxon_key is not None:
+            params['taxonKey'] = args.taxon_key
+        if args.scientific_name:
+            params['scientificName'] = args.scientific_name
+        if args.start and args.end:
+            params['eventDate'] = f"{args.start},{args.end}"
+    else:
+        if args.taxon_key is not None:
+            params['taxonid'] = args.taxon_key
+        if args.scientific_name:
+            params['scientificname'] = args.scientific_name
+        if args.start:
+            params['startdate'] = args.start
+        if args.end:
+            params['enddate'] = args.end
+
+    summary = harvest_occurrences(
+        args.source, args.output_dir, params,
+        checkpoint_path=args.checkpoint,
+        row_group_size=args.row_group_size,
+        max_in_flight=args.max_in_flight,
+        geoparquet=not args.no_geometry
+    )
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Micro-batching de previsões ML BGAPP
+Agrupa pedidos concorrentes durante alguns milissegundos e avalia-os numa única
+chamada vetorizada (MLModelManager.predict_batch) num pool de workers
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+
+from .models import MLModelManager, PredictionResult
+
+
+@dataclass
+class _PendingBatch:
+    """Pedidos acumulados para um tipo de modelo"""
+    inputs: List[Dict[str, Any]] = field(default_factory=list)
+    futures: List[asyncio.Future] = field(default_factory=list)
+    enqueued_at: List[float] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatchPredictor:
+    """
+    Servidor de previsões com micro-batching
+
+    - Pedidos individuais são agrupados por tipo de modelo até `max_batch_size`
+      ou até passarem `max_wait_ms` desde o primeiro pedido do lote
+    - Cada lote corre num ThreadPoolExecutor: a inferência sklearn (que liberta
+      o GIL nas árvores) não bloqueia o event loop do FastAPI
+    - `max_concurrent_batches` limita os lotes em execução simultânea
+    - Se o lote falhar, os pedidos são repetidos um a um e só o pedido inválido
+      recebe a exceção
+    """
+
+    def __init__(self,
+                 manager: MLModelManager,
+                 max_batch_size: int = 256,
+                 max_wait_ms: float = 5.0,
+                 max_workers: int = 4,
+                 max_concurrent_batches: Optional[int] = None,
+                 latency_window: int = 10000):
+        self.manager = manager
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_workers = max_workers
+        self.max_concurrent_batches = max_concurrent_batches or max_workers
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, _PendingBatch] = {}
+        self._tasks: set = set()
+
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._batch_sizes: Deque[int] = deque(maxlen=latency_window)
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'direct_batches': 0,
+            'errors': 0,
+            'batch_retries': 0,
+            'rows_predicted': 0,
+            'inference_seconds': 0.0
+        }
+
+    # ------------------------------------------------------------------
+    # Pool de workers
+    # ------------------------------------------------------------------
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="ml-predict"
+            )
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Criado no loop em execução (evita associar o semáforo a outro loop)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+        return self._semaphore
+
+    async def _run_batch(self, model_type: str, inputs: Any, function: Optional[Any] = None) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        async with self._get_semaphore():
+            started = time.perf_counter()
+            try:
+                return await loop.run_in_executor(
+                    self._get_executor(), function or self.manager.predict_batch, model_type, inputs
+                )
+            finally:
+                self.stats['inference_seconds'] += time.perf_counter() - started
+
+    def _predict_each(self, model_type: str, inputs: List[Dict[str, Any]]) -> List[Any]:
+        """Avaliar linha a linha: devolve o resultado ou a exceção de cada pedido"""
+        outcomes: List[Any] = []
+        for input_data in inputs:
+            try:
+                outcomes.append(self.manager.predict_batch(model_type, [input_data])[0])
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    async def predict(self, model_type: str, input_data: Dict[str, Any]) -> PredictionResult:
+        """Previsão individual, agrupada com outros pedidos concorrentes"""
+        if model_type not in self.manager.models:
+            raise ValueError(f"Modelo {model_type} não encontrado")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        pending = self._pending.get(model_type)
+        if pending is None:
+            pending = _PendingBatch()
+            self._pending[model_type] = pending
+
+        pending.inputs.append(input_data)
+        pending.futures.append(future)
+        pending.enqueued_at.append(time.perf_counter())
+        self.stats['requests'] += 1
+
+        if len(pending.inputs) >= self.max_batch_size:
+            self._flush(model_type)
+        elif pending.timer is None:
+            pending.timer = loop.call_later(self.max_wait, self._flush, model_type)
+
+        return await future
+
+    async def predict_many(self, model_type: str, inputs: Any) -> List[PredictionResult]:
+        """Lote já formado (lista de dicts, DataFrame ou array): vai direto ao pool"""
+        started = time.perf_counter()
+        results = await self._run_batch(model_type, inputs)
+        self.stats['direct_batches'] += 1
+        self.stats['rows_predicted'] += len(results)
+        self._latencies.append(time.perf_counter() - started)
+        self._batch_sizes.append(len(results))
+        return results
+
+    def _flush(self, model_type: str):
+        """Retirar o lote pendente e agendar a sua avaliação"""
+        pending = self._pending.pop(model_type, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+
+        task = asyncio.get_running_loop().create_task(self._execute(model_type, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, model_type: str, pending: _PendingBatch):
+        try:
+            outcomes = await self._run_batch(model_type, pending.inputs)
+        except Exception as e:
+            if len(pending.inputs) == 1:
+                outcomes = [e]
+            else:
+                # Um pedido inválido não deve fazer falhar os restantes do lote:
+                # repetir linha a linha para isolar a exceção no futuro culpado
+                self.stats['batch_retries'] += 1
+                try:
+                    outcomes = await self._run_batch(model_type, pending.inputs, self._predict_each)
+                except Exception as retry_error:
+                    outcomes = [retry_error] * len(pending.inputs)
+
+        finished = time.perf_counter()
+        self.stats['batches'] += 1
+        self._batch_sizes.append(len(outcomes))
+
+        for future, enqueued_at, outcome in zip(pending.futures, pending.enqueued_at, outcomes):
+            self._latencies.append(finished - enqueued_at)
+            failed = isinstance(outcome, Exception)
+            self.stats['errors' if failed else 'rows_predicted'] += 1
+            # Pedidos cancelados (cliente desligou) são ignorados
+            if future.done():
+                continue
+            if failed:
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def flush_all(self):
+        """Avaliar imediatamente todos os lotes pendentes e esperar por eles"""
+        for model_type in list(self._pending.keys()):
+            self._flush(model_type)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def shutdown(self):
+        """Terminar lotes pendentes e o pool de workers"""
+        await self.flush_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas de throughput e latência (ms)"""
+        latencies = np.asarray(self._latencies) * 1000.0
+        batch_sizes = np.asarray(self._batch_sizes)
+        stats = {
+            **self.stats,
+            'inference_seconds': round(self.stats['inference_seconds'], 4),
+            'pending_requests': sum(len(p.inputs) for p in self._pending.values()),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'max_workers': self.max_workers,
+            'mean_batch_size': float(batch_sizes.mean()) if batch_sizes.size else 0.0
+        }
+        if latencies.size:
+            stats['latency_ms'] = {
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max())
+            }
+        return stats
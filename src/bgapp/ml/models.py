@@ -10,7 +10,7 @@ import pickle
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Union
 from dataclasses import dataclass
 from enum import Enum
 
@@ -402,49 +402,89 @@ class MLModelManager:
 
     def predict(self, model_type: str, input_data: Dict[str, Any]) -> PredictionResult:
         """Fazer previsão usando modelo específico"""
+        return self.predict_batch(model_type, [input_data])[0]
+
+    def _prepare_batch(self, model_info: Dict, inputs: Union[List[Dict[str, Any]], pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """Converter entradas (lista de dicts, DataFrame ou array) numa matriz (n, features)"""
+        features = model_info['features']
+        
+        if isinstance(inputs, pd.DataFrame):
+            return inputs.reindex(columns=features).fillna(0).to_numpy(dtype=float)
         
+        if isinstance(inputs, np.ndarray):
+            X = np.asarray(inputs, dtype=float)
+            if X.ndim == 1:
+                X = X.reshape(1, -1)
+            if X.shape[1] != len(features):
+                raise ValueError(f"Esperadas {len(features)} features ({', '.join(features)}), recebidas {X.shape[1]}")
+            return X
+        
+        X = np.empty((len(inputs), len(features)))
+        for i, row in enumerate(inputs):
+            X[i] = [row.get(f, 0) for f in features]
+        return X
+
+    def predict_array(self, model_type: str,
+                      inputs: Union[List[Dict[str, Any]], pd.DataFrame, np.ndarray]) -> Dict[str, Any]:
+        """
+        Previsão vetorizada para um lote de entradas
+        
+        Returns:
+            Dicionário com 'predictions' (n,), 'confidence' (n,) e, para o
+            classificador de espécies, 'probabilities' (n, classes) e 'classes'
+        """
         if model_type not in self.models:
             raise ValueError(f"Modelo {model_type} não encontrado")
         
+        model_info = self.models[model_type]
+        scaler = self.scalers.get(model_type)
+        
+        # Preparar dados de entrada
+        X = self._prepare_batch(model_info, inputs)
+        n_rows = len(X)
+        if n_rows == 0:
+            return {'predictions': np.empty(0), 'confidence': np.empty(0)}
+        
+        if scaler:
+            X = scaler.transform(X)
+        
+        # Fazer previsão (uma chamada por modelo para todo o lote)
+        if model_type == ModelType.BIODIVERSITY_PREDICTOR:
+            predictions = self._ensemble_predict(
+                model_info['models'], 
+                model_info['weights'], 
+                X
+            )
+            confidence = np.minimum(95.0 + np.random.rand(n_rows) * 5, 100.0)  # Simulado
+            return {'predictions': predictions, 'confidence': confidence}
+        
+        if model_type == ModelType.SPECIES_CLASSIFIER:
+            model = model_info['model']
+            
+            # Probabilidades (a classe prevista é a de maior probabilidade)
+            probabilities = model.predict_proba(X)
+            prediction_idx = model.classes_[np.argmax(probabilities, axis=1)]
+            return {
+                'predictions': np.asarray(model_info['classes'])[prediction_idx],
+                'confidence': probabilities.max(axis=1) * 100,
+                'probabilities': probabilities,
+                'classes': model_info['classes']
+            }
+        
+        model = model_info['model']
+        predictions = np.asarray(model.predict(X), dtype=float).ravel()
+        confidence = np.minimum(95.0 + np.random.rand(n_rows) * 5, 100.0)  # Simulado
+        return {'predictions': predictions, 'confidence': confidence}
+
+    def predict_batch(self, model_type: str,
+                      inputs: Union[List[Dict[str, Any]], pd.DataFrame, np.ndarray]) -> List[PredictionResult]:
+        """Fazer previsões para um lote de entradas numa única avaliação vetorizada"""
         try:
+            batch = self.predict_array(model_type, inputs)
             model_info = self.models[model_type]
-            scaler = self.scalers.get(model_type)
-            
-            # Preparar dados de entrada
             features = model_info['features']
-            X = np.array([[input_data.get(f, 0) for f in features]])
-            
-            if scaler:
-                X = scaler.transform(X)
-            
-            # Fazer previsão
-            if model_type == ModelType.BIODIVERSITY_PREDICTOR:
-                prediction = self._ensemble_predict(
-                    model_info['models'], 
-                    model_info['weights'], 
-                    X
-                )[0]
-                confidence = min(95.0 + np.random.rand() * 5, 100.0)  # Simulado
-                
-            elif model_type == ModelType.SPECIES_CLASSIFIER:
-                model = model_info['model']
-                prediction_idx = model.predict(X)[0]
-                prediction = model_info['classes'][prediction_idx]
-                
-                # Probabilidades
-                probabilities = model.predict_proba(X)[0]
-                prob_dict = {
-                    cls: float(prob) for cls, prob in 
-                    zip(model_info['classes'], probabilities)
-                }
-                confidence = max(probabilities) * 100
-                
-            else:
-                model = model_info['model']
-                prediction = float(model.predict(X)[0])
-                confidence = min(95.0 + np.random.rand() * 5, 100.0)  # Simulado
             
-            # Feature importance (se disponível)
+            # Feature importance (se disponível) é igual para todo o lote
             feature_importance = None
             if hasattr(model_info.get('model'), 'feature_importances_'):
                 feature_importance = {
@@ -452,17 +492,33 @@ class MLModelManager:
                     zip(features, model_info['model'].feature_importances_)
                 }
             
-            result = PredictionResult(
-                prediction=prediction,
-                confidence=confidence,
-                probability_distribution=prob_dict if model_type == ModelType.SPECIES_CLASSIFIER else None,
-                feature_importance=feature_importance,
-                uncertainty_bounds=None,  # Seria calculado com modelos probabilísticos
-                model_version="1.0",
-                timestamp=datetime.now()
-            )
-            
-            return result
+            probabilities = batch.get('probabilities')
+            classes = batch.get('classes')
+            timestamp = datetime.now()
+            
+            results = []
+            for i, prediction in enumerate(batch['predictions']):
+                prob_dict = None
+                if probabilities is not None:
+                    prob_dict = {
+                        cls: float(prob) for cls, prob in 
+                        zip(classes, probabilities[i])
+                    }
+                    prediction = str(prediction)
+                else:
+                    prediction = float(prediction)
+                
+                results.append(PredictionResult(
+                    prediction=prediction,
+                    confidence=float(batch['confidence'][i]),
+                    probability_distribution=prob_dict,
+                    feature_importance=feature_importance,
+                    uncertainty_bounds=None,  # Seria calculado com modelos probabilísticos
+                    model_version="1.0",
+                    timestamp=timestamp
+                ))
+            
+            return results
             
         except Exception as e:
             print(f"❌ Erro fazendo previsão: {e}")
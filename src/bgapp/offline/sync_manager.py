@@ -3,6 +3,7 @@ Sistema de Sincronização Offline para BGAPP Angola
 Gerencia coleta de dados em áreas remotas e sincronização posterior
 """
 
+import gzip
 import json
 import sqlite3
 import hashlib
@@ -62,6 +63,9 @@ class OfflineSyncManager:
         # Configurações
         self.max_sync_attempts = 5
         self.sync_batch_size = 50
+        self.bulk_batch_size = 500  # Registos por pedido NDJSON no modo bulk
+        self.bulk_endpoint = "/sync/bulk"  # POST {bulk_endpoint}/{data_type}
+        self.bulk_supported: Optional[bool] = None  # Descoberto no primeiro pedido bulk
         self.retry_delay_hours = [1, 2, 6, 24, 72]  # Backoff exponencial
         
         self._init_database()
@@ -99,8 +103,22 @@ class OfflineSyncManager:
                 )
             """)
             
+            # Cursores de sincronização bulk (retomar sincronizações interrompidas)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_cursors (
+                    data_type TEXT PRIMARY KEY,
+                    last_timestamp TEXT NOT NULL,
+                    last_id TEXT NOT NULL,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             # Índices para performance
             conn.execute("CREATE INDEX IF NOT EXISTS idx_sync_status ON offline_records (sync_status)")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bulk_keyset
+                ON offline_records (data_type, sync_status, timestamp, id)
+            """)
             conn.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON offline_records (timestamp)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_hash ON offline_records (hash)")
     
@@ -121,7 +139,11 @@ class OfflineSyncManager:
                     record.sync_attempts, record.last_sync_attempt, record.hash
                 ))
                 
-                self._log_action(record.id, "store", "success", "Registo armazenado localmente")
+                # Mesma conexão: uma segunda conexão bloquearia na transação ainda aberta
+                conn.execute("""
+                    INSERT INTO sync_log (record_id, action, status, message)
+                    VALUES (?, ?, ?, ?)
+                """, (record.id, "store", "success", "Registo armazenado localmente"))
                 return True
                 
         except sqlite3.IntegrityError as e:
@@ -170,14 +192,35 @@ class OfflineSyncManager:
     
     def update_sync_status(self, record_id: str, status: SyncStatus, message: str = ""):
         """Atualizar status de sincronização"""
+        self.update_sync_statuses([(record_id, status, message)])
+    
+    def update_sync_statuses(self, updates: List[Tuple[str, SyncStatus, str]],
+                             cursor: Optional[Tuple[str, str, str]] = None):
+        """
+        Atualizar status de vários registos numa única transação
+        
+        Args:
+            updates: Lista de (record_id, status, mensagem)
+            cursor: (data_type, timestamp, id) do último registo confirmado, gravado na mesma transação
+        """
+        now = datetime.now().isoformat()
         with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
+            conn.executemany("""
                 UPDATE offline_records 
                 SET sync_status = ?, last_sync_attempt = ?, sync_attempts = sync_attempts + 1
                 WHERE id = ?
-            """, (status.value, datetime.now().isoformat(), record_id))
+            """, [(status.value, now, record_id) for record_id, status, _ in updates])
             
-            self._log_action(record_id, "sync_update", status.value, message)
+            conn.executemany("""
+                INSERT INTO sync_log (record_id, action, status, message)
+                VALUES (?, ?, ?, ?)
+            """, [(record_id, "sync_update", status.value, message) for record_id, status, message in updates])
+            
+            if cursor:
+                conn.execute("""
+                    INSERT OR REPLACE INTO sync_cursors (data_type, last_timestamp, last_id, updated_at)
+                    VALUES (?, ?, ?, ?)
+                """, (*cursor, now))
     
     def _log_action(self, record_id: str, action: str, status: str, message: str):
         """Registar ação no log"""
@@ -187,24 +230,75 @@ class OfflineSyncManager:
                 VALUES (?, ?, ?, ?)
             """, (record_id, action, status, message))
     
+    def get_sync_cursor(self, data_type: str) -> Optional[Tuple[str, str]]:
+        """Obter cursor (timestamp, id) da última sincronização bulk confirmada"""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT last_timestamp, last_id FROM sync_cursors WHERE data_type = ?", (data_type,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+    
+    def reset_sync_cursor(self, data_type: str):
+        """Remover cursor (a próxima passagem começa do registo mais antigo)"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM sync_cursors WHERE data_type = ?", (data_type,))
+    
+    def _get_pending_data_types(self) -> List[str]:
+        with sqlite3.connect(self.db_path) as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT DISTINCT data_type FROM offline_records WHERE sync_status = 'pending'"
+            )]
+    
+    def _get_pending_page(self, data_type: str, after: Optional[Tuple[str, str]],
+                          limit: int) -> List[OfflineRecord]:
+        """Página de registos pendentes de um tipo, ordenada por (timestamp, id) após o cursor"""
+        query = """
+            SELECT id, timestamp, data_type, content, latitude, longitude,
+                   collector_id, device_id, sync_status, sync_attempts,
+                   last_sync_attempt, hash
+            FROM offline_records
+            WHERE sync_status = 'pending' AND data_type = ?
+        """
+        params: List[Any] = [data_type]
+        if after:
+            query += " AND (timestamp > ? OR (timestamp = ? AND id > ?))"
+            params.extend([after[0], after[0], after[1]])
+        query += " ORDER BY timestamp ASC, id ASC LIMIT ?"
+        params.append(limit)
+        
+        with sqlite3.connect(self.db_path) as conn:
+            return [
+                OfflineRecord(
+                    id=row[0], timestamp=row[1], data_type=row[2], content=json.loads(row[3]),
+                    location=(row[4], row[5]), collector_id=row[6], device_id=row[7],
+                    sync_status=row[8], sync_attempts=row[9], last_sync_attempt=row[10], hash=row[11]
+                )
+                for row in conn.execute(query, params)
+            ]
+    
+    @staticmethod
+    def _to_sync_payload(record: OfflineRecord) -> Dict[str, Any]:
+        """Preparar dados de um registo para envio"""
+        return {
+            'id': record.id,
+            'timestamp': record.timestamp,
+            'data_type': record.data_type,
+            'content': record.content,
+            'location': {
+                'latitude': record.location[0],
+                'longitude': record.location[1]
+            },
+            'collector_id': record.collector_id,
+            'device_id': record.device_id,
+            'hash': record.hash,
+            'source': 'offline_sync'
+        }
+    
     async def sync_single_record(self, record: OfflineRecord, session: aiohttp.ClientSession) -> bool:
         """Sincronizar um registo individual"""
         try:
             # Preparar dados para envio
-            sync_data = {
-                'id': record.id,
-                'timestamp': record.timestamp,
-                'data_type': record.data_type,
-                'content': record.content,
-                'location': {
-                    'latitude': record.location[0],
-                    'longitude': record.location[1]
-                },
-                'collector_id': record.collector_id,
-                'device_id': record.device_id,
-                'hash': record.hash,
-                'source': 'offline_sync'
-            }
+            sync_data = self._to_sync_payload(record)
             
             # Determinar endpoint baseado no tipo de dados
             endpoint_map = {
@@ -230,6 +324,10 @@ class OfflineSyncManager:
                     self.update_sync_status(record.id, SyncStatus.ERROR, error_msg)
                     return False
                     
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            # Falha de transporte (sem rede, timeout): o registo fica pendente
+            self._log_action(record.id, "sync_attempt", "transport_error", str(e) or type(e).__name__)
+            raise
         except Exception as e:
             error_msg = f"Erro de sincronização: {str(e)}"
             self.update_sync_status(record.id, SyncStatus.ERROR, error_msg)
@@ -237,16 +335,21 @@ class OfflineSyncManager:
             return False
     
     async def sync_batch(self, max_records: int = None) -> Dict[str, int]:
-        """Sincronizar lote de registos"""
+        """
+        Sincronizar lote de registos
+        
+        Falhas de transporte (sem ligação, timeout) não alteram o status do
+        registo e são contadas em 'transport_error', não em 'error'.
+        """
         if max_records is None:
             max_records = self.sync_batch_size
         
         pending_records = self.get_pending_records(max_records)
         
         if not pending_records:
-            return {'total': 0, 'success': 0, 'error': 0, 'conflict': 0}
+            return {'total': 0, 'success': 0, 'error': 0, 'conflict': 0, 'transport_error': 0}
         
-        results = {'total': len(pending_records), 'success': 0, 'error': 0, 'conflict': 0}
+        results = {'total': len(pending_records), 'success': 0, 'error': 0, 'conflict': 0, 'transport_error': 0}
         
         # Criar sessão HTTP assíncrona
         timeout = aiohttp.ClientTimeout(total=30)
@@ -265,7 +368,9 @@ class OfflineSyncManager:
             
             # Contar resultados
             for result in sync_results:
-                if isinstance(result, Exception):
+                if isinstance(result, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+                    results['transport_error'] += 1
+                elif isinstance(result, Exception):
                     results['error'] += 1
                 elif result:
                     results['success'] += 1
@@ -275,6 +380,138 @@ class OfflineSyncManager:
         self.logger.info(f"Sincronização concluída: {results}")
         return results
     
+    async def sync_all_individually(self, max_records: Optional[int] = None) -> Dict[str, int]:
+        """
+        Sincronizar registo a registo, em lotes de sync_batch_size, até não
+        restarem pendentes (ou até max_records); pára à primeira falha de transporte
+        """
+        results = {'total': 0, 'success': 0, 'error': 0, 'conflict': 0, 'transport_error': 0}
+        while max_records is None or results['total'] < max_records:
+            limit = self.sync_batch_size if max_records is None else min(
+                self.sync_batch_size, max_records - results['total']
+            )
+            batch = await self.sync_batch(limit)
+            for key in results:
+                results[key] += batch[key]
+            # Registos com falha de transporte continuam pendentes: não insistir agora
+            if batch['total'] == 0 or batch['transport_error']:
+                break
+        return results
+    
+    async def _post_bulk(self, session: aiohttp.ClientSession, data_type: str,
+                         records: List[OfflineRecord]) -> Optional[Dict[str, Tuple[SyncStatus, str]]]:
+        """
+        Enviar um lote NDJSON comprimido (gzip) ao endpoint bulk.
+        
+        O servidor responde com {"results": [{"id": ..., "status": "created|exists|conflict|error",
+        "message": ...}]}. Retorna None se o servidor não suportar o modo bulk.
+        """
+        body = gzip.compress(
+            "".join(json.dumps(self._to_sync_payload(r), ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        )
+        url = f"{self.api_base_url}{self.bulk_endpoint}/{data_type}"
+        headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+        
+        async with session.post(url, data=body, headers=headers) as response:
+            if response.status in (404, 405, 501):
+                return None
+            if response.status not in (200, 201, 207):
+                error_msg = f"Erro HTTP {response.status}: {await response.text()}"
+                return {r.id: (SyncStatus.ERROR, error_msg) for r in records}
+            payload = await response.json()
+        
+        status_map = {
+            'created': SyncStatus.SYNCED,
+            'synced': SyncStatus.SYNCED,
+            'ok': SyncStatus.SYNCED,
+            'exists': SyncStatus.CONFLICT,
+            'conflict': SyncStatus.CONFLICT
+        }
+        outcome = {
+            r.id: (SyncStatus.ERROR, "Registo ausente na resposta bulk") for r in records
+        }
+        for item in payload.get('results', []):
+            if item.get('id') in outcome:
+                status = status_map.get(str(item.get('status', '')).lower(), SyncStatus.ERROR)
+                outcome[item['id']] = (status, item.get('message') or item.get('status', ''))
+        return outcome
+    
+    async def sync_bulk(self, max_records: Optional[int] = None,
+                        batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Sincronizar registos pendentes em lotes NDJSON por data_type.
+        
+        Cada lote confirmado atualiza os status e avança o cursor numa única transação,
+        por isso uma sincronização interrompida retoma a partir do último lote confirmado.
+        Se o servidor não tiver endpoint bulk (404/405/501), recorre a
+        sync_all_individually para todos os pendentes e não volta a tentar o bulk.
+        Falhas de transporte deixam os registos pendentes e contam em 'transport_error'.
+        """
+        batch_size = batch_size or self.bulk_batch_size
+        results = {'total': 0, 'success': 0, 'error': 0, 'conflict': 0, 'transport_error': 0, 'batches': 0}
+        
+        if self.bulk_supported is False:
+            return await self._sync_bulk_fallback(results, max_records)
+        
+        timeout = aiohttp.ClientTimeout(total=120)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            for data_type in self._get_pending_data_types():
+                cursor = self.get_sync_cursor(data_type)
+                
+                while max_records is None or results['total'] < max_records:
+                    limit = batch_size if max_records is None else min(batch_size, max_records - results['total'])
+                    records = self._get_pending_page(data_type, cursor, limit)
+                    if not records:
+                        # Passagem completa: a próxima começa do início (apanha registos tardios)
+                        self.reset_sync_cursor(data_type)
+                        break
+                    
+                    try:
+                        outcome = await self._post_bulk(session, data_type, records)
+                    except Exception as e:
+                        # Sem ligação (ou resposta inválida): manter pendentes e cursor para retomar mais tarde
+                        self.logger.error(f"Erro na sincronização bulk ({data_type}): {e}")
+                        transport = isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+                        results['transport_error' if transport else 'error'] += len(records)
+                        results['total'] += len(records)
+                        self.logger.info(f"Sincronização bulk interrompida: {results}")
+                        return results
+                    
+                    if outcome is None:
+                        self.logger.info("Endpoint bulk indisponível - a usar sincronização individual")
+                        self.bulk_supported = False
+                        return await self._sync_bulk_fallback(results, max_records)
+                    
+                    self.bulk_supported = True
+                    last = records[-1]
+                    cursor = (last.timestamp, last.id)
+                    self.update_sync_statuses(
+                        [(record_id, status, message) for record_id, (status, message) in outcome.items()],
+                        cursor=(data_type, *cursor)
+                    )
+                    
+                    results['batches'] += 1
+                    results['total'] += len(records)
+                    for status, _ in outcome.values():
+                        if status == SyncStatus.SYNCED:
+                            results['success'] += 1
+                        elif status == SyncStatus.CONFLICT:
+                            results['conflict'] += 1
+                        else:
+                            results['error'] += 1
+        
+        self.logger.info(f"Sincronização bulk concluída: {results}")
+        return results
+    
+    async def _sync_bulk_fallback(self, results: Dict[str, int],
+                                  max_records: Optional[int]) -> Dict[str, int]:
+        remaining = None if max_records is None else max_records - results['total']
+        fallback = await self.sync_all_individually(remaining)
+        for key, value in fallback.items():
+            results[key] += value
+        self.logger.info(f"Sincronização individual concluída: {results}")
+        return results
+    
     def get_sync_statistics(self) -> Dict[str, Any]:
         """Obter estatísticas de sincronização"""
         with sqlite3.connect(self.db_path) as conn:
@@ -431,8 +668,8 @@ class OfflineSyncManager:
                     try:
                         async with session.get(f"{self.api_base_url}/health", timeout=5) as response:
                             if response.status == 200:
-                                # Servidor disponível, tentar sincronizar
-                                results = await self.sync_batch()
+                                # Servidor disponível, tentar sincronizar (lotes bulk)
+                                results = await self.sync_bulk()
                                 if results['total'] > 0:
                                     self.logger.info(f"Sincronização automática: {results}")
                     except:
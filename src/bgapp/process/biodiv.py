@@ -1,19 +1,215 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
+import pandas as pd
 
-def clean_occurrences(records: List[Dict]) -> List[Dict]:
-    seen = set()
-    cleaned: List[Dict] = []
-    for r in records:
-        lon = r.get("decimalLongitude")
-        lat = r.get("decimalLatitude")
-        if lon is None or lat is None:
-            continue
-        key = (round(float(lon), 6), round(float(lat), 6), r.get("scientificName"), r.get("eventDate"))
-        if key in seen:
+# Nomes de colunas Darwin Core (OBIS/GBIF brutos) e do esquema normalizado do harvester
+DWC_COLUMNS = ("decimalLongitude", "decimalLatitude", "scientificName", "eventDate")
+NORMALIZED_COLUMNS = ("longitude", "latitude", "scientific_name", "event_date")
+
+OccurrenceChunk = Union[pd.DataFrame, List[Dict], Any]
+
+
+def _resolve_columns(columns: Iterable[str]) -> Tuple[str, str, str, str]:
+    """Detetar o esquema (Darwin Core ou normalizado) pelas colunas presentes."""
+    columns = set(columns)
+    if "decimalLongitude" not in columns and "longitude" in columns:
+        return NORMALIZED_COLUMNS
+    return DWC_COLUMNS
+
+
+def _to_frame(chunk: OccurrenceChunk) -> pd.DataFrame:
+    """Aceitar DataFrame, lista de dicts ou Table/RecordBatch Arrow."""
+    if isinstance(chunk, pd.DataFrame):
+        return chunk
+    if hasattr(chunk, "to_pandas"):
+        return chunk.to_pandas()
+    return pd.DataFrame.from_records(chunk)
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def valid_coordinates_mask(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Coordenadas presentes, finitas e dentro dos limites WGS84."""
+    with np.errstate(invalid="ignore"):
+        return (
+            np.isfinite(lon) & np.isfinite(lat)
+            & (lon >= -180.0) & (lon <= 180.0)
+            & (lat >= -90.0) & (lat <= 90.0)
+        )
+
+
+def occurrence_hashes(df: pd.DataFrame, lon: np.ndarray, lat: np.ndarray,
+                      precision: int = 6, columns: Optional[Tuple[str, str, str, str]] = None) -> np.ndarray:
+    """
+    Hash uint64 por registo de (lon, lat arredondadas, nome científico, data).
+
+    As coordenadas são quantizadas em inteiros (10^-precision graus), o que equivale
+    ao round(x, precision) da chave original sem criar tuplos Python.
+    """
+    columns = columns or _resolve_columns(df.columns)
+    scale = 10.0 ** precision
+    # NaN não tem representação inteira: quantizar só os finitos e marcar os restantes
+    finite = np.isfinite(lon) & np.isfinite(lat)
+    lon_q = np.full(lon.shape, np.iinfo(np.int64).min, dtype=np.int64)
+    lat_q = np.full(lat.shape, np.iinfo(np.int64).min, dtype=np.int64)
+    lon_q[finite] = np.rint(lon[finite] * scale).astype(np.int64)
+    lat_q[finite] = np.rint(lat[finite] * scale).astype(np.int64)
+    key = pd.DataFrame({
+        "lon": lon_q,
+        "lat": lat_q,
+        "name": _column(df, columns[2]).astype(object).to_numpy(),
+        "date": _column(df, columns[3]).astype(object).to_numpy(),
+    })
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+
+def _aoi_geometries(aoi: Any) -> List[Any]:
+    """GeoJSON (geometria, Feature ou FeatureCollection) ou geometria shapely → lista de geometrias."""
+    from shapely.geometry import shape  # type: ignore
+
+    if hasattr(aoi, "geom_type"):
+        return [aoi]
+    if isinstance(aoi, (list, tuple)):
+        return [g for item in aoi for g in _aoi_geometries(item)]
+    if aoi.get("type") == "FeatureCollection":
+        return [shape(f["geometry"]) for f in aoi.get("features", []) if f.get("geometry")]
+    if aoi.get("type") == "Feature":
+        return [shape(aoi["geometry"])]
+    return [shape(aoi)]
+
+
+def aoi_mask(lon: np.ndarray, lat: np.ndarray, aoi: Any) -> np.ndarray:
+    """
+    Pontos estritamente contidos na AOI (mesma semântica de geom.contains(Point)).
+
+    Uma geometria: geometria preparada + shapely.contains_xy vetorizado, após
+    pré-filtro pela bbox. Várias geometrias: STRtree com predicado 'within'.
+    Sem shapely 2 recorre a geometria preparada ponto a ponto (só dentro da bbox).
+    """
+    geometries = _aoi_geometries(aoi)
+    inside = np.zeros(lon.shape[0], dtype=bool)
+    if not geometries or lon.size == 0:
+        return inside
+
+    minx = min(g.bounds[0] for g in geometries)
+    miny = min(g.bounds[1] for g in geometries)
+    maxx = max(g.bounds[2] for g in geometries)
+    maxy = max(g.bounds[3] for g in geometries)
+    with np.errstate(invalid="ignore"):
+        candidates = np.flatnonzero((lon >= minx) & (lon <= maxx) & (lat >= miny) & (lat <= maxy))
+    if candidates.size == 0:
+        return inside
+
+    x = lon[candidates]
+    y = lat[candidates]
+
+    try:
+        import shapely  # type: ignore
+        has_vectorized = hasattr(shapely, "contains_xy")
+    except ImportError:
+        has_vectorized = False
+
+    if has_vectorized:
+        if len(geometries) == 1:
+            geometry = geometries[0]
+            shapely.prepare(geometry)
+            inside[candidates] = shapely.contains_xy(geometry, x, y)
+        else:
+            tree = shapely.STRtree(geometries)
+            point_index, _ = tree.query(shapely.points(x, y), predicate="within")
+            inside[candidates[np.unique(point_index)]] = True
+        return inside
+
+    from shapely.geometry import Point  # type: ignore
+    from shapely.prepared import prep  # type: ignore
+
+    prepared = [prep(g) for g in geometries]
+    inside[candidates] = [
+        any(p.contains(Point(float(px), float(py))) for p in prepared) for px, py in zip(x, y)
+    ]
+    return inside
+
+
+class OccurrenceDeduplicator:
+    """Conjunto de hashes já vistos, partilhado entre chunks (array ordenado uint64)."""
+
+    def __init__(self):
+        self._seen = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return int(self._seen.size)
+
+    def first_seen(self, hashes: np.ndarray) -> np.ndarray:
+        """Máscara dos registos cujo hash não apareceu antes (no chunk ou em chunks anteriores)."""
+        keep = ~pd.Series(hashes).duplicated(keep="first").to_numpy()
+        if self._seen.size:
+            position = np.searchsorted(self._seen, hashes)
+            position[position >= self._seen.size] = 0
+            keep &= self._seen[position] != hashes
+        new = np.unique(hashes[keep])
+        if new.size:
+            self._seen = np.union1d(self._seen, new)
+        return keep
+
+
+def clean_occurrence_mask(df: pd.DataFrame, aoi: Any = None, precision: int = 6,
+                          deduplicator: Optional[OccurrenceDeduplicator] = None) -> np.ndarray:
+    """Máscara booleana dos registos a manter: coordenadas válidas, dentro da AOI, não duplicados."""
+    columns = _resolve_columns(df.columns)
+    lon = pd.to_numeric(_column(df, columns[0]), errors="coerce").to_numpy(dtype=np.float64)
+    lat = pd.to_numeric(_column(df, columns[1]), errors="coerce").to_numpy(dtype=np.float64)
+
+    keep = valid_coordinates_mask(lon, lat)
+    if aoi is not None:
+        keep &= aoi_mask(lon, lat, aoi)
+
+    rows = np.flatnonzero(keep)
+    if rows.size:
+        hashes = occurrence_hashes(df.iloc[rows], lon[rows], lat[rows], precision, columns)
+        # Não usar `or`: um deduplicador partilhado ainda vazio é falsy (__len__ == 0)
+        if deduplicator is None:
+            deduplicator = OccurrenceDeduplicator()
+        keep[rows] = deduplicator.first_seen(hashes)
+    return keep
+
+
+def iter_clean_occurrences(chunks: Iterable[OccurrenceChunk], aoi: Any = None,
+                           precision: int = 6) -> Iterator[pd.DataFrame]:
+    """Limpeza em streaming: cada chunk sai filtrado, com deduplicação entre chunks."""
+    deduplicator = OccurrenceDeduplicator()
+    for chunk in chunks:
+        df = _to_frame(chunk)
+        if df.empty:
             continue
-        seen.add(key)
-        cleaned.append(r)
-    return cleaned
+        keep = clean_occurrence_mask(df, aoi, precision, deduplicator)
+        if keep.any():
+            yield df.loc[keep]
+
+
+def read_occurrence_chunks(path: Path, chunk_size: int = 1_000_000) -> Iterator[pd.DataFrame]:
+    """Ler Parquet (ficheiro ou diretório de partes) ou CSV em chunks de `chunk_size` linhas."""
+    path = Path(path)
+    if path.is_dir() or path.suffix == ".parquet":
+        import pyarrow.dataset as ds  # type: ignore
+
+        dataset = ds.dataset(str(path), format="parquet")
+        for batch in dataset.to_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def clean_occurrences(records: List[Dict], aoi: Any = None, precision: int = 6) -> List[Dict]:
+    """Remover registos sem coordenadas válidas (ou fora da AOI) e duplicados, mantendo a ordem."""
+    if not records:
+        return []
+    keep = clean_occurrence_mask(pd.DataFrame.from_records(records), aoi, precision)
+    return [records[i] for i in np.flatnonzero(keep)]
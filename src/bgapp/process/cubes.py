@@ -1,45 +1,438 @@
 from __future__ import annotations
 
+import argparse
+import logging
+import math
+import os
+import shutil
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import xarray as xr
 import rioxarray  # noqa
 
+try:
+    import dask
+    from dask.diagnostics import ProgressBar
+    DASK_AVAILABLE = True
+except ImportError:
+    dask = None
+    DASK_AVAILABLE = False
 
-def load_netcdf_cube(path: Path, chunks: Optional[dict] = None) -> xr.Dataset:
-    """Load NetCDF as xarray Dataset with optional chunking."""
-    return xr.open_dataset(path, chunks=chunks or {"time": 10})
+try:
+    from distributed import Client, LocalCluster, Lock as DistributedLock, progress as distributed_progress
+    DISTRIBUTED_AVAILABLE = True
+except ImportError:
+    DISTRIBUTED_AVAILABLE = False
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+CubeSource = Union[str, Path, Sequence[Union[str, Path]]]
+
+X_NAMES = ("longitude", "lon", "x")
+Y_NAMES = ("latitude", "lat", "y")
+
+# Margem para intermédios (groupby, subtração, compressão) por cada chunk em memória
+CHUNK_MEMORY_HEADROOM = 8
+
+
+def available_memory() -> int:
+    """Available system memory in bytes (4 GiB if psutil is missing)."""
+    if psutil is not None:
+        return int(psutil.virtual_memory().available)
+    return 4 * 1024 ** 3
+
+
+def spatial_dims(obj: Union[xr.Dataset, xr.DataArray]) -> Tuple[str, str]:
+    """Names of the (x, y) dimensions: longitude/latitude, lon/lat or x/y."""
+    x_dim = next((name for name in X_NAMES if name in obj.dims), None)
+    y_dim = next((name for name in Y_NAMES if name in obj.dims), None)
+    if x_dim is None or y_dim is None:
+        raise ValueError(f"Cube without recognizable spatial dims: {tuple(obj.dims)}")
+    return x_dim, y_dim
+
+
+def _main_variable(ds: xr.Dataset, variable: Optional[str]) -> xr.DataArray:
+    if variable is not None:
+        return ds[variable]
+    return max(ds.data_vars.values(), key=lambda da: da.size * da.dtype.itemsize)
+
+
+def _disk_chunks(da: xr.DataArray) -> Dict[str, int]:
+    """On-disk chunk shape (NetCDF4/HDF5 or Zarr); empty for contiguous storage."""
+    preferred = da.encoding.get("preferred_chunks")
+    if preferred:
+        return {dim: int(size) for dim, size in preferred.items()}
+    chunksizes = da.encoding.get("chunksizes") or da.encoding.get("chunks")
+    if chunksizes:
+        return {dim: int(size) for dim, size in zip(da.dims, chunksizes)}
+    return {}
+
+
+def select_chunks(shape: Dict[str, int], itemsize: int, disk_chunks: Optional[Dict[str, int]] = None,
+                  target_chunk_mb: float = 128, memory_limit: Optional[int] = None,
+                  n_workers: Optional[int] = None, time_dim: str = "time") -> Dict[str, int]:
+    """
+    Chunk shape aligned to the file layout and bounded by available memory.
+
+    Starts from the on-disk chunk (one time step x full grid for contiguous
+    files) and grows by doubling, so every chunk is a multiple of the disk
+    chunk: the spatial dims first (whole grid per chunk suits clipping and
+    tiled export), then time. Never exceeds target_chunk_mb nor the per-worker
+    memory share divided by CHUNK_MEMORY_HEADROOM; if a single disk chunk is
+    already larger, the spatial dims are halved until it fits.
+    """
+    disk_chunks = disk_chunks or {}
+    n_workers = n_workers or os.cpu_count() or 1
+    memory_limit = memory_limit or available_memory()
+    budget = min(target_chunk_mb * 1024 ** 2, memory_limit / (n_workers * CHUNK_MEMORY_HEADROOM))
+
+    chunks = {
+        dim: min(size, disk_chunks.get(dim, 1 if dim == time_dim else size))
+        for dim, size in shape.items()
+    }
+
+    def nbytes(candidate: Dict[str, int]) -> int:
+        return itemsize * math.prod(candidate.values())
+
+    spatial = [dim for dim in shape if dim != time_dim]
+    while nbytes(chunks) > budget and any(chunks[dim] > 1 for dim in spatial):
+        largest = max(spatial, key=lambda dim: chunks[dim])
+        chunks[largest] = max(1, chunks[largest] // 2)
+
+    for dim in spatial + ([time_dim] if time_dim in shape else []):
+        while chunks[dim] < shape[dim]:
+            grown = {**chunks, dim: min(shape[dim], chunks[dim] * 2)}
+            if nbytes(grown) > budget:
+                break
+            chunks = grown
+    return chunks
+
+
+def auto_chunks(source: CubeSource, variable: Optional[str] = None, target_chunk_mb: float = 128,
+                memory_limit: Optional[int] = None, n_workers: Optional[int] = None) -> Dict[str, int]:
+    """Inspect the first file of `source` (lazily) and pick chunks with select_chunks."""
+    first = source if isinstance(source, (str, Path)) else list(source)[0]
+    with xr.open_dataset(first) as ds:
+        da = _main_variable(ds, variable)
+        return select_chunks(
+            dict(zip(da.dims, da.shape)), da.dtype.itemsize, _disk_chunks(da),
+            target_chunk_mb, memory_limit, n_workers
+        )
+
+
+def load_netcdf_cube(path: CubeSource, chunks: Optional[dict] = None, variable: Optional[str] = None,
+                     target_chunk_mb: float = 128, memory_limit: Optional[int] = None,
+                     n_workers: Optional[int] = None) -> xr.Dataset:
+    """Load NetCDF (one file or a multi-file series) as a lazy, chunked Dataset."""
+    chunks = chunks or auto_chunks(path, variable, target_chunk_mb, memory_limit, n_workers)
+    if isinstance(path, (str, Path)) and "*" not in str(path):
+        return xr.open_dataset(path, chunks=chunks)
+    return xr.open_mfdataset(
+        path if not isinstance(path, (str, Path)) else str(path),
+        chunks=chunks, combine="by_coords", parallel=True, data_vars="minimal",
+        coords="minimal", compat="override"
+    )
 
 
 def clip_cube_to_bbox(ds: xr.Dataset, bbox: Tuple[float, float, float, float]) -> xr.Dataset:
-    """Clip cube to bounding box (minx, miny, maxx, maxy)."""
+    """Clip cube to bounding box (minx, miny, maxx, maxy); handles descending latitude."""
     minx, miny, maxx, maxy = bbox
-    return ds.sel(
-        longitude=slice(minx, maxx),
-        latitude=slice(miny, maxy)
-    )
+    x_dim, y_dim = spatial_dims(ds)
+    y_values = ds[y_dim].values
+    y_slice = slice(maxy, miny) if y_values.size > 1 and y_values[0] > y_values[-1] else slice(miny, maxy)
+    return ds.sel({x_dim: slice(minx, maxx), y_dim: y_slice})
 
 
 def compute_temporal_mean(ds: xr.Dataset, variable: str) -> xr.DataArray:
-    """Compute temporal mean of variable."""
+    """Compute temporal mean of variable (lazy for chunked cubes)."""
     return ds[variable].mean(dim="time")
 
 
+def compute_climatology(ds: xr.Dataset, variable: str, groupby: str = "time.month") -> xr.DataArray:
+    """Climatology of variable grouped by `groupby` (e.g. time.month, time.season)."""
+    return ds[variable].groupby(groupby).mean(dim="time")
+
+
 def compute_anomalies(ds: xr.Dataset, variable: str, climatology: Optional[xr.DataArray] = None) -> xr.DataArray:
     """Compute anomalies relative to climatology or long-term mean."""
     data = ds[variable]
     if climatology is None:
         climatology = data.mean(dim="time")
+    group_dims = [dim for dim in ("month", "season", "dayofyear") if dim in climatology.dims]
+    if group_dims:
+        return data.groupby(f"time.{group_dims[0]}") - climatology
     return data - climatology
 
 
-def export_to_cog(da: xr.DataArray, output_path: Path) -> Path:
-    """Export DataArray to Cloud Optimized GeoTIFF."""
-    da.rio.to_raster(
-        output_path,
-        driver="COG",
-        compress="LZW",
-        blocksize=512,
-    )
-    return output_path
+def _uniform_chunks(obj: Union[xr.Dataset, xr.DataArray]) -> Union[xr.Dataset, xr.DataArray]:
+    """Zarr needs regular chunks: rechunk every dim to its largest chunk and drop source encodings."""
+    if obj.chunks:
+        obj = obj.chunk({dim: max(sizes) for dim, sizes in obj.chunksizes.items()})
+    variables = obj.variables.values() if isinstance(obj, xr.Dataset) else [obj.variable]
+    for variable in variables:
+        for key in ("chunks", "preferred_chunks", "chunksizes", "zlib", "complevel", "shuffle",
+                    "contiguous", "fletcher32", "compressor", "compressors", "filters"):
+            variable.encoding.pop(key, None)
+    return obj
+
+
+class CubeEngine:
+    """
+    Lazy cube processing on a local multi-process scheduler.
+
+    With `distributed` installed a LocalCluster of single-threaded worker
+    processes is started, each with memory_limit / n_workers (workers spill
+    to disk and pause before exceeding it). Without it, dask's
+    multiprocessing scheduler is used (memory is then only bounded through
+    the chunk size). Graphs passed to `compute` are evaluated in a single
+    pass, so shared inputs (e.g. the clipped cube feeding climatology and
+    anomalies) are read once.
+    """
+
+    def __init__(self, n_workers: Optional[int] = None, memory_limit: Optional[int] = None,
+                 target_chunk_mb: float = 128, progress: bool = True, use_distributed: bool = True,
+                 dashboard: bool = False):
+        if not DASK_AVAILABLE:
+            raise ImportError("dask é necessário para o CubeEngine (pip install 'dask[complete]')")
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit or int(available_memory() * 0.75)
+        self.target_chunk_mb = target_chunk_mb
+        self.progress = progress
+        if use_distributed and not DISTRIBUTED_AVAILABLE:
+            logger.warning("⚠️ distributed não instalado - scheduler multiprocessing sem limite de memória por worker")
+        self.use_distributed = use_distributed and DISTRIBUTED_AVAILABLE
+        self.dashboard = dashboard
+
+        self.cluster = None
+        self.client = None
+
+    def __enter__(self) -> "CubeEngine":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        if self.use_distributed and self.client is None:
+            self.cluster = LocalCluster(
+                n_workers=self.n_workers,
+                threads_per_worker=1,
+                processes=True,
+                memory_limit=self.memory_limit // self.n_workers,
+                dashboard_address=":8787" if self.dashboard else None
+            )
+            self.client = Client(self.cluster)
+            logger.info(f"🧊 CubeEngine: {self.n_workers} processos, "
+                        f"{self.memory_limit / 1024 ** 3:.1f} GiB no total")
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.cluster.close()
+        self.client = None
+        self.cluster = None
+
+    @property
+    def write_lock(self):
+        """Lock for concurrent raster writes into the same GeoTIFF."""
+        if self.client is not None:
+            return DistributedLock("rio")
+        return threading.Lock()
+
+    def open(self, source: CubeSource, variable: Optional[str] = None,
+             chunks: Optional[dict] = None) -> xr.Dataset:
+        return load_netcdf_cube(source, chunks, variable, self.target_chunk_mb,
+                                self.memory_limit, self.n_workers)
+
+    def compute(self, *objs: Any, scheduler: Optional[str] = None) -> Tuple[Any, ...]:
+        """Evaluate lazy objects together (one graph), with a progress bar."""
+        if self.client is not None:
+            futures = self.client.compute(list(objs))
+            if self.progress:
+                distributed_progress(futures)
+            return tuple(self.client.gather(futures))
+
+        scheduler = scheduler or "processes"
+        kwargs = {"num_workers": self.n_workers} if scheduler != "synchronous" else {}
+        if self.progress:
+            with ProgressBar():
+                return dask.compute(*objs, scheduler=scheduler, **kwargs)
+        return dask.compute(*objs, scheduler=scheduler, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def to_zarr(self, obj: Union[xr.Dataset, xr.DataArray], path: Path, name: Optional[str] = None):
+        """Lazy Zarr write (chunks written in parallel by the scheduler)."""
+        if isinstance(obj, xr.DataArray):
+            obj = obj.to_dataset(name=obj.name or name or "data")
+        return _uniform_chunks(obj).to_zarr(path, mode="w", compute=False)
+
+    def to_tiled_geotiff(self, da: xr.DataArray, path: Path, blocksize: int = 512,
+                         crs: str = "EPSG:4326"):
+        """Lazy tiled GeoTIFF write: every band at once, one window per dask chunk."""
+        da = _prepare_raster(da, crs)
+        x_dim, y_dim = spatial_dims(da)
+        # Janelas quadradas múltiplas do bloco (cada uma cobre blocos inteiros do TIFF)
+        n_bands = max(1, da.size // (da.sizes[x_dim] * da.sizes[y_dim]))
+        side = math.sqrt(self.target_chunk_mb * 1024 ** 2 / (da.dtype.itemsize * n_bands))
+        tile = max(1, int(side // blocksize)) * blocksize
+        da = da.chunk({**{dim: -1 for dim in da.dims if dim not in (x_dim, y_dim)}, x_dim: tile, y_dim: tile})
+        da = da.rio.set_spatial_dims(x_dim=x_dim, y_dim=y_dim)  # lost with the new object
+        return da.rio.to_raster(
+            path, tiled=True, blockxsize=blocksize, blockysize=blocksize, compress="LZW",
+            lock=self.write_lock, compute=False
+        )
+
+    def finalize_cog(self, tiled_path: Path, output_path: Path, blocksize: int = 512) -> Path:
+        """Tiled GeoTIFF → COG (overviews and compression multi-threaded in GDAL)."""
+        from rasterio.shutil import copy as rio_copy
+
+        rio_copy(
+            tiled_path, output_path, driver="COG", compress="LZW", blocksize=blocksize,
+            overview_resampling="average", num_threads="ALL_CPUS"
+        )
+        Path(tiled_path).unlink(missing_ok=True)
+        return Path(output_path)
+
+    def export(self, outputs: Dict[str, Tuple[Union[xr.Dataset, xr.DataArray], Path]],
+               blocksize: int = 512) -> Dict[str, Path]:
+        """
+        Write several lazy outputs in one scheduler pass.
+
+        `outputs` maps a name to (object, path); the format follows the path
+        suffix (.zarr or .tif). All writes go into a single graph, so inputs
+        shared between outputs (e.g. the climatology written as Zarr and as
+        COG) are computed once. GeoTIFF windows are written under a lock; with
+        the plain multiprocessing scheduler a graph containing GeoTIFF writes
+        runs on threads, since the file handle cannot be shared across
+        processes.
+        """
+        zarr_writes = []
+        raster_writes = []
+        cog_targets = []
+        for name, (obj, path) in outputs.items():
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.suffix == ".zarr":
+                if path.exists():
+                    shutil.rmtree(path)
+                zarr_writes.append(self.to_zarr(obj, path, name))
+            else:
+                if isinstance(obj, xr.Dataset):
+                    raise ValueError(f"Output COG '{name}' tem de ser um DataArray")
+                tiled_path = path.with_name(f"{path.stem}.tiled.tif")
+                raster_writes.append(self.to_tiled_geotiff(obj, tiled_path, blocksize))
+                cog_targets.append((tiled_path, path))
+
+        if self.client is not None:
+            self.compute(*zarr_writes, *raster_writes)
+        elif raster_writes:
+            self.compute(*zarr_writes, *raster_writes, scheduler="threads")
+        elif zarr_writes:
+            self.compute(*zarr_writes)
+
+        for tiled_path, path in cog_targets:
+            self.finalize_cog(tiled_path, path, blocksize)
+        return {name: Path(path) for name, (_, path) in outputs.items()}
+
+    # ------------------------------------------------------------------
+    # Pipelines
+    # ------------------------------------------------------------------
+
+    def anomaly_pipeline(self, source: CubeSource, variable: str, output_dir: Path,
+                         bbox: Optional[Tuple[float, float, float, float]] = None,
+                         groupby: str = "time.month", formats: Iterable[str] = ("zarr", "cog")) -> Dict[str, Path]:
+        """
+        clip → climatology → anomalies → export, as a single lazy graph.
+
+        Produces the climatology (Zarr and one multi-band COG, one band per
+        group) and the anomalies (Zarr; the full time series is not exported as
+        COG, since it can have thousands of bands).
+        """
+        output_dir = Path(output_dir)
+        formats = set(formats)
+        ds = self.open(source, variable)
+        if bbox is not None:
+            ds = clip_cube_to_bbox(ds, bbox)
+
+        climatology = compute_climatology(ds, variable, groupby)
+        anomalies = compute_anomalies(ds, variable, climatology)
+
+        outputs: Dict[str, Tuple[Any, Path]] = {}
+        if "zarr" in formats:
+            outputs[f"{variable}_climatology"] = (climatology, output_dir / f"{variable}_climatology.zarr")
+            outputs[f"{variable}_anomaly"] = (anomalies, output_dir / f"{variable}_anomaly.zarr")
+        if "cog" in formats:
+            outputs[f"{variable}_climatology_cog"] = (
+                climatology.rename({climatology.dims[0]: "band"}),
+                output_dir / f"{variable}_climatology.tif"
+            )
+        return self.export(outputs)
+
+
+def _prepare_raster(da: xr.DataArray, crs: str = "EPSG:4326") -> xr.DataArray:
+    x_dim, y_dim = spatial_dims(da)
+    da = da.transpose(..., y_dim, x_dim).rio.set_spatial_dims(x_dim=x_dim, y_dim=y_dim)
+    if da.rio.crs is None:
+        da = da.rio.write_crs(crs)
+    return da
+
+
+def export_to_cog(da: xr.DataArray, output_path: Path, engine: Optional[CubeEngine] = None,
+                  blocksize: int = 512) -> Path:
+    """Export DataArray (all bands at once) to Cloud Optimized GeoTIFF."""
+    if engine is None and not (DASK_AVAILABLE and da.chunks):
+        _prepare_raster(da).rio.to_raster(
+            output_path,
+            driver="COG",
+            compress="LZW",
+            blocksize=blocksize,
+        )
+        return Path(output_path)
+
+    owns_engine = engine is None
+    engine = engine or CubeEngine(use_distributed=False, progress=False)
+    try:
+        return engine.export({"cog": (da, Path(output_path))}, blocksize)["cog"]
+    finally:
+        if owns_engine:
+            engine.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Climatologia e anomalias de cubos NetCDF (CMEMS)")
+    parser.add_argument("source", nargs="+", help="Ficheiro(s) NetCDF ou padrão glob")
+    parser.add_argument("--variable", required=True, help="Variável (ex.: CHL)")
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MINX", "MINY", "MAXX", "MAXY"))
+    parser.add_argument("--groupby", default="time.month")
+    parser.add_argument("--formats", nargs="+", default=["zarr", "cog"], choices=["zarr", "cog"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--memory-limit-gb", type=float, default=None)
+    parser.add_argument("--chunk-mb", type=float, default=128)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    source = args.source[0] if len(args.source) == 1 else args.source
+    memory_limit = int(args.memory_limit_gb * 1024 ** 3) if args.memory_limit_gb else None
+    with CubeEngine(args.workers, memory_limit, args.chunk_mb) as engine:
+        outputs = engine.anomaly_pipeline(
+            source, args.variable, args.output_dir, tuple(args.bbox) if args.bbox else None,
+            args.groupby, args.formats
+        )
+    for name, path in outputs.items():
+        print(f"✅ {name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,388 @@
 from __future__ import annotations
 
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 import rasterio
-from rasterio.mask import mask
+import rasterio.warp
 from rasterio.enums import Resampling
+from rasterio.features import bounds as geometry_bounds, geometry_mask
 from rasterio.shutil import copy as rio_copy
-import json
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window, from_bounds, transform as window_transform
+
+logger = logging.getLogger(__name__)
+
+AOI = Union[Path, str, Dict[str, Any]]
+
+# Janela de processamento = bloco do GeoTIFF: a memória é limitada a
+# window_size² × bandas × itemsize por thread
+DEFAULT_WINDOW_SIZE = 512
+DEFAULT_WARP_MEM_LIMIT_MB = 256
+
+
+def _aoi_geometries(aoi: AOI) -> List[Dict[str, Any]]:
+    if isinstance(aoi, (str, Path)):
+        aoi = json.loads(Path(aoi).read_text())
+    if aoi.get("type") == "FeatureCollection":
+        return [f["geometry"] for f in aoi.get("features", [])]
+    if aoi.get("type") == "Feature":
+        return [aoi["geometry"]]
+    return [aoi]
+
+
+def _geometries_bounds(geoms: Iterable[Dict[str, Any]]):
+    bounds = [geometry_bounds(g) for g in geoms]
+    return (min(b[0] for b in bounds), min(b[1] for b in bounds),
+            max(b[2] for b in bounds), max(b[3] for b in bounds))
+
+
+def _clip_window(window: Window, width: int, height: int) -> Window:
+    return window.round_offsets().round_lengths().intersection(Window(0, 0, width, height))
+
+
+def _write_windows(open_source, dst, geoms: Optional[List[Dict[str, Any]]],
+                   nodata: float, num_workers: int) -> int:
+    """
+    Stream every block window of `dst` from a (warped) source, masking pixels
+    outside `geoms`. Each worker thread opens its own source handle; reads and
+    warps release the GIL, writes are serialized. Windows entirely outside the
+    AOI are not read at all. Returns the number of windows written.
+    """
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+    write_lock = threading.Lock()
+
+    def source():
+        if not hasattr(local, "source"):
+            local.source = open_source()
+            with handles_lock:
+                handles.append(local.source)
+        return local.source
+
+    def process(window: Window) -> bool:
+        outside = None
+        if geoms:
+            outside = geometry_mask(
+                geoms, out_shape=(int(window.height), int(window.width)),
+                transform=dst.window_transform(window)
+            )
+            if outside.all():
+                return False
+        data = source().read(window=window)
+        if outside is not None and outside.any():
+            data[:, outside] = nodata
+        with write_lock:
+            dst.write(data, window=window)
+        return True
+
+    windows = [window for _, window in dst.block_windows(1)]
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="raster-window") as executor:
+            written = sum(executor.map(process, windows))
+    finally:
+        for handle in handles:
+            handle.close()
+    return written
+
 
+def _num_threads_value(num_threads: Union[int, str]) -> str:
+    return str(num_threads).upper() if isinstance(num_threads, str) else str(int(num_threads))
 
-def clip_raster_to_aoi(input_path: Path, aoi_geojson: Path, output_path: Path) -> Path:
+
+def _thread_count(num_threads: Union[int, str]) -> int:
+    if isinstance(num_threads, str):
+        return os.cpu_count() or 1
+    return max(1, int(num_threads))
+
+
+def clip_raster_to_aoi(input_path: Path, aoi_geojson: Path, output_path: Path,
+                       window_size: int = DEFAULT_WINDOW_SIZE, num_threads: Union[int, str] = "ALL_CPUS") -> Path:
+    """Clip to the AOI window by window (never reads the full raster)."""
+    geoms = _aoi_geometries(aoi_geojson)
     with rasterio.open(input_path) as src:
-        aoi = json.loads(aoi_geojson.read_text())
-        if aoi.get("type") == "FeatureCollection":
-            geoms = [f["geometry"] for f in aoi.get("features", [])]
-        elif aoi.get("type") == "Feature":
-            geoms = [aoi["geometry"]]
-        else:
-            geoms = [aoi]
-        data, transform = mask(src, geoms, crop=True)
+        if src.crs and src.crs.to_string() != "EPSG:4326":
+            geoms = [rasterio.warp.transform_geom("EPSG:4326", src.crs, g) for g in geoms]
+        window = _clip_window(from_bounds(*_geometries_bounds(geoms), transform=src.transform),
+                              src.width, src.height)
+        nodata = src.nodata if src.nodata is not None else 0
         meta = src.meta.copy()
         meta.update({
-            "height": data.shape[1],
-            "width": data.shape[2],
-            "transform": transform,
+            "driver": "GTiff",
+            "height": int(window.height),
+            "width": int(window.width),
+            "transform": src.window_transform(window),
+            "nodata": nodata,
+            "tiled": True,
+            "blockxsize": window_size,
+            "blockysize": window_size,
+            "compress": "LZW",
+            "num_threads": _num_threads_value(num_threads),
         })
+
+        def open_source():
+            # Janela do destino → janela da fonte (deslocamento constante)
+            return _OffsetReader(rasterio.open(input_path), window)
+
         with rasterio.open(output_path, "w", **meta) as dst:
-            dst.write(data)
+            _write_windows(open_source, dst, geoms, nodata, _thread_count(num_threads))
     return output_path
 
 
-def reproject_raster(input_path: Path, output_path: Path, dst_crs: str = "EPSG:4326") -> Path:
+class _OffsetReader:
+    """Read windows of a source dataset shifted by a fixed offset."""
+
+    def __init__(self, dataset, offset: Window):
+        self.dataset = dataset
+        self.offset = offset
+
+    def read(self, window: Window):
+        return self.dataset.read(window=Window(
+            window.col_off + self.offset.col_off, window.row_off + self.offset.row_off,
+            window.width, window.height
+        ), boundless=True, fill_value=self.dataset.nodata or 0)
+
+    def close(self):
+        self.dataset.close()
+
+
+def _warped_vrt_options(src, dst_crs: str, resampling: Resampling, num_threads: Union[int, str],
+                        warp_mem_limit: int, aoi_bounds=None) -> Dict[str, Any]:
+    """WarpedVRT parameters for dst_crs, optionally restricted to the AOI bounds (in dst_crs)."""
+    transform, width, height = rasterio.warp.calculate_default_transform(
+        src.crs, dst_crs, src.width, src.height, *src.bounds
+    )
+    if aoi_bounds is not None:
+        window = _clip_window(from_bounds(*aoi_bounds, transform=transform), width, height)
+        transform = window_transform(window, transform)
+        width, height = int(window.width), int(window.height)
+    return {
+        "crs": dst_crs,
+        "transform": transform,
+        "width": width,
+        "height": height,
+        "resampling": resampling,
+        "warp_mem_limit": warp_mem_limit,
+        "warp_extras": {"NUM_THREADS": _num_threads_value(num_threads)},
+    }
+
+
+def reproject_raster(input_path: Path, output_path: Path, dst_crs: str = "EPSG:4326",
+                     resampling: Resampling = Resampling.nearest, num_threads: Union[int, str] = "ALL_CPUS",
+                     warp_mem_limit: int = DEFAULT_WARP_MEM_LIMIT_MB) -> Path:
+    """Reproject all bands through a multi-threaded WarpedVRT, streamed block by block."""
     with rasterio.open(input_path) as src:
-        transform, width, height = rasterio.warp.calculate_default_transform(
-            src.crs, dst_crs, src.width, src.height, *src.bounds
-        )
-        kwargs = src.meta.copy()
-        kwargs.update({
-            "crs": dst_crs,
-            "transform": transform,
-            "width": width,
-            "height": height,
-        })
-        with rasterio.open(output_path, "w", **kwargs) as dst:
-            for i in range(1, src.count + 1):
-                rasterio.warp.reproject(
-                    source=rasterio.band(src, i),
-                    destination=rasterio.band(dst, i),
-                    src_transform=src.transform,
-                    src_crs=src.crs,
-                    dst_transform=transform,
-                    dst_crs=dst_crs,
-                    resampling=Resampling.nearest,
-                )
+        options = _warped_vrt_options(src, dst_crs, resampling, num_threads, warp_mem_limit)
+        with WarpedVRT(src, **options) as vrt:
+            rio_copy(
+                vrt, output_path, driver="GTiff", tiled=True, blockxsize=DEFAULT_WINDOW_SIZE,
+                blockysize=DEFAULT_WINDOW_SIZE, compress="LZW", num_threads=_num_threads_value(num_threads)
+            )
     return output_path
 
 
-def to_cog(input_path: Path, output_path: Path) -> Path:
-    profile = {
-        "driver": "COG",
-        "compress": "LZW",
-        "blocksize": 512,
-        "overview_levels": [2, 4, 8, 16],
-    }
+def to_cog(input_path: Path, output_path: Path, num_threads: Union[int, str] = "ALL_CPUS",
+           overview_resampling: str = "average") -> Path:
     rio_copy(
         src=input_path,
         dst=output_path,
         driver="COG",
-        copy_src_overviews=True,
-        **profile,
+        compress="LZW",
+        blocksize=512,
+        overview_resampling=overview_resampling,
+        num_threads=_num_threads_value(num_threads),
     )
     return output_path
+
+
+def process_raster(input_path: Path, output_path: Path, aoi: Optional[AOI] = None,
+                   dst_crs: Optional[str] = "EPSG:4326", resampling: Resampling = Resampling.nearest,
+                   window_size: int = DEFAULT_WINDOW_SIZE, num_threads: Union[int, str] = "ALL_CPUS",
+                   warp_mem_limit: int = DEFAULT_WARP_MEM_LIMIT_MB,
+                   overview_resampling: str = "average") -> Path:
+    """
+    Fused clip → reproject → overviews → COG.
+
+    The source is warped on the fly (WarpedVRT restricted to the AOI extent,
+    GDAL multi-threaded warping) and streamed window by window; pixels
+    outside the AOI polygon are masked per window. Without an AOI the VRT is
+    copied straight into the COG driver. With an AOI the masked windows go to
+    one internal tiled GeoTIFF, from which the COG driver builds overviews
+    (the COG format can only be produced by a final copy).
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    resampling = Resampling[resampling] if isinstance(resampling, str) else resampling
+    threads = _num_threads_value(num_threads)
+
+    with rasterio.open(input_path) as src:
+        dst_crs = dst_crs or src.crs.to_string()
+        geoms = None
+        aoi_bounds = None
+        if aoi is not None:
+            geoms = [rasterio.warp.transform_geom("EPSG:4326", dst_crs, g) for g in _aoi_geometries(aoi)]
+            aoi_bounds = _geometries_bounds(geoms)
+        options = _warped_vrt_options(src, dst_crs, resampling, num_threads, warp_mem_limit, aoi_bounds)
+        nodata = src.nodata if src.nodata is not None else 0
+        profile = {
+            "driver": "GTiff",
+            "count": src.count,
+            "dtype": src.dtypes[0],
+            "crs": dst_crs,
+            "transform": options["transform"],
+            "width": options["width"],
+            "height": options["height"],
+            "nodata": nodata,
+            "tiled": True,
+            "blockxsize": window_size,
+            "blockysize": window_size,
+            "compress": "LZW",
+            "num_threads": threads,
+            "bigtiff": "IF_SAFER",
+        }
+        cog_options = {
+            "driver": "COG",
+            "compress": "LZW",
+            "blocksize": window_size,
+            "overview_resampling": overview_resampling,
+            "num_threads": threads,
+            "bigtiff": "IF_SAFER",
+        }
+
+        if geoms is None:
+            with WarpedVRT(src, nodata=nodata, **options) as vrt:
+                rio_copy(vrt, output_path, **cog_options)
+            return output_path
+
+    tiled_path = output_path.with_name(f"{output_path.stem}.tiled.tif")
+
+    def open_source():
+        return _OwnedVRT(input_path, nodata, options)
+
+    try:
+        with rasterio.open(tiled_path, "w", **profile) as dst:
+            _write_windows(open_source, dst, geoms, nodata, _thread_count(num_threads))
+        rio_copy(tiled_path, output_path, **cog_options)
+    finally:
+        tiled_path.unlink(missing_ok=True)
+    return output_path
+
+
+class _OwnedVRT:
+    """WarpedVRT that also closes its source dataset (one per worker thread)."""
+
+    def __init__(self, path: Path, nodata: float, options: Dict[str, Any]):
+        self.src = rasterio.open(path)
+        self.vrt = WarpedVRT(self.src, nodata=nodata, **options)
+
+    def read(self, window: Window):
+        return self.vrt.read(window=window)
+
+    def close(self):
+        self.vrt.close()
+        self.src.close()
+
+
+def _process_raster_job(input_path: str, output_path: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    process_raster(Path(input_path), Path(output_path), **kwargs)
+    return {
+        "input": input_path,
+        "output": output_path,
+        "seconds": round(time.perf_counter() - started, 2),
+        "size_mb": round(Path(output_path).stat().st_size / (1024 * 1024), 2),
+    }
+
+
+def process_raster_batch(input_dir: Path, output_dir: Path, patterns: Iterable[str] = ("*.tif", "*.jp2"),
+                         max_workers: Optional[int] = None, overwrite: bool = False,
+                         **kwargs) -> Dict[str, Any]:
+    """
+    Run process_raster over a directory of tiles (Sentinel/MODIS) in parallel.
+
+    One process per tile; the GDAL threads (num_threads) are split between
+    processes so the machine is not oversubscribed. Tiles whose COG is newer
+    than the source are skipped unless `overwrite`.
+    """
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    inputs = sorted({path for pattern in patterns for path in input_dir.rglob(pattern)})
+    jobs = []
+    skipped = []
+    for path in inputs:
+        target = output_dir / path.relative_to(input_dir).with_suffix(".tif")
+        if not overwrite and target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+            skipped.append(str(path))
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        jobs.append((str(path), str(target)))
+
+    cpus = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers or cpus, len(jobs) or 1))
+    kwargs.setdefault("num_threads", max(1, cpus // max_workers))
+    if isinstance(kwargs.get("aoi"), (str, Path)):
+        kwargs["aoi"] = json.loads(Path(kwargs["aoi"]).read_text())
+
+    results = []
+    errors = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_process_raster_job, src, dst, kwargs): src for src, dst in jobs}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+                logger.info(f"✅ {futures[future]} ({results[-1]['seconds']}s)")
+            except Exception as e:
+                logger.error(f"❌ {futures[future]}: {e}")
+                errors.append({"input": futures[future], "error": str(e)})
+
+    return {
+        "processed": results,
+        "errors": errors,
+        "skipped": skipped,
+        "workers": max_workers,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Pipeline raster: recorte → reprojeção → COG")
+    parser.add_argument("input", type=Path, help="Raster ou diretório de tiles")
+    parser.add_argument("output", type=Path, help="COG de saída ou diretório (modo batch)")
+    parser.add_argument("--aoi", type=Path, help="GeoJSON da área de interesse (EPSG:4326)")
+    parser.add_argument("--dst-crs", default="EPSG:4326")
+    parser.add_argument("--resampling", default="nearest", choices=[r.name for r in Resampling])
+    parser.add_argument("--window-size", type=int, default=DEFAULT_WINDOW_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="Processos no modo batch")
+    parser.add_argument("--pattern", nargs="+", default=["*.tif", "*.jp2"])
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    options = {
+        "aoi": args.aoi,
+        "dst_crs": args.dst_crs,
+        "resampling": Resampling[args.resampling],
+        "window_size": args.window_size,
+    }
+    if args.input.is_dir():
+        summary = process_raster_batch(args.input, args.output, args.pattern, args.workers,
+                                       args.overwrite, **options)
+        print(f"✅ {len(summary['processed'])} tiles em {summary['seconds']}s "
+              f"({len(summary['skipped'])} atualizados, {len(summary['errors'])} erros)")
+    else:
+        print(f"✅ {process_raster(args.input, args.output, **options)}")
+
+
+if __name__ == "__main__":
+    main()
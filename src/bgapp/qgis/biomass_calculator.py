@@ -20,6 +20,13 @@ from ..models.angola_oceanography import AngolaOceanographicModel
 
 logger = logging.getLogger(__name__)
 
+# Elipsoide WGS84 (km)
+WGS84_SEMI_MAJOR_KM = 6378.137
+WGS84_FLATTENING = 1 / 298.257223563
+
+LAT_NAMES = ('latitude', 'lat', 'y')
+LON_NAMES = ('longitude', 'lon', 'x')
+
 
 class BiomassType(Enum):
     """Tipos de biomassa suportados"""
@@ -56,6 +63,84 @@ class BiomassTimeSeries:
     statistics: Dict[str, float]
 
 
+def _cell_edges(centers: np.ndarray) -> np.ndarray:
+    """Limites das células a partir das coordenadas dos centros"""
+    centers = np.asarray(centers, dtype=np.float64)
+    if centers.size < 2:
+        raise ValueError("São necessárias pelo menos 2 coordenadas para inferir o tamanho dos píxeis")
+    midpoints = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate([[2 * centers[0] - midpoints[0]], midpoints, [2 * centers[-1] - midpoints[-1]]])
+
+
+def geodesic_pixel_areas(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Área (km²) de cada píxel de uma grelha lat/lon no elipsoide WGS84
+
+    Usa a área exata de uma faixa de latitude do elipsoide (latitude autálica),
+    pelo que píxeis de 0.01° perto do equador e a -18° têm áreas diferentes.
+    Devolve um array (lat, lon).
+    """
+    e2 = WGS84_FLATTENING * (2 - WGS84_FLATTENING)
+    e = np.sqrt(e2)
+    b = WGS84_SEMI_MAJOR_KM * (1 - WGS84_FLATTENING)
+
+    def authalic(phi: np.ndarray) -> np.ndarray:
+        sin_phi = np.sin(phi)
+        return sin_phi / (1 - e2 * sin_phi ** 2) + np.log((1 + e * sin_phi) / (1 - e * sin_phi)) / (2 * e)
+
+    lat_edges = np.radians(np.clip(_cell_edges(lats), -90.0, 90.0))
+    band_areas = np.abs(np.diff(authalic(lat_edges))) * b ** 2 / 2  # km² por radiano de longitude
+    lon_widths = np.abs(np.diff(np.radians(_cell_edges(lons))))
+    return np.outer(band_areas, lon_widths)
+
+
+def _zone_mask(zone: Dict[str, Any], lat_grid: np.ndarray, lon_grid: np.ndarray) -> np.ndarray:
+    """Píxeis dentro da zona: geometria GeoJSON ('geometry') ou limites ('bounds')"""
+    if zone.get('geometry'):
+        import shapely
+        from shapely.geometry import shape
+        return shapely.contains_xy(shape(zone['geometry']), lon_grid, lat_grid)
+
+    bounds = zone.get('bounds') or {}
+    inside = np.ones(lat_grid.shape, dtype=bool)
+    if 'lat_min' in bounds:
+        inside &= lat_grid >= bounds['lat_min']
+    if 'lat_max' in bounds:
+        inside &= lat_grid <= bounds['lat_max']
+    if 'lon_min' in bounds:
+        inside &= lon_grid >= bounds['lon_min']
+    if 'lon_max' in bounds:
+        inside &= lon_grid <= bounds['lon_max']
+    return inside
+
+
+def zone_label_raster(lats: np.ndarray, lons: np.ndarray, zones: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Raster (lat, lon) de rótulos de zona: 0 = fora de todas as zonas, i = zones[i - 1]
+
+    Calculado uma única vez por grelha; em zonas sobrepostas o píxel fica na
+    primeira zona da lista.
+    """
+    lat_grid, lon_grid = np.meshgrid(np.asarray(lats), np.asarray(lons), indexing='ij')
+    labels = np.zeros(lat_grid.shape, dtype=np.int16)
+    for index, zone in enumerate(zones, start=1):
+        inside = _zone_mask(zone, lat_grid, lon_grid)
+        overlap = int(np.count_nonzero(inside & (labels > 0)))
+        if overlap:
+            logger.warning(f"Zona '{zone.get('name', index)}' sobrepõe-se a zonas anteriores em {overlap} píxeis")
+        labels[inside & (labels == 0)] = index
+    return labels
+
+
+def _spatial_dims(data: xr.DataArray) -> Optional[Tuple[str, str]]:
+    """Dimensões (lat, lon) do cubo, ou None se não tiver coordenadas geográficas"""
+    lat_dim = next((name for name in LAT_NAMES if name in data.dims and name in data.coords), None)
+    lon_dim = next((name for name in LON_NAMES if name in data.dims and name in data.coords), None)
+    if lat_dim is None or lon_dim is None:
+        return None
+    return lat_dim, lon_dim
+
+
 class AdvancedBiomassCalculator:
     """
     Calculadora avançada de biomassa para Angola
@@ -399,31 +484,197 @@ class AdvancedBiomassCalculator:
             }
         )
     
+    # Modelos com motor vetorizado em cubo (time, lat, lon)
+    CUBE_BIOMASS_TYPES = (BiomassType.TERRESTRIAL, BiomassType.MARINE_PHYTOPLANKTON, BiomassType.MARINE_FISH)
+    EUPHOTIC_DEPTH_M = 50
+    
+    def _zone_parameters(self, zones: List[Dict[str, Any]], biomass_type: BiomassType,
+                         vegetation_type: str, fish_type: str) -> Dict[str, np.ndarray]:
+        """
+        Tabelas de parâmetros por rótulo de zona (índice 0 = fora das zonas)
+        
+        Mantêm as regras dos cálculos por região: tipo de vegetação e limites da
+        zona ecológica (terrestre), tipo de zona marinha (fitoplâncton) e
+        eficiência trófica (peixes).
+        """
+        size = len(zones) + 1
+        params = {'a': np.zeros(size), 'b': np.zeros(size),
+                  'low': np.full(size, -np.inf), 'high': np.full(size, np.inf),
+                  'confidence': np.zeros(size)}
+        
+        for label, zone in enumerate(zones, start=1):
+            bounds = zone.get('bounds') or {}
+            if biomass_type == BiomassType.TERRESTRIAL:
+                ndvi_params = self.conversion_parameters['ndvi_to_biomass']
+                zone_vegetation = zone.get('vegetation_type', vegetation_type)
+                coefficients = ndvi_params.get(zone_vegetation, ndvi_params['mixed'])
+                params['a'][label] = coefficients['slope']
+                params['b'][label] = coefficients['intercept']
+                params['confidence'][label] = coefficients['r2']
+                ecological_zone = self._identify_ecological_zone(bounds) if bounds else None
+                if ecological_zone:
+                    density_range = self.ecological_zones[ecological_zone]['biomass_density_range']
+                    params['low'][label] = density_range[0] * 0.5
+                    params['high'][label] = density_range[1] * 1.2
+            elif biomass_type == BiomassType.MARINE_PHYTOPLANKTON:
+                zone_params = self.conversion_parameters['chl_to_phytoplankton']['coastal']
+                marine_zone = self._identify_marine_zone(bounds or self.angola_model.bounds)
+                if marine_zone and marine_zone in self.marine_zones:
+                    zone_type = self.marine_zones[marine_zone]['zone_type']
+                    if zone_type in ('upwelling', 'offshore'):
+                        zone_params = self.conversion_parameters['chl_to_phytoplankton'][zone_type]
+                # Biomassa húmida (mg/m³) = Chl-a * carbon_ratio * depth_factor / 0.1 / 0.2
+                params['a'][label] = zone_params['carbon_ratio'] * zone_params['depth_factor'] / 0.1 / 0.2
+                params['confidence'][label] = 0.7
+            else:
+                transfer_params = self.conversion_parameters['npp_to_fish']
+                fish_efficiency = transfer_params['trophic_levels'].get(fish_type, 0.15)
+                # Biomassa (mg/m²) = NPP * eficiências * 365 dias / 0.1 / 0.2
+                params['a'][label] = transfer_params['transfer_efficiency'] * fish_efficiency * 365 / 0.1 / 0.2
+                params['confidence'][label] = 0.5
+        return params
+    
+    @staticmethod
+    def _as_cube(data: Union[xr.DataArray, Dict[str, Union[np.ndarray, xr.DataArray]]],
+                 time_dim: str = 'time') -> xr.DataArray:
+        """Normalizar DataArray 2D/3D ou dicionário {timestamp: array} para um cubo com `time_dim`"""
+        if isinstance(data, dict):
+            timestamps = sorted(data.keys())
+            layers = [
+                value if isinstance(value, xr.DataArray) else xr.DataArray(np.asarray(value), dims=('y', 'x'))
+                for value in (data[timestamp] for timestamp in timestamps)
+            ]
+            return xr.concat(layers, dim=pd.Index(timestamps, name=time_dim))
+        if not isinstance(data, xr.DataArray):
+            data = xr.DataArray(np.asarray(data), dims=('y', 'x'))
+        if time_dim not in data.dims:
+            data = data.expand_dims(time_dim)
+        return data
+    
+    def calculate_biomass_cube(self,
+                               cube: Union[xr.DataArray, Dict[str, Union[np.ndarray, xr.DataArray]]],
+                               biomass_type: BiomassType,
+                               zones: Optional[List[Dict[str, Any]]] = None,
+                               vegetation_type: str = 'mixed',
+                               fish_type: str = 'total',
+                               time_dim: str = 'time') -> xr.Dataset:
+        """
+        Biomassa por (tempo, zona) de um cubo (time, lat, lon) numa única redução vetorizada
+        
+        O cubo pode ser lazy (dask, ex.: process.cubes.load_netcdf_cube): máscaras
+        de validade, densidades, áreas geodésicas dos píxeis e totais por zona
+        formam um único grafo, avaliado de uma só vez para todos os passos
+        temporais. As zonas ({'name', 'bounds'} ou 'geometry' GeoJSON) são
+        convertidas uma vez num raster de rótulos. Sem coordenadas lat/lon cada
+        píxel conta como 1 km² e só é aceite uma zona (o cubo inteiro).
+        
+        Returns:
+            Dataset (time, zone) com total_biomass (t), valid_area_km2,
+            mean_density, mean_value, valid_pixels, data_quality e confidence_level
+        """
+        if biomass_type not in self.CUBE_BIOMASS_TYPES:
+            raise ValueError(f"Tipo de biomassa não suportado: {biomass_type}")
+        
+        cube = self._as_cube(cube, time_dim)
+        zones = zones or [{'name': 'region', 'bounds': {}}]
+        dims = _spatial_dims(cube)
+        
+        if dims is not None:
+            lat_dim, lon_dim = dims
+            lats = cube[lat_dim].values
+            lons = cube[lon_dim].values
+            area = geodesic_pixel_areas(lats, lons)
+            labels = zone_label_raster(lats, lons, zones)
+        else:
+            lat_dim, lon_dim = [dim for dim in cube.dims if dim != time_dim][-2:]
+            if len(zones) > 1:
+                raise ValueError("Comparar várias zonas requer um cubo com coordenadas lat/lon")
+            shape = (cube.sizes[lat_dim], cube.sizes[lon_dim])
+            area = np.ones(shape)  # Simplificação: píxeis de ~1 km²
+            labels = np.ones(shape, dtype=np.int16)
+        
+        spatial = (lat_dim, lon_dim)
+        params = self._zone_parameters(zones, biomass_type, vegetation_type, fish_type)
+        area = xr.DataArray(area, dims=spatial)
+        a, b = (xr.DataArray(params[key][labels], dims=spatial) for key in ('a', 'b'))
+        
+        if biomass_type == BiomassType.TERRESTRIAL:
+            # Biomassa (t/ha) = slope * NDVI + intercept, limitada à zona ecológica; km² → ha
+            valid = (cube >= 0.1) & (cube <= 0.9)
+            density = (a * cube + b).clip(xr.DataArray(params['low'][labels], dims=spatial),
+                                          xr.DataArray(params['high'][labels], dims=spatial))
+            tons_per_km2 = density * 100
+        elif biomass_type == BiomassType.MARINE_PHYTOPLANKTON:
+            # mg/m³ na zona eufótica: mg/m³ * km² * km = t
+            valid = (cube >= 0.1) & (cube <= 50.0)
+            density = a * cube
+            tons_per_km2 = density * (self.EUPHOTIC_DEPTH_M / 1000)
+        else:
+            # mg/m²: mg/m² * 1e6 m²/km² / 1e9 mg/t
+            valid = (cube > 0) & (cube < 5000)
+            density = a * cube
+            tons_per_km2 = density * 1e-3
+        
+        zone_ids = np.arange(1, len(zones) + 1)
+        one_hot = xr.DataArray((labels[None, :, :] == zone_ids[:, None, None]).astype(np.float64),
+                               dims=('zone',) + spatial)
+        weight = area * one_hot
+        
+        result = xr.Dataset({
+            'total_biomass': xr.dot(tons_per_km2.where(valid, 0.0), weight, dims=spatial),
+            'valid_area_km2': xr.dot(valid.astype(np.float64), weight, dims=spatial),
+            'density_area_sum': xr.dot(density.where(valid, 0.0), weight, dims=spatial),
+            'value_sum': xr.dot(cube.where(valid, 0.0), one_hot, dims=spatial),
+            'valid_pixels': xr.dot(valid.astype(np.float64), one_hot, dims=spatial),
+        }).compute()
+        
+        zone_pixels = xr.DataArray(one_hot.sum(spatial).values, dims='zone')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result['mean_density'] = (result['density_area_sum'] / result['valid_area_km2']).fillna(0.0)
+            result['mean_value'] = result['value_sum'] / result['valid_pixels']
+            result['data_quality'] = (result['valid_pixels'] / zone_pixels).fillna(0.0)
+        
+        confidence = xr.DataArray(params['confidence'][1:], dims='zone')
+        if biomass_type == BiomassType.TERRESTRIAL:
+            result['confidence_level'] = confidence * (result['valid_pixels'] > 0)
+        else:
+            result['confidence_level'] = confidence * result['data_quality']
+        
+        result = result.drop_vars(['density_area_sum', 'value_sum'])
+        result = result.assign_coords(zone=[zone.get('name', f'zone_{i}') for i, zone in enumerate(zones, start=1)])
+        result['zone_area_km2'] = xr.DataArray([float(area.values[labels == i].sum()) for i in zone_ids], dims='zone')
+        result.attrs.update({'biomass_type': biomass_type.value, 'units': 'toneladas',
+                             'pixel_area': 'geodesic' if dims is not None else '1km2'})
+        return result
+    
+    @staticmethod
+    def _timestamp_labels(values: np.ndarray) -> List[str]:
+        if np.issubdtype(np.asarray(values).dtype, np.datetime64):
+            return [pd.Timestamp(value).isoformat() for value in values]
+        return [str(value) for value in values]
+    
     def calculate_biomass_time_series(self, 
-                                    data_series: Dict[str, Union[np.ndarray, xr.DataArray]],
+                                    data_series: Union[xr.DataArray, Dict[str, Union[np.ndarray, xr.DataArray]]],
                                     biomass_type: BiomassType,
                                     region_bounds: Dict[str, float],
                                     region_name: str = "Angola") -> BiomassTimeSeries:
         """
         Calcular série temporal de biomassa
-        """
-        timestamps = sorted(data_series.keys())
-        biomass_values = []
         
-        for timestamp in timestamps:
-            data = data_series[timestamp]
-            
-            if biomass_type == BiomassType.TERRESTRIAL:
-                result = self.calculate_terrestrial_biomass(data, region_bounds, calculation_date=timestamp)
-            elif biomass_type == BiomassType.MARINE_PHYTOPLANKTON:
-                result = self.calculate_marine_phytoplankton_biomass(data, region_bounds=region_bounds, calculation_date=timestamp)
-            elif biomass_type == BiomassType.MARINE_FISH:
-                result = self.calculate_marine_fish_biomass(data, region_bounds=region_bounds, calculation_date=timestamp)
-            else:
-                logger.error(f"Tipo de biomassa não suportado: {biomass_type}")
-                continue
-            
-            biomass_values.append(result.total_biomass)
+        Aceita um cubo (time, lat, lon) - lazy ou em memória - ou um dicionário
+        {timestamp: array}; todos os passos temporais são reduzidos de uma vez
+        por calculate_biomass_cube.
+        """
+        if biomass_type not in self.CUBE_BIOMASS_TYPES:
+            logger.error(f"Tipo de biomassa não suportado: {biomass_type}")
+            timestamps, biomass_values = [], []
+        else:
+            cube = self._as_cube(data_series)
+            result = self.calculate_biomass_cube(
+                cube, biomass_type, zones=[{'name': region_name, 'bounds': region_bounds}]
+            )
+            timestamps = self._timestamp_labels(result['time'].values)
+            biomass_values = [float(value) for value in result['total_biomass'].isel(zone=0).values]
         
         # Calcular estatísticas da série temporal
         if biomass_values:
@@ -460,18 +711,27 @@ class AdvancedBiomassCalculator:
                             calculation_date: str = None) -> List[Dict[str, Any]]:
         """
         Comparar biomassa entre diferentes zonas
+        
+        Com um DataArray georreferenciado (lat/lon) as zonas são rasterizadas
+        uma vez e todas as zonas (e passos temporais; o resultado é a média
+        temporal) são reduzidas numa só passagem. Arrays sem coordenadas são
+        tratados como já recortados para cada zona.
         """
         if calculation_date is None:
             calculation_date = datetime.now().isoformat()[:10]
         
+        if biomass_type in self.CUBE_BIOMASS_TYPES and isinstance(data, xr.DataArray) and _spatial_dims(data):
+            zone_results = self._compare_biomass_zones_cube(data, zones, biomass_type, calculation_date)
+            zone_results.sort(key=lambda x: x['biomass_result'].total_biomass, reverse=True)
+            return zone_results
+        
         zone_results = []
         
         for zone in zones:
             zone_bounds = zone.get('bounds', {})
             zone_name = zone.get('name', 'Unnamed Zone')
             
-            # Extrair dados da zona (simplificação - em produção usar masking espacial)
-            # Aqui assumimos que os dados já estão filtrados para a zona
+            # Sem coordenadas assumimos que os dados já estão filtrados para a zona
             
             if biomass_type == BiomassType.TERRESTRIAL:
                 result = self.calculate_terrestrial_biomass(
@@ -504,6 +764,63 @@ class AdvancedBiomassCalculator:
         
         return zone_results
     
+    def _compare_biomass_zones_cube(self, data: xr.DataArray, zones: List[Dict[str, Any]],
+                                    biomass_type: BiomassType, calculation_date: str) -> List[Dict[str, Any]]:
+        """Comparação de zonas via raster de rótulos e redução única do cubo"""
+        cube = self._as_cube(data)
+        result = self.calculate_biomass_cube(cube, biomass_type, zones=zones)
+        timestamps = self._timestamp_labels(result['time'].values)
+        temporal_coverage = (
+            {'date': calculation_date} if len(timestamps) == 1
+            else {'start': timestamps[0], 'end': timestamps[-1], 'steps': str(len(timestamps))}
+        )
+        mean_result = result.mean('time')
+        
+        # Unidades de densidade dos cálculos por região
+        density_scale = {
+            BiomassType.TERRESTRIAL: 1.0,               # t/ha
+            BiomassType.MARINE_PHYTOPLANKTON: 1e-3,     # kg/m³
+            BiomassType.MARINE_FISH: 1e-6               # kg/m²
+        }[biomass_type]
+        methods = {
+            BiomassType.TERRESTRIAL: 'NDVI_regression_{vegetation_type}',
+            BiomassType.MARINE_PHYTOPLANKTON: 'chlorophyll_carbon_conversion',
+            BiomassType.MARINE_FISH: 'npp_trophic_transfer_total'
+        }
+        
+        zone_results = []
+        for index, zone in enumerate(zones):
+            values = mean_result.isel(zone=index)
+            area_km2 = float(values['valid_area_km2'])
+            biomass_result = BiomassResult(
+                biomass_type=biomass_type,
+                total_biomass=float(values['total_biomass']),
+                biomass_density=float(values['mean_density']) * density_scale,
+                area_km2=area_km2,
+                calculation_method=methods[biomass_type].format(
+                    vegetation_type=zone.get('vegetation_type', 'mixed')
+                ),
+                confidence_level=float(values['confidence_level']),
+                temporal_coverage=temporal_coverage,
+                spatial_bounds=zone.get('bounds', {}),
+                metadata={
+                    'engine': 'cube',
+                    'pixel_area': result.attrs['pixel_area'],
+                    'zone_area_km2': float(values['zone_area_km2']),
+                    'valid_pixels': int(round(float(values['valid_pixels']))),
+                    'data_quality': float(values['data_quality']),
+                    'mean_value': float(values['mean_value']),
+                    'time_steps': len(timestamps)
+                }
+            )
+            zone_results.append({
+                'zone_name': zone.get('name', 'Unnamed Zone'),
+                'zone_properties': zone,
+                'biomass_result': biomass_result,
+                'biomass_per_km2': biomass_result.total_biomass / area_km2 if area_km2 > 0 else 0
+            })
+        return zone_results
+    
     def _identify_ecological_zone(self, bounds: Dict[str, float]) -> Optional[str]:
         """Identificar zona ecológica baseada nos limites espaciais"""
         center_lat = (bounds.get('lat_min', 0) + bounds.get('lat_max', 0)) / 2
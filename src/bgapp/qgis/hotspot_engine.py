@@ -0,0 +1,326 @@
+"""
+Hotspot Engine for BGAPP
+Motor de hotspots com índice espacial (cKDTree), pesos esparsos para Gi* e KDE por binning + FFT
+"""
+
+import numpy as np
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+import logging
+
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from scipy.signal import fftconvolve
+
+logger = logging.getLogger(__name__)
+
+# (coordenadas (n, 2) lon/lat, valores (n,))
+PointChunk = Tuple[np.ndarray, np.ndarray]
+
+
+class HotspotEngine:
+    """
+    Motor de identificação de hotspots para grandes volumes de pontos
+
+    - Densidade kernel: pontos agregados numa grelha regular e convolução gaussiana via FFT,
+      acumulando chunk a chunk (os pontos nunca precisam de estar todos em memória)
+    - Getis-Ord Gi*: vizinhanças por raio numa cKDTree, pesos em matrizes esparsas por lote,
+      com lotes dimensionados pelo número de pares vizinhos (memória limitada mesmo em zonas densas)
+    - Clustering simples: vizinhos por consulta à cKDTree em vez de matriz de distâncias densa
+    """
+
+    def __init__(self,
+                 grid_resolution: float = 0.1,
+                 bandwidth: float = 0.2,
+                 neighbour_radius: float = 0.5,
+                 cluster_distance: float = 0.3,
+                 oversample: int = 2,
+                 kernel_extent: float = 6.0,
+                 chunk_size: int = 100_000,
+                 max_neighbour_pairs: int = 4_000_000):
+        self.grid_resolution = grid_resolution
+        self.bandwidth = bandwidth
+        self.neighbour_radius = neighbour_radius
+        self.cluster_distance = cluster_distance
+        self.oversample = oversample
+        self.kernel_extent = kernel_extent
+        self.chunk_size = chunk_size
+        self.max_neighbour_pairs = max_neighbour_pairs
+
+    def iter_chunks(self, coordinates: np.ndarray, values: np.ndarray) -> Iterable[PointChunk]:
+        """Dividir arrays (possivelmente memory-mapped) em chunks"""
+        for start in range(0, len(coordinates), self.chunk_size):
+            end = start + self.chunk_size
+            yield np.asarray(coordinates[start:end], dtype=float), np.asarray(values[start:end], dtype=float)
+
+    # ------------------------------------------------------------------
+    # Densidade kernel (binning + FFT)
+    # ------------------------------------------------------------------
+
+    def kernel_density_grid(self,
+                            chunks: Iterable[PointChunk],
+                            bounds: Tuple[float, float, float, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Média ponderada por kernel gaussiano (sum(w*v) / sum(w)) nos nós da grelha
+
+        Args:
+            chunks: Iterável de (coordenadas, valores)
+            bounds: (lon_min, lat_min, lon_max, lat_max)
+
+        Returns:
+            (grid_points (m, 2) lon/lat, densities (m,)); NaN onde o kernel não tem suporte
+        """
+        lon_min, lat_min, lon_max, lat_max = bounds
+        lon_nodes = np.arange(lon_min, lon_max, self.grid_resolution)
+        lat_nodes = np.arange(lat_min, lat_max, self.grid_resolution)
+        if len(lon_nodes) == 0 or len(lat_nodes) == 0:
+            return np.empty((0, 2)), np.empty(0)
+
+        # Bins mais finos que a grelha de saída (os nós coincidem com centros de bins)
+        step = self.grid_resolution / self.oversample
+        nx_bins = len(lon_nodes) * self.oversample
+        ny_bins = len(lat_nodes) * self.oversample
+        size = nx_bins * ny_bins
+
+        weighted = np.zeros(size)
+        counts = np.zeros(size)
+        for coordinates, values in chunks:
+            if len(coordinates) == 0:
+                continue
+            ix = np.clip(np.rint((coordinates[:, 0] - lon_min) / step).astype(np.int64), 0, nx_bins - 1)
+            iy = np.clip(np.rint((coordinates[:, 1] - lat_min) / step).astype(np.int64), 0, ny_bins - 1)
+            flat = iy * nx_bins + ix
+            weighted += np.bincount(flat, weights=values, minlength=size)
+            counts += np.bincount(flat, minlength=size)
+
+        weighted = weighted.reshape(ny_bins, nx_bins)
+        counts = counts.reshape(ny_bins, nx_bins)
+
+        # Kernel gaussiano truncado a `kernel_extent` larguras de banda (peso < 1e-7 além disso)
+        half_width = int(np.ceil(self.kernel_extent * self.bandwidth / step))
+        hx = min(nx_bins - 1, half_width)
+        hy = min(ny_bins - 1, half_width)
+        kx = np.arange(-hx, hx + 1) * step
+        ky = np.arange(-hy, hy + 1) * step
+        kernel = np.outer(
+            np.exp(-(ky ** 2) / (2 * self.bandwidth ** 2)),
+            np.exp(-(kx ** 2) / (2 * self.bandwidth ** 2))
+        )
+
+        numerator = fftconvolve(weighted, kernel, mode='same')
+        denominator = fftconvolve(counts, kernel, mode='same')
+
+        numerator = numerator[::self.oversample, ::self.oversample]
+        denominator = denominator[::self.oversample, ::self.oversample]
+
+        # Ruído numérico da FFT: sem suporte do kernel → NaN
+        support = denominator > max(denominator.max(), 0) * 1e-9
+        densities = np.full(denominator.shape, np.nan)
+        densities[support] = numerator[support] / denominator[support]
+
+        lon_mesh, lat_mesh = np.meshgrid(lon_nodes, lat_nodes)
+        grid_points = np.column_stack([lon_mesh.ravel(), lat_mesh.ravel()])
+        return grid_points, densities.ravel()
+
+    def kernel_density_hotspots(self,
+                                chunks: Iterable[PointChunk],
+                                bounds: Tuple[float, float, float, float]) -> List[Dict[str, Any]]:
+        """
+        Nós da grelha com densidade acima do percentil 90
+
+        O percentil é calculado só sobre os nós com suporte do kernel (a menos de
+        `kernel_extent` larguras de banda de algum ponto); os nós sem suporte (NaN) ficam
+        de fora do limiar e nunca são hotspots
+        """
+        grid_points, densities = self.kernel_density_grid(chunks, bounds)
+        valid = ~np.isnan(densities)
+        if not valid.any():
+            return []
+
+        threshold = np.percentile(densities[valid], 90)
+        hotspot_indices = np.where(valid & (densities > threshold))[0]
+
+        return [
+            {
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': grid_points[idx].tolist()
+                },
+                'properties': {
+                    'density_value': float(densities[idx]),
+                    'hotspot_rank': float(densities[idx] / threshold),
+                    'method': 'kernel_density'
+                }
+            }
+            for idx in hotspot_indices
+        ]
+
+    # ------------------------------------------------------------------
+    # Getis-Ord Gi* (cKDTree + pesos esparsos)
+    # ------------------------------------------------------------------
+
+    def _neighbour_batches(self, tree: cKDTree, coordinates: np.ndarray) -> Iterable[Tuple[int, int]]:
+        """
+        Intervalos [start, end) com no máximo `max_neighbour_pairs` pares vizinhos (mínimo um ponto)
+
+        As contagens vêm de query_ball_point(return_length=True), que não materializa as listas
+        """
+        n = len(coordinates)
+        for chunk_start in range(0, n, self.chunk_size):
+            chunk_end = min(chunk_start + self.chunk_size, n)
+            lengths = tree.query_ball_point(coordinates[chunk_start:chunk_end], self.neighbour_radius,
+                                            return_length=True)
+            cumulative = np.cumsum(lengths)
+            start = 0
+            while start < len(lengths):
+                budget = (cumulative[start - 1] if start else 0) + self.max_neighbour_pairs
+                end = max(start + 1, int(np.searchsorted(cumulative, budget, side='right')))
+                yield chunk_start + start, chunk_start + end
+                start = end
+
+    def getis_ord_statistics(self, coordinates: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estatística Gi* com vizinhança binária de raio `neighbour_radius` (sem o próprio ponto)
+
+        Returns:
+            (gi_star (n,) com NaN onde não definido, número de vizinhos (n,))
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        values = np.asarray(values, dtype=float)
+        n = len(coordinates)
+
+        tree = cKDTree(coordinates)
+        mean_value = values.mean()
+        std_value = values.std()
+
+        gi_star = np.full(n, np.nan)
+        neighbour_counts = np.zeros(n, dtype=np.int64)
+
+        for start, end in self._neighbour_batches(tree, coordinates):
+            # Pares (i, j) do lote como arrays numpy (24 bytes/par), sem listas Python por ponto
+            pairs = cKDTree(coordinates[start:end]).sparse_distance_matrix(
+                tree, self.neighbour_radius, output_type='ndarray'
+            )
+            lengths = np.bincount(pairs['i'], minlength=end - start)
+
+            # Matriz de pesos esparsa apenas para este lote de pontos
+            weights = csr_matrix((np.ones(len(pairs)), (pairs['i'], pairs['j'])), shape=(end - start, n))
+            del pairs
+
+            # Remover auto-correlação (o próprio ponto está sempre na bola)
+            neighbour_sum = lengths - 1
+            weighted_sum = weights @ values - values[start:end]
+
+            numerator = weighted_sum - mean_value * neighbour_sum
+            with np.errstate(invalid='ignore', divide='ignore'):
+                denominator = std_value * np.sqrt((n * neighbour_sum - neighbour_sum ** 2) / (n - 1))
+                chunk_gi = numerator / denominator
+
+            defined = (neighbour_sum > 0) & (denominator != 0)
+            gi_star[start:end] = np.where(defined, chunk_gi, np.nan)
+            neighbour_counts[start:end] = neighbour_sum
+
+        return gi_star, neighbour_counts
+
+    def getis_ord_hotspots(self, coordinates: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
+        """Pontos com |Gi*| > 1.96 (95% confiança)"""
+        if len(coordinates) < 5:
+            return []
+
+        gi_star, _ = self.getis_ord_statistics(coordinates, values)
+        significant = np.where(np.abs(np.nan_to_num(gi_star)) > 1.96)[0]
+
+        return [
+            {
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': np.asarray(coordinates[i], dtype=float).tolist()
+                },
+                'properties': {
+                    'gi_star': float(gi_star[i]),
+                    'hotspot_type': 'hot' if gi_star[i] > 0 else 'cold',
+                    'confidence': '95%',
+                    'original_value': float(values[i]),
+                    'method': 'getis_ord'
+                }
+            }
+            for i in significant
+        ]
+
+    # ------------------------------------------------------------------
+    # Clustering simples (cKDTree)
+    # ------------------------------------------------------------------
+
+    def clustering_hotspots(self, coordinates: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
+        """Agrupar pontos acima do percentil 75 que estejam a menos de `cluster_distance`"""
+        values = np.asarray(values, dtype=float)
+        high_value_threshold = np.percentile(values, 75)
+        high_value_indices = np.where(values > high_value_threshold)[0]
+
+        if len(high_value_indices) == 0:
+            return []
+
+        high_value_coords = np.asarray(coordinates, dtype=float)[high_value_indices]
+        high_values = values[high_value_indices]
+        tree = cKDTree(high_value_coords)
+
+        hotspots = []
+        visited = np.zeros(len(high_value_coords), dtype=bool)
+
+        for i in range(len(high_value_coords)):
+            if visited[i]:
+                continue
+
+            neighbours = np.sort(tree.query_ball_point(high_value_coords[i], self.cluster_distance))
+            visited[neighbours] = True
+
+            cluster_coords = high_value_coords[neighbours]
+            cluster_values = high_values[neighbours]
+
+            hotspots.append({
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': cluster_coords.mean(axis=0).tolist()
+                },
+                'properties': {
+                    'cluster_size': len(neighbours),
+                    'mean_value': float(cluster_values.mean()),
+                    'max_value': float(cluster_values.max()),
+                    'method': 'simple_clustering'
+                }
+            })
+
+        return hotspots
+
+    # ------------------------------------------------------------------
+    # Entrada única
+    # ------------------------------------------------------------------
+
+    def identify(self, coordinates: np.ndarray, values: np.ndarray,
+                 method: str = 'kernel_density') -> List[Dict[str, Any]]:
+        """Identificar hotspots a partir de arrays (aceita arrays memory-mapped)"""
+        if method == 'kernel_density':
+            lon_min, lat_min, lon_max, lat_max = self.bounds_of(self.iter_chunks(coordinates, values))
+            return self.kernel_density_hotspots(
+                self.iter_chunks(coordinates, values), (lon_min, lat_min, lon_max, lat_max)
+            )
+        if method == 'getis_ord':
+            return self.getis_ord_hotspots(coordinates, values)
+        return self.clustering_hotspots(coordinates, values)
+
+    @staticmethod
+    def bounds_of(chunks: Iterable[PointChunk]) -> Tuple[float, float, float, float]:
+        """Extensão (lon_min, lat_min, lon_max, lat_max) de um iterável de chunks"""
+        lon_min = lat_min = np.inf
+        lon_max = lat_max = -np.inf
+        for coordinates, _ in chunks:
+            if len(coordinates) == 0:
+                continue
+            lon_min = min(lon_min, float(coordinates[:, 0].min()))
+            lat_min = min(lat_min, float(coordinates[:, 1].min()))
+            lon_max = max(lon_max, float(coordinates[:, 0].max()))
+            lat_max = max(lat_max, float(coordinates[:, 1].max()))
+        return lon_min, lat_min, lon_max, lat_max
+
+
+# Instância global do motor de hotspots
+hotspot_engine = HotspotEngine()
@@ -13,7 +13,8 @@ import logging
 from dataclasses import dataclass
 from enum import Enum
 
-from shapely.geometry import Point, LineString, Polygon, MultiLineString
+import shapely
+from shapely.geometry import Point, LineString, Polygon, MultiLineString, shape
 from shapely.ops import unary_union, nearest_points
 import geopandas as gpd
 from scipy.spatial.distance import cdist
@@ -356,119 +357,234 @@ class MigrationOverlaySystem:
         
         return angola_trajectories
     
-    def analyze_fishing_zone_interactions(self, 
-                                        trajectories: List[MigrationTrajectory],
-                                        fishing_zones: List[Dict[str, Any]]) -> List[FishingZoneInteraction]:
+    # Colunas aceites em tabelas de posições (ex.: exportações Movebank)
+    FIX_COLUMN_ALIASES = {
+        'individual_id': 'trajectory_id', 'individual-local-identifier': 'trajectory_id',
+        'tag_id': 'trajectory_id', 'lon': 'longitude', 'location-long': 'longitude',
+        'lat': 'latitude', 'location-lat': 'latitude', 'individual-taxon-canonical-name': 'species'
+    }
+    
+    def build_fix_table(self, trajectories: List[MigrationTrajectory]) -> pd.DataFrame:
+        """Tabela colunar com uma linha por posição (fix) de todas as trajetórias"""
+        points = [point for trajectory in trajectories for point in trajectory.points]
+        trajectory_ids = [trajectory.individual_id for trajectory in trajectories for _ in trajectory.points]
+        fixes = pd.DataFrame({
+            'trajectory_id': trajectory_ids,
+            'species': [p.species for p in points],
+            'timestamp': pd.to_datetime([p.timestamp for p in points]),
+            'longitude': np.fromiter((p.longitude for p in points), dtype=np.float64, count=len(points)),
+            'latitude': np.fromiter((p.latitude for p in points), dtype=np.float64, count=len(points)),
+            'status': [p.status.value for p in points]
+        })
+        environmental = pd.DataFrame([p.environmental_data for p in points], index=fixes.index)
+        if not environmental.empty:
+            fixes = fixes.join(environmental.add_prefix('env_'))
+        return fixes
+    
+    def _normalize_fixes(self, fixes: pd.DataFrame, max_gap_hours: Optional[float]) -> pd.DataFrame:
         """
-        Analisar interações entre trajetórias de migração e zonas de pesca
+        Ordenar posições por (trajetória, tempo) e atribuir a cada uma metade
+        dos segmentos adjacentes; segmentos acima de max_gap_hours (tag
+        desligada, lacunas) não contam como tempo de permanência.
         """
-        interactions = []
-        
-        # Converter zonas de pesca para geometrias Shapely
-        fishing_polygons = []
+        fixes = fixes.rename(columns={k: v for k, v in self.FIX_COLUMN_ALIASES.items() if k in fixes.columns})
+        missing = {'trajectory_id', 'timestamp', 'longitude', 'latitude'} - set(fixes.columns)
+        if missing:
+            raise ValueError(f"Colunas em falta na tabela de posições: {sorted(missing)}")
+        if 'species' not in fixes.columns:
+            fixes = fixes.assign(species='unknown')
+        if 'status' not in fixes.columns:
+            fixes = fixes.assign(status=MigrationStatus.UNKNOWN.value)
+        
+        fixes = fixes.dropna(subset=['longitude', 'latitude', 'timestamp'])
+        fixes = fixes.assign(timestamp=pd.to_datetime(fixes['timestamp']))
+        fixes = fixes.sort_values(['trajectory_id', 'timestamp'], kind='mergesort').reset_index(drop=True)
+        
+        trajectory_ids = fixes['trajectory_id'].to_numpy()
+        seconds = fixes['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        same_trajectory = np.r_[False, trajectory_ids[1:] == trajectory_ids[:-1]]
+        gap_hours = np.r_[0.0, np.diff(seconds) / 3600] * same_trajectory
+        if max_gap_hours is not None:
+            gap_hours[gap_hours > max_gap_hours] = 0.0
+        fixes['_half_prev_hours'] = gap_hours / 2
+        fixes['_half_next_hours'] = np.r_[gap_hours[1:], 0.0] / 2
+        return fixes
+    
+    @staticmethod
+    def _prepare_fishing_zones(fishing_zones: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Zonas de pesca GeoJSON → geometrias shapely (Polygon/MultiPolygon)"""
+        prepared = []
         for zone in fishing_zones:
             try:
-                if zone['geometry']['type'] == 'Polygon':
-                    poly = Polygon(zone['geometry']['coordinates'][0])
-                    fishing_polygons.append({
-                        'geometry': poly,
+                if zone['geometry']['type'] in ('Polygon', 'MultiPolygon'):
+                    prepared.append({
+                        'geometry': shape(zone['geometry']),
                         'properties': zone.get('properties', {}),
-                        'zone_id': zone.get('id', f"zone_{len(fishing_polygons)}")
+                        'zone_id': zone.get('id', f"zone_{len(prepared)}")
                     })
             except Exception as e:
                 logger.error(f"Erro ao processar zona de pesca: {e}")
                 continue
+        return prepared
+    
+    def _zone_hits(self, fixes: pd.DataFrame, zones: List[Dict[str, Any]],
+                   batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pares (posição, zona) com a posição dentro ou na fronteira da zona
         
-        # Analisar cada trajetória
-        for trajectory in trajectories:
-            trajectory_line = trajectory.trajectory_geometry
+        Geometrias preparadas numa STRtree; cada lote de posições é testado com
+        uma única consulta vetorizada (shapely 2) em vez de um Point por fix.
+        """
+        geometries = np.array([zone['geometry'] for zone in zones], dtype=object)
+        shapely.prepare(geometries)
+        tree = shapely.STRtree(geometries)
+        
+        longitudes = fixes['longitude'].to_numpy(dtype=np.float64)
+        latitudes = fixes['latitude'].to_numpy(dtype=np.float64)
+        fix_hits, zone_hits = [], []
+        for start in range(0, len(fixes), batch_size):
+            points = shapely.points(longitudes[start:start + batch_size], latitudes[start:start + batch_size])
+            fix_index, zone_index = tree.query(points, predicate='intersects')
+            fix_hits.append(fix_index + start)
+            zone_hits.append(zone_index)
+        
+        if not fix_hits:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(fix_hits), np.concatenate(zone_hits)
+    
+    @staticmethod
+    def _classify_interaction_types(feeding: np.ndarray, resting: np.ndarray, fixes_in_zone: np.ndarray) -> np.ndarray:
+        """Classificar o tipo de interação (alimentação, repouso, travessia, permanência)"""
+        return np.select(
+            [feeding, resting, fixes_in_zone == 1, fixes_in_zone > 5],  # Muitos pontos = permanência
+            ['feeding', 'resting', 'crossing', 'extended_stay'],
+            default='crossing'
+        )
+    
+    def _interaction_table(self, fixes: pd.DataFrame, zones: List[Dict[str, Any]],
+                           max_gap_hours: Optional[float], batch_size: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """(tabela de interações, posições dentro de zonas) para posições já normalizadas"""
+        fixes = self._normalize_fixes(fixes, max_gap_hours)
+        fix_index, zone_index = self._zone_hits(fixes, zones, batch_size) if zones and len(fixes) else ([], [])
+        
+        env_columns = [column for column in fixes.columns if column.startswith('env_')]
+        hits = fixes.iloc[fix_index].assign(_fix=np.asarray(fix_index, dtype=np.int64),
+                                            _zone=np.asarray(zone_index, dtype=np.int64))
+        hits = hits.sort_values(['_zone', '_fix'], kind='mergesort').reset_index(drop=True)
+        
+        # Tempo na zona: metade de cada segmento adjacente a uma posição dentro da zona
+        # (segmentos com ambas as extremidades dentro contam por inteiro)
+        hits['_hours'] = hits['_half_prev_hours'] + hits['_half_next_hours']
+        # Nova visita quando a posição anterior da mesma trajetória não estava na zona
+        previous_fix = hits['_fix'].shift()
+        hits['_visit'] = ~((hits['_zone'] == hits['_zone'].shift()) & (hits['_fix'] - previous_fix == 1) &
+                           (hits['trajectory_id'] == hits['trajectory_id'].shift()))
+        hits['_feeding'] = hits['status'] == MigrationStatus.FEEDING.value
+        hits['_resting'] = hits['status'] == MigrationStatus.RESTING.value
+        
+        aggregations = {
+            'species': ('species', 'first'),
+            'fixes_in_zone': ('_fix', 'size'),
+            'visits': ('_visit', 'sum'),
+            'entry_time': ('timestamp', 'min'),
+            'exit_time': ('timestamp', 'max'),
+            'time_in_zone_hours': ('_hours', 'sum'),
+            'feeding': ('_feeding', 'any'),
+            'resting': ('_resting', 'any'),
+            **{column: (column, 'mean') for column in env_columns}
+        }
+        table = hits.groupby(['trajectory_id', '_zone'], sort=False).agg(**aggregations).reset_index()
+        
+        zone_ids = np.array([zone['zone_id'] for zone in zones], dtype=object)
+        zone_properties = [zones[i]['properties'] for i in table['_zone']]
+        table.insert(2, 'fishing_zone_id', zone_ids[table['_zone'].to_numpy()] if len(table) else [])
+        table.insert(3, 'fishing_type', [props.get('fishing_type', 'unknown') for props in zone_properties])
+        table['visits'] = table['visits'].astype(np.int64)
+        table['interaction_type'] = self._classify_interaction_types(
+            table['feeding'].to_numpy(bool), table['resting'].to_numpy(bool), table['fixes_in_zone'].to_numpy()
+        )
+        table['risk_level'] = [
+            self._calculate_risk_level(species, props, hours)
+            for species, props, hours in zip(table['species'], zone_properties, table['time_in_zone_hours'])
+        ]
+        table = table.drop(columns=['feeding', 'resting'])
+        return table, hits
+    
+    def compute_interaction_table(self,
+                                  fixes: Union[pd.DataFrame, List[MigrationTrajectory]],
+                                  fishing_zones: List[Dict[str, Any]],
+                                  max_gap_hours: Optional[float] = None,
+                                  batch_size: int = 1_000_000,
+                                  as_arrow: bool = False):
+        """
+        Motor de interações trajetória × zona de pesca
+        
+        Args:
+            fixes: trajetórias ou tabela de posições (trajectory_id/individual_id,
+                   timestamp, longitude/lon, latitude/lat e opcionalmente species,
+                   status e colunas env_*), p.ex. milhões de fixes Movebank
+            fishing_zones: zonas GeoJSON (Polygon/MultiPolygon) com id e properties
+            max_gap_hours: segmentos mais longos não contam para o tempo na zona
+            batch_size: posições por consulta vetorizada à STRtree
+            as_arrow: devolver pyarrow.Table em vez de DataFrame
             
-            for fishing_zone in fishing_polygons:
-                fishing_poly = fishing_zone['geometry']
-                zone_id = fishing_zone['zone_id']
-                
-                # Verificar interseção
-                if trajectory_line.intersects(fishing_poly):
-                    interaction = self._analyze_single_interaction(
-                        trajectory, fishing_zone, fishing_poly
-                    )
-                    if interaction:
-                        interactions.append(interaction)
+        Returns:
+            Uma linha por (trajetória, zona) com posições, visitas, entrada/saída,
+            tempo na zona, tipo de interação, risco e médias ambientais (_mean)
+        """
+        if not isinstance(fixes, pd.DataFrame):
+            fixes = self.build_fix_table(fixes)
+        table, _ = self._interaction_table(
+            fixes, self._prepare_fishing_zones(fishing_zones), max_gap_hours, batch_size
+        )
+        table = table.drop(columns=['_zone']).rename(
+            columns=lambda column: f"{column[4:]}_mean" if column.startswith('env_') else column
+        )
+        logger.info(f"🐋 {len(table)} interações trajetória × zona calculadas a partir de {len(fixes)} posições")
         
-        return interactions
+        if as_arrow:
+            try:
+                import pyarrow as pa
+            except ImportError as e:
+                raise ImportError("pyarrow é necessário para as_arrow=True (pip install pyarrow)") from e
+            return pa.Table.from_pandas(table, preserve_index=False)
+        return table
     
-    def _analyze_single_interaction(self, 
-                                  trajectory: MigrationTrajectory,
-                                  fishing_zone: Dict[str, Any],
-                                  fishing_poly: Polygon) -> Optional[FishingZoneInteraction]:
-        """Analisar uma interação específica"""
-        
-        # Encontrar pontos da trajetória dentro da zona
-        points_in_zone = []
-        intersection_points = []
-        
-        for point in trajectory.points:
-            point_geom = Point(point.longitude, point.latitude)
-            if fishing_poly.contains(point_geom) or fishing_poly.touches(point_geom):
-                points_in_zone.append(point)
-                intersection_points.append(point_geom)
-        
-        if not points_in_zone:
-            return None
-        
-        # Calcular tempo na zona
-        if len(points_in_zone) > 1:
-            time_in_zone = (points_in_zone[-1].timestamp - points_in_zone[0].timestamp).total_seconds() / 3600
-        else:
-            time_in_zone = 2.0  # Assumir 2 horas se apenas um ponto
-        
-        # Determinar tipo de interação
-        interaction_type = self._classify_interaction_type(points_in_zone, trajectory)
+    def analyze_fishing_zone_interactions(self, 
+                                        trajectories: List[MigrationTrajectory],
+                                        fishing_zones: List[Dict[str, Any]],
+                                        max_gap_hours: Optional[float] = None) -> List[FishingZoneInteraction]:
+        """
+        Analisar interações entre trajetórias de migração e zonas de pesca
         
-        # Calcular nível de risco
-        risk_level = self._calculate_risk_level(
-            trajectory.species, fishing_zone['properties'], time_in_zone
-        )
+        Usa o motor vetorizado de compute_interaction_table e converte cada
+        linha num FishingZoneInteraction com os pontos dentro da zona.
+        """
+        zones = self._prepare_fishing_zones(fishing_zones)
+        table, hits = self._interaction_table(self.build_fix_table(trajectories), zones, max_gap_hours, 1_000_000)
+        if table.empty:
+            return []
+        
+        env_columns = [column for column in table.columns if column.startswith('env_')]
+        points_by_pair = {
+            key: shapely.points(group['longitude'].to_numpy(), group['latitude'].to_numpy()).tolist()
+            for key, group in hits.groupby(['trajectory_id', '_zone'], sort=False)
+        }
         
-        # Calcular condições ambientais médias
-        env_conditions = {}
-        if points_in_zone:
-            env_vars = points_in_zone[0].environmental_data.keys()
-            for var in env_vars:
-                values = [p.environmental_data.get(var, 0) for p in points_in_zone]
-                env_conditions[var] = np.mean(values)
-        
-        return FishingZoneInteraction(
-            trajectory_id=trajectory.individual_id,
-            fishing_zone_id=fishing_zone['zone_id'],
-            intersection_points=intersection_points,
-            time_in_zone_hours=time_in_zone,
-            interaction_type=interaction_type,
-            risk_level=risk_level,
-            environmental_conditions=env_conditions
-        )
-    
-    def _classify_interaction_type(self, 
-                                 points_in_zone: List[MigrationPoint],
-                                 trajectory: MigrationTrajectory) -> str:
-        """Classificar o tipo de interação"""
-        
-        if not points_in_zone:
-            return 'none'
-        
-        # Analisar status dos pontos na zona
-        statuses = [p.status for p in points_in_zone]
-        
-        if MigrationStatus.FEEDING in statuses:
-            return 'feeding'
-        elif MigrationStatus.RESTING in statuses:
-            return 'resting'
-        elif len(points_in_zone) == 1:
-            return 'crossing'
-        elif len(points_in_zone) > 5:  # Muitos pontos = permanência
-            return 'extended_stay'
-        else:
-            return 'crossing'
+        interactions = []
+        for row in table.to_dict('records'):
+            interactions.append(FishingZoneInteraction(
+                trajectory_id=row['trajectory_id'],
+                fishing_zone_id=row['fishing_zone_id'],
+                intersection_points=points_by_pair[(row['trajectory_id'], row['_zone'])],
+                time_in_zone_hours=float(row['time_in_zone_hours']),
+                interaction_type=row['interaction_type'],
+                risk_level=row['risk_level'],
+                environmental_conditions={
+                    column[4:]: float(row[column]) for column in env_columns if pd.notna(row[column])
+                }
+            ))
+        return interactions
     
     def _calculate_risk_level(self, 
                             species: str, 
@@ -18,6 +18,8 @@ import branca.colormap as cm
 from jinja2 import Template, Environment, FileSystemLoader
 import logging
 
+from ..cartography.tile_server import COLORMAPS, MetoceanTileLayer, tile_url
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,9 +27,12 @@ logger = logging.getLogger(__name__)
 class QGIS2WebExporter:
     """Classe principal para exportar mapas interativos estilo qgis2web"""
     
-    def __init__(self, output_dir: str = "static/interactive_maps"):
+    def __init__(self, output_dir: str = "static/interactive_maps", tiles_base_url: Optional[str] = None):
         """Inicializa o exportador"""
         self.output_dir = Path(output_dir)
+        
+        # Tile server BGAPP (/tiles/...); vazio = URLs relativas à origem que serve o mapa
+        self.tiles_base_url = tiles_base_url if tiles_base_url is not None else os.getenv("BGAPP_TILES_BASE_URL", "")
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
         # Diretório de templates
@@ -288,55 +293,42 @@ class QGIS2WebExporter:
         
         return map_obj
     
-    def add_environmental_layers(self, map_obj: folium.Map) -> folium.Map:
-        """Adiciona camadas ambientais (clorofila, temperatura)"""
+    def add_environmental_layers(self, map_obj: folium.Map,
+                                 variables: Tuple[str, ...] = ("chlorophyll", "sst")) -> folium.Map:
+        """Adiciona camadas ambientais (clorofila, temperatura) como tiles XYZ do tile server BGAPP"""
+        
+        names = {
+            'chlorophyll': ("🌿 Clorofila-a", 'Clorofila-a (mg/m³)'),
+            'sst': ("🌡️ Temperatura da Superfície do Mar", 'Temperatura (°C)'),
+            'salinity': ("🧂 Salinidade", 'Salinidade (PSU)'),
+            'currents': ("🌊 Correntes", 'Velocidade das correntes (m/s)'),
+            'wind': ("💨 Vento", 'Velocidade do vento (m/s)')
+        }
         
         try:
-            # Camada de clorofila (simulada)
-            chl_group = folium.FeatureGroup(name="🌿 Clorofila-a", show=False)
-            
-            # Gerar dados de exemplo para demonstração
-            lat_range = np.linspace(-18, -5, 20)
-            lon_range = np.linspace(11, 24, 20)
-            
-            for lat in lat_range[::3]:  # Reduzir densidade
-                for lon in lon_range[::3]:
-                    # Simular concentração de clorofila
-                    chl_value = np.random.lognormal(mean=np.log(0.5), sigma=0.8)
-                    
-                    # Cor baseada na concentração
-                    if chl_value < 0.3:
-                        color = 'blue'
-                        fillColor = 'lightblue'
-                    elif chl_value < 1.0:
-                        color = 'green'
-                        fillColor = 'lightgreen'
-                    else:
-                        color = 'red'
-                        fillColor = 'orange'
-                    
-                    folium.CircleMarker(
-                        location=[lat, lon],
-                        radius=4,
-                        color=color,
-                        fillColor=fillColor,
-                        weight=1,
-                        fillOpacity=0.6,
-                        popup=f"Clorofila-a: {chl_value:.2f} mg/m³",
-                        tooltip=f"Chl-a: {chl_value:.2f}"
-                    ).add_to(chl_group)
-            
-            chl_group.add_to(map_obj)
-            
-            # Adicionar legenda de clorofila
-            colormap = cm.LinearColormap(
-                colors=['blue', 'green', 'orange', 'red'],
-                vmin=0.1, vmax=2.0,
-                caption='Clorofila-a (mg/m³)'
-            )
-            colormap.add_to(map_obj)
-            
-            logger.info("✅ Adicionadas camadas ambientais")
+            for variable in variables:
+                layer_name, caption = names.get(variable, (variable, variable))
+                folium.TileLayer(
+                    tiles=tile_url(f"metocean-{variable}", 'png', self.tiles_base_url),
+                    attr='BGAPP Metocean',
+                    name=layer_name,
+                    overlay=True,
+                    control=True,
+                    show=False,
+                    opacity=0.7,
+                    max_native_zoom=10  # maxzoom das camadas metocean; acima disso o Leaflet amplia
+                ).add_to(map_obj)
+                
+                # Legenda com a mesma rampa e escala usadas na renderização das tiles
+                style = MetoceanTileLayer.STYLES.get(variable)
+                if style:
+                    cm.LinearColormap(
+                        colors=['#%02x%02x%02x' % rgb for _, rgb in COLORMAPS[style['colormap']]],
+                        vmin=style['vmin'], vmax=style['vmax'],
+                        caption=caption
+                    ).add_to(map_obj)
+            
+            logger.info(f"✅ Adicionadas camadas ambientais (tiles): {', '.join(variables)}")
             
         except Exception as e:
             logger.error(f"Erro ao adicionar camadas ambientais: {e}")
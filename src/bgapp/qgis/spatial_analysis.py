@@ -7,18 +7,22 @@ import json
 import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Any, Optional, Tuple, Union
 from pathlib import Path
 import logging
 from dataclasses import dataclass
 
-from shapely.geometry import Point, Polygon, LineString, MultiPolygon
+import shapely
+from shapely.geometry import Point, Polygon, LineString, MultiPolygon, mapping, shape
 from shapely.ops import unary_union, transform
 from shapely import affinity
 import geopandas as gpd
-from scipy.spatial.distance import cdist
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
 from scipy.ndimage import binary_dilation, binary_erosion
-import networkx as nx
+
+from .hotspot_engine import HotspotEngine
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +81,9 @@ class SpatialAnalysisTools:
             'viewshed': 'Análise de visibilidade',
             'watershed': 'Análise de bacias hidrográficas'
         }
+        
+        # Motor de hotspots (índice espacial, pesos esparsos, KDE por FFT)
+        self.hotspot_engine = HotspotEngine()
     
     def create_buffer_zones(self, 
                            geometries: List[Dict[str, Any]],
@@ -169,134 +176,240 @@ class SpatialAnalysisTools:
         
         return merged_buffers
     
+    # Acima deste número de habitats a betweenness é aproximada por amostragem de k fontes
+    EXACT_BETWEENNESS_MAX_NODES = 1000
+    BETWEENNESS_SAMPLES = 256
+    
     def analyze_connectivity(self, 
                            habitats: List[Dict[str, Any]],
                            species_mobility: float,
-                           barrier_features: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+                           barrier_features: Optional[List[Dict[str, Any]]] = None,
+                           include_corridors: bool = True,
+                           betweenness_samples: Optional[int] = None) -> Dict[str, Any]:
         """
         Análise de conectividade entre habitats
         Similar ao plugin Connectivity Analysis do QGIS
+        
+        Pares candidatos vêm de uma consulta por raio numa cKDTree dos
+        centróides; as barreiras são indexadas uma vez numa STRtree e todos os
+        segmentos candidatos testados numa só consulta. O grafo é mantido como
+        matriz esparsa e 'connectivity_matrix' é uma lista de arestas COO
+        (ver iter_connectivity_edges) em vez de uma matriz densa n².
         """
         
         # Converter habitats para geometrias Shapely
+        habitat_ids = []
         habitat_geometries = []
+        habitat_properties = []
         for i, habitat in enumerate(habitats):
             try:
-                if habitat['geometry']['type'] == 'Polygon':
-                    geom = Polygon(habitat['geometry']['coordinates'][0])
-                    habitat_geometries.append({
-                        'id': i,
-                        'geometry': geom,
-                        'properties': habitat.get('properties', {})
-                    })
+                if habitat['geometry']['type'] in ('Polygon', 'MultiPolygon'):
+                    habitat_geometries.append(shape(habitat['geometry']))
+                    habitat_ids.append(i)
+                    habitat_properties.append(habitat.get('properties', {}))
             except Exception as e:
                 logger.error(f"Erro ao processar habitat {i}: {e}")
                 continue
         
-        # Criar grafo de conectividade
-        connectivity_graph = nx.Graph()
-        
-        # Adicionar nós (habitats)
-        for habitat in habitat_geometries:
-            connectivity_graph.add_node(
-                habitat['id'],
-                geometry=habitat['geometry'],
-                properties=habitat['properties']
-            )
-        
-        # Calcular distâncias entre habitats
-        centroids = [(h['geometry'].centroid.x, h['geometry'].centroid.y) 
-                    for h in habitat_geometries]
+        n_habitats = len(habitat_geometries)
+        ids = np.array(habitat_ids, dtype=np.int64)
+        centroids = shapely.get_coordinates(shapely.centroid(np.array(habitat_geometries, dtype=object)))
         
-        if len(centroids) > 1:
-            distances = cdist(centroids, centroids)
-            
-            # Adicionar arestas baseadas na mobilidade da espécie
-            mobility_degrees = species_mobility / 111000  # Converter metros para graus
-            
-            for i in range(len(habitat_geometries)):
-                for j in range(i + 1, len(habitat_geometries)):
-                    distance = distances[i][j]
-                    
-                    if distance <= mobility_degrees:
-                        # Verificar se há barreiras
-                        if not self._has_barriers(centroids[i], centroids[j], barrier_features):
-                            connectivity_graph.add_edge(
-                                i, j,
-                                distance=distance,
-                                weight=1.0 / (distance + 0.001)  # Peso inversamente proporcional à distância
-                            )
+        # Pares dentro do alcance da espécie (KD-tree em graus)
+        mobility_degrees = species_mobility / 111000  # Converter metros para graus
+        if n_habitats > 1:
+            pairs = cKDTree(centroids).query_pairs(r=mobility_degrees, output_type='ndarray')
+        else:
+            pairs = np.empty((0, 2), dtype=np.int64)
+        pairs = pairs[self._unobstructed_pairs(centroids, pairs, barrier_features)]
+        distances = np.linalg.norm(centroids[pairs[:, 0]] - centroids[pairs[:, 1]], axis=1)
+        weights = 1.0 / (distances + 0.001)  # Peso inversamente proporcional à distância
+        
+        # Grafo esparso simétrico
+        adjacency = sparse.coo_matrix(
+            (np.ones(2 * len(pairs)), (np.r_[pairs[:, 0], pairs[:, 1]], np.r_[pairs[:, 1], pairs[:, 0]])),
+            shape=(n_habitats, n_habitats)
+        ).tocsr()
+        n_components, labels = connected_components(adjacency, directed=False)
+        order = np.argsort(labels, kind='stable')
+        components = np.split(ids[order], np.flatnonzero(np.diff(labels[order])) + 1) if n_habitats else []
         
         # Análise do grafo de conectividade
+        n_edges = len(pairs)
         analysis_results = {
-            'total_habitats': len(habitat_geometries),
-            'connected_components': list(nx.connected_components(connectivity_graph)),
-            'connectivity_matrix': nx.adjacency_matrix(connectivity_graph).todense().tolist(),
+            'total_habitats': n_habitats,
+            'total_edges': int(n_edges),
+            'connected_components': [component.tolist() for component in components],
+            'connectivity_matrix': {
+                # Índices são posições na lista original de habitats (incluindo os ignorados)
+                'format': 'coo',
+                'shape': [len(habitats), len(habitats)],
+                'symmetric': True,
+                'from_habitat': ids[pairs[:, 0]].tolist(),
+                'to_habitat': ids[pairs[:, 1]].tolist(),
+                'distance': distances.tolist(),
+                'weight': weights.tolist()
+            },
             'network_metrics': {
-                'number_of_components': nx.number_connected_components(connectivity_graph),
-                'average_clustering': nx.average_clustering(connectivity_graph),
-                'density': nx.density(connectivity_graph)
+                'number_of_components': int(n_components),
+                'average_clustering': self._average_clustering(adjacency),
+                'density': float(2 * n_edges / (n_habitats * (n_habitats - 1))) if n_habitats > 1 else 0.0
             },
             'critical_habitats': [],
             'corridors': []
         }
         
         # Identificar habitats críticos (alta centralidade)
-        if connectivity_graph.number_of_edges() > 0:
-            centrality = nx.betweenness_centrality(connectivity_graph)
-            critical_threshold = np.mean(list(centrality.values())) + np.std(list(centrality.values()))
+        if n_edges > 0:
+            samples = betweenness_samples
+            if samples is None and n_habitats > self.EXACT_BETWEENNESS_MAX_NODES:
+                samples = self.BETWEENNESS_SAMPLES
+            samples = min(samples, n_habitats) if samples else None
+            values = self._betweenness_centrality(adjacency, samples)
+            analysis_results['network_metrics']['betweenness'] = (
+                {'method': 'approximate', 'samples': samples} if samples else {'method': 'exact'}
+            )
             
-            for node_id, centrality_value in centrality.items():
-                if centrality_value > critical_threshold:
-                    analysis_results['critical_habitats'].append({
-                        'habitat_id': node_id,
-                        'centrality': centrality_value,
-                        'properties': habitat_geometries[node_id]['properties']
-                    })
+            critical_threshold = values.mean() + values.std()
+            for node in np.flatnonzero(values > critical_threshold):
+                analysis_results['critical_habitats'].append({
+                    'habitat_id': int(ids[node]),
+                    'centrality': float(values[node]),
+                    'properties': habitat_properties[node]
+                })
         
         # Identificar corredores importantes
-        for edge in connectivity_graph.edges(data=True):
-            node1, node2, edge_data = edge
-            corridor = {
-                'from_habitat': node1,
-                'to_habitat': node2,
-                'distance_km': edge_data['distance'] * 111,
-                'weight': edge_data['weight'],
-                'geometry': LineString([
-                    centroids[node1],
-                    centroids[node2]
-                ])
-            }
-            analysis_results['corridors'].append(corridor)
+        if include_corridors:
+            analysis_results['corridors'] = [
+                {
+                    'from_habitat': int(ids[i]),
+                    'to_habitat': int(ids[j]),
+                    'distance_km': float(distance * 111),
+                    'weight': float(weight),
+                    'geometry': mapping(LineString([centroids[i], centroids[j]]))
+                }
+                for (i, j), distance, weight in zip(pairs, distances, weights)
+            ]
         
+        logger.info(f"🕸️ Conectividade: {n_habitats} habitats, {n_edges} ligações, {n_components} componentes")
         return analysis_results
     
-    def _has_barriers(self, point1: Tuple[float, float], 
-                     point2: Tuple[float, float],
-                     barrier_features: Optional[List[Dict[str, Any]]]) -> bool:
-        """Verificar se há barreiras entre dois pontos"""
-        if not barrier_features:
-            return False
-        
-        # Criar linha entre os pontos
-        line = LineString([point1, point2])
+    @staticmethod
+    def iter_connectivity_edges(connectivity: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+        """Arestas da lista COO de analyze_connectivity, uma a uma (para NDJSON/streaming)"""
+        matrix = connectivity['connectivity_matrix']
+        for from_habitat, to_habitat, distance, weight in zip(
+            matrix['from_habitat'], matrix['to_habitat'], matrix['distance'], matrix['weight']
+        ):
+            yield {
+                'from_habitat': from_habitat,
+                'to_habitat': to_habitat,
+                'distance_km': distance * 111,
+                'weight': weight
+            }
+    
+    @staticmethod
+    def _betweenness_centrality(adjacency: sparse.csr_matrix, samples: Optional[int] = None,
+                                seed: int = 42, batch_size: int = 64) -> np.ndarray:
+        """
+        Betweenness normalizada (como networkx) pelo algoritmo de Brandes
         
-        # Verificar interseção com barreiras
+        As BFS de um lote de fontes avançam em conjunto por produtos esparsos
+        A @ fronteira (contagem de caminhos mínimos) e as dependências são
+        acumuladas nível a nível no sentido inverso. Com `samples` usa apenas k
+        fontes aleatórias e extrapola (aproximação de Brandes-Pich).
+        """
+        n_nodes = adjacency.shape[0]
+        if samples:
+            sources = np.random.default_rng(seed).choice(n_nodes, size=samples, replace=False)
+        else:
+            sources = np.arange(n_nodes)
+        adjacency = adjacency.astype(np.float64).tocsr()
+        centrality = np.zeros(n_nodes)
+        
+        for start in range(0, len(sources), batch_size):
+            batch = sources[start:start + batch_size]
+            columns = np.arange(len(batch))
+            sigma = np.zeros((n_nodes, len(batch)))
+            distance = np.full((n_nodes, len(batch)), -1, dtype=np.int32)
+            sigma[batch, columns] = 1.0
+            distance[batch, columns] = 0
+            levels = [(batch, columns)]
+            frontier = sparse.csr_matrix((np.ones(len(batch)), (batch, columns)), shape=sigma.shape)
+            
+            # BFS simultânea: número de caminhos mínimos até cada nó, por fonte
+            while frontier.nnz:
+                reached = (adjacency @ frontier).tocoo()
+                new = distance[reached.row, reached.col] < 0
+                rows, cols, paths = reached.row[new], reached.col[new], reached.data[new]
+                if not len(rows):
+                    break
+                distance[rows, cols] = len(levels)
+                sigma[rows, cols] = paths
+                levels.append((rows, cols))
+                frontier = sparse.csr_matrix((paths, (rows, cols)), shape=sigma.shape)
+            
+            # Acumulação das dependências do nível mais profundo para a fonte
+            delta = np.zeros_like(sigma)
+            for level in range(len(levels) - 1, 0, -1):
+                rows, cols = levels[level]
+                coefficients = (1.0 + delta[rows, cols]) / sigma[rows, cols]
+                spread = (adjacency @ sparse.csr_matrix((coefficients, (rows, cols)), shape=sigma.shape)).tocoo()
+                parent = distance[spread.row, spread.col] == level - 1
+                rows, cols = spread.row[parent], spread.col[parent]
+                delta[rows, cols] += sigma[rows, cols] * spread.data[parent]
+            delta[batch, columns] = 0.0
+            centrality += delta.sum(axis=1)
+        
+        if n_nodes > 2:
+            centrality /= (n_nodes - 1) * (n_nodes - 2)
+        return centrality * (n_nodes / len(sources))
+    
+    @staticmethod
+    def _average_clustering(adjacency: sparse.csr_matrix) -> float:
+        """Coeficiente de clustering médio (triângulos por nó via A² ⊙ A, sem densificar)"""
+        n_nodes = adjacency.shape[0]
+        if n_nodes == 0:
+            return 0.0
+        degree = np.asarray(adjacency.sum(axis=1)).ravel()
+        triangles = np.asarray((adjacency @ adjacency).multiply(adjacency).sum(axis=1)).ravel() / 2
+        possible = degree * (degree - 1) / 2
+        clustering = np.divide(triangles, possible, out=np.zeros(n_nodes), where=possible > 0)
+        return float(clustering.mean())
+    
+    def _unobstructed_pairs(self, centroids: np.ndarray, pairs: np.ndarray,
+                            barrier_features: Optional[List[Dict[str, Any]]],
+                            batch_size: int = 500_000) -> np.ndarray:
+        """Máscara dos pares cujo segmento entre centróides não cruza nenhuma barreira"""
+        keep = np.ones(len(pairs), dtype=bool)
+        barriers = self._barrier_index(barrier_features)
+        if barriers is None or not len(pairs):
+            return keep
+        
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            segments = shapely.linestrings(np.stack([centroids[batch[:, 0]], centroids[batch[:, 1]]], axis=1))
+            blocked, _ = barriers.query(segments, predicate='intersects')
+            keep[start + np.unique(blocked)] = False
+        return keep
+    
+    @staticmethod
+    def _barrier_index(barrier_features: Optional[List[Dict[str, Any]]]) -> Optional[shapely.STRtree]:
+        """Barreiras (Polygon/LineString e variantes Multi) interpretadas uma vez e indexadas numa STRtree"""
+        if not barrier_features:
+            return None
+        geometries = []
         for barrier in barrier_features:
             try:
-                if barrier['geometry']['type'] == 'Polygon':
-                    barrier_geom = Polygon(barrier['geometry']['coordinates'][0])
-                elif barrier['geometry']['type'] == 'LineString':
-                    barrier_geom = LineString(barrier['geometry']['coordinates'])
-                else:
-                    continue
-                
-                if line.intersects(barrier_geom):
-                    return True
+                if barrier['geometry']['type'] in ('Polygon', 'MultiPolygon', 'LineString', 'MultiLineString'):
+                    geometries.append(shape(barrier['geometry']))
             except Exception:
                 continue
-        
-        return False
+        if not geometries:
+            return None
+        geometries = np.array(geometries, dtype=object)
+        shapely.prepare(geometries)
+        return shapely.STRtree(geometries)
     
     def identify_hotspots(self, 
                          point_data: List[Dict[str, Any]],
@@ -305,6 +418,10 @@ class SpatialAnalysisTools:
         """
         Identificar hotspots espaciais
         Similar ao Hotspot Analysis (Getis-Ord Gi*) do QGIS
+        
+        Com method='kernel_density' o kernel é truncado a `kernel_extent` larguras de banda:
+        os nós da grelha mais afastados de todos os pontos não têm densidade e não entram no
+        limiar do percentil 90, que é assim calculado só sobre a zona com dados
         """
         
         if not point_data:
@@ -318,7 +435,7 @@ class SpatialAnalysisTools:
             try:
                 coords = point['geometry']['coordinates']
                 value = point['properties'].get(analysis_field, 0)
-                coordinates.append(coords)
+                coordinates.append(coords[:2])
                 values.append(value)
             except Exception as e:
                 logger.error(f"Erro ao processar ponto: {e}")
@@ -327,8 +444,8 @@ class SpatialAnalysisTools:
         if len(coordinates) < 3:
             return {'hotspots': [], 'method': method, 'error': 'Insufficient data points'}
         
-        coordinates = np.array(coordinates)
-        values = np.array(values)
+        coordinates = np.asarray(coordinates, dtype=float)
+        values = np.asarray(values, dtype=float)
         
         if method == 'kernel_density':
             hotspots = self._kernel_density_hotspots(coordinates, values)
@@ -345,158 +462,43 @@ class SpatialAnalysisTools:
         }
     
     def _kernel_density_hotspots(self, coordinates: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
-        """Análise de hotspots usando densidade kernel simplificada"""
-        hotspots = []
-        
-        # Criar grid para análise
-        lon_min, lat_min = coordinates.min(axis=0)
-        lon_max, lat_max = coordinates.max(axis=0)
-        
-        # Grid com resolução aproximada de 0.1 graus
-        lon_grid = np.arange(lon_min, lon_max, 0.1)
-        lat_grid = np.arange(lat_min, lat_max, 0.1)
-        
-        lon_mesh, lat_mesh = np.meshgrid(lon_grid, lat_grid)
-        grid_points = np.column_stack([lon_mesh.ravel(), lat_mesh.ravel()])
-        
-        # Calcular densidade em cada ponto do grid
-        bandwidth = 0.2  # Aproximadamente 22km
-        densities = []
-        
-        for grid_point in grid_points:
-            distances = np.sqrt(np.sum((coordinates - grid_point) ** 2, axis=1))
-            weights = np.exp(-(distances ** 2) / (2 * bandwidth ** 2))
-            density = np.sum(weights * values) / np.sum(weights)
-            densities.append(density)
-        
-        densities = np.array(densities)
-        
-        # Identificar pontos com densidade acima do percentil 90
-        threshold = np.percentile(densities, 90)
-        hotspot_indices = np.where(densities > threshold)[0]
-        
-        for idx in hotspot_indices:
-            hotspot = {
-                'geometry': {
-                    'type': 'Point',
-                    'coordinates': grid_points[idx].tolist()
-                },
-                'properties': {
-                    'density_value': float(densities[idx]),
-                    'hotspot_rank': float(densities[idx] / threshold),
-                    'method': 'kernel_density'
-                }
-            }
-            hotspots.append(hotspot)
-        
-        return hotspots
+        """Análise de hotspots por densidade kernel (binning em grelha de 0.1° + convolução FFT)"""
+        return self.hotspot_engine.identify(coordinates, values, method='kernel_density')
     
     def _getis_ord_hotspots(self, coordinates: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
-        """Análise Getis-Ord Gi* simplificada"""
-        hotspots = []
-        n = len(coordinates)
-        
-        if n < 5:
-            return hotspots
-        
-        # Calcular matriz de distâncias
-        distances = cdist(coordinates, coordinates)
-        
-        # Definir vizinhança (distância máxima de 0.5 graus ≈ 55km)
-        max_distance = 0.5
-        spatial_weights = (distances <= max_distance).astype(float)
-        np.fill_diagonal(spatial_weights, 0)  # Remover auto-correlação
-        
-        # Calcular estatística Gi* para cada ponto
-        mean_value = np.mean(values)
-        std_value = np.std(values)
-        
-        for i in range(n):
-            neighbors = spatial_weights[i]
-            neighbor_sum = np.sum(neighbors)
-            
-            if neighbor_sum == 0:
-                continue
-            
-            # Gi* statistic
-            numerator = np.sum(neighbors * values) - mean_value * neighbor_sum
-            denominator = std_value * np.sqrt((n * neighbor_sum - neighbor_sum ** 2) / (n - 1))
-            
-            if denominator != 0:
-                gi_star = numerator / denominator
-                
-                # Considerar hotspot se Gi* > 1.96 (95% confiança)
-                if abs(gi_star) > 1.96:
-                    hotspot_type = 'hot' if gi_star > 0 else 'cold'
-                    
-                    hotspot = {
-                        'geometry': {
-                            'type': 'Point',
-                            'coordinates': coordinates[i].tolist()
-                        },
-                        'properties': {
-                            'gi_star': float(gi_star),
-                            'hotspot_type': hotspot_type,
-                            'confidence': '95%',
-                            'original_value': float(values[i]),
-                            'method': 'getis_ord'
-                        }
-                    }
-                    hotspots.append(hotspot)
-        
-        return hotspots
+        """Análise Getis-Ord Gi* com vizinhança por cKDTree e pesos esparsos"""
+        return self.hotspot_engine.getis_ord_hotspots(coordinates, values)
     
     def _simple_clustering_hotspots(self, coordinates: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
         """Clustering simples baseado em valores altos e proximidade"""
-        hotspots = []
-        
-        # Identificar pontos com valores acima do percentil 75
-        high_value_threshold = np.percentile(values, 75)
-        high_value_indices = np.where(values > high_value_threshold)[0]
-        
-        if len(high_value_indices) == 0:
-            return hotspots
-        
-        high_value_coords = coordinates[high_value_indices]
-        high_values = values[high_value_indices]
+        return self.hotspot_engine.clustering_hotspots(coordinates, values)
+    
+    def identify_hotspots_chunked(self,
+                                  chunks: Iterable[Tuple[np.ndarray, np.ndarray]],
+                                  bounds: Tuple[float, float, float, float],
+                                  analysis_field: str = 'value') -> Dict[str, Any]:
+        """
+        Hotspots por densidade kernel para conjuntos maiores que a memória
         
-        # Agrupar pontos próximos (distância < 0.3 graus ≈ 33km)
-        cluster_distance = 0.3
-        distances = cdist(high_value_coords, high_value_coords)
+        Args:
+            chunks: Iterável de (coordenadas lon/lat (n, 2), valores (n,)), ex.: leitura Parquet por row group
+            bounds: (lon_min, lat_min, lon_max, lat_max) da área de análise
+        """
+        total_points = 0
         
-        visited = set()
+        def counted(source):
+            nonlocal total_points
+            for coordinates, values in source:
+                total_points += len(coordinates)
+                yield coordinates, values
         
-        for i, coord in enumerate(high_value_coords):
-            if i in visited:
-                continue
-            
-            # Encontrar vizinhos próximos
-            neighbors = np.where(distances[i] <= cluster_distance)[0]
-            cluster_coords = high_value_coords[neighbors]
-            cluster_values = high_values[neighbors]
-            
-            # Marcar como visitados
-            visited.update(neighbors)
-            
-            # Criar hotspot representando o cluster
-            centroid = np.mean(cluster_coords, axis=0)
-            mean_value = np.mean(cluster_values)
-            
-            hotspot = {
-                'geometry': {
-                    'type': 'Point',
-                    'coordinates': centroid.tolist()
-                },
-                'properties': {
-                    'cluster_size': len(neighbors),
-                    'mean_value': float(mean_value),
-                    'max_value': float(np.max(cluster_values)),
-                    'method': 'simple_clustering'
-                }
-            }
-            hotspots.append(hotspot)
-        
-        return hotspots
+        hotspots = self.hotspot_engine.kernel_density_hotspots(counted(chunks), bounds)
+        return {
+            'hotspots': hotspots,
+            'method': 'kernel_density',
+            'total_points': total_points,
+            'analysis_field': analysis_field
+        }
     
     def create_ecological_corridors(self, 
                                   source_habitats: List[Dict[str, Any]],
@@ -13,6 +13,7 @@ import logging
 from dataclasses import dataclass
 from enum import Enum
 
+from scipy import ndimage
 from scipy.spatial.distance import cdist
 from sklearn.preprocessing import MinMaxScaler
 import networkx as nx
@@ -69,7 +70,11 @@ class SustainableZonesMCDA:
     Implementa múltiplos métodos MCDA para ordenamento espacial marinho
     """
     
-    def __init__(self):
+    def __init__(self,
+                 grid_size: int = 50,
+                 min_zone_cells: int = 3,
+                 max_zones: int = 20,
+                 stack_dir: str = "data/mcda/stacks"):
         # Configuração da ZEE angolana
         self.angola_bounds = {
             'north': -4.2, 'south': -18.2, 'east': 17.5, 'west': 8.5
@@ -190,7 +195,14 @@ class SustainableZonesMCDA:
         }
         
         # Grid de análise padrão
-        self.default_grid_size = 50  # 50x50 células
+        self.default_grid_size = grid_size  # 50x50 células por omissão
+        
+        # Zonas: tamanho mínimo (células) e número máximo devolvido
+        self.min_zone_cells = min_zone_cells
+        self.max_zones = max_zones
+        
+        # Diretório com stacks de critérios (.npy + .json) abertos por memory-map
+        self.stack_dir = Path(stack_dir)
     
     def create_criteria_from_template(self, 
                                     zone_type: str,
@@ -234,8 +246,107 @@ class SustainableZonesMCDA:
                 criterion.weight = criterion.weight / total_weight
         
         return criteria
-    
-    def _simulate_criterion_data(self, 
+
+    def save_criteria_stack(self,
+                            data_sources: Dict[str, np.ndarray],
+                            output_path: str,
+                            dtype: str = 'float32') -> Path:
+        """
+        Gravar rasters de critérios como um stack (critério, linha, coluna) em .npy
+
+        Os nomes dos critérios ficam num ficheiro .json ao lado do .npy
+        """
+        if not data_sources:
+            raise ValueError("Nenhum raster de critério fornecido")
+
+        names = list(data_sources.keys())
+        shape = np.shape(data_sources[names[0]])
+        for name in names:
+            if np.shape(data_sources[name]) != shape:
+                raise ValueError(f"Raster '{name}' com dimensões diferentes de {shape}")
+
+        stack_file = Path(output_path).with_suffix('.npy')
+        stack_file.parent.mkdir(parents=True, exist_ok=True)
+
+        # Escrita critério a critério: o stack completo nunca é montado em memória
+        stack = np.lib.format.open_memmap(
+            stack_file, mode='w+', dtype=dtype, shape=(len(names),) + tuple(shape)
+        )
+        for index, name in enumerate(names):
+            stack[index] = data_sources[name]
+        stack.flush()
+        del stack
+
+        with open(stack_file.with_suffix('.json'), 'w', encoding='utf-8') as f:
+            json.dump({'criteria': names, 'shape': list(shape), 'dtype': dtype}, f)
+
+        return stack_file
+
+    def load_criteria_stack(self, stack_path: str) -> Dict[str, np.ndarray]:
+        """
+        Abrir um stack de critérios por memory-map
+
+        Returns:
+            Dicionário nome → vista (linha, coluna) sobre o ficheiro; os dados só
+            são lidos do disco quando usados
+        """
+        stack_file = Path(stack_path).with_suffix('.npy')
+        if not stack_file.exists():
+            raise FileNotFoundError(f"Stack de critérios não encontrado: {stack_file}")
+
+        stack = np.load(stack_file, mmap_mode='r')
+        if stack.ndim != 3:
+            raise ValueError(f"Stack de critérios deve ter 3 dimensões, tem {stack.ndim}")
+
+        metadata_file = stack_file.with_suffix('.json')
+        if metadata_file.exists():
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                names = json.load(f)['criteria']
+        else:
+            names = [f"criterion_{index}" for index in range(stack.shape[0])]
+
+        if len(names) != stack.shape[0]:
+            raise ValueError("Número de nomes de critérios não corresponde ao stack")
+
+        return {name: stack[index] for index, name in enumerate(names)}
+
+    def resolve_criteria_stack(self, stack_name: str) -> Path:
+        """Resolver o nome de um stack dentro de `stack_dir` (sem caminhos arbitrários)"""
+        if not stack_name or Path(stack_name).name != stack_name:
+            raise ValueError(f"Nome de stack inválido: {stack_name}")
+        return self.stack_dir / Path(stack_name).with_suffix('.npy').name
+
+    def create_criteria_from_stack(self,
+                                   zone_type: str,
+                                   stack: Union[str, np.ndarray],
+                                   criterion_names: Optional[List[str]] = None,
+                                   custom_weights: Optional[Dict[str, float]] = None) -> List[MCDACriterion]:
+        """
+        Criar critérios de um template a partir de um stack (critério, linha, coluna)
+
+        Args:
+            stack: Caminho para um .npy (aberto por memory-map) ou array 3D
+            criterion_names: Nomes das camadas quando `stack` é um array
+        """
+        if isinstance(stack, np.ndarray):
+            if stack.ndim != 3:
+                raise ValueError(f"Stack de critérios deve ter 3 dimensões, tem {stack.ndim}")
+            names = criterion_names or list(self.default_criteria_templates.get(zone_type, {}).keys())
+            if len(names) != stack.shape[0]:
+                raise ValueError("Número de nomes de critérios não corresponde ao stack")
+            data_sources = {name: stack[index] for index, name in enumerate(names)}
+        else:
+            data_sources = self.load_criteria_stack(stack)
+
+        # Critérios em falta no stack seriam simulados numa grelha de tamanho diferente
+        template = self.default_criteria_templates.get(zone_type, {})
+        missing = [name for name in template if name not in data_sources]
+        if missing:
+            raise ValueError(f"Critérios em falta no stack: {', '.join(missing)}")
+
+        return self.create_criteria_from_template(zone_type, data_sources, custom_weights)
+
+    def _simulate_criterion_data(self,
                                criterion_name: str, 
                                criterion_config: Dict[str, Any]) -> np.ndarray:
         """Simular dados de critério para demonstração"""
@@ -248,20 +359,16 @@ class SustainableZonesMCDA:
         if 'biodiversity' in criterion_name.lower():
             # Biodiversidade: maior próximo da costa e upwelling
             base_data = np.random.beta(2, 3, (grid_size, grid_size))
-            # Adicionar gradiente coastal
-            for i in range(grid_size):
-                coastal_factor = 1.0 - (i / grid_size) * 0.5  # Diminui com distância da costa
-                base_data[i, :] *= coastal_factor
+            # Adicionar gradiente coastal (diminui com distância da costa)
+            rows = np.arange(grid_size)[:, np.newaxis]
+            base_data *= 1.0 - (rows / grid_size) * 0.5
             return base_data
         
         elif 'depth' in criterion_name.lower() or 'profundidade' in criterion_name.lower():
             # Profundidade: aumenta com distância da costa
-            depth_data = np.zeros((grid_size, grid_size))
-            for i in range(grid_size):
-                for j in range(grid_size):
-                    # Distância normalizada da costa (simplificado)
-                    coastal_distance = i / grid_size
-                    depth_data[i, j] = coastal_distance * 2000 + np.random.normal(0, 100)
+            # Distância normalizada da costa (simplificado)
+            coastal_distance = np.arange(grid_size)[:, np.newaxis] / grid_size
+            depth_data = coastal_distance * 2000 + np.random.normal(0, 100, (grid_size, grid_size))
             return np.maximum(depth_data, 10)  # Mínimo 10m
         
         elif 'fishing' in criterion_name.lower():
@@ -269,11 +376,10 @@ class SustainableZonesMCDA:
             pressure_data = np.random.exponential(2, (grid_size, grid_size))
             # Adicionar hotspots de pesca
             hotspots = [(10, 15), (25, 30), (40, 20)]  # Posições dos portos principais
+            rows, cols = np.ogrid[:grid_size, :grid_size]
             for hot_i, hot_j in hotspots:
-                for i in range(grid_size):
-                    for j in range(grid_size):
-                        distance = np.sqrt((i - hot_i)**2 + (j - hot_j)**2)
-                        pressure_data[i, j] += 5 * np.exp(-distance / 10)
+                distance = np.sqrt((rows - hot_i)**2 + (cols - hot_j)**2)
+                pressure_data += 5 * np.exp(-distance / 10)
             return pressure_data
         
         elif 'quality' in criterion_name.lower() or 'qualidade' in criterion_name.lower():
@@ -284,19 +390,15 @@ class SustainableZonesMCDA:
         
         elif 'accessibility' in criterion_name.lower() or 'acessibilidade' in criterion_name.lower():
             # Acessibilidade: maior próximo da costa e infraestrutura
-            access_data = np.zeros((grid_size, grid_size))
-            for i in range(grid_size):
-                coastal_access = 1.0 - (i / grid_size) * 0.8
-                access_data[i, :] = coastal_access + np.random.normal(0, 0.1, grid_size)
+            coastal_access = 1.0 - (np.arange(grid_size)[:, np.newaxis] / grid_size) * 0.8
+            access_data = coastal_access + np.random.normal(0, 0.1, (grid_size, grid_size))
             return np.clip(access_data, 0, 1)
         
         elif 'abundance' in criterion_name.lower() or 'abundancia' in criterion_name.lower():
             # Abundância de peixes: relacionada com upwelling e características oceanográficas
             abundance_data = np.random.lognormal(0, 1, (grid_size, grid_size))
             # Simular efeito do upwelling (mais forte no sul)
-            for i in range(grid_size):
-                upwelling_factor = 1.0 + (i / grid_size) * 2  # Aumenta para sul
-                abundance_data[i, :] *= upwelling_factor
+            abundance_data *= 1.0 + (np.arange(grid_size)[:, np.newaxis] / grid_size) * 2
             return abundance_data
         
         elif 'current' in criterion_name.lower() or 'corrente' in criterion_name.lower():
@@ -306,11 +408,8 @@ class SustainableZonesMCDA:
         
         elif 'wave' in criterion_name.lower() or 'onda' in criterion_name.lower():
             # Exposição a ondas: maior no oceano aberto
-            wave_data = np.zeros((grid_size, grid_size))
-            for i in range(grid_size):
-                for j in range(grid_size):
-                    oceanic_exposure = i / grid_size  # Aumenta com distância da costa
-                    wave_data[i, j] = oceanic_exposure * 3 + np.random.normal(0, 0.3)
+            oceanic_exposure = np.arange(grid_size)[:, np.newaxis] / grid_size  # Aumenta com distância da costa
+            wave_data = oceanic_exposure * 3 + np.random.normal(0, 0.3, (grid_size, grid_size))
             return np.maximum(wave_data, 0.5)
         
         else:
@@ -359,7 +458,8 @@ class SustainableZonesMCDA:
             'statistics': statistics,
             'sensitivity_analysis': sensitivity_analysis,
             'analysis_metadata': {
-                'grid_size': self.default_grid_size,
+                'grid_size': suitability_matrix.shape[0],
+                'grid_shape': list(suitability_matrix.shape),
                 'total_criteria': len(criteria),
                 'analysis_date': datetime.now().isoformat(),
                 'bounds': self.angola_bounds
@@ -437,17 +537,17 @@ class SustainableZonesMCDA:
         if not np.any(valid_mask):
             return np.ones_like(data) * 0.5
         
-        ranks = np.zeros_like(flat_data)
-        valid_data = flat_data[valid_mask]
+        ranks = np.zeros(flat_data.shape)
+        valid_indices = np.flatnonzero(valid_mask)
+        valid_data = flat_data[valid_indices]
         
         if criterion_type == CriteriaType.BENEFIT:
             sorted_indices = np.argsort(valid_data)[::-1]  # Descendente
         else:
             sorted_indices = np.argsort(valid_data)  # Ascendente
         
-        for i, idx in enumerate(sorted_indices):
-            original_idx = np.where(valid_mask)[0][idx]
-            ranks[original_idx] = (i + 1) / len(valid_data)
+        # Posição de cada célula na ordenação, numa única atribuição
+        ranks[valid_indices[sorted_indices]] = np.arange(1, len(valid_data) + 1) / len(valid_data)
         
         return ranks.reshape(data.shape)
     
@@ -476,9 +576,11 @@ class SustainableZonesMCDA:
         shape = criteria[0].data.shape
         suitability_matrix = np.zeros(shape)
         
-        # Somar critérios ponderados
+        # Somar critérios ponderados (acumulação in-place, sem temporários por critério)
+        scratch = np.empty(shape)
         for criterion in criteria:
-            suitability_matrix += criterion.weight * criterion.data
+            np.multiply(criterion.data, criterion.weight, out=scratch)
+            suitability_matrix += scratch
         
         return suitability_matrix
     
@@ -521,10 +623,15 @@ class SustainableZonesMCDA:
                                   suitability_matrix: np.ndarray,
                                   criteria: List[MCDACriterion],
                                   zone_type: str) -> List[SustainableZone]:
-        """Identificar zonas sustentáveis baseadas na matriz de adequação"""
+        """
+        Identificar zonas sustentáveis baseadas na matriz de adequação
+
+        Cada classe de adequação é rotulada numa única passagem (componentes conexas)
+        e as estatísticas por zona são agregadas com np.bincount sobre os rótulos.
+        Só as `max_zones` melhores zonas são materializadas em SustainableZone.
+        """
         
-        zones = []
-        grid_size = suitability_matrix.shape[0]
+        n_rows, n_cols = suitability_matrix.shape
         
         # Definir classes de adequação
         suitability_classes = [
@@ -534,10 +641,16 @@ class SustainableZonesMCDA:
         ]
         
         # Calcular coordenadas geográficas
-        lat_range = np.linspace(self.angola_bounds['south'], self.angola_bounds['north'], grid_size)
-        lon_range = np.linspace(self.angola_bounds['west'], self.angola_bounds['east'], grid_size)
+        lat_range = np.linspace(self.angola_bounds['south'], self.angola_bounds['north'], n_rows)
+        lon_range = np.linspace(self.angola_bounds['west'], self.angola_bounds['east'], n_cols)
+        cell_area_km2 = self._cell_area_km2(suitability_matrix.shape)
+        
+        # Índices de linha/coluna de cada célula (ordem row-major)
+        row_index = np.repeat(np.arange(n_rows, dtype=float), n_cols)
+        col_index = np.tile(np.arange(n_cols, dtype=float), n_rows)
+        suitability_flat = suitability_matrix.ravel()
         
-        zone_id = 0
+        candidates = []  # Uma entrada por classe com arrays por zona
         
         for suitability_class in suitability_classes:
             # Identificar células que pertencem a esta classe
@@ -548,105 +661,119 @@ class SustainableZonesMCDA:
                 continue
             
             # Agrupar células contíguas em zonas
-            zone_clusters = self._find_contiguous_zones(mask)
+            labels, n_labels = self._label_zones(mask)
+            flat_labels = labels.ravel()
+            cell_counts = np.bincount(flat_labels, minlength=n_labels + 1)
             
-            for cluster in zone_clusters:
-                if len(cluster) < 3:  # Ignorar zonas muito pequenas
-                    continue
-                
-                # Calcular centroide
-                cluster_i, cluster_j = zip(*cluster)
-                centroid_i = int(np.mean(cluster_i))
-                centroid_j = int(np.mean(cluster_j))
-                
-                centroid_lat = lat_range[centroid_i]
-                centroid_lon = lon_range[centroid_j]
-                
-                # Calcular área (aproximada)
-                cell_area_km2 = ((self.angola_bounds['east'] - self.angola_bounds['west']) / grid_size) * \
-                               ((self.angola_bounds['north'] - self.angola_bounds['south']) / grid_size) * \
-                               111 * 111  # Conversão aproximada graus para km
-                
-                area_km2 = len(cluster) * cell_area_km2
-                
-                # Calcular pontuação média da zona
-                zone_scores = [suitability_matrix[i, j] for i, j in cluster]
-                avg_suitability = np.mean(zone_scores)
-                
-                # Calcular pontuações individuais dos critérios
-                criteria_scores = {}
-                for criterion in criteria:
-                    criterion_values = [criterion.data[i, j] for i, j in cluster]
-                    criteria_scores[criterion.name] = np.mean(criterion_values)
-                
-                # Gerar recomendações baseadas no tipo de zona
-                recommendations = self._generate_zone_recommendations(
-                    zone_type, suitability_class['name'], criteria_scores
-                )
-                
-                # Identificar restrições
-                constraints = self._identify_zone_constraints(
-                    zone_type, criteria_scores
-                )
-                
-                zone = SustainableZone(
-                    zone_id=f"{zone_type}_{zone_id:03d}",
-                    suitability_score=avg_suitability,
-                    area_km2=area_km2,
-                    centroid_lat=centroid_lat,
-                    centroid_lon=centroid_lon,
-                    zone_type=zone_type,
-                    criteria_scores=criteria_scores,
-                    recommendations=recommendations,
-                    constraints=constraints,
-                    metadata={
-                        'suitability_class': suitability_class['name'],
-                        'cell_count': len(cluster),
-                        'cluster_cells': cluster[:10]  # Primeiras 10 células para referência
-                    }
-                )
-                
-                zones.append(zone)
-                zone_id += 1
+            # Ignorar zonas muito pequenas (rótulo 0 é o fundo)
+            kept = np.flatnonzero(cell_counts >= self.min_zone_cells)
+            kept = kept[kept > 0]
+            if len(kept) == 0:
+                continue
+            
+            counts = cell_counts[kept]
+            
+            def zone_mean(values: np.ndarray) -> np.ndarray:
+                sums = np.bincount(flat_labels, weights=values, minlength=n_labels + 1)
+                return sums[kept] / counts
+            
+            candidates.append({
+                'class_name': suitability_class['name'],
+                'labels': labels,
+                'zone_labels': kept,
+                'cell_counts': counts,
+                'scores': zone_mean(suitability_flat),
+                'centroid_rows': zone_mean(row_index).astype(int),
+                'centroid_cols': zone_mean(col_index).astype(int),
+                'criteria_scores': {
+                    criterion.name: zone_mean(np.ravel(criterion.data))
+                    for criterion in criteria
+                }
+            })
         
-        # Ordenar zonas por adequação (decrescente)
-        zones.sort(key=lambda z: z.suitability_score, reverse=True)
+        if not candidates:
+            return []
         
-        return zones[:20]  # Retornar top 20 zonas
-    
-    def _find_contiguous_zones(self, mask: np.ndarray) -> List[List[Tuple[int, int]]]:
-        """Encontrar zonas contíguas usando flood fill"""
-        visited = np.zeros_like(mask, dtype=bool)
-        clusters = []
-        
-        def flood_fill(start_i, start_j):
-            stack = [(start_i, start_j)]
-            cluster = []
+        # Ordenar zonas por adequação (decrescente, estável na ordem de descoberta)
+        all_scores = np.concatenate([candidate['scores'] for candidate in candidates])
+        class_of_zone = np.concatenate([
+            np.full(len(candidate['scores']), index) for index, candidate in enumerate(candidates)
+        ])
+        position_in_class = np.concatenate([np.arange(len(candidate['scores'])) for candidate in candidates])
+        top = np.argsort(-all_scores, kind='stable')[:self.max_zones]
+        
+        zones = []
+        objects_cache = {}
+        
+        for zone_id in top:
+            candidate = candidates[class_of_zone[zone_id]]
+            k = position_in_class[zone_id]
+            label = candidate['zone_labels'][k]
             
-            while stack:
-                i, j = stack.pop()
-                
-                if (i < 0 or i >= mask.shape[0] or j < 0 or j >= mask.shape[1] or
-                    visited[i, j] or not mask[i, j]):
-                    continue
-                
-                visited[i, j] = True
-                cluster.append((i, j))
-                
-                # Adicionar vizinhos (4-conectividade)
-                stack.extend([(i+1, j), (i-1, j), (i, j+1), (i, j-1)])
+            criteria_scores = {
+                name: float(values[k]) for name, values in candidate['criteria_scores'].items()
+            }
             
-            return cluster
-        
-        # Encontrar todos os clusters
-        for i in range(mask.shape[0]):
-            for j in range(mask.shape[1]):
-                if mask[i, j] and not visited[i, j]:
-                    cluster = flood_fill(i, j)
-                    if cluster:
-                        clusters.append(cluster)
+            # Gerar recomendações baseadas no tipo de zona
+            recommendations = self._generate_zone_recommendations(
+                zone_type, candidate['class_name'], criteria_scores
+            )
+            
+            # Identificar restrições
+            constraints = self._identify_zone_constraints(
+                zone_type, criteria_scores
+            )
+            
+            # Primeiras células da zona, procuradas apenas dentro da sua bounding box
+            class_index = class_of_zone[zone_id]
+            if class_index not in objects_cache:
+                objects_cache[class_index] = ndimage.find_objects(candidate['labels'])
+            bbox = objects_cache[class_index][label - 1]
+            cells = np.argwhere(candidate['labels'][bbox] == label)[:10]
+            cluster_cells = [
+                (int(i + bbox[0].start), int(j + bbox[1].start)) for i, j in cells
+            ]
+            
+            cell_count = int(candidate['cell_counts'][k])
+            
+            zone = SustainableZone(
+                zone_id=f"{zone_type}_{zone_id:03d}",
+                suitability_score=float(candidate['scores'][k]),
+                area_km2=cell_count * cell_area_km2,
+                centroid_lat=float(lat_range[candidate['centroid_rows'][k]]),
+                centroid_lon=float(lon_range[candidate['centroid_cols'][k]]),
+                zone_type=zone_type,
+                criteria_scores=criteria_scores,
+                recommendations=recommendations,
+                constraints=constraints,
+                metadata={
+                    'suitability_class': candidate['class_name'],
+                    'cell_count': cell_count,
+                    'cluster_cells': cluster_cells  # Primeiras 10 células para referência
+                }
+            )
+            
+            zones.append(zone)
         
-        return clusters
+        return zones
+    
+    def _label_zones(self, mask: np.ndarray) -> Tuple[np.ndarray, int]:
+        """
+        Rotular zonas contíguas (4-conectividade) numa única passagem vetorizada
+
+        Returns:
+            (rótulos com 0 no fundo e 1..n por zona em ordem de varrimento, n)
+        """
+        structure = ndimage.generate_binary_structure(2, 1)
+        labels, n_labels = ndimage.label(mask, structure=structure)
+        return labels, int(n_labels)
+    
+    def _cell_area_km2(self, shape: Tuple[int, ...]) -> float:
+        """Área aproximada de uma célula da grelha de análise"""
+        n_rows, n_cols = shape[0], shape[1]
+        return ((self.angola_bounds['east'] - self.angola_bounds['west']) / n_cols) * \
+               ((self.angola_bounds['north'] - self.angola_bounds['south']) / n_rows) * \
+               111 * 111  # Conversão aproximada graus para km
     
     def _generate_zone_recommendations(self, 
                                      zone_type: str,
@@ -752,6 +879,8 @@ class SustainableZonesMCDA:
         if len(valid_suitability) == 0:
             return {'error': 'No valid suitability values'}
         
+        cell_area_km2 = self._cell_area_km2(suitability_matrix.shape)
+        
         statistics = {
             'suitability_statistics': {
                 'mean': float(np.mean(valid_suitability)),
@@ -767,28 +896,22 @@ class SustainableZonesMCDA:
                 }
             },
             'area_statistics': {
-                'total_analyzed_km2': float(len(valid_suitability) * 
-                    ((self.angola_bounds['east'] - self.angola_bounds['west']) / self.default_grid_size) *
-                    ((self.angola_bounds['north'] - self.angola_bounds['south']) / self.default_grid_size) *
-                    111 * 111),
-                'high_suitability_km2': float(np.sum(valid_suitability > 0.7) * 
-                    ((self.angola_bounds['east'] - self.angola_bounds['west']) / self.default_grid_size) *
-                    ((self.angola_bounds['north'] - self.angola_bounds['south']) / self.default_grid_size) *
-                    111 * 111),
-                'medium_suitability_km2': float(np.sum((valid_suitability > 0.4) & (valid_suitability <= 0.7)) * 
-                    ((self.angola_bounds['east'] - self.angola_bounds['west']) / self.default_grid_size) *
-                    ((self.angola_bounds['north'] - self.angola_bounds['south']) / self.default_grid_size) *
-                    111 * 111)
+                'total_analyzed_km2': float(len(valid_suitability) * cell_area_km2),
+                'high_suitability_km2': float(np.sum(valid_suitability > 0.7) * cell_area_km2),
+                'medium_suitability_km2': float(
+                    np.sum((valid_suitability > 0.4) & (valid_suitability <= 0.7)) * cell_area_km2
+                )
             },
             'criteria_contribution': {}
         }
         
         # Calcular contribuição de cada critério
         for criterion in criteria:
-            criterion_contribution = criterion.weight * np.mean(criterion.data[valid_cells])
+            mean_value = np.mean(criterion.data[valid_cells])
+            criterion_contribution = criterion.weight * mean_value
             statistics['criteria_contribution'][criterion.name] = {
                 'weight': float(criterion.weight),
-                'mean_normalized_value': float(np.mean(criterion.data[valid_cells])),
+                'mean_normalized_value': float(mean_value),
                 'contribution_to_suitability': float(criterion_contribution)
             }
         
@@ -797,7 +920,14 @@ class SustainableZonesMCDA:
     def _perform_sensitivity_analysis(self, 
                                     criteria: List[MCDACriterion],
                                     method: MCDAMethod) -> Dict[str, Any]:
-        """Realizar análise de sensibilidade dos pesos"""
+        """
+        Realizar análise de sensibilidade dos pesos
+
+        Todas as perturbações (critério × multiplicador) são avaliadas de uma vez como
+        um tensor de pesos (critério, variação, critério). Como a soma ponderada é linear,
+        a adequação média de cada perturbação é o produto desse tensor pelo vetor das
+        médias dos critérios, sem recalcular nem copiar as grelhas.
+        """
         
         sensitivity_results = {
             'weight_variations': [],
@@ -805,64 +935,58 @@ class SustainableZonesMCDA:
             'critical_criteria': []
         }
         
+        if not criteria:
+            return sensitivity_results
+        
         # Testar variações de ±20% nos pesos
-        weight_variations = [0.8, 0.9, 1.0, 1.1, 1.2]
+        weight_variations = np.array([0.8, 0.9, 1.0, 1.1, 1.2])
+        
+        weights = np.array([c.weight for c in criteria], dtype=float)
+        # Médias dos critérios: uma única leitura de cada grelha (também sobre memory-maps)
+        criteria_means = np.array([np.mean(c.data) for c in criteria], dtype=float)
+        
+        # Peso modificado do critério atual: w_i * variação → (critério, variação)
+        scaled = weights[:, np.newaxis] * weight_variations[np.newaxis, :]
+        
+        # Ajustar outros pesos como na versão em ciclo: cada outro critério j é multiplicado
+        # por (1 - w_j * variação) / (1 - w_j), que não depende do critério perturbado
+        # → (variação, outro critério), replicado para todos os critérios
+        remaining = 1.0 - weights
+        with np.errstate(divide='ignore', invalid='ignore'):
+            adjustment_factor = np.where(
+                remaining[np.newaxis, :] > 0,
+                (1.0 - scaled.T) / remaining[np.newaxis, :],
+                1.0
+            )
+        modified_weights = np.repeat((weights[np.newaxis, :] * adjustment_factor)[np.newaxis], len(criteria), axis=0)
+        diagonal = np.arange(len(criteria))
+        modified_weights[diagonal, :, diagonal] = scaled
+        
+        # Manter entre 1% e 99% e normalizar pesos
+        modified_weights = np.clip(modified_weights, 0.01, 0.99)
+        modified_weights /= modified_weights.sum(axis=2, keepdims=True)
+        
+        # Mudança na adequação média para todas as perturbações de uma vez
+        # (outros métodos usam a soma ponderada como aproximação, como anteriormente)
+        original_mean = float(weights @ criteria_means)
+        mean_changes = modified_weights @ criteria_means - original_mean
         
         for i, criterion in enumerate(criteria):
             criterion_sensitivity = {
                 'criterion_name': criterion.name,
                 'original_weight': criterion.weight,
-                'suitability_changes': []
+                'suitability_changes': [
+                    {
+                        'weight_multiplier': float(variation),
+                        'new_weight': float(modified_weights[i, v, i]),
+                        'mean_suitability_change': float(mean_changes[i, v])
+                    }
+                    for v, variation in enumerate(weight_variations)
+                ]
             }
             
-            for variation in weight_variations:
-                # Criar cópia dos critérios com peso modificado
-                modified_criteria = []
-                for j, c in enumerate(criteria):
-                    if i == j:
-                        # Modificar peso do critério atual
-                        new_weight = c.weight * variation
-                    else:
-                        # Ajustar outros pesos proporcionalmente
-                        adjustment_factor = (1.0 - c.weight * variation) / (1.0 - c.weight) if (1.0 - c.weight) > 0 else 1.0
-                        new_weight = c.weight * adjustment_factor
-                    
-                    modified_criterion = MCDACriterion(
-                        name=c.name,
-                        description=c.description,
-                        criterion_type=c.criterion_type,
-                        weight=max(0.01, min(0.99, new_weight)),  # Manter entre 1% e 99%
-                        data=c.data,
-                        units=c.units,
-                        normalization_method=c.normalization_method,
-                        metadata=c.metadata
-                    )
-                    modified_criteria.append(modified_criterion)
-                
-                # Normalizar pesos
-                total_weight = sum(c.weight for c in modified_criteria)
-                for c in modified_criteria:
-                    c.weight = c.weight / total_weight
-                
-                # Recalcular adequação
-                if method == MCDAMethod.WEIGHTED_SUM:
-                    modified_suitability = self._weighted_sum_method(modified_criteria)
-                else:
-                    modified_suitability = self._weighted_sum_method(modified_criteria)  # Fallback
-                
-                # Calcular mudança na adequação média
-                original_suitability = self._weighted_sum_method(criteria)
-                mean_change = np.mean(modified_suitability) - np.mean(original_suitability)
-                
-                criterion_sensitivity['suitability_changes'].append({
-                    'weight_multiplier': variation,
-                    'new_weight': modified_criteria[i].weight,
-                    'mean_suitability_change': float(mean_change)
-                })
-            
             # Calcular sensibilidade (variação máxima)
-            changes = [abs(sc['mean_suitability_change']) for sc in criterion_sensitivity['suitability_changes']]
-            max_sensitivity = max(changes) if changes else 0
+            max_sensitivity = float(np.max(np.abs(mean_changes[i])))
             
             criterion_sensitivity['max_sensitivity'] = max_sensitivity
             sensitivity_results['weight_variations'].append(criterion_sensitivity)
@@ -320,7 +320,11 @@ curl -H "Authorization: Bearer YOUR_TOKEN" https://api.bgapp.com/qgis/endpoint
                     description="Análise de conectividade concluída",
                     example={
                         "success": True,
-                        "connectivity_matrix": [[1.0, 0.8], [0.8, 1.0]],
+                        "connectivity_matrix": {
+                            "format": "coo", "shape": [2, 2], "symmetric": True,
+                            "from_habitat": [0], "to_habitat": [1],
+                            "distance": [0.45], "weight": [2.22]
+                        },
                         "connected_pairs": 1,
                         "isolated_habitats": 0
                     }
@@ -0,0 +1,306 @@
+"""
+Motor de Grelhas Meteoceânicas Vetorizado para Angola
+Calcula campos u/v e escalares completos com NumPy e mantém cache por
+(variável, janela temporal, resolução) para os endpoints /metocean/*
+"""
+
+import json
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Área de Angola (mesmos limites usados em admin_api.ANGOLA_BOUNDS)
+ANGOLA_BOUNDS = {
+    'north': -4.2,
+    'south': -18.2,
+    'east': 17.5,
+    'west': 8.5
+}
+
+VELOCITY_VARIABLES = ('currents', 'wind')
+SCALAR_VARIABLES = ('sst', 'salinity', 'chlorophyll')
+
+SCALAR_UNITS = {
+    'sst': 'degrees_celsius',
+    'salinity': 'psu',
+    'chlorophyll': 'mg/m3'
+}
+
+# Formato binário: magic + comprimento do cabeçalho JSON + arrays float32 (little-endian)
+BINARY_MAGIC = b'BGMF'
+BINARY_MEDIA_TYPE = 'application/vnd.bgapp.metocean-grid'
+
+
+@dataclass
+class MetoceanGrid:
+    """Campo meteoceânico numa grelha regular (linhas sul→norte, colunas oeste→leste)"""
+    variable: str
+    time: datetime
+    resolution: float
+    lats: np.ndarray
+    lons: np.ndarray
+    fields: Dict[str, np.ndarray] = field(default_factory=dict)
+    units: str = 'm/s'
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (len(self.lats), len(self.lons))
+
+    @property
+    def points(self) -> int:
+        return len(self.lats) * len(self.lons)
+
+    def header(self) -> Dict[str, Any]:
+        """Cabeçalho da grelha (compatível com camadas de partículas tipo leaflet-velocity)"""
+        ny, nx = self.shape
+        header = {
+            'variable': self.variable,
+            'time': self.time.isoformat(),
+            'units': self.units,
+            'nx': nx,
+            'ny': ny,
+            'lo1': float(self.lons[0]) if nx else None,
+            'la1': float(self.lats[0]) if ny else None,
+            'dx': self.resolution,
+            'dy': self.resolution,
+            'scan': 'south_to_north',
+            'fields': list(self.fields.keys()),
+            'dtype': 'float32',
+            'points': self.points
+        }
+        for name, values in self.fields.items():
+            header[f'{name}Min'] = float(np.min(values)) if values.size else None
+            header[f'{name}Max'] = float(np.max(values)) if values.size else None
+        return header
+
+    def to_columnar(self) -> Dict[str, Any]:
+        """Payload colunar JSON: cabeçalho + arrays planos por campo"""
+        payload = {'header': self.header()}
+        for name, values in self.fields.items():
+            payload[name] = np.round(values.astype(np.float64).ravel(), 4).tolist()
+        return payload
+
+    def to_binary(self) -> bytes:
+        """Payload binário: BGMF | uint32 len(header) | header JSON | float32[campos]"""
+        header_bytes = json.dumps(self.header(), separators=(',', ':')).encode('utf-8')
+        # Alinhar os arrays a 4 bytes para leitura direta com Float32Array no browser
+        header_bytes += b' ' * (-(len(BINARY_MAGIC) + 4 + len(header_bytes)) % 4)
+        body = b''.join(
+            np.ascontiguousarray(values, dtype='<f4').tobytes()
+            for values in self.fields.values()
+        )
+        return BINARY_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes + body
+
+    def to_points(self) -> List[Dict[str, float]]:
+        """Lista de pontos {'lat','lon',campos...} no formato legado do endpoint"""
+        lat_grid, lon_grid = np.meshgrid(self.lats, self.lons, indexing='ij')
+        columns = [lat_grid.ravel().tolist(), lon_grid.ravel().tolist()]
+        names = ['lat', 'lon'] + list(self.fields.keys())
+        columns.extend(
+            np.round(values.astype(np.float64), 4).ravel().tolist() for values in self.fields.values()
+        )
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def decode_binary_payload(payload: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Descodificar um payload binário produzido por MetoceanGrid.to_binary"""
+    if payload[:4] != BINARY_MAGIC:
+        raise ValueError("Payload meteoceânico inválido")
+    header_length = struct.unpack('<I', payload[4:8])[0]
+    header = json.loads(payload[8:8 + header_length].decode('utf-8'))
+    offset = 8 + header_length
+    size = header['nx'] * header['ny']
+    fields = {}
+    for name in header['fields']:
+        fields[name] = np.frombuffer(payload, dtype='<f4', count=size, offset=offset).reshape(
+            header['ny'], header['nx']
+        )
+        offset += size * 4
+    return header, fields
+
+
+class MetoceanGridEngine:
+    """Motor vetorizado para campos de correntes, vento e variáveis escalares"""
+
+    def __init__(self, bounds: Dict[str, float] = None, time_bucket_seconds: int = 3600,
+                 max_cached_fields: int = 64, min_resolution: float = 0.05):
+        self.bounds = bounds or ANGOLA_BOUNDS
+        self.time_bucket_seconds = time_bucket_seconds
+        self.max_cached_fields = max_cached_fields
+        self.min_resolution = min_resolution
+        self._cache: "OrderedDict[Tuple[str, int, float], MetoceanGrid]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _time_bucket(self, time: datetime) -> int:
+        # Datetimes sem fuso são UTC (timestamp() tomá-los-ia como hora local)
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+        return int(time.timestamp()) // self.time_bucket_seconds
+
+    def _bucket_start(self, bucket: int) -> datetime:
+        return datetime.fromtimestamp(bucket * self.time_bucket_seconds, tz=timezone.utc)
+
+    def _rng(self, variable: str, bucket: int, resolution: float) -> np.random.Generator:
+        # Semente determinística: o mesmo campo é reproduzível dentro da janela temporal
+        seed = zlib.crc32(f"{variable}:{bucket}:{resolution}".encode())
+        return np.random.default_rng(seed)
+
+    def get_field(self, variable: str, time: Optional[datetime] = None,
+                  resolution: float = 0.5) -> MetoceanGrid:
+        """
+        Obter campo (do cache ou calculado numa única passagem vetorizada)
+
+        O campo é calculado para o início da janela temporal (UTC) que contém
+        `time`, pelo que todos os pedidos da mesma janela recebem o mesmo `time`.
+        """
+        if variable not in VELOCITY_VARIABLES and variable not in SCALAR_VARIABLES:
+            raise ValueError(f"Variável não suportada: {variable}")
+        if resolution < self.min_resolution:
+            raise ValueError(f"Resolução mínima suportada: {self.min_resolution}°")
+
+        resolution = round(float(resolution), 4)
+        bucket = self._time_bucket(time or datetime.now(timezone.utc))
+        key = (variable, bucket, resolution)
+
+        with self._lock:
+            grid = self._cache.get(key)
+            if grid is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return grid
+            self.stats['misses'] += 1
+
+        grid = self._compute(variable, self._bucket_start(bucket), resolution,
+                             self._rng(variable, bucket, resolution))
+
+        with self._lock:
+            self._cache[key] = grid
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached_fields:
+                self._cache.popitem(last=False)
+                self.stats['evictions'] += 1
+        return grid
+
+    def clear_cache(self):
+        """Limpar campos em cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas do cache de campos"""
+        with self._lock:
+            cached_bytes = sum(
+                values.nbytes for grid in self._cache.values() for values in grid.fields.values()
+            )
+            return {
+                **self.stats,
+                'cached_fields': len(self._cache),
+                'cached_bytes': cached_bytes,
+                'time_bucket_seconds': self.time_bucket_seconds
+            }
+
+    # ------------------------------------------------------------------
+    # Cálculo dos campos
+    # ------------------------------------------------------------------
+
+    def _axes(self, resolution: float) -> Tuple[np.ndarray, np.ndarray]:
+        lats = np.arange(self.bounds['south'], self.bounds['north'], resolution)
+        lons = np.arange(self.bounds['west'], self.bounds['east'], resolution)
+        return lats, lons
+
+    def _compute(self, variable: str, time: datetime, resolution: float,
+                 rng: np.random.Generator) -> MetoceanGrid:
+        lats, lons = self._axes(resolution)
+        lat, lon = np.meshgrid(lats, lons, indexing='ij')
+
+        if variable == 'currents':
+            fields = self._benguela_current(lat, lon, time, rng)
+            units = 'm/s'
+        elif variable == 'wind':
+            fields = self._wind_patterns(lat, lon, time, rng)
+            units = 'm/s'
+        else:
+            fields = {'value': self.sample_scalar(variable, lat, lon, time, rng)}
+            units = SCALAR_UNITS[variable]
+
+        fields = {name: values.astype(np.float32) for name, values in fields.items()}
+        return MetoceanGrid(variable=variable, time=time, resolution=resolution,
+                            lats=lats, lons=lons, fields=fields, units=units)
+
+    @staticmethod
+    def _benguela_current(lat: np.ndarray, lon: np.ndarray, time: datetime,
+                          rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        """Corrente de Benguela (versão vetorizada de simulate_benguela_current)"""
+        coast_distance = np.abs(lon - 13.0)
+        latitude_factor = np.maximum(0, (-lat - 4) / 14)
+        benguela_strength = np.maximum(0, 1.5 - coast_distance * 0.3) * latitude_factor
+
+        v = benguela_strength * 0.8 + rng.normal(0, 0.1, lat.shape)
+        u = benguela_strength * 0.2 + rng.normal(0, 0.05, lat.shape)
+
+        # Variação sazonal
+        if 6 <= time.month <= 9:
+            v *= 1.3
+
+        return {'u': u, 'v': v}
+
+    @staticmethod
+    def _wind_patterns(lat: np.ndarray, lon: np.ndarray, time: datetime,
+                       rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        """Ventos alísios (versão vetorizada de simulate_wind_patterns)"""
+        u = -5.0 + rng.normal(0, 2.0, lat.shape)
+        v = 2.0 + rng.normal(0, 1.0, lat.shape)
+
+        month = time.month
+        if month in (12, 1, 2):
+            u *= 0.7
+            v *= 0.8
+        elif 6 <= month <= 8:
+            u *= 1.2
+            v *= 1.1
+
+        u = np.where(np.abs(lon - 13.0) < 1.0, u * 1.3, u)
+        return {'u': u, 'v': v}
+
+    @staticmethod
+    def sample_scalar(variable: str, lat: np.ndarray, lon: np.ndarray, time: datetime,
+                      rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """Calcular variável escalar para arrays de coordenadas"""
+        rng = rng or np.random.default_rng()
+        lat = np.asarray(lat, dtype=np.float64)
+        month = time.month
+
+        if variable == 'sst':
+            # SST baseada na latitude e época
+            base_temp = 28 - np.abs(lat + 4) * 0.8
+            seasonal_var = 3 * np.sin(2 * np.pi * (month - 3) / 12)
+            return base_temp + seasonal_var + rng.normal(0, 0.5, lat.shape)
+
+        if variable == 'salinity':
+            # Salinidade baseada no upwelling
+            base_salinity = np.where(lat < -12, 35.3, 35.0)
+            return base_salinity + rng.normal(0, 0.1, lat.shape)
+
+        if variable == 'chlorophyll':
+            # Clorofila baseada no upwelling
+            base_chl = np.where(lat < -10, 5.0 + np.abs(lat + 10) * 2, 1.0)
+            if 6 <= month <= 9:
+                base_chl = base_chl * 1.5
+            return np.maximum(0.1, base_chl + rng.normal(0, 1.0, lat.shape) * base_chl * 0.2)
+
+        raise ValueError(f"Variável não suportada: {variable}")
+
+
+# Instância global do motor de grelhas
+metocean_engine = MetoceanGridEngine()
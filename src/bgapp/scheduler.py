@@ -6,8 +6,8 @@ Executa conectores automaticamente baseado na configuração
 
 import asyncio
 import logging
-import subprocess
 import time
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any
@@ -30,13 +30,32 @@ logger = logging.getLogger(__name__)
 class BGAPPScheduler:
     """Scheduler para executar conectores automaticamente"""
     
+    # Configuração por omissão do executor (secção `scheduler` em admin.yaml)
+    DEFAULT_RUNNER_CONFIG = {
+        "max_workers": 4,              # Conectores em execução simultânea (todos)
+        "default_max_concurrent": 1,   # Por conector, salvo `max_concurrent` no conector
+        "max_queue": 50,               # Jobs em espera antes de rejeitar
+        "output_buffer_lines": 500     # Linhas de stdout/stderr guardadas por job
+    }
+    METRICS_WINDOW = 200
+    STREAM_CHUNK_SIZE = 64 * 1024  # Bytes guardados de uma linha acima do limite do StreamReader
+    
     def __init__(self, config_path: str = "configs/admin.yaml"):
         self.config_path = Path(config_path)
         self.config = self._load_config()
-        self.running_jobs: Dict[str, subprocess.Popen] = {}
+        self.runner_config = {**self.DEFAULT_RUNNER_CONFIG, **(self.config.get("scheduler") or {})}
+        self.running_jobs: Dict[str, asyncio.subprocess.Process] = {}
+        self.queued_jobs: Dict[str, Dict[str, Any]] = {}
         self.job_history: List[Dict[str, Any]] = []
         self.is_running = False
         
+        self._active_jobs: Dict[str, Dict[str, Any]] = {}
+        self._worker_slots: Optional[asyncio.Semaphore] = None
+        self._connector_slots: Dict[str, asyncio.Semaphore] = {}
+        self._wait_times: deque = deque(maxlen=self.METRICS_WINDOW)
+        self._run_times: Dict[str, deque] = {}
+        self.metrics: Dict[str, int] = {"rejected": 0}
+        
     def _load_config(self) -> Dict[str, Any]:
         """Carregar configuração do scheduler"""
         try:
@@ -72,84 +91,195 @@ class BGAPPScheduler:
         connector_config = self.config.get("connectors", {}).get(connector_name, {})
         return connector_config.get("timeout", 300)  # 5 minutos por padrão
     
+    # Mapear conectores para módulos
+    CONNECTOR_MODULES = {
+        "obis": "src.bgapp.ingest.obis",
+        "cmems": "src.bgapp.ingest.cmems_chla", 
+        "modis": "src.bgapp.ingest.modis_ndvi",
+        "erddap": "src.bgapp.ingest.erddap_sst",
+        "fisheries": "src.bgapp.ingest.fisheries_angola",
+        "copernicus_real": "src.bgapp.ingest.copernicus_real",
+        "cdse_sentinel": "src.bgapp.ingest.cdse_sentinel",
+        "cds_era5": "src.bgapp.ingest.cds_era5",
+        "angola_sources": "src.bgapp.ingest.angola_sources"
+    }
+    
+    def get_connector_max_concurrent(self, connector_name: str) -> int:
+        """Execuções simultâneas permitidas para o conector"""
+        connector_config = self.config.get("connectors", {}).get(connector_name, {})
+        return max(1, int(connector_config.get("max_concurrent", self.runner_config["default_max_concurrent"])))
+    
+    def _get_worker_slots(self) -> asyncio.Semaphore:
+        # Criado no loop em execução (evita associar o semáforo a outro loop)
+        if self._worker_slots is None:
+            self._worker_slots = asyncio.Semaphore(self.runner_config["max_workers"])
+        return self._worker_slots
+    
+    def _get_connector_slots(self, connector_name: str) -> asyncio.Semaphore:
+        if connector_name not in self._connector_slots:
+            self._connector_slots[connector_name] = asyncio.Semaphore(
+                self.get_connector_max_concurrent(connector_name)
+            )
+        return self._connector_slots[connector_name]
+    
+    async def _drain_stream(self, stream: asyncio.StreamReader, buffer: deque, counters: Dict[str, int]):
+        """Ler stdout/stderr linha a linha para um ring buffer (só as últimas N linhas ficam em memória)"""
+        while True:
+            skipped = 0
+            try:
+                line = await stream.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                line = e.partial  # Última linha sem \n (EOF)
+            except asyncio.LimitOverrunError as e:
+                # Linha maior que o limite do StreamReader (readline descartá-la-ia em silêncio):
+                # guardar o início (até STREAM_CHUNK_SIZE) e saltar o resto até ao fim da linha
+                line = await stream.readexactly(e.consumed)
+                skipped = max(0, len(line) - self.STREAM_CHUNK_SIZE) + await self._skip_line(stream)
+                line = line[:self.STREAM_CHUNK_SIZE]
+            if not line:
+                break
+            counters["lines"] += 1
+            counters["bytes"] += len(line) + skipped
+            text = line.decode("utf-8", errors="replace").rstrip("\n")
+            if skipped:
+                counters["truncated_lines"] += 1
+                text += f" … [linha truncada: {skipped} bytes omitidos]"
+            buffer.append(text)
+    
+    @staticmethod
+    async def _skip_line(stream: asyncio.StreamReader) -> int:
+        """Descartar o resto da linha atual (sem a carregar inteira); devolve os bytes descartados"""
+        skipped = 0
+        while True:
+            try:
+                return skipped + len(await stream.readuntil(b"\n"))
+            except asyncio.IncompleteReadError as e:
+                return skipped + len(e.partial)
+            except asyncio.LimitOverrunError as e:
+                skipped += len(await stream.readexactly(e.consumed))
+    
+    async def _finish_readers(self, readers: List[asyncio.Future], grace: float = 5.0):
+        """Esperar pelo fim dos pipes (processos-filho podem mantê-los abertos)"""
+        _, pending = await asyncio.wait(readers, timeout=grace)
+        for reader in pending:
+            reader.cancel()
+    
     async def execute_connector(self, connector_name: str) -> Dict[str, Any]:
-        """Executar um conector específico"""
-        if connector_name in self.running_jobs:
-            logger.warning(f"Conector {connector_name} já está em execução")
-            return {"status": "already_running", "connector": connector_name}
+        """
+        Executar um conector específico
         
-        # Mapear conectores para módulos
-        connector_modules = {
-            "obis": "src.bgapp.ingest.obis",
-            "cmems": "src.bgapp.ingest.cmems_chla", 
-            "modis": "src.bgapp.ingest.modis_ndvi",
-            "erddap": "src.bgapp.ingest.erddap_sst",
-            "fisheries": "src.bgapp.ingest.fisheries_angola",
-            "copernicus_real": "src.bgapp.ingest.copernicus_real",
-            "cdse_sentinel": "src.bgapp.ingest.cdse_sentinel",
-            "cds_era5": "src.bgapp.ingest.cds_era5",
-            "angola_sources": "src.bgapp.ingest.angola_sources"
-        }
+        O job espera por uma vaga do conector (max_concurrent) e por um worker do
+        pool (scheduler.max_workers); o subprocesso corre sem bloquear o event loop.
         
-        module = connector_modules.get(connector_name)
+        Um pedido para um conector já em execução não é rejeitado (o antigo
+        "already_running"): fica em fila e corre quando houver vaga. Só é devolvido
+        "already_queued" se o conector já tiver um job à espera (no máximo um por
+        conector) e "queue_full" se a fila atingir scheduler.max_queue.
+        """
+        module = self.CONNECTOR_MODULES.get(connector_name)
         if not module:
             logger.error(f"Módulo não encontrado para conector: {connector_name}")
             return {"status": "error", "message": "Módulo não encontrado"}
         
-        start_time = datetime.now()
+        if any(job["connector"] == connector_name for job in self.queued_jobs.values()):
+            logger.warning(f"Conector {connector_name} já está em fila")
+            return {"status": "already_queued", "connector": connector_name}
+        
+        if len(self.queued_jobs) >= self.runner_config["max_queue"]:
+            logger.warning(f"Fila do scheduler cheia; conector {connector_name} rejeitado")
+            self.metrics["rejected"] += 1
+            return {"status": "queue_full", "connector": connector_name}
+        
+        queued_at = datetime.now()
         job_info = {
-            "id": f"{connector_name}_{int(time.time())}",
+            "id": f"{connector_name}_{int(time.time() * 1000)}",
             "connector": connector_name,
-            "status": "running",
-            "start_time": start_time,
+            "status": "queued",
+            "queued_time": queued_at,
+            "start_time": None,
             "module": module,
             "pid": None
         }
+        self.queued_jobs[job_info["id"]] = job_info
         
+        try:
+            async with self._get_connector_slots(connector_name):
+                async with self._get_worker_slots():
+                    del self.queued_jobs[job_info["id"]]
+                    await self._run_job(job_info)
+        finally:
+            self.queued_jobs.pop(job_info["id"], None)
+            if job_info["status"] == "queued":
+                job_info.update({"status": "cancelled", "end_time": datetime.now()})
+            self._record_job(job_info)
+        
+        return job_info
+    
+    async def _run_job(self, job_info: Dict[str, Any]):
+        """Executar o subprocesso do conector com timeout e captura de output em ring buffers"""
+        connector_name = job_info["connector"]
+        start_time = datetime.now()
+        job_info.update({
+            "status": "running",
+            "start_time": start_time,
+            "wait_seconds": (start_time - job_info["queued_time"]).total_seconds()
+        })
+        self._wait_times.append(job_info["wait_seconds"])
+        
+        buffer_lines = self.runner_config["output_buffer_lines"]
+        stdout_buffer: deque = deque(maxlen=buffer_lines)
+        stderr_buffer: deque = deque(maxlen=buffer_lines)
+        stdout_counters = {"lines": 0, "bytes": 0, "truncated_lines": 0}
+        stderr_counters = {"lines": 0, "bytes": 0, "truncated_lines": 0}
+        job_info["_stdout"] = stdout_buffer
+        job_info["_stderr"] = stderr_buffer
+        self._active_jobs[job_info["id"]] = job_info
+        
+        timeout = self.get_connector_timeout(connector_name)
+        process = None
         try:
             logger.info(f"Iniciando conector {connector_name}")
             
             # Executar o módulo
-            cmd = ["python", "-m", module]
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=Path(__file__).parent.parent.parent
+            process = await asyncio.create_subprocess_exec(
+                "python", "-m", job_info["module"],
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(Path(__file__).parent.parent.parent)
             )
-            
             job_info["pid"] = process.pid
-            self.running_jobs[connector_name] = process
+            self.running_jobs[job_info["id"]] = process
+            
+            readers = [
+                asyncio.ensure_future(self._drain_stream(process.stdout, stdout_buffer, stdout_counters)),
+                asyncio.ensure_future(self._drain_stream(process.stderr, stderr_buffer, stderr_counters))
+            ]
             
             # Aguardar conclusão com timeout
-            timeout = self.get_connector_timeout(connector_name)
             try:
-                stdout, stderr = process.communicate(timeout=timeout)
-                return_code = process.returncode
+                return_code = await asyncio.wait_for(process.wait(), timeout=timeout)
+                await self._finish_readers(readers)
                 
                 end_time = datetime.now()
                 duration = (end_time - start_time).total_seconds()
-                
                 job_info.update({
                     "status": "completed" if return_code == 0 else "failed",
                     "end_time": end_time,
                     "duration": duration,
-                    "return_code": return_code,
-                    "stdout": stdout,
-                    "stderr": stderr
+                    "return_code": return_code
                 })
                 
                 if return_code == 0:
                     logger.info(f"Conector {connector_name} concluído com sucesso em {duration:.1f}s")
                 else:
                     logger.error(f"Conector {connector_name} falhou com código {return_code}")
-                    logger.error(f"Stderr: {stderr}")
+                    logger.error(f"Stderr: {chr(10).join(list(stderr_buffer)[-20:])}")
                 
-            except subprocess.TimeoutExpired:
+            except asyncio.TimeoutError:
                 logger.warning(f"Conector {connector_name} excedeu timeout de {timeout}s")
                 process.kill()
-                process.communicate()
+                await process.wait()
+                await self._finish_readers(readers)
                 
                 job_info.update({
                     "status": "timeout",
@@ -159,6 +289,12 @@ class BGAPPScheduler:
                     "error": f"Timeout após {timeout}s"
                 })
             
+        except asyncio.CancelledError:
+            if process is not None and process.returncode is None:
+                process.kill()
+            job_info.update({"status": "cancelled", "end_time": datetime.now()})
+            raise
+        
         except Exception as e:
             logger.error(f"Erro ao executar conector {connector_name}: {e}")
             job_info.update({
@@ -169,27 +305,113 @@ class BGAPPScheduler:
         
         finally:
             # Remover da lista de jobs em execução
-            if connector_name in self.running_jobs:
-                del self.running_jobs[connector_name]
-            
-            # Adicionar ao histórico
-            self.job_history.append(job_info)
-            
-            # Manter apenas os últimos 100 jobs
-            if len(self.job_history) > 100:
-                self.job_history = self.job_history[-100:]
+            self.running_jobs.pop(job_info["id"], None)
+            self._active_jobs.pop(job_info["id"], None)
+            job_info.pop("_stdout", None)
+            job_info.pop("_stderr", None)
+            job_info.update({
+                "stdout": "\n".join(stdout_buffer),
+                "stderr": "\n".join(stderr_buffer),
+                "stdout_lines": stdout_counters["lines"],
+                "stderr_lines": stderr_counters["lines"],
+                "truncated_lines": stdout_counters["truncated_lines"] + stderr_counters["truncated_lines"],
+                "output_truncated": max(stdout_counters["lines"], stderr_counters["lines"]) > buffer_lines
+            })
+    
+    def _record_job(self, job_info: Dict[str, Any]):
+        """Adicionar ao histórico e às métricas de execução"""
+        self.job_history.append(job_info)
         
-        return job_info
+        # Manter apenas os últimos 100 jobs
+        if len(self.job_history) > 100:
+            self.job_history = self.job_history[-100:]
+        
+        status = job_info["status"]
+        self.metrics[status] = self.metrics.get(status, 0) + 1
+        if job_info.get("duration") is not None and status in ("completed", "failed", "timeout"):
+            self._run_times.setdefault(
+                job_info["connector"], deque(maxlen=self.METRICS_WINDOW)
+            ).append(job_info["duration"])
+    
+    def get_job_output(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Output (ring buffer) de um job em execução ou do histórico"""
+        for job in reversed(self.job_history):
+            if job["id"] == job_id:
+                return {"id": job_id, "status": job["status"], "stdout": job.get("stdout", ""),
+                        "stderr": job.get("stderr", "")}
+        for job in self._running_job_infos():
+            if job["id"] == job_id:
+                return {"id": job_id, "status": job["status"],
+                        "stdout": "\n".join(job.get("_stdout", [])),
+                        "stderr": "\n".join(job.get("_stderr", []))}
+        return None
+    
+    def _running_job_infos(self) -> List[Dict[str, Any]]:
+        return [job for job in self._active_jobs.values() if job["status"] == "running"]
+    
+    def is_connector_running(self, connector_name: str) -> bool:
+        """Se o conector tem um job em execução (um novo pedido ficará em fila)"""
+        return any(job["connector"] == connector_name for job in self._running_job_infos())
+    
+    @staticmethod
+    def _duration_stats(values) -> Dict[str, float]:
+        ordered = sorted(values)
+        if not ordered:
+            return {"count": 0}
+        return {
+            "count": len(ordered),
+            "mean": round(sum(ordered) / len(ordered), 3),
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p95": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3),
+            "max": round(ordered[-1], 3),
+            "last": round(values[-1], 3)
+        }
+    
+    def get_runner_metrics(self) -> Dict[str, Any]:
+        """Profundidade da fila, ocupação do pool e tempos de execução por conector"""
+        queue_by_connector: Dict[str, int] = {}
+        for job in self.queued_jobs.values():
+            queue_by_connector[job["connector"]] = queue_by_connector.get(job["connector"], 0) + 1
+        
+        running_by_connector: Dict[str, int] = {}
+        now = datetime.now()
+        running = []
+        for job in self._running_job_infos():
+            running_by_connector[job["connector"]] = running_by_connector.get(job["connector"], 0) + 1
+            running.append({
+                "id": job["id"],
+                "connector": job["connector"],
+                "pid": job.get("pid"),
+                "elapsed_seconds": round((now - job["start_time"]).total_seconds(), 1)
+            })
+        
+        return {
+            "max_workers": self.runner_config["max_workers"],
+            "busy_workers": len(self.running_jobs),
+            "queue_depth": len(self.queued_jobs),
+            "max_queue": self.runner_config["max_queue"],
+            "queue_by_connector": queue_by_connector,
+            "running_by_connector": running_by_connector,
+            "running": running,
+            "wait_seconds": self._duration_stats(list(self._wait_times)),
+            "run_seconds": {
+                connector: self._duration_stats(list(durations))
+                for connector, durations in self._run_times.items()
+            },
+            "totals": dict(self.metrics)
+        }
     
     def get_system_status(self) -> Dict[str, Any]:
         """Obter status do sistema"""
         return {
             "scheduler_running": self.is_running,
             "running_jobs": len(self.running_jobs),
-            "active_connectors": list(self.running_jobs.keys()),
+            "active_connectors": sorted({job["connector"] for job in self._running_job_infos()}),
             "total_jobs_history": len(self.job_history),
-            "system_load": psutil.cpu_percent(interval=1),
+            # interval=None: não bloquear o event loop (valor desde a última chamada)
+            "system_load": psutil.cpu_percent(interval=None),
             "memory_usage": psutil.virtual_memory().percent,
+            "runner": self.get_runner_metrics(),
             "timestamp": datetime.now().isoformat()
         }
     
@@ -241,18 +463,30 @@ class BGAPPScheduler:
         logger.info("Parando scheduler...")
         self.is_running = False
         
-        # Terminar jobs em execução
-        for connector_name, process in self.running_jobs.items():
-            logger.info(f"Terminando job {connector_name} (PID: {process.pid})")
+        # Terminar jobs em execução (o job em curso regista o fim ao terminar o processo)
+        for job_id, process in list(self.running_jobs.items()):
+            logger.info(f"Terminando job {job_id} (PID: {process.pid})")
             try:
                 process.terminate()
-                process.wait(timeout=10)
-            except subprocess.TimeoutExpired:
-                process.kill()
+            except ProcessLookupError:
+                continue
             except Exception as e:
-                logger.error(f"Erro ao terminar job {connector_name}: {e}")
-        
-        self.running_jobs.clear()
+                logger.error(f"Erro ao terminar job {job_id}: {e}")
+                continue
+            
+            # Forçar kill se o processo não terminar em 10s
+            try:
+                asyncio.get_running_loop().call_later(10, self._kill_if_running, process)
+            except RuntimeError:
+                pass
+    
+    @staticmethod
+    def _kill_if_running(process: asyncio.subprocess.Process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
 
 # Instância global do scheduler
 scheduler = BGAPPScheduler()
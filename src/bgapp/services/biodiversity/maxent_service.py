@@ -25,6 +25,9 @@ import geopandas as gpd
 from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
 import json
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import asyncio
 import aiohttp
@@ -32,6 +35,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, classification_report
 from sklearn.ensemble import RandomForestClassifier
 import rasterio
+import rasterio.windows
 from rasterio.mask import mask
 from shapely.geometry import Point, Polygon
 import matplotlib.pyplot as plt
@@ -75,6 +79,190 @@ class MaxEntResult:
     model_path: str
     created_at: datetime
 
+@dataclass
+class _CovariateRaster:
+    """Raster de covariável carregado (array memory-mapped + georreferenciação)"""
+    name: str
+    cache_path: str
+    transform: Tuple[float, float, float, float, float, float]
+    shape: Tuple[int, int]
+    data: Optional[np.ndarray] = None
+
+
+class EnvironmentalCovariateStore:
+    """
+    🗺️ Armazém de covariáveis ambientais em raster
+    
+    Cada EnvironmentalLayer é lido uma única vez (janela a janela) para um .npy
+    em cache e depois aberto por memory-map. A amostragem é bilinear e vetorizada,
+    processada em chunks de pontos para limitar a memória com milhões de pontos.
+    """
+    
+    def __init__(self, cache_dir: Union[str, Path], chunk_size: int = 1_000_000,
+                 block_rows: int = 1024):
+        self.cache_dir = Path(cache_dir)
+        self.chunk_size = chunk_size
+        self.block_rows = block_rows
+        self.layers: Dict[str, EnvironmentalLayer] = {}
+        self._rasters: Dict[str, _CovariateRaster] = {}
+    
+    def __getstate__(self):
+        # Os memory-maps não são enviados para processos worker: são reabertos lá
+        state = self.__dict__.copy()
+        state['_rasters'] = {
+            name: _CovariateRaster(raster.name, raster.cache_path, raster.transform, raster.shape)
+            for name, raster in self._rasters.items()
+        }
+        return state
+    
+    @property
+    def names(self) -> List[str]:
+        return list(self.layers.keys())
+    
+    def __len__(self) -> int:
+        return len(self.layers)
+    
+    def register(self, layer: EnvironmentalLayer) -> None:
+        """Registar camada (carregada apenas no primeiro acesso)"""
+        self.layers[layer.name] = layer
+        self._rasters.pop(layer.name, None)
+    
+    def _cache_path(self, layer: EnvironmentalLayer) -> Path:
+        source = Path(layer.file_path)
+        stat = source.stat()
+        key = f"{source.resolve()}:{stat.st_size}:{int(stat.st_mtime)}"
+        digest = hashlib.md5(key.encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"{layer.name}-{digest}.npy"
+    
+    def _load(self, name: str) -> _CovariateRaster:
+        raster = self._rasters.get(name)
+        if raster is not None:
+            if raster.data is None:
+                raster.data = np.load(raster.cache_path, mmap_mode='r')
+            return raster
+        
+        layer = self.layers[name]
+        cache_path = self._cache_path(layer)
+        
+        with rasterio.open(layer.file_path) as src:
+            transform = tuple(src.transform)[:6]
+            shape = (src.height, src.width)
+            
+            if not cache_path.exists():
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix('.tmp.npy')
+                target = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=shape)
+                
+                # Leitura por blocos de linhas: o raster nunca está todo em memória
+                for row in range(0, src.height, self.block_rows):
+                    height = min(self.block_rows, src.height - row)
+                    window = rasterio.windows.Window(0, row, src.width, height)
+                    block = src.read(1, window=window, masked=True).astype(np.float32)
+                    target[row:row + height] = block.filled(np.nan)
+                
+                target.flush()
+                del target
+                tmp_path.replace(cache_path)
+                logger.info(f"🗺️ Camada '{name}' convertida para cache memory-mapped ({shape[0]}x{shape[1]})")
+        
+        raster = _CovariateRaster(
+            name=name,
+            cache_path=str(cache_path),
+            transform=transform,
+            shape=shape,
+            data=np.load(cache_path, mmap_mode='r')
+        )
+        self._rasters[name] = raster
+        return raster
+    
+    @staticmethod
+    def _bilinear(raster: _CovariateRaster, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Interpolação bilinear vetorizada (NaN fora do raster ou sem vizinhos válidos)"""
+        a, b, c, d, e, f = raster.transform
+        det = a * e - b * d
+        
+        # Transformação afim inversa → coordenadas de pixel (centros em +0.5)
+        x = lons - c
+        y = lats - f
+        cols = (e * x - b * y) / det - 0.5
+        rows = (-d * x + a * y) / det - 0.5
+        
+        height, width = raster.shape
+        inside = (rows >= -0.5) & (rows <= height - 0.5) & (cols >= -0.5) & (cols <= width - 0.5)
+        
+        rows = np.clip(rows, 0, height - 1)
+        cols = np.clip(cols, 0, width - 1)
+        r0 = np.minimum(np.floor(rows).astype(np.int64), max(height - 2, 0))
+        c0 = np.minimum(np.floor(cols).astype(np.int64), max(width - 2, 0))
+        r1 = np.minimum(r0 + 1, height - 1)
+        c1 = np.minimum(c0 + 1, width - 1)
+        dr = rows - r0
+        dc = cols - c0
+        
+        data = raster.data
+        corners = (
+            (data[r0, c0], (1 - dr) * (1 - dc)),
+            (data[r0, c1], (1 - dr) * dc),
+            (data[r1, c0], dr * (1 - dc)),
+            (data[r1, c1], dr * dc)
+        )
+        
+        # Renormalizar os pesos sobre os vizinhos válidos (nodata → NaN)
+        total = np.zeros(len(lats))
+        weight = np.zeros(len(lats))
+        for values, w in corners:
+            valid = ~np.isnan(values)
+            total += np.where(valid, values, 0.0) * w
+            weight += valid * w
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sampled = total / weight
+        sampled[~inside | (weight == 0)] = np.nan
+        return sampled
+    
+    def sample(self, lats: np.ndarray, lons: np.ndarray,
+               names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Amostrar covariáveis em arrays de coordenadas
+        
+        Returns:
+            Dicionário nome da camada → valores (float64, NaN sem dados)
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        names = names or self.names
+        
+        result = {name: np.empty(len(lats)) for name in names}
+        for name in names:
+            raster = self._load(name)
+            for start in range(0, len(lats), self.chunk_size):
+                end = start + self.chunk_size
+                result[name][start:end] = self._bilinear(raster, lats[start:end], lons[start:end])
+        return result
+
+
+# Estado global dos processos worker de predição (definido pelo initializer do pool)
+_prediction_worker_state: Dict[str, object] = {}
+
+
+def _init_prediction_worker(store: EnvironmentalCovariateStore, model, feature_cols: List[str]) -> None:
+    """Inicializar processo worker: modelo e covariáveis são enviados uma única vez"""
+    _prediction_worker_state['store'] = store
+    _prediction_worker_state['model'] = model
+    _prediction_worker_state['feature_cols'] = feature_cols
+
+
+def _predict_tile_worker(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Prever um tile num processo worker"""
+    return MaxEntService._predict_tile(
+        _prediction_worker_state['store'],
+        _prediction_worker_state['model'],
+        _prediction_worker_state['feature_cols'],
+        lats,
+        lons
+    )
+
+
 class MaxEntService:
     """
     🎯 Serviço MaxEnt para Modelação de Distribuição de Espécies
@@ -104,6 +292,12 @@ class MaxEntService:
         # Criar diretórios se não existirem
         for dir_path in [self.data_dir, self.models_dir, self.output_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
+        
+        # Covariáveis em raster (sem camadas registadas usa valores simulados)
+        self.covariate_store = EnvironmentalCovariateStore(
+            self.data_dir / 'covariates',
+            chunk_size=self.config['covariate_chunk_size']
+        )
             
         logger.info("🚀 Serviço MaxEnt inicializado com sucesso")
     
@@ -119,6 +313,9 @@ class MaxEntService:
             'test_size': 0.2,
             'random_state': 42,
             'n_background_points': 10000,
+            'covariate_chunk_size': 1000000,
+            'prediction_tile_size': 262144,
+            'prediction_workers': 0,
             'angola_bounds': {
                 'min_lat': -18.0,
                 'max_lat': -4.0,
@@ -268,6 +465,7 @@ class MaxEntService:
             layer: Camada ambiental com metadados
         """
         self.environmental_layers[layer.name] = layer
+        self.covariate_store.register(layer)
         logger.info(f"✅ Camada ambiental '{layer.name}' adicionada")
     
     def generate_background_points(self, n_points: Optional[int] = None) -> List[Tuple[float, float]]:
@@ -296,65 +494,80 @@ class MaxEntService:
     
     def extract_environmental_values(
         self, 
-        coordinates: List[Tuple[float, float]]
+        coordinates: Union[List[Tuple[float, float]], np.ndarray]
     ) -> pd.DataFrame:
         """
         🌍 Extrair valores ambientais para coordenadas específicas
         
+        Com camadas registadas (add_environmental_layer) as covariáveis são amostradas
+        dos rasters por interpolação bilinear; caso contrário são simuladas.
+        Pontos fora dos rasters ficam com NaN.
+        
         Args:
-            coordinates: Lista de coordenadas (lat, lon)
+            coordinates: Lista ou array (n, 2) de coordenadas (lat, lon)
             
         Returns:
             DataFrame com valores ambientais
         """
-        logger.info(f"🌍 Extraindo valores ambientais para {len(coordinates)} pontos")
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        logger.info(f"🌍 Extraindo valores ambientais para {len(coords)} pontos")
         
-        # Por agora, usar valores simulados baseados em dados reais de Angola
-        # Em implementação futura, integrar com rasters reais
-        
-        data = []
-        for lat, lon in coordinates:
-            # Simular valores ambientais baseados na localização
-            env_values = self._simulate_environmental_values(lat, lon)
-            env_values['latitude'] = lat
-            env_values['longitude'] = lon
-            data.append(env_values)
-        
-        df = pd.DataFrame(data)
+        df = self._covariate_frame(self.covariate_store, coords[:, 0], coords[:, 1])
         logger.info(f"✅ Valores ambientais extraídos para {len(df)} pontos")
         return df
     
+    @staticmethod
+    def _covariate_frame(store: EnvironmentalCovariateStore,
+                         lats: np.ndarray, lons: np.ndarray) -> pd.DataFrame:
+        """Covariáveis (raster ou simuladas) + coordenadas num DataFrame"""
+        if len(store):
+            columns = store.sample(lats, lons)
+        else:
+            columns = MaxEntService._simulate_environmental_arrays(lats, lons)
+        columns['latitude'] = lats
+        columns['longitude'] = lons
+        return pd.DataFrame(columns)
+    
     def _simulate_environmental_values(self, lat: float, lon: float) -> Dict[str, float]:
         """Simular valores ambientais baseados na localização"""
+        values = self._simulate_environmental_arrays(np.array([lat]), np.array([lon]))
+        return {name: float(column[0]) for name, column in values.items()}
+    
+    @staticmethod
+    def _simulate_environmental_arrays(lats: np.ndarray, lons: np.ndarray) -> Dict[str, np.ndarray]:
+        """Simular valores ambientais para arrays de coordenadas (vetorizado)"""
         # Valores simulados mas realistas para Angola
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        n = len(lats)
         
         # Temperatura do mar (baseada na latitude - mais quente no norte)
-        sst = 24 + (lat + 18) * 0.3 + np.random.normal(0, 1)
+        sst = 24 + (lats + 18) * 0.3 + np.random.normal(0, 1, n)
         
         # Salinidade (varia com proximidade à costa)
-        salinity = 35 + np.random.normal(0, 0.5)
+        salinity = 35 + np.random.normal(0, 0.5, n)
         
         # Clorofila-a (maior perto da costa devido ao upwelling)
         # Costa de Angola tem upwelling forte
-        coastal_distance = min(abs(lon - 13), abs(lat + 12))  # Aproximação
-        chlorophyll = max(0.1, 2.0 - coastal_distance * 0.1 + np.random.normal(0, 0.2))
+        coastal_distance = np.minimum(np.abs(lons - 13), np.abs(lats + 12))  # Aproximação
+        chlorophyll = np.maximum(0.1, 2.0 - coastal_distance * 0.1 + np.random.normal(0, 0.2, n))
         
         # Profundidade (simulada baseada na distância da costa)
-        bathymetry = -50 - coastal_distance * 100 + np.random.normal(0, 20)
+        bathymetry = -50 - coastal_distance * 100 + np.random.normal(0, 20, n)
         
         # Velocidade da corrente
-        current_speed = 0.2 + np.random.normal(0, 0.1)
+        current_speed = 0.2 + np.random.normal(0, 0.1, n)
         
         # Produtividade primária
-        primary_productivity = chlorophyll * 50 + np.random.normal(0, 10)
+        primary_productivity = chlorophyll * 50 + np.random.normal(0, 10, n)
         
         return {
-            'sea_surface_temperature': max(20, min(30, sst)),
-            'salinity': max(30, min(40, salinity)),
-            'chlorophyll_a': max(0.01, chlorophyll),
-            'bathymetry': min(-10, bathymetry),
-            'current_speed': max(0, current_speed),
-            'primary_productivity': max(0, primary_productivity)
+            'sea_surface_temperature': np.clip(sst, 20, 30),
+            'salinity': np.clip(salinity, 30, 40),
+            'chlorophyll_a': np.maximum(0.01, chlorophyll),
+            'bathymetry': np.minimum(-10, bathymetry),
+            'current_speed': np.maximum(0, current_speed),
+            'primary_productivity': np.maximum(0, primary_productivity)
         }
     
     async def train_maxent_model(
@@ -401,6 +614,9 @@ class MaxEntService:
         # Preparar features e target
         feature_cols = [col for col in full_dataset.columns 
                        if col not in ['latitude', 'longitude', 'presence']]
+        
+        # Pontos fora da cobertura dos rasters não entram no treino
+        full_dataset = full_dataset.dropna(subset=feature_cols)
         X = full_dataset[feature_cols]
         y = full_dataset['presence']
         
@@ -461,29 +677,70 @@ class MaxEntService:
         self, 
         model, 
         feature_cols: List[str], 
-        resolution: float = 0.1
+        resolution: float = 0.1,
+        tile_size: Optional[int] = None,
+        n_workers: Optional[int] = None
     ) -> np.ndarray:
-        """Gerar mapa de predição de adequação de habitat"""
+        """
+        Gerar mapa de predição de adequação de habitat
+        
+        A grelha é dividida em tiles de `tile_size` células; cada tile é amostrado e
+        previsto em lote. Com `n_workers` > 0 os tiles correm num pool de processos
+        (modelo e covariáveis são enviados uma vez por worker). Células sem
+        covariáveis válidas ficam com NaN.
+        """
         bounds = self.config['angola_bounds']
+        tile_size = tile_size or self.config['prediction_tile_size']
+        n_workers = self.config['prediction_workers'] if n_workers is None else n_workers
         
-        # Criar grid de predição
+        # Criar grid de predição (mesma orientação do meshgrid original: linhas = longitude)
         lats = np.arange(bounds['min_lat'], bounds['max_lat'], resolution)
         lons = np.arange(bounds['min_lon'], bounds['max_lon'], resolution)
-        
-        lat_grid, lon_grid = np.meshgrid(lats, lons)
-        coords = list(zip(lat_grid.ravel(), lon_grid.ravel()))
-        
-        # Extrair valores ambientais para o grid
-        env_data = self.extract_environmental_values(coords)
-        
-        # Fazer predições
-        predictions = model.predict_proba(env_data[feature_cols])[:, 1]
+        shape = (len(lons), len(lats))
+        n_cells = shape[0] * shape[1]
+        
+        def tile_coords(start: int) -> Tuple[np.ndarray, np.ndarray]:
+            cells = np.arange(start, min(start + tile_size, n_cells))
+            return lats[cells % len(lats)], lons[cells // len(lats)]
+        
+        starts = range(0, n_cells, tile_size)
+        predictions = np.empty(n_cells)
+        
+        if n_workers and len(starts) > 1:
+            with ProcessPoolExecutor(
+                max_workers=min(n_workers, os.cpu_count() or 1, len(starts)),
+                initializer=_init_prediction_worker,
+                initargs=(self.covariate_store, model, feature_cols)
+            ) as executor:
+                futures = {
+                    start: executor.submit(_predict_tile_worker, *tile_coords(start))
+                    for start in starts
+                }
+                for start, future in futures.items():
+                    tile = future.result()
+                    predictions[start:start + len(tile)] = tile
+        else:
+            for start in starts:
+                tile = self._predict_tile(self.covariate_store, model, feature_cols, *tile_coords(start))
+                predictions[start:start + len(tile)] = tile
         
         # Reformatar como mapa
-        prediction_map = predictions.reshape(lat_grid.shape)
+        prediction_map = predictions.reshape(shape)
         
         return prediction_map
     
+    @staticmethod
+    def _predict_tile(store: EnvironmentalCovariateStore, model, feature_cols: List[str],
+                      lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Amostrar covariáveis e prever um tile em lote"""
+        features = MaxEntService._covariate_frame(store, lats, lons)[feature_cols]
+        valid = features.notna().all(axis=1).to_numpy()
+        
+        predictions = np.full(len(lats), np.nan)
+        if valid.any():
+            predictions[valid] = model.predict_proba(features[valid])[:, 1]
+        return predictions
+    
     def visualize_results(self, result: MaxEntResult, save_path: Optional[str] = None) -> None:
         """
         📊 Visualizar resultados da modelação MaxEnt
@@ -588,7 +845,9 @@ class MaxEntService:
         env_values = self.extract_environmental_values([(latitude, longitude)])
         feature_cols = [col for col in env_values.columns 
                        if col not in ['latitude', 'longitude']]
-        
+        if env_values[feature_cols].isna().to_numpy().any():
+            raise ValueError(f"❌ Sem dados ambientais para ({latitude}, {longitude})")
+
         # Fazer predição
         probability = model.predict_proba(env_values[feature_cols])[0, 1]
         prediction = model.predict(env_values[feature_cols])[0]
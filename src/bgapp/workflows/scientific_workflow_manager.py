@@ -6,8 +6,14 @@ workflows pré-definidos e personalizáveis para investigação marinha de Angol
 """
 
 import asyncio
+import copy
+import hashlib
 import json
 import logging
+import math
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Union, Callable
@@ -91,6 +97,178 @@ class ScientificWorkflow:
     auto_publish: bool = False
 
 
+# Funções científicas CPU-bound, executadas num ProcessPoolExecutor.
+# Assinatura (parameters, inputs) -> resultado, onde inputs são os resultados das
+# dependências; ficam ao nível do módulo para serem picklable.
+
+def compute_biodiversity_indices(parameters: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Índices de Shannon, Simpson, Margalef e Pielou a partir de abundâncias por espécie"""
+    abundances = parameters.get('abundances')
+    if not abundances:
+        # Sem abundâncias explícitas: série geométrica a partir das contagens recolhidas
+        species = max((r.get('species_count', 0) for r in inputs.values() if isinstance(r, dict)), default=0)
+        records = sum(r.get('records_collected', 0) for r in inputs.values() if isinstance(r, dict))
+        species = int(parameters.get('species_count', species))
+        records = int(parameters.get('records_collected', records))
+        if species <= 0 or records <= 0:
+            raise ValueError("Sem abundâncias nem contagens de espécies para calcular índices")
+        ratio = float(parameters.get('dominance_ratio', 0.9))
+        weights = [ratio ** i for i in range(species)]
+        total_weight = sum(weights)
+        abundances = [max(1, round(records * w / total_weight)) for w in weights]
+
+    abundances = [float(a) for a in abundances if a > 0]
+    total = sum(abundances)
+    richness = len(abundances)
+    proportions = [a / total for a in abundances]
+
+    shannon = -sum(p * math.log(p) for p in proportions)
+    simpson = 1.0 - sum(p * p for p in proportions)
+    margalef = (richness - 1) / math.log(total) if total > 1 else 0.0
+    pielou = shannon / math.log(richness) if richness > 1 else 0.0
+
+    return {
+        'shannon_index': round(shannon, 4),
+        'simpson_index': round(simpson, 4),
+        'margalef_richness': round(margalef, 4),
+        'pielou_evenness': round(pielou, 4),
+        'species_richness': richness,
+        'total_abundance': int(total)
+    }
+
+
+PROCESS_POOL_FUNCTIONS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = {
+    'calculate_biodiversity_indices': compute_biodiversity_indices
+}
+
+# Funções que dependem do momento de execução (dados externos) ou que produzem
+# artefactos do próprio workflow (relatórios, mapas): nunca servidas da cache
+VOLATILE_FUNCTIONS = {
+    'collect_biodiversity_data',
+    'fetch_copernicus_daily_data',
+    'collect_fisheries_statistics',
+    'collect_sst_timeseries',
+    'check_environmental_alerts',
+    'prepare_species_occurrence_data',
+    'prepare_environmental_layers',
+    'generate_scientific_report',
+    'generate_fisheries_report',
+    'generate_species_distribution_maps'
+}
+
+
+class WorkflowStepCache:
+    """
+    Cache de resultados de passos, indexada pelo hash das entradas
+
+    LRU em memória com persistência em JSON (um ficheiro por hash), para que uma
+    nova execução do mesmo workflow salte passos cujas entradas não mudaram.
+    Os ficheiros expiram após `max_age_days` e o diretório é limitado a
+    `max_disk_entries` (os menos usados recentemente são removidos primeiro).
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_entries: int = 512,
+                 max_disk_entries: int = 5000, max_age_days: float = 30.0,
+                 prune_every: int = 100):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.prune_every = prune_every
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._writes_since_prune = 0
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+        self.prune()
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{key}.json" if self.cache_dir else None
+
+    def get(self, key: str) -> Optional[Any]:
+        # Devolver cópias: quem consome o resultado pode alterá-lo sem corromper a cache
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return copy.deepcopy(self._entries[key])
+
+        path = self._path(key)
+        if path is not None and path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                # Acesso renova o mtime, que serve de ordem LRU na poda do disco
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                self._remember(key, value)
+                self.stats['hits'] += 1
+                return copy.deepcopy(value)
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, value: Any):
+        self._remember(key, copy.deepcopy(value))
+        self.stats['writes'] += 1
+
+        path = self._path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"⚠️ Não foi possível persistir cache do passo {key}: {e}")
+            return
+
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= self.prune_every:
+            self.prune()
+
+    def prune(self) -> int:
+        """Remover do disco entradas expiradas e as mais antigas acima do limite"""
+        self._writes_since_prune = 0
+        if self.cache_dir is None or not self.cache_dir.exists():
+            return 0
+
+        files = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        files.sort(reverse=True)
+
+        cutoff = time.time() - self.max_age_seconds
+        evicted = 0
+        for index, (mtime, path) in enumerate(files):
+            if index < self.max_disk_entries and mtime >= cutoff:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._entries.pop(path.stem, None)
+            evicted += 1
+
+        if evicted:
+            self.stats['evicted'] += evicted
+            logger.info(f"🧹 Cache de passos: {evicted} entradas removidas do disco")
+        return evicted
+
+    def _remember(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
 class ScientificWorkflowManager:
     """
     🔬 Gestor de Workflows Científicos BGAPP
@@ -99,7 +277,8 @@ class ScientificWorkflowManager:
     da biodiversidade e oceanografia da ZEE de Angola.
     """
     
-    def __init__(self):
+    def __init__(self, step_cache_dir: Optional[str] = "data/workflows/step_cache",
+                 max_process_workers: Optional[int] = None):
         """Inicializar gestor de workflows"""
         
         # Registry de workflows
@@ -117,6 +296,12 @@ class ScientificWorkflowManager:
         # Scheduler para workflows recorrentes
         self.scheduler_active = False
         
+        # Execução: cache de passos por hash das entradas e pool de processos (lazy)
+        self.step_cache = WorkflowStepCache(Path(step_cache_dir) if step_cache_dir else None)
+        self.max_process_workers = max_process_workers or min(4, os.cpu_count() or 1)
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._workflow_tasks: Dict[str, asyncio.Task] = {}
+        
         # Métricas de workflows
         self.workflow_metrics = {
             'total_workflows': 0,
@@ -126,7 +311,8 @@ class ScientificWorkflowManager:
             'scheduled_workflows': 0,
             'total_analysis_hours': 0.0,
             'species_analyzed': set(),
-            'publications_generated': 0
+            'publications_generated': 0,
+            'steps_from_cache': 0
         }
     
     def _initialize_workflow_templates(self) -> Dict[str, Dict[str, Any]]:
@@ -344,7 +530,6 @@ class ScientificWorkflowManager:
             'collect_fisheries_statistics': self._collect_fisheries_statistics,
             
             # Funções de análise
-            'calculate_biodiversity_indices': self._calculate_biodiversity_indices,
             'perform_quality_control': self._perform_quality_control,
             'calculate_oceanographic_statistics': self._calculate_oceanographic_statistics,
             'analyze_catch_trends': self._analyze_catch_trends,
@@ -490,7 +675,9 @@ class ScientificWorkflowManager:
         logger.info(f"▶️ Iniciando execução do workflow: {workflow.name}")
         
         # Executar em background
-        asyncio.create_task(self._execute_workflow_steps(workflow))
+        task = asyncio.create_task(self._execute_workflow_steps(workflow))
+        self._workflow_tasks[workflow_id] = task
+        task.add_done_callback(lambda _: self._workflow_tasks.pop(workflow_id, None))
         
         return {
             'workflow_id': workflow_id,
@@ -498,59 +685,143 @@ class ScientificWorkflowManager:
             'estimated_completion': (datetime.now() + timedelta(seconds=workflow.metadata.get('estimated_total_duration', 3600))).isoformat()
         }
     
+    @staticmethod
+    def _topological_order(steps_by_id: Dict[str, WorkflowStep]) -> List[str]:
+        """Ordem topológica (Kahn); falha com dependências desconhecidas ou circulares"""
+        for step in steps_by_id.values():
+            unknown = [dep for dep in step.dependencies if dep not in steps_by_id]
+            if unknown:
+                raise ValueError(f"Passo {step.step_id} depende de passos inexistentes: {unknown}")
+        
+        pending = {step_id: len(set(step.dependencies)) for step_id, step in steps_by_id.items()}
+        dependents: Dict[str, List[str]] = {step_id: [] for step_id in steps_by_id}
+        for step in steps_by_id.values():
+            for dep in set(step.dependencies):
+                dependents[dep].append(step.step_id)
+        
+        ready = [step_id for step_id, count in pending.items() if count == 0]
+        order = []
+        while ready:
+            step_id = ready.pop(0)
+            order.append(step_id)
+            for child in dependents[step_id]:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    ready.append(child)
+        
+        if len(order) < len(steps_by_id):
+            cyclic = sorted(set(steps_by_id) - set(order))
+            raise ValueError(f"Dependência circular entre passos: {cyclic}")
+        return order
+    
     async def _execute_workflow_steps(self, workflow: ScientificWorkflow):
-        """Executar passos do workflow"""
+        """
+        Executar passos do workflow orientado por dependências
+        
+        Cada passo arranca assim que as suas dependências terminam (sem ondas),
+        e os tempos de cada passo alimentam a análise do caminho crítico.
+        """
         
+        step_tasks: Dict[asyncio.Task, str] = {}
         try:
             total_steps = len(workflow.steps)
             completed_steps = 0
             
             # Criar grafo de dependências
             steps_by_id = {step.step_id: step for step in workflow.steps}
-            completed_step_ids = set()
+            order = self._topological_order(steps_by_id)
+            remaining = {step_id: set(step.dependencies) for step_id, step in steps_by_id.items()}
+            dependents: Dict[str, List[str]] = {step_id: [] for step_id in steps_by_id}
+            for step in workflow.steps:
+                for dep in set(step.dependencies):
+                    dependents[dep].append(step.step_id)
             
-            while completed_steps < total_steps:
-                # Encontrar passos prontos para execução
-                ready_steps = []
-                for step in workflow.steps:
-                    if (step.step_id not in completed_step_ids and
-                        all(dep_id in completed_step_ids for dep_id in step.dependencies)):
-                        ready_steps.append(step)
-                
-                if not ready_steps:
-                    # Deadlock ou erro na configuração de dependências
-                    raise Exception("Nenhum passo pronto para execução - possível dependência circular")
-                
-                # Executar passos prontos em paralelo
-                step_tasks = []
-                for step in ready_steps:
-                    task = asyncio.create_task(self._execute_workflow_step(workflow, step))
-                    step_tasks.append((step.step_id, task))
+            timings: Dict[str, Dict[str, Any]] = {}
+            workflow.metadata['step_timings'] = timings
+            origin = time.perf_counter()
+            # Passos opcionais falhados e passos saltados por dependerem deles
+            unsatisfied: set = set()
+            
+            def settle(step_id: str):
+                """Libertar dependentes de um passo terminado; os que dependem de um passo falhado ou saltado também são saltados"""
+                nonlocal completed_steps
+                completed_steps += 1
+                workflow.progress = (completed_steps / total_steps) * 100
+                for child in dependents[step_id]:
+                    remaining[child].discard(step_id)
+                    if remaining[child] or child in timings:
+                        continue
+                    failed_deps = sorted(unsatisfied & set(steps_by_id[child].dependencies))
+                    if not failed_deps:
+                        launch(child)
+                        continue
+                    offset = round(time.perf_counter() - origin, 4)
+                    timings[child] = {
+                        'function': steps_by_id[child].function,
+                        'start_offset': offset,
+                        'end_offset': offset,
+                        'duration': 0.0,
+                        'status': 'skipped'
+                    }
+                    unsatisfied.add(child)
+                    workflow.error_log.append(
+                        f"Passo {child} saltado: depende de passos não concluídos {failed_deps}"
+                    )
+                    logger.warning(f"⏭️ Passo saltado: {steps_by_id[child].name} (dependências não concluídas: {failed_deps})")
+                    settle(child)
+            
+            def launch(step_id: str):
+                step = steps_by_id[step_id]
+                timings[step_id] = {
+                    'function': step.function,
+                    'start_offset': round(time.perf_counter() - origin, 4)
+                }
+                task = asyncio.create_task(self._execute_workflow_step(workflow, step))
+                step_tasks[task] = step_id
+            
+            for step_id in order:
+                if not remaining[step_id]:
+                    launch(step_id)
+            
+            while step_tasks:
+                done, _ = await asyncio.wait(list(step_tasks), return_when=asyncio.FIRST_COMPLETED)
                 
-                # Aguardar conclusão dos passos
-                for step_id, task in step_tasks:
+                for task in done:
+                    step_id = step_tasks.pop(task)
+                    step = steps_by_id[step_id]
+                    timing = timings[step_id]
+                    timing['end_offset'] = round(time.perf_counter() - origin, 4)
+                    timing['duration'] = round(timing['end_offset'] - timing['start_offset'], 4)
+                    
                     try:
-                        step_result = await task
-                        completed_step_ids.add(step_id)
-                        completed_steps += 1
-                        
-                        # Atualizar progresso
-                        workflow.progress = (completed_steps / total_steps) * 100
-                        workflow.current_step = f"Concluído: {steps_by_id[step_id].name}"
+                        step_result = task.result()
+                        timing['status'] = 'completed'
+                        timing['cache_hit'] = step_result.get('cache_hit', False)
+                        timing['executor'] = step_result.get('executor')
                         
                         # Armazenar resultado
                         workflow.output_data[step_id] = step_result
-                        
-                        logger.info(f"✅ Passo concluído: {steps_by_id[step_id].name}")
+                        if step_result.get('cache_hit'):
+                            self.workflow_metrics['steps_from_cache'] += 1
+                        logger.info(f"✅ Passo concluído: {step.name}")
                         
                     except Exception as e:
+                        timing['status'] = 'failed'
                         error_msg = f"Erro no passo {step_id}: {str(e)}"
                         workflow.error_log.append(error_msg)
                         logger.error(f"❌ {error_msg}")
                         
                         # Se passo não é opcional, falhar workflow
-                        if not steps_by_id[step_id].optional:
+                        if not step.optional:
                             raise Exception(error_msg)
+                        unsatisfied.add(step_id)
+                    
+                    workflow.current_step = f"Concluído: {step.name}"
+                    
+                    # Atualizar progresso e arrancar dependentes cujas dependências ficaram todas satisfeitas
+                    settle(step_id)
+            
+            workflow.metadata['critical_path'] = self._critical_path(steps_by_id, order, timings)
             
             # Workflow concluído com sucesso
             workflow.status = WorkflowStatus.COMPLETED
@@ -586,32 +857,120 @@ class ScientificWorkflowManager:
             self.workflow_metrics['failed_workflows'] += 1
             
             logger.error(f"❌ Workflow falhado: {workflow.name} - {str(e)}")
+        
+        finally:
+            # Falha ou cancelamento: não deixar passos órfãos em execução
+            for task in step_tasks:
+                task.cancel()
+    
+    @staticmethod
+    def _critical_path(steps_by_id: Dict[str, WorkflowStep], order: List[str],
+                       timings: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Caminho mais longo do DAG ponderado pela duração medida de cada passo"""
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for step_id in order:
+            duration = timings.get(step_id, {}).get('duration', 0.0)
+            deps = steps_by_id[step_id].dependencies
+            parent = max(deps, key=lambda dep: finish[dep]) if deps else None
+            finish[step_id] = (finish[parent] if parent else 0.0) + duration
+            previous[step_id] = parent
+        
+        if not finish:
+            return {'steps': [], 'duration_seconds': 0.0}
+        
+        step_id = max(finish, key=finish.get)
+        path = []
+        while step_id is not None:
+            path.append(step_id)
+            step_id = previous[step_id]
+        path.reverse()
+        
+        total_work = sum(t.get('duration', 0.0) for t in timings.values())
+        wall_time = max((t.get('end_offset', 0.0) for t in timings.values()), default=0.0)
+        return {
+            'steps': path,
+            'duration_seconds': round(finish[path[-1]], 4),
+            'wall_seconds': round(wall_time, 4),
+            'total_step_seconds': round(total_work, 4),
+            'parallelism': round(total_work / wall_time, 2) if wall_time > 0 else 0.0
+        }
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_process_workers)
+        return self._process_pool
+    
+    def shutdown(self):
+        """Terminar o pool de processos das funções CPU-bound"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+    
+    @staticmethod
+    def _step_input_hash(step: WorkflowStep, inputs: Dict[str, Any]) -> str:
+        """Hash da função, parâmetros e resultados das dependências"""
+        payload = json.dumps(
+            {'function': step.function, 'parameters': step.parameters, 'inputs': inputs},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
     
     async def _execute_workflow_step(self, workflow: ScientificWorkflow, step: WorkflowStep) -> Dict[str, Any]:
-        """Executar um passo individual do workflow"""
+        """Executar um passo individual do workflow (cache → pool de processos ou coroutine)"""
         
-        if step.function not in self.scientific_functions:
+        in_process_pool = step.function in PROCESS_POOL_FUNCTIONS
+        if not in_process_pool and step.function not in self.scientific_functions:
             raise Exception(f"Função científica '{step.function}' não encontrada")
         
-        function = self.scientific_functions[step.function]
-        
+        inputs = {
+            dep: workflow.output_data[dep].get('result')
+            for dep in step.dependencies if dep in workflow.output_data
+        }
+        input_hash = self._step_input_hash(step, inputs)
+        cacheable = step.function not in VOLATILE_FUNCTIONS
+        
+        if cacheable:
+            cached = self.step_cache.get(input_hash)
+            if cached is not None:
+                logger.info(f"♻️ Passo {step.name} servido da cache ({input_hash[:12]})")
+                return {
+                    'success': True,
+                    'result': cached,
+                    'execution_time': 0.0,
+                    'cache_hit': True,
+                    'input_hash': input_hash,
+                    'executor': 'cache'
+                }
+        
+        started = time.perf_counter()
         try:
             # Executar função com timeout
-            result = await asyncio.wait_for(
-                function(workflow, step),
-                timeout=step.timeout
-            )
-            
-            return {
-                'success': True,
-                'result': result,
-                'execution_time': time.time()
-            }
+            if in_process_pool:
+                loop = asyncio.get_running_loop()
+                pending = loop.run_in_executor(
+                    self._get_process_pool(), PROCESS_POOL_FUNCTIONS[step.function], step.parameters, inputs
+                )
+            else:
+                pending = self.scientific_functions[step.function](workflow, step)
+            result = await asyncio.wait_for(pending, timeout=step.timeout)
             
         except asyncio.TimeoutError:
             raise Exception(f"Passo '{step.name}' excedeu timeout de {step.timeout} segundos")
         except Exception as e:
             raise Exception(f"Erro na execução: {str(e)}")
+        
+        if cacheable:
+            self.step_cache.put(input_hash, result)
+        
+        return {
+            'success': True,
+            'result': result,
+            'execution_time': time.perf_counter() - started,
+            'cache_hit': False,
+            'input_hash': input_hash,
+            'executor': 'process' if in_process_pool else 'async'
+        }
     
     # Implementações das funções científicas (simuladas)
     async def _collect_biodiversity_data(self, workflow: ScientificWorkflow, step: WorkflowStep) -> Dict[str, Any]:
@@ -658,18 +1017,6 @@ class ScientificWorkflowManager:
             'period_days': period_days
         }
     
-    async def _calculate_biodiversity_indices(self, workflow: ScientificWorkflow, step: WorkflowStep) -> Dict[str, Any]:
-        """Calcular índices de biodiversidade"""
-        await asyncio.sleep(1)
-        
-        return {
-            'shannon_index': 2.45,
-            'simpson_index': 0.83,
-            'margalef_richness': 4.12,
-            'pielou_evenness': 0.78,
-            'species_richness': 45
-        }
-    
     async def _perform_quality_control(self, workflow: ScientificWorkflow, step: WorkflowStep) -> Dict[str, Any]:
         """Realizar controle de qualidade"""
         threshold = step.parameters.get('threshold', 0.8)
@@ -1144,6 +1491,7 @@ class ScientificWorkflowManager:
             'steps_count': len(workflow.steps),
             'output_data_keys': list(workflow.output_data.keys()),
             'error_count': len(workflow.error_log),
+            'critical_path': workflow.metadata.get('critical_path'),
             'metadata': workflow.metadata
         }
     
@@ -1160,6 +1508,12 @@ class ScientificWorkflowManager:
         
         if workflow_id in self.active_workflows:
             workflow = self.active_workflows[workflow_id]
+            
+            # Interromper o executor (cancela os passos em curso)
+            task = self._workflow_tasks.pop(workflow_id, None)
+            if task is not None and not task.done():
+                task.cancel()
+            
             workflow.status = WorkflowStatus.CANCELLED
             workflow.completed_at = datetime.now()
             
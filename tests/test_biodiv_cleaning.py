@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Testes da limpeza vetorizada de ocorrências (bgapp.process.biodiv)
+Deduplicação entre chunks e tratamento de coordenadas em falta
+"""
+
+import importlib.util
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Carregar o módulo diretamente: `import bgapp` arranca a Admin API inteira
+_spec = importlib.util.spec_from_file_location(
+    "bgapp_process_biodiv",
+    Path(__file__).resolve().parent.parent / "src" / "bgapp" / "process" / "biodiv.py"
+)
+biodiv = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(biodiv)
+
+OccurrenceDeduplicator = biodiv.OccurrenceDeduplicator
+clean_occurrence_mask = biodiv.clean_occurrence_mask
+clean_occurrences = biodiv.clean_occurrences
+occurrence_hashes = biodiv.occurrence_hashes
+iter_clean_occurrences = biodiv.iter_clean_occurrences
+
+
+def _occurrences(rows: int = 5000, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Poucas combinações distintas: muitos duplicados, espalhados por todos os chunks
+    return pd.DataFrame({
+        "decimalLongitude": rng.integers(0, 40, rows) * 0.25 + 8.5,
+        "decimalLatitude": rng.integers(0, 40, rows) * -0.25 - 4.2,
+        "scientificName": rng.choice(["Sardinella aurita", "Thunnus albacares", "Merluccius capensis"], rows),
+        "eventDate": rng.choice(["2024-01-01", "2024-02-01"], rows),
+    })
+
+
+def test_duplicates_removed_across_chunks():
+    """O streaming em chunks mantém exatamente os mesmos registos que a limpeza de uma só vez"""
+    df = _occurrences()
+    expected = clean_occurrences(df.to_dict("records"))
+
+    chunks = [df.iloc[start:start + 700] for start in range(0, len(df), 700)]
+    kept = pd.concat(list(iter_clean_occurrences(chunks)))
+
+    assert len(kept) == len(expected)
+    assert not kept.duplicated().any()
+
+
+def test_shared_deduplicator_is_used_while_empty():
+    """Um deduplicador partilhado vazio (falsy) tem de ser usado, não substituído"""
+    df = _occurrences(rows=200)
+    deduplicator = OccurrenceDeduplicator()
+
+    first = clean_occurrence_mask(df, deduplicator=deduplicator)
+    assert len(deduplicator) == int(first.sum())
+
+    # O mesmo chunk outra vez: tudo já foi visto
+    assert not clean_occurrence_mask(df, deduplicator=deduplicator).any()
+
+
+def test_missing_coordinates_without_runtime_warning():
+    """Coordenadas NaN são descartadas sem avisos do cast para inteiro"""
+    df = pd.DataFrame({
+        "decimalLongitude": [13.2, np.nan, 13.2, "x"],
+        "decimalLatitude": [-8.8, -8.8, np.nan, -8.8],
+        "scientificName": ["Sardinella aurita"] * 4,
+        "eventDate": ["2024-01-01"] * 4,
+    })
+    lon = pd.to_numeric(df["decimalLongitude"], errors="coerce").to_numpy(dtype=np.float64)
+    lat = pd.to_numeric(df["decimalLatitude"], errors="coerce").to_numpy(dtype=np.float64)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        hashes = occurrence_hashes(df, lon, lat)
+        keep = clean_occurrence_mask(df)
+    assert hashes.shape == (4,)
+    assert keep.tolist() == [True, False, False, False]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Testes da análise de sensibilidade MCDA (bgapp.qgis.sustainable_zones_mcda)
+A versão vetorizada tem de reproduzir o ciclo original critério × variação
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+
+# Carregar o módulo diretamente: `import bgapp` arranca a Admin API inteira
+_spec = importlib.util.spec_from_file_location(
+    "bgapp_qgis_sustainable_zones_mcda",
+    Path(__file__).resolve().parent.parent / "src" / "bgapp" / "qgis" / "sustainable_zones_mcda.py"
+)
+mcda = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(mcda)
+
+WEIGHTS = [0.35, 0.25, 0.2, 0.15, 0.05]
+VARIATIONS = [0.8, 0.9, 1.0, 1.1, 1.2]
+
+
+def _criteria():
+    rng = np.random.default_rng(11)
+    return [
+        mcda.MCDACriterion(
+            name=f"c{i}", description="", criterion_type=list(mcda.CriteriaType)[0],
+            weight=weight, data=rng.random((20, 20)), units=""
+        )
+        for i, weight in enumerate(WEIGHTS)
+    ]
+
+
+def _loop_sensitivity(criteria):
+    """Ciclo original: os outros pesos j são ajustados por (1 - w_j * var) / (1 - w_j)"""
+    original_mean = np.mean(sum(c.weight * c.data for c in criteria))
+    results = []
+    for i in range(len(criteria)):
+        rows = []
+        for variation in VARIATIONS:
+            modified = []
+            for j, c in enumerate(criteria):
+                if j == i:
+                    new_weight = c.weight * variation
+                else:
+                    factor = (1.0 - c.weight * variation) / (1.0 - c.weight) if (1.0 - c.weight) > 0 else 1.0
+                    new_weight = c.weight * factor
+                modified.append(max(0.01, min(0.99, new_weight)))
+            total = sum(modified)
+            modified = [weight / total for weight in modified]
+            mean = np.mean(sum(weight * c.data for weight, c in zip(modified, criteria)))
+            rows.append((modified[i], mean - original_mean))
+        results.append(rows)
+    return results
+
+
+def test_vectorized_sensitivity_matches_loop(tmp_path):
+    criteria = _criteria()
+    engine = mcda.SustainableZonesMCDA(stack_dir=str(tmp_path))
+    result = engine._perform_sensitivity_analysis(criteria, mcda.MCDAMethod.WEIGHTED_SUM)
+
+    expected = _loop_sensitivity(criteria)
+    for i, criterion_result in enumerate(result['weight_variations']):
+        changes = criterion_result['suitability_changes']
+        assert [change['weight_multiplier'] for change in changes] == VARIATIONS
+        for change, (new_weight, mean_change) in zip(changes, expected[i]):
+            assert np.isclose(change['new_weight'], new_weight)
+            assert np.isclose(change['mean_suitability_change'], mean_change, atol=1e-12)